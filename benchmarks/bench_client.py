@@ -0,0 +1,293 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+bench_client.py
+
+Throughput, latency and memory of the client against the local mock API
+(see clubhouse/mockserver.py), started in a separate process so that it
+does not compete with the client for the GIL.
+
+Results are written as JSON. Pass the results of a previous run with
+--compare to see the change of every number.
+
+$ python benchmarks/bench_client.py --output before.json
+$ python benchmarks/bench_client.py --compare before.json
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import socket
+import asyncio
+import platform
+import argparse
+import tracemalloc
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# pylint: disable=wrong-import-position
+from clubhouse.clubhouse import Clubhouse, AsyncClubhouse
+from clubhouse.metrics import Histogram, MetricsCollector
+
+USER_ID, USER_TOKEN, USER_DEVICE = "1", "benchmark", "benchmark"
+
+def free_port():
+    """ () -> int """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(args):
+    """ (Namespace) -> (subprocess.Popen, str)
+
+    Start the mock API and wait until it accepts connections.
+    """
+    port = free_port()
+    server = subprocess.Popen([
+        sys.executable, "-m", "clubhouse.mockserver",
+        "--port", str(port),
+        "--users", str(args.users),
+        "--room-size", str(args.room_size),
+        "--latency", str(args.latency),
+    ], cwd=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."), stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server, f"http://127.0.0.1:{port}/api"
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise Exception("The mock API did not start")
+
+def rss():
+    """ () -> int
+
+    Current resident set size in bytes, or the peak where unavailable.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource # pylint: disable=import-outside-toplevel
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+def summarize(count, elapsed, latency):
+    """ (int, float, Histogram) -> dict """
+    return {
+        "requests": count,
+        "seconds": round(elapsed, 4),
+        "rps": round(count / elapsed, 1),
+        "p50_ms": round(latency.percentile(50) * 1000, 3),
+        "p99_ms": round(latency.percentile(99) * 1000, 3),
+    }
+
+def bench_sync(client, call, requests, threads):
+    """ (Clubhouse, callable, int, int) -> dict
+
+    Run `requests` calls over `threads` threads.
+    """
+    latency = Histogram()
+    def timed(_):
+        start = time.perf_counter()
+        call(client)
+        latency.record(time.perf_counter() - start)
+    call(client)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(timed, range(requests)))
+    return summarize(requests, time.perf_counter() - start, latency)
+
+def bench_async(api_url, call, requests, concurrency):
+    """ (str, coroutine function, int, int) -> dict
+
+    Run `requests` calls with up to `concurrency` in flight.
+    """
+    latency = Histogram()
+    async def run():
+        AsyncClubhouse.API_URL = api_url
+        async with AsyncClubhouse(USER_ID, USER_TOKEN, USER_DEVICE, coalesce=False) as client:
+            await call(client)
+            semaphore = asyncio.Semaphore(concurrency)
+            async def timed():
+                async with semaphore:
+                    started = time.perf_counter()
+                    await call(client)
+                    latency.record(time.perf_counter() - started)
+            start = time.perf_counter()
+            await asyncio.gather(*(timed() for _ in range(requests)))
+            return time.perf_counter() - start
+    elapsed = asyncio.run(run())
+    return summarize(requests, elapsed, latency)
+
+def bench_allocations(client, call, calls):
+    """ (Clubhouse, callable, int) -> dict
+
+    Memory allocated and kept per call.
+    """
+    call(client)
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    for _ in range(calls):
+        call(client)
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "calls": calls,
+        "peak_bytes": peak,
+        "retained_bytes_per_call": round(current / calls, 1),
+        "retained_blocks_per_call": round((sys.getallocatedblocks() - blocks) / calls, 2),
+    }
+
+def bench_ping_rss(client, channel, pings):
+    """ (Clubhouse, str, int) -> dict
+
+    RSS growth over a long active_ping loop.
+    """
+    for _ in range(100):
+        client.active_ping(channel)
+    gc.collect()
+    before = rss()
+    samples = []
+    for i in range(pings):
+        client.active_ping(channel)
+        if i % max(1, pings // 10) == 0:
+            samples.append(rss())
+    gc.collect()
+    after = rss()
+    return {
+        "pings": pings,
+        "rss_before": before,
+        "rss_after": after,
+        "rss_growth": after - before,
+        "rss_samples": samples,
+    }
+
+def bench_decode(api_url, channel, calls):
+    """ (str, str, int) -> dict
+
+    JSON decode time per endpoint, from the client hooks.
+    """
+    Clubhouse.API_URL = api_url
+    collector = MetricsCollector()
+    with Clubhouse(USER_ID, USER_TOKEN, USER_DEVICE, coalesce=False, metrics=collector) as client:
+        for _ in range(calls):
+            client.get_channels()
+            client.get_channel(channel)
+            client.get_followers(USER_ID, page_size=200)
+            client.search_users("user1")
+    results = {}
+    for name, stats in collector.stats().items():
+        decode = stats["phases"]["decode"]
+        results[name] = {
+            "bytes": stats["bytes_received"] // stats["requests"],
+            "decode_p50_ms": round(decode["p50"], 3),
+            "decode_p99_ms": round(decode["p99"], 3),
+        }
+    return results
+
+def run(args, api_url):
+    """ (Namespace, str) -> dict """
+    Clubhouse.API_URL = api_url
+    client = Clubhouse(USER_ID, USER_TOKEN, USER_DEVICE, coalesce=False)
+    channel = client.get_channels()["channels"][0]["channel"]
+    client.join_channel(channel)
+
+    # Same calls for Clubhouse and AsyncClubhouse, where they return coroutines
+    calls = {
+        "get_channels": lambda c: c.get_channels(),
+        "get_channel": lambda c: c.get_channel(channel),
+        "active_ping": lambda c: c.active_ping(channel),
+    }
+    results = {"sync": {}, "threads": {}, "async": {}, "allocations": {}}
+    for name, call in calls.items():
+        results["sync"][name] = bench_sync(client, call, args.requests, 1)
+        results["threads"][name] = bench_sync(client, call, args.requests, args.concurrency)
+        results["async"][name] = bench_async(api_url, call, args.requests, args.concurrency)
+        results["allocations"][name] = bench_allocations(client, call, min(args.requests, 200))
+    results["active_ping_rss"] = bench_ping_rss(client, channel, args.pings)
+    results["decode"] = bench_decode(api_url, channel, 20)
+    client.close()
+    return results
+
+def flatten(results, prefix=""):
+    """ (dict, str) -> dict
+
+    Get the numbers of the results, keyed by their path.
+    """
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+def compare(old, new):
+    """ (dict, dict) -> NoneType
+
+    Print the change of every number between two runs.
+    """
+    old_flat, new_flat = flatten(old["results"]), flatten(new["results"])
+    for key in sorted(new_flat):
+        if key not in old_flat:
+            continue
+        before, after = old_flat[key], new_flat[key]
+        change = f"{(after - before) / before:+.1%}" if before else "n/a"
+        print(f"{key:60} {before:>14,.3f} {after:>14,.3f} {change:>9}")
+
+def main():
+    """ Main function """
+    parser = argparse.ArgumentParser(description="Client benchmark against the local mock API")
+    parser.add_argument("--api-url", help="use a running server instead of starting one")
+    parser.add_argument("--requests", type=int, default=1000, help="calls per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--pings", type=int, default=5000, help="active_ping calls of the RSS loop")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--room-size", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.0, help="latency of the mock API, in seconds")
+    parser.add_argument("--label", default="", help="free text stored with the results")
+    parser.add_argument("--output", help="write the results to this file instead of stdout")
+    parser.add_argument("--compare", help="results of a previous run")
+    args = parser.parse_args()
+
+    server = None
+    api_url = args.api_url
+    if api_url is None:
+        server, api_url = start_server(args)
+    try:
+        results = run(args, api_url)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = {
+        "label": args.label,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "codec": Clubhouse(coalesce=False).codec.name,
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare) as previous:
+            compare(json.load(previous), report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+bench_codec.py
+
+Decode time per endpoint for each installed JSON codec.
+
+Payloads are read from `<directory>/<endpoint>.json` (raw response bodies,
+e.g. saved with `curl -o`). Without a directory, synthetic get_channel,
+get_channels and get_club_members payloads are used.
+
+$ python benchmarks/bench_codec.py [directory]
+"""
+
+import os
+import sys
+import glob
+import json
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from clubhouse.codec import CODECS  # pylint: disable=wrong-import-position
+from bench_models import make_payload  # pylint: disable=wrong-import-position
+
+def synthetic_payloads():
+    """ () -> dict
+
+    Get synthetic response bodies, by endpoint.
+    """
+    channel = json.loads(make_payload(20))
+    channels = [dict(channel, channel=f"room{i}", users=channel['users'][:4]) for i in range(200)]
+    members = json.loads(make_payload(1000))['users']
+    return {
+        "get_channel": make_payload(5000).encode(),
+        "get_channels": json.dumps({"success": True, "channels": channels, "events": []}).encode(),
+        "get_club_members": json.dumps({"success": True, "users": members, "count": 1000, "next": 2}).encode(),
+    }
+
+def recorded_payloads(directory):
+    """ (str) -> dict
+
+    Get the response bodies saved in `directory`, by endpoint.
+    """
+    payloads = {}
+    for filename in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(filename, "rb") as payload:
+            payloads[os.path.splitext(os.path.basename(filename))[0]] = payload.read()
+    return payloads
+
+def installed_codecs():
+    """ () -> list of JSONCodec """
+    codecs = []
+    for codec in CODECS.values():
+        try:
+            codecs.append(codec())
+        except ImportError:
+            continue
+    return codecs
+
+def main():
+    """ Main function """
+    payloads = recorded_payloads(sys.argv[1]) if len(sys.argv) > 1 else synthetic_payloads()
+    if not payloads:
+        print("No payloads found")
+        return
+    codecs = installed_codecs()
+
+    print(f"{'endpoint':20} {'size':>10}" + "".join(f" {codec.name:>10}" for codec in codecs))
+    for name, payload in payloads.items():
+        row = f"{name:20} {len(payload):>10,}"
+        for codec in codecs:
+            timer = timeit.Timer(lambda: codec.loads(payload)) # pylint: disable=cell-var-from-loop
+            number, _ = timer.autorange()
+            row += f" {min(timer.repeat(3, number)) / number * 1000:>8.2f}ms"
+        print(row)
+
+if __name__ == "__main__":
+    main()
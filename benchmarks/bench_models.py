@@ -0,0 +1,91 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+bench_models.py
+
+Memory of a 5,000-user get_channel payload, kept as raw dicts vs models.
+
+$ python benchmarks/bench_models.py [num_users]
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from clubhouse import models  # pylint: disable=wrong-import-position
+
+def make_payload(num_users):
+    """ (int) -> str
+
+    Build a get_channel response with `num_users` users, as sent on the wire.
+    """
+    users = []
+    for i in range(num_users):
+        users.append({
+            "user_id": 1000000 + i,
+            "name": f"User {i}",
+            "username": f"user{i}",
+            "photo_url": f"https://clubhouseprod.s3.amazonaws.com:443/{1000000 + i}_photo",
+            "first_name": "User",
+            "skintone": 1 + i % 5,
+            "is_new": i % 7 == 0,
+            "is_speaker": i < 20,
+            "is_moderator": i < 3,
+            "is_invited_as_speaker": False,
+            "is_followed_by_speaker": i % 3 == 0,
+            "time_joined_as_speaker": "2021-02-14T10:00:00.000000+00:00" if i < 20 else None,
+        })
+    return json.dumps({
+        "success": True,
+        "channel": "abcd1234",
+        "channel_id": 12345678,
+        "topic": "Benchmark",
+        "is_private": False,
+        "is_social_mode": False,
+        "url": "https://www.joinclub.com/room/abcd1234",
+        "club": None,
+        "num_all": num_users,
+        "num_speakers": 20,
+        "users": users,
+        "pubnub_token": "token",
+        "pubnub_heartbeat_value": 30,
+        "token": "agora-token",
+    })
+
+def measure(payload, decoder):
+    """ (str, callable) -> (int, float)
+
+    Get the bytes retained by the decoded payload, and the decode time.
+    """
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = decoder(json.loads(payload))
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size, elapsed
+
+def main():
+    """ Main function """
+    num_users = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    payload = make_payload(num_users)
+    raw_size, raw_time = measure(payload, lambda result: result)
+    model_size, model_time = measure(payload, lambda result: models.decode("get_channel", result))
+
+    print(f"get_channel payload with {num_users} users ({len(payload)} bytes of JSON)")
+    print(f"{'':8} {'retained':>12} {'per user':>10} {'decode':>10}")
+    print(f"{'dict':8} {raw_size:>12,} {raw_size // num_users:>10,} {raw_time * 1000:>8.1f}ms")
+    print(f"{'models':8} {model_size:>12,} {model_size // num_users:>10,} {model_time * 1000:>8.1f}ms")
+    print(f"models use {model_size / raw_size:.0%} of the memory of raw dicts")
+
+if __name__ == "__main__":
+    main()
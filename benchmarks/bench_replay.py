@@ -0,0 +1,137 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+bench_replay.py
+
+CPU cost of the client alone, without any network.
+
+A session is recorded once against the local mock API (or taken from an
+existing capture file, see clubhouse/replay.py), then replayed many times
+through ReplayTransport. Every replay sends the same requests and gets the
+same responses, so runs can be compared with each other.
+
+$ python benchmarks/bench_replay.py --record session.jsonl
+$ python benchmarks/bench_replay.py --capture session.jsonl --rounds 200 --profile
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import cProfile
+import pstats
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# pylint: disable=wrong-import-position
+from clubhouse.clubhouse import Clubhouse
+from clubhouse.transport import HTTPTransport
+from clubhouse.metrics import MetricsCollector
+from clubhouse.ratelimit import Scheduler
+from clubhouse.replay import RecordingTransport, ReplayTransport
+from clubhouse.mockserver import MockServer, MockData
+
+USER_ID, USER_TOKEN, USER_DEVICE = "1", "benchmark", "benchmark"
+
+def session(client):
+    """ (Clubhouse) -> int
+
+    Calls of a user browsing the hallway and sitting in a room. Returns the number of calls.
+    """
+    channels = client.get_channels()["channels"]
+    calls = 1
+    for channel in channels[:3]:
+        name = channel["channel"]
+        info = client.join_channel(name)
+        users = info.get("users") or []
+        client.active_ping(name)
+        client.get_channel(name)
+        for user in users[:5]:
+            client.get_profile(user["user_id"])
+        client.audience_reply(name, True, False)
+        client.leave_channel(name)
+        calls += 5 + len(users[:5])
+    client.get_followers(USER_ID, page_size=50)
+    client.search_users("user1")
+    return calls + 2
+
+def unlimited():
+    """ () -> Scheduler
+
+    The scheduler without rate budgets, which would otherwise pace the replay.
+    """
+    return Scheduler(rates={name: None for name in Scheduler.DEFAULT_RATES})
+
+def record(path, users, room_size):
+    """ (str, int, int) -> int
+
+    Record one session against the mock API into `path`.
+    """
+    with MockServer(MockData(num_users=users, users_per_channel=room_size)) as server:
+        Clubhouse.API_URL = server.api_url
+        transport = RecordingTransport(HTTPTransport(), path)
+        with Clubhouse(USER_ID, USER_TOKEN, USER_DEVICE, transport=transport, scheduler=unlimited()) as client:
+            session(client)
+        return transport.writer.entries
+
+def replay(path, rounds, profile=None):
+    """ (str, int, cProfile.Profile) -> dict
+
+    Replay the session `rounds` times and time the client.
+    """
+    transport = ReplayTransport(path)
+    collector = MetricsCollector()
+    client = Clubhouse(USER_ID, USER_TOKEN, USER_DEVICE, transport=transport, scheduler=unlimited(), metrics=collector)
+    session(client)
+    collector.reset()
+    calls = 0
+    if profile is not None:
+        profile.enable()
+    cpu, start = time.process_time(), time.perf_counter()
+    for _ in range(rounds):
+        calls += session(client)
+    cpu, elapsed = time.process_time() - cpu, time.perf_counter() - start
+    if profile is not None:
+        profile.disable()
+    endpoints = {}
+    for name, stats in collector.stats().items():
+        endpoints[name] = {
+            "calls": stats["requests"],
+            "p50_us": round(stats["latency"]["p50"] * 1000, 1),
+            "decode_p50_us": round(stats["phases"]["decode"]["p50"] * 1000, 1),
+        }
+    return {
+        "calls": calls,
+        "calls_per_second": round(calls / elapsed, 1),
+        "cpu_us_per_call": round(cpu / calls * 1e6, 1),
+        "replay": transport.stats(),
+        "endpoints": endpoints,
+    }
+
+def main():
+    """ Main function """
+    parser = argparse.ArgumentParser(description="Client CPU benchmark on a recorded session")
+    parser.add_argument("--capture", help="replay this capture file instead of recording one")
+    parser.add_argument("--record", default="session.jsonl", help="where to record the session")
+    parser.add_argument("--rounds", type=int, default=100, help="replays of the session")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--room-size", type=int, default=500)
+    parser.add_argument("--profile", action="store_true", help="print the functions taking the most time")
+    args = parser.parse_args()
+
+    path = args.capture
+    if path is None:
+        if os.path.exists(args.record):
+            os.remove(args.record)
+        print(f"recorded {record(args.record, args.users, args.room_size)} requests into {args.record}",
+              file=sys.stderr)
+        path = args.record
+    profile = cProfile.Profile() if args.profile else None
+    print(json.dumps(replay(path, args.rounds, profile), indent=2))
+    if profile is not None:
+        pstats.Stats(profile, stream=sys.stderr).sort_stats("cumulative").print_stats(25)
+
+if __name__ == "__main__":
+    main()
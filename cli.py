@@ -8,12 +8,18 @@ RTC: For voice communication
 
 import os
 import sys
-import threading
 import configparser
 import keyboard
 from rich.table import Table
 from rich.console import Console
 from clubhouse.clubhouse import Clubhouse
+from clubhouse.timer import set_interval
+from clubhouse.feed import ChannelFeed
+from clubhouse.ratelimit import RequestFailed
+
+# Point to another API server, e.g. the local mock:
+# CLUBHOUSE_API_URL=http://127.0.0.1:8080/api python3 cli.py
+Clubhouse.API_URL = os.environ.get("CLUBHOUSE_API_URL", Clubhouse.API_URL)
 
 # Set some global variables
 try:
@@ -32,26 +38,6 @@ try:
 except ImportError:
     RTC = None
 
-def set_interval(interval):
-    """ (int) -> decorator
-
-    set_interval decorator
-    """
-    def decorator(func):
-        def wrap(*args, **kwargs):
-            stopped = threading.Event()
-            def loop():
-                while not stopped.wait(interval):
-                    ret = func(*args, **kwargs)
-                    if not ret:
-                        break
-            thread = threading.Thread(target=loop)
-            thread.daemon = True
-            thread.start()
-            return stopped
-        return wrap
-    return decorator
-
 def write_config(user_id, user_token, user_device, filename='setting.ini'):
     """ (str, str, str, str) -> bool
 
@@ -130,10 +116,10 @@ def process_onboarding(client):
         print("    Try registering by real device if this process pops again.")
         break
 
-def print_channel_list(client, max_limit=20):
-    """ (Clubhouse) -> NoneType
+def print_channel_list(feed, max_limit=20):
+    """ (ChannelFeed) -> NoneType
 
-    Print list of channels
+    Print list of channels, from the listing kept by the feed
     """
     # Get channels and print out
     console = Console()
@@ -142,7 +128,11 @@ def print_channel_list(client, max_limit=20):
     table.add_column("channel_name", style="cyan", justify="right")
     table.add_column("topic")
     table.add_column("speaker_count")
-    channels = client.get_channels()['channels']
+    try:
+        channels = feed.get()
+    except Exception as err:
+        print(f"[-] Error while listing the channels ({err})")
+        return
     i = 0
     for channel in channels:
         i += 1
@@ -157,6 +147,8 @@ def print_channel_list(client, max_limit=20):
             str(int(channel['num_speakers'])),
         )
     console.print(table)
+    if feed.age is not None:
+        print(f"[-] Updated {int(feed.age)}s ago")
 
 def chat_main(client):
     """ (Clubhouse) -> NoneType
@@ -167,14 +159,21 @@ def chat_main(client):
     channel_speaker_permission = False
     _wait_func = None
     _ping_func = None
+    # Refreshed in the background, so listing the channels does not wait for the API
+    feed = ChannelFeed(client)
 
     def _request_speaker_permission(client, channel_name, user_id):
         """ (str) -> bool
 
         Raise hands for permissions
         """
+        nonlocal _wait_func
         if not channel_speaker_permission:
-            client.audience_reply(channel_name, True, False)
+            try:
+                client.audience_reply(channel_name, True, False)
+            except RequestFailed as err:
+                print(f"[-] Error while raising your hand ({err})")
+                return
             _wait_func = _wait_speaker_permission(client, channel_name, user_id)
             print("[/] You've raised your hand. Wait for the moderator to give you the permission.")
 
@@ -194,102 +193,117 @@ def chat_main(client):
         Function that runs when you've requested for a voice permission.
         """
         # Get some random users from the channel.
-        _channel_info = client.get_channel(channel_name)
-        if _channel_info['success']:
-            for _user in _channel_info['users']:
-                if _user['user_id'] != user_id:
-                    user_id = _user['user_id']
-                    break
+        # Only the first other user is needed: the stream stops there, and
+        # then reads the fields after the list (such as `success`).
+        own_id = user_id
+        inviter_id = None
+        with client.stream_items(
+            "get_channel", channel_name, until=lambda user: user['user_id'] != own_id, rest=True
+        ) as users:
+            for _user in users:
+                if inviter_id is None and _user['user_id'] != own_id:
+                    inviter_id = _user['user_id']
+        if users.fields.get('success') and inviter_id is not None:
             # Check if the moderator allowed your request.
-            res_inv = client.accept_speaker_invite(channel_name, user_id)
+            res_inv = client.accept_speaker_invite(channel_name, inviter_id)
             if res_inv['success']:
                 print("[-] Now you have a speaker permission.")
                 print("    Please re-join this channel to activate a permission.")
                 return False
         return True
 
-    while True:
-        # Choose which channel to enter.
-        # Join the talk on success.
-        user_id = client.HEADERS.get("CH-UserID")
-        print_channel_list(client, max_limit)
-        channel_name = input("[.] Enter channel_name: ")
-        channel_info = client.join_channel(channel_name)
-        if not channel_info['success']:
-            # Check if this channel_name was taken from the link
-            channel_info = client.join_channel(channel_name, "link", "e30=")
+    try:
+        while True:
+            # Choose which channel to enter.
+            # Join the talk on success.
+            user_id = client.HEADERS.get("CH-UserID")
+            print_channel_list(feed, max_limit)
+            channel_name = input("[.] Enter channel_name: ")
+            try:
+                channel_info = client.join_channel(channel_name)
+                if not channel_info['success']:
+                    # Check if this channel_name was taken from the link
+                    channel_info = client.join_channel(channel_name, "link", "e30=")
+            except RequestFailed as err:
+                print(f"[-] Error while joining the channel ({err})")
+                continue
             if not channel_info['success']:
                 print(f"[-] Error while joining the channel ({channel_info['error_message']})")
                 continue
 
-        # List currently available users (TOP 20 only.)
-        # Also, check for the current user's speaker permission.
-        channel_speaker_permission = False
-        console = Console()
-        table = Table(show_header=True, header_style="bold magenta")
-        table.add_column("user_id", style="cyan", justify="right")
-        table.add_column("username")
-        table.add_column("name")
-        table.add_column("is_speaker")
-        table.add_column("is_moderator")
-        users = channel_info['users']
-        i = 0
-        for user in users:
-            i += 1
-            if i > max_limit:
-                break
-            table.add_row(
-                str(user['user_id']),
-                str(user['name']),
-                str(user['username']),
-                str(user['is_speaker']),
-                str(user['is_moderator']),
-            )
-            # Check if the user is the speaker
-            if user['user_id'] == int(user_id):
-                channel_speaker_permission = bool(user['is_speaker'])
-        console.print(table)
-
-        # Check for the voice level.
-        if RTC:
-            token = channel_info['token']
-            RTC.joinChannel(token, channel_name, "", int(user_id))
-        else:
-            print("[!] Agora SDK is not installed.")
-            print("    You may not speak or listen to the conversation.")
-
-        # Activate pinging
-        client.active_ping(channel_name)
-        _ping_func = _ping_keep_alive(client, channel_name)
-        _wait_func = None
-
-        # Add raise_hands key bindings for speaker permission
-        # Sorry for the bad quality
-        if not channel_speaker_permission:
-
-            if sys.platform == "darwin": # OSX
-                _hotkey = "9"
-            elif sys.platform == "win32": # Windows
-                _hotkey = "ctrl+shift+h"
-
-            print(f"[*] Press [{_hotkey}] to raise your hands for the speaker permission.")
-            keyboard.add_hotkey(
-                _hotkey,
-                _request_speaker_permission,
-                args=(client, channel_name, user_id)
-            )
-
-        input("[*] Press [Enter] to quit conversation.\n")
-        keyboard.unhook_all()
-
-        # Safely leave the channel upon quitting the channel.
-        if _ping_func:
-            _ping_func.set()
-        if _wait_func:
-            _wait_func.set()
-        if RTC:
-            RTC.leaveChannel()
-        client.leave_channel(channel_name)
+            # List currently available users (TOP 20 only.)
+            # Also, check for the current user's speaker permission.
+            channel_speaker_permission = False
+            console = Console()
+            table = Table(show_header=True, header_style="bold magenta")
+            table.add_column("user_id", style="cyan", justify="right")
+            table.add_column("username")
+            table.add_column("name")
+            table.add_column("is_speaker")
+            table.add_column("is_moderator")
+            users = channel_info['users']
+            i = 0
+            for user in users:
+                i += 1
+                if i > max_limit:
+                    break
+                table.add_row(
+                    str(user['user_id']),
+                    str(user['name']),
+                    str(user['username']),
+                    str(user['is_speaker']),
+                    str(user['is_moderator']),
+                )
+                # Check if the user is the speaker
+                if user['user_id'] == int(user_id):
+                    channel_speaker_permission = bool(user['is_speaker'])
+            console.print(table)
+
+            # Check for the voice level.
+            if RTC:
+                token = channel_info['token']
+                RTC.joinChannel(token, channel_name, "", int(user_id))
+            else:
+                print("[!] Agora SDK is not installed.")
+                print("    You may not speak or listen to the conversation.")
+
+            # Activate pinging
+            client.active_ping(channel_name)
+            _ping_func = _ping_keep_alive(client, channel_name)
+            _wait_func = None
+
+            # Add raise_hands key bindings for speaker permission
+            # Sorry for the bad quality
+            if not channel_speaker_permission:
+
+                if sys.platform == "darwin": # OSX
+                    _hotkey = "9"
+                elif sys.platform == "win32": # Windows
+                    _hotkey = "ctrl+shift+h"
+
+                print(f"[*] Press [{_hotkey}] to raise your hands for the speaker permission.")
+                keyboard.add_hotkey(
+                    _hotkey,
+                    _request_speaker_permission,
+                    args=(client, channel_name, user_id)
+                )
+
+            input("[*] Press [Enter] to quit conversation.\n")
+            keyboard.unhook_all()
+
+            # Safely leave the channel upon quitting the channel.
+            if _ping_func:
+                _ping_func.cancel()
+            if _wait_func:
+                _wait_func.cancel()
+            if RTC:
+                RTC.leaveChannel()
+            try:
+                client.leave_channel(channel_name)
+            except RequestFailed as err:
+                print(f"[-] Error while leaving the channel ({err})")
+    finally:
+        feed.close()
 
 def user_authentication(client):
     """ (Clubhouse) -> NoneType
@@ -353,7 +367,8 @@ def main():
         client = Clubhouse(
             user_id=user_id,
             user_token=user_token,
-            user_device=user_device
+            user_device=user_device,
+            scheduler=True
         )
 
         # Check if user is still on the waitlist
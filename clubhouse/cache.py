@@ -0,0 +1,166 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+cache.py
+
+Opt-in response cache for read-only endpoints.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+
+MISS = object()
+
+class ResponseCache:
+    """
+    ResponseCache Class
+
+    Bounded LRU cache with a TTL per endpoint. Only successful responses of
+    endpoints listed in `ttls` are stored. Entries carry the `tag` of their
+    endpoint (see endpoints.py) so that mutating calls can drop them.
+
+    Cached responses are shared between callers; do not modify them in place.
+
+    A response fetched while its tag was invalidated is not stored: take
+    generation(tag) before sending the request, and pass it to put().
+
+    >>> clubhouse = Clubhouse(user_id, user_token, user_device, cache=ResponseCache())
+    >>> clubhouse.get_club(1234)  # network
+    >>> clubhouse.get_club(1234)  # cache
+    >>> clubhouse.follow_club(1234)  # drops get_club(1234)
+    """
+
+    # Seconds to keep each response
+    DEFAULT_TTLS = {
+        "me": 30,
+        "get_profile": 60,
+        "get_club": 60,
+        "get_topic": 300,
+        "get_all_topics": 300,
+        "get_channels": 10,
+    }
+
+    def __init__(self, maxsize=1024, ttls=None):
+        """ (ResponseCache, int, dict) -> NoneType
+        `ttls` overrides DEFAULT_TTLS. Set a TTL to 0 to disable caching for that endpoint.
+        """
+        self.maxsize = maxsize
+        self.ttls = {**self.DEFAULT_TTLS, **(ttls or {})}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.discarded = 0
+        self._entries = OrderedDict()
+        self._tags = {}
+        # tag -> number of invalidations. Dropped all at once (bumping
+        # _epoch) when it grows past maxsize, or on clear().
+        self._generations = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def caches(self, endpoint):
+        """ (ResponseCache, Endpoint) -> bool
+
+        Check whether responses of the endpoint are cached.
+        """
+        return bool(self.ttls.get(endpoint.name))
+
+    def get(self, key):
+        """ (ResponseCache, tuple) -> object
+
+        Get the cached response of endpoints.request_key(), or MISS.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value, _ = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+            self.misses += 1
+            return MISS
+
+    def generation(self, tag=None):
+        """ (ResponseCache, str) -> tuple
+
+        Get the current generation of the tag, which changes whenever it is invalidated.
+        """
+        with self._lock:
+            return (self._epoch, self._generations.get(tag, 0))
+
+    def put(self, key, value, tag=None, generation=None):
+        """ (ResponseCache, tuple, dict, str, tuple) -> NoneType
+
+        Store the response for the TTL of its endpoint. With `generation`,
+        the response is dropped if the tag was invalidated since then.
+        """
+        expires = time.monotonic() + self.ttls[key[0]]
+        with self._lock:
+            if generation is not None and generation != (self._epoch, self._generations.get(tag, 0)):
+                self.discarded += 1
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires, value, tag)
+            if tag is not None:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, *tags):
+        """ (ResponseCache, str, ...) -> NoneType
+
+        Drop every response carrying one of the given tags.
+        """
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+                for key in self._tags.pop(tag, ()):
+                    if key in self._entries:
+                        del self._entries[key]
+                        self.invalidations += 1
+            if len(self._generations) > self.maxsize:
+                self._generations.clear()
+                self._epoch += 1
+
+    def clear(self):
+        """ (ResponseCache) -> NoneType
+
+        Drop everything.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._generations.clear()
+            self._epoch += 1
+
+    def stats(self):
+        """ (ResponseCache) -> dict
+
+        Get hit/miss counters.
+        """
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "discarded": self.discarded,
+        }
+
+    def _remove(self, key):
+        _, _, tag = self._entries.pop(key)
+        keys = self._tags.get(tag)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._tags[tag]
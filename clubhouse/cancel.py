@@ -0,0 +1,121 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+cancel.py
+
+Cooperative cancellation of API calls.
+
+A CancelToken is passed down to the calls made on its behalf (see
+Clubhouse.limits). Cancelling it aborts them: the socket of a request in
+flight is shut down, which frees its pooled connection, and retries or
+backoff waits stop right away. Tokens form a tree, so cancelling the token
+of a session cancels the tokens of its rooms, and theirs of every call.
+"""
+
+import asyncio
+import threading
+
+class Cancelled(Exception):
+    """ Raised by a call whose CancelToken was cancelled """
+
+
+class DeadlineExceeded(Cancelled):
+    """ Raised by a call which ran out of time """
+
+
+class CancelToken:
+    """
+    CancelToken Class
+
+    >>> token = CancelToken()
+    >>> with clubhouse.limits(cancel=token):
+    ...     clubhouse.get_channel(channel)   # raises Cancelled once
+    >>> token.cancel()                       # called from another thread
+    """
+
+    def __init__(self, parent=None):
+        """ (CancelToken, CancelToken) -> NoneType
+        The token is cancelled along with `parent`, if given.
+        """
+        self.reason = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = {}
+        self._next = 0
+        self._detach = parent.add_callback(self.cancel) if parent is not None else None
+
+    @property
+    def cancelled(self):
+        """ (CancelToken) -> bool """
+        return self._event.is_set()
+
+    def cancel(self, reason=None):
+        """ (CancelToken, Cancelled) -> NoneType
+
+        Cancel the token and run its callbacks, once. `reason` is the
+        exception raised by the calls, Cancelled by default.
+        """
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason or Cancelled("Cancelled")
+            self._event.set()
+            callbacks, self._callbacks = list(self._callbacks.values()), {}
+        for callback in callbacks:
+            callback(self.reason)
+
+    def add_callback(self, callback):
+        """ (CancelToken, callable) -> callable
+
+        Call `callback(reason)` when the token is cancelled, right away if
+        it already is. Returns a function removing the callback.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                key = self._next
+                self._next += 1
+                self._callbacks[key] = callback
+                return lambda: self._callbacks.pop(key, None)
+        callback(self.reason)
+        return lambda: None
+
+    def detach(self):
+        """ (CancelToken) -> NoneType
+
+        Stop following the parent token, e.g. once the call is over.
+        """
+        if self._detach is not None:
+            self._detach()
+            self._detach = None
+
+    def wait(self, timeout=None):
+        """ (CancelToken, float) -> bool
+
+        Sleep for `timeout` seconds or until cancelled. Returns True if cancelled.
+        """
+        return self._event.wait(timeout)
+
+    async def async_wait(self, timeout=None):
+        """ (CancelToken, float) -> bool
+
+        Same as wait(), from a coroutine.
+        """
+        loop = asyncio.get_running_loop()
+        woken = loop.create_future()
+        def wake(_reason):
+            loop.call_soon_threadsafe(lambda: woken.done() or woken.set_result(None))
+        remove = self.add_callback(wake)
+        try:
+            await asyncio.wait([woken], timeout=timeout)
+        finally:
+            remove()
+        return self.cancelled
+
+    def raise_if_cancelled(self):
+        """ (CancelToken) -> NoneType """
+        if self._event.is_set():
+            raise type(self.reason)(*self.reason.args)
+
+    def __repr__(self):
+        return f"CancelToken(cancelled={self.cancelled})"
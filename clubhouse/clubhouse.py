@@ -11,16 +11,41 @@ Please make sure to know what you're trying to do!
 Sending an odd API request could result in a permanent ban on your account.
 """
 
+import time
 import uuid
 import random
+import asyncio
 import secrets
 import functools
-import requests
+import contextlib
+import contextvars
+from types import MappingProxyType
+from .transport import HTTPTransport, AsyncTransport
+from .endpoints import ENDPOINTS, ENDPOINTS_BY_NAME, install_endpoints, request_key
+from .pagination import paginate, apaginate
+from .cache import ResponseCache, MISS
+from .singleflight import SingleFlight, AsyncSingleFlight
+from . import models as _models
+from .codec import get_codec
+from .ratelimit import Scheduler
+from .metrics import RequestRecord, MetricsCollector
+from .cancel import CancelToken, DeadlineExceeded
+from .timer import deadline_scheduler
+from .streaming import ItemStream, AsyncItemStream
+
+# (timeout, expires, CancelToken, priority) set by Clubhouse.limits() for the current thread or task
+_LIMITS = contextvars.ContextVar("clubhouse_limits", default=None)
+
+# ItemStream of the call made by Clubhouse.stream_items()
+_STREAMING = contextvars.ContextVar("clubhouse_streaming", default=None)
 
 class Clubhouse:
     """
     Clubhouse Class
 
+    Most endpoint methods are generated from the table in `endpoints.py`.
+    Flags of the table work the same as the decorators below.
+
     Decorators:
         @require_authentication:
             - this means that the endpoint requires authentication to access.
@@ -52,6 +77,15 @@ class Clubhouse:
     INSTABUG_KEY = "4e53155da9b00728caa5249f2e35d6b3"
     AMPLITUDE_KEY = "9098a21a950e7cb0933fb5b30affe5be"
 
+    # Number of keep-alive connections kept in the pool
+    POOL_SIZE = 10
+
+    # Seconds to connect, and to wait for each read of a response
+    TIMEOUT = (10, 30)
+
+    # Events of add_hook()
+    HOOK_EVENTS = ("request", "response", "error")
+
     # Useful header information
     HEADERS = {
         "CH-Languages": "en-JP,ja-JP",
@@ -62,7 +96,7 @@ class Clubhouse:
         "CH-AppBuild": f"{API_BUILD_ID}",
         "CH-AppVersion": f"{API_BUILD_VERSION}",
         "User-Agent": f"{API_UA}",
-        "Connection": "close",
+        "Connection": "keep-alive",
         "Content-Type": "application/json; charset=utf-8",
         "Cookie": f"__cfduid={secrets.token_hex(21)}{random.randint(1, 9)}"
     }
@@ -71,9 +105,7 @@ class Clubhouse:
         """ Simple decorator to check for the authentication """
         @functools.wraps(func)
         def wrap(self, *args, **kwargs):
-            if not (self.HEADERS.get("CH-UserID") and
-                    self.HEADERS.get("CH-DeviceId") and
-                    self.HEADERS.get("Authorization")):
+            if not self._authenticated:
                 raise Exception('Not Authenticated')
             return func(self, *args, **kwargs)
         return wrap
@@ -86,14 +118,71 @@ class Clubhouse:
             return func(self, *args, **kwargs)
         return wrap
 
-    def __init__(self, user_id='', user_token='', user_device=''):
-        """ (Clubhouse, str, str, str) -> NoneType
+    def __init__(self, user_id='', user_token='', user_device='', pool_size=None, transport=None, cache=None,
+                 coalesce=True, models=False, codec=None, scheduler=None, metrics=None,
+                 timeout=None, deadline=None, cancel=None):
+        """ (Clubhouse, str, str, str, int, HTTPTransport, ResponseCache, bool, bool, JSONCodec, Scheduler, MetricsCollector, tuple, float, CancelToken) -> NoneType
         Set authenticated information
+
+        Every request goes through `transport`, which keeps a pool of
+        keep-alive connections. A new one is created unless given.
+        Headers are fixed at this point; create a new instance to switch accounts.
+
+        Responses of read-only endpoints are cached when `cache` is given.
+        Pass True for a ResponseCache with the default settings.
+
+        With `coalesce`, identical read-only calls made at the same time
+        (e.g. get_channel of the same room from two threads) share one request
+        and get the same response object.
+
+        With `models`, users, channels, clubs, events and topics of the
+        responses are decoded into the compact classes of models.py.
+
+        `codec` decodes responses and encodes request bodies (see codec.py).
+        The fastest JSON library installed is used unless given.
+
+        `scheduler` retries failed calls with backoff and keeps calls within
+        a rate budget and priority lanes (see ratelimit.py). Pass True for a
+        Scheduler with the default settings. Without it, every call is sent
+        once, right away, and error responses are returned as they are.
+
+        `metrics` collects latency histograms, byte counts and errors per
+        endpoint (see metrics.py and stats()). Pass True for a new MetricsCollector.
+
+        `timeout` is (connect, read) in seconds, TIMEOUT by default. `deadline`
+        limits each call, retries included, to that many seconds. Cancelling
+        `cancel` aborts every call of the client. See also limits().
         """
-        self.HEADERS['CH-UserID'] = user_id if user_id else "(null)"
+        headers = dict(self.HEADERS)
+        headers['CH-UserID'] = user_id if user_id else "(null)"
         if user_token:
-            self.HEADERS['Authorization'] = f"Token {user_token}"
-        self.HEADERS['CH-DeviceId'] = user_device.upper() if user_device else str(uuid.uuid4()).upper()
+            headers['Authorization'] = f"Token {user_token}"
+        headers['CH-DeviceId'] = user_device.upper() if user_device else str(uuid.uuid4()).upper()
+
+        # Per-instance, read-only header sets. The class-level HEADERS is only a template.
+        self.HEADERS = MappingProxyType(headers)
+        self._upload_headers = MappingProxyType({
+            key: value for key, value in headers.items() if key != "Content-Type"
+        })
+        self._authenticated = bool(
+            headers.get("CH-UserID") and headers.get("CH-DeviceId") and headers.get("Authorization")
+        )
+        # URL of every endpoint, built once
+        self._urls = {endpoint.name: f"{self.API_URL}/{endpoint.path}" for endpoint in ENDPOINTS}
+        self.transport = transport or HTTPTransport(pool_size or self.POOL_SIZE)
+        self.cache = ResponseCache() if cache is True else cache
+        self.singleflight = SingleFlight() if coalesce else None
+        self.models = models
+        self.codec = codec or get_codec()
+        self.scheduler = Scheduler() if scheduler is True else scheduler or None
+        self.hooks = {event: [] for event in self.HOOK_EVENTS}
+        self._hooked = False
+        self.metrics = MetricsCollector() if metrics is True else metrics
+        if self.metrics is not None:
+            self.metrics.attach(self)
+        self.timeout = timeout or self.TIMEOUT
+        self.deadline = deadline
+        self.cancel = cancel
 
     def __str__(self):
         """ (Clubhouse) -> str
@@ -108,113 +197,320 @@ class Clubhouse:
             self.HEADERS.get('CH-DeviceId')
         )
 
-    def start_phone_number_auth(self, phone_number):
-        """ (Clubhouse, str) -> dict
-
-        Begin phone number authentication.
-        Some examples for the phone number.
-
-        >>> clubhouse = Clubhouse()
-        >>> clubhouse.start_phone_number_auth("+821012341337")
-        ...
-        >>> clubhouse.start_phone_number_auth("+818013371221")
-        ...
-        """
-        if self.HEADERS.get("Authorization"):
-            raise Exception('Already Authenticatied')
-        data = {
-            "phone_number": phone_number
-        }
-        req = requests.post(f"{self.API_URL}/start_phone_number_auth", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @unstable_endpoint
-    def call_phone_number_auth(self, phone_number):
-        """ (Clubhouse, str) -> dict
-
-        Call the person and send verification message.
-        """
-        if self.HEADERS.get("Authorization"):
-            raise Exception('Already Authenticatied')
-        data = {
-            "phone_number": phone_number
-        }
-        req = requests.post(f"{self.API_URL}/call_phone_number_auth", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @unstable_endpoint
-    def resend_phone_number_auth(self, phone_number):
-        """ (Clubhouse, str) -> dict
-
-        Resend the verification message
-        """
-        if self.HEADERS.get("Authorization"):
-            raise Exception('Already Authenticatied')
-        data = {
-            "phone_number": phone_number
-        }
-        req = requests.post(f"{self.API_URL}/resend_phone_number_auth", headers=self.HEADERS, json=data)
-        return req.json()
-
-    def complete_phone_number_auth(self, phone_number, verification_code):
-        """ (Clubhouse, str, str) -> dict
-
-        Complete phone number authentication.
-        This should return `auth_token`, `access_token`, `refresh_token`, is_waitlisted, ...
-        Please note that output may be different depending on the status of the authenticated user
-        """
-        if self.HEADERS.get("Authorization"):
-            raise Exception('Already Authenticatied')
-        data = {
-            "phone_number": phone_number,
-            "verification_code": verification_code
-        }
-        req = requests.post(f"{self.API_URL}/complete_phone_number_auth", headers=self.HEADERS, json=data)
-        return req.json()
-
-    def check_for_update(self, is_testflight=False):
-        """ (Clubhouse, bool) -> dict
-
-        Check for app updates.
-
-        >>> clubhouse = Clubhouse()
-        >>> clubhouse.check_for_update(False)
-        {'has_update': False, 'success': True}
-        """
-        query = f"is_testflight={int(is_testflight)}"
-        req = requests.get(f"{self.API_URL}/check_for_update?{query}", headers=self.HEADERS)
-        return req.json()
-
-    @require_authentication
-    def get_release_notes(self):
-        """ (Clubhouse) -> dict
-
-        Get release notes.
-        """
-        req = requests.post(f"{self.API_URL}/get_release_notes", headers=self.HEADERS)
-        return req.json()
-
-    @require_authentication
-    def check_waitlist_status(self):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """ (Clubhouse) -> NoneType
+
+        Release every pooled connection held by the transport.
+        """
+        self.transport.close()
+
+    def add_hook(self, event, callback):
+        """ (Clubhouse, str, callable) -> NoneType
+
+        Call `callback(record)` with a metrics.RequestRecord on each request:
+            - "request": before the request is sent.
+            - "response": once the response is decoded, with the timings of every phase.
+            - "error": when the request failed for good.
+        Hooks run on the thread (or event loop) making the call; keep them short.
+        """
+        if event not in self.hooks:
+            raise ValueError(f"Unknown event {event}, expected one of {', '.join(self.HOOK_EVENTS)}")
+        self.hooks[event].append(callback)
+        self._hooked = True
+
+    def remove_hook(self, event, callback):
+        """ (Clubhouse, str, callable) -> NoneType """
+        self.hooks[event].remove(callback)
+        self._hooked = any(self.hooks.values())
+
+    def _start_record(self, endpoint, url, data, json=None):
+        """ (Clubhouse, Endpoint, str, bytes, dict) -> RequestRecord """
+        record = RequestRecord(endpoint.name, url, json.get("channel") if json else None)
+        record.sent = len(data) if data else 0
+        for callback in self.hooks["request"]:
+            callback(record)
+        return record
+
+    def _finish_record(self, record, error=None):
+        """ (Clubhouse, RequestRecord, Exception) -> NoneType """
+        record.total = time.perf_counter() - record.started
+        record.error = error
+        for callback in self.hooks["error" if error is not None else "response"]:
+            callback(record)
+
+    @contextlib.contextmanager
+    def limits(self, timeout=None, deadline=None, cancel=None, priority=None):
+        """ (Clubhouse, tuple, float, CancelToken, str) -> context manager
+
+        Limit the calls made in the block, by this thread or task:
+            - timeout: (connect, read) in seconds, instead of the client's.
+            - deadline: seconds for the whole block. Calls still running
+              by then raise cancel.DeadlineExceeded.
+            - cancel: CancelToken aborting the calls, which raise cancel.Cancelled.
+              It replaces the token of an enclosing block.
+            - priority: lane of the calls ("interactive", "keepalive" or
+              "background"), see ratelimit.Scheduler.
+        Blocks can be nested; the earliest deadline wins.
+
+        >>> with clubhouse.limits(timeout=(3, 5), deadline=10, cancel=room_token):
+        ...     clubhouse.get_channel(channel)
+        """
+        outer_timeout, outer_expires, outer_cancel, outer_priority = _LIMITS.get() or (None, None, None, None)
+        expires = outer_expires
+        if deadline is not None:
+            expires = time.monotonic() + deadline
+            if outer_expires is not None:
+                expires = min(expires, outer_expires)
+        reset = _LIMITS.set((timeout or outer_timeout, expires, cancel or outer_cancel, priority or outer_priority))
+        try:
+            yield self
+        finally:
+            _LIMITS.reset(reset)
+
+    def _call_limits(self, endpoint):
+        """ (Clubhouse, Endpoint) -> (tuple, str, CancelToken, callable)
+
+        Get the timeout, priority and token of a call. The token is cancelled
+        by the client's token, the one of limits() and the deadline.
+        Call the returned function once the call is over.
+        """
+        timeout, expires, cancel, priority = _LIMITS.get() or (None, None, None, None)
+        if self.deadline is not None:
+            own = time.monotonic() + self.deadline
+            expires = own if expires is None else min(expires, own)
+        if expires is None and cancel is None and self.cancel is None:
+            return timeout or self.timeout, priority, None, lambda: None
+        token = CancelToken(self.cancel)
+        removers = [token.detach]
+        if cancel is not None:
+            removers.append(cancel.add_callback(token.cancel))
+        if expires is not None:
+            reason = DeadlineExceeded(f"{endpoint.name} missed its deadline")
+            removers.append(self._call_at(expires, token, reason))
+        def done():
+            for remove in removers:
+                remove()
+        return timeout or self.timeout, priority, token, done
+
+    def _call_at(self, expires, token, reason):
+        """ (Clubhouse, float, CancelToken, Cancelled) -> callable
+
+        Cancel the token at `expires`, on the timer of deadlines, which is
+        not held up by blocked tasks. Returns a function undoing it.
+        """
+        return deadline_scheduler().call_later(expires - time.monotonic(), token.cancel, reason).cancel
+
+    def stats(self):
         """ (Clubhouse) -> dict
 
-        Check whether you're still on a waitlist or not.
-        """
-        req = requests.post(f"{self.API_URL}/check_waitlist_status", headers=self.HEADERS)
-        return req.json()
-
-    @require_authentication
-    def add_email(self, email):
-        """ (Clubhouse, str) -> dict
-
-        Request for email verification.
-        You only need to do this once.
-        """
-        data = {
-            "email": email
-        }
-        req = requests.post(f"{self.API_URL}/add_email", headers=self.HEADERS, json=data)
-        return req.json()
+        Get a snapshot of the metrics (when enabled), cache, coalescing and retries.
+        """
+        stats = {}
+        if self.metrics is not None:
+            stats["endpoints"] = self.metrics.stats()
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        if self.singleflight is not None:
+            stats["singleflight"] = self.singleflight.stats()
+        if self.scheduler is not None:
+            stats["scheduler"] = self.scheduler.stats()
+        return stats
+
+    def _headers(self, files=None, headers=None):
+        """ (Clubhouse, dict, dict) -> Mapping
+
+        Pick the precomputed header set for the request.
+        Per-request overrides are merged into a copy, leaving the instance untouched.
+        """
+        base = self._upload_headers if files else self.HEADERS
+        if headers:
+            return {**base, **headers}
+        return base
+
+    def _dispatch(self, endpoint, query=None, json=None, files=None, headers=None):
+        """ (Clubhouse, Endpoint, str, dict, dict, dict) -> dict
+
+        Single path taken by every endpoint method.
+        """
+        url = self._urls[endpoint.name]
+        if query:
+            url = f"{url}?{query}"
+        stream = _STREAMING.get()
+        if stream is not None:
+            return self._stream(endpoint, url, json, self._headers(files, headers), stream)
+        cached = self.cache is not None and self.cache.caches(endpoint)
+        shared = self.singleflight is not None and endpoint.idempotent and not (files or headers)
+        key = request_key(endpoint, query, json) if cached or shared else None
+        if cached:
+            result = self.cache.get(key)
+            if result is not MISS:
+                return result
+        headers = self._headers(files, headers)
+        if shared:
+            # Callers wait for a shared call within their own limits,
+            # and only share calls of the same lane.
+            _, priority, cancel, done = self._call_limits(endpoint)
+            try:
+                return self.singleflight.do(
+                    key if priority is None else (key, priority), self._fetch, endpoint, url, key, json, files, headers,
+                    cancel=cancel
+                )
+            finally:
+                done()
+        return self._fetch(endpoint, url, key, json, files, headers)
+
+    def _fetch(self, endpoint, url, key, json, files, headers):
+        """ (Clubhouse, Endpoint, str, tuple, dict, dict, Mapping) -> dict
+
+        Send the request and update the cache with the response.
+        """
+        generation = self._cache_generation(endpoint, json)
+        result = self._send(endpoint, url, json, files, headers)
+        if self.cache is not None:
+            self._update_cache(endpoint, key, json, result, generation)
+        return result
+
+    def _stream(self, endpoint, url, json, headers, stream):
+        """ (Clubhouse, Endpoint, str, dict, Mapping, ItemStream) -> ItemStream
+
+        Send the request of stream_items() and hand the response over to the stream.
+        """
+        data = self.codec.dumps(json) if json is not None else None
+        record = self._start_record(endpoint, url, data, json) if self._hooked else None
+        timeout, priority, cancel, done = self._call_limits(endpoint)
+        def send():
+            return self.transport.request(
+                endpoint.method, url, headers=headers, data=data, record=record,
+                timeout=timeout, cancel=cancel, stream=True
+            )
+        try:
+            if self.scheduler is None:
+                resp = send()
+            else:
+                resp = self.scheduler.run(endpoint, send, self.transport.errors, cancel, priority)
+        except Exception as err:
+            done()
+            if record is not None:
+                self._finish_record(record, err)
+            raise
+        # The limits of the call hold until the stream is closed
+        return stream.attach(resp, functools.partial(self._finish_stream, record, done), cancel)
+
+    def _cache_generation(self, endpoint, json):
+        """ (Clubhouse, Endpoint, dict) -> tuple
+
+        Get the cache generation of the response, before it is requested.
+        """
+        if self.cache is None or not self.cache.caches(endpoint):
+            return None
+        return self.cache.generation(endpoint.tag.format(**(json or {})) if endpoint.tag else None)
+
+    def _update_cache(self, endpoint, key, json, result, generation=None):
+        """ (Clubhouse, Endpoint, tuple, dict, dict, tuple) -> NoneType
+
+        Drop the responses invalidated by the endpoint, then store the new one,
+        unless it was invalidated while in flight.
+        """
+        fields = json or {}
+        if endpoint.invalidates:
+            user_id = self.HEADERS['CH-UserID']
+            self.cache.invalidate(*(tag.format(self=user_id, **fields) for tag in endpoint.invalidates))
+        if self.cache.caches(endpoint) and isinstance(result, (dict, _models.Model)) and result.get("success"):
+            self.cache.put(key, result, endpoint.tag.format(**fields) if endpoint.tag else None, generation)
+
+    def _send(self, endpoint, url, json, files, headers):
+        """ (Clubhouse, Endpoint, str, dict, dict, Mapping) -> dict
+
+        Send the request through the pooled transport and decode the response.
+        """
+        data = self.codec.dumps(json) if json is not None and not files else None
+        record = self._start_record(endpoint, url, data, json) if self._hooked else None
+        timeout, priority, cancel, done = self._call_limits(endpoint)
+        def send():
+            return self.transport.request(
+                endpoint.method, url, headers=headers, files=files, data=data, record=record,
+                timeout=timeout, cancel=cancel
+            )
+        try:
+            if self.scheduler is None:
+                req = send()
+            else:
+                req = self.scheduler.run(endpoint, send, self.transport.errors, cancel, priority)
+            decoding = time.perf_counter()
+            result = self.codec.loads(req.content)
+            if self.models:
+                result = _models.decode(endpoint.name, result)
+        except Exception as err:
+            if record is not None:
+                self._finish_record(record, err)
+            raise
+        finally:
+            done()
+        if record is not None:
+            record.decode = time.perf_counter() - decoding
+            self._finish_record(record)
+        return result
+
+    def paginate(self, name, *args, page_size=None, max_items=None, page=1, **kwargs):
+        """ (Clubhouse, str, ..., int, int, int, ...) -> generator
+
+        Iterate over every item of a paged endpoint, prefetching the next page.
+        See pagination.paginate.
+
+        >>> for user in clubhouse.paginate("get_followers", user_id, max_items=500):
+        ...     print(user['username'])
+        """
+        return paginate(self, name, *args, page_size=page_size, max_items=max_items, page=page, **kwargs)
+
+    def stream_items(self, name, *args, key="users", limit=None, until=None, rest=False, **kwargs):
+        """ (Clubhouse, str, ..., str, int, callable, bool, ...) -> ItemStream
+
+        Call the endpoint `name` and get the items of its `key` array while the
+        response is received, e.g. the users of a large room. Reading stops
+        after `limit` items, or at the first item for which `until(item)` is
+        true. With `rest`, the fields after the array are read as well. Items
+        are dicts, and streamed calls are never cached. See streaming.ItemStream.
+
+        >>> with clubhouse.stream_items("get_channel", channel, limit=20) as users:
+        ...     for user in users:
+        ...         print(user['username'])
+        ...     print(users.fields["success"])
+        """
+        reset = _STREAMING.set(ItemStream(key, limit, until, rest))
+        try:
+            stream = getattr(self, name)(*args, **kwargs)
+        finally:
+            _STREAMING.reset(reset)
+        if stream is False:
+            raise ValueError(f"Invalid arguments for {name}")
+        return stream
+
+    def _finish_stream(self, record, done, stream):
+        """ (Clubhouse, RequestRecord, callable, ItemStream) -> NoneType
+
+        Release the limits of a streamed call and complete its record
+        (if any) once the stream is closed.
+        """
+        done()
+        if record is None:
+            return
+        record.received = stream.received or record.received
+        record.download = stream.read_time
+        record.decode = stream.parse_time
+        self._finish_record(record)
+
+    def _invalid(self):
+        """ (Clubhouse) -> bool
+
+        Returned by endpoint methods when an argument is out of range.
+        """
+        return False
 
     @require_authentication
     def update_photo(self, photo_filename):
@@ -222,1360 +518,240 @@ class Clubhouse:
 
         Update photo. Please make sure to upload a JPG format.
         """
+        with open(photo_filename, "rb") as photo:
+            photo_data = photo.read()
         files = {
-            "file": ("image.jpg", open(photo_filename, "rb"), "image/jpeg"),
-        }
-        tmp = self.HEADERS['Content-Type']
-        self.HEADERS.pop("Content-Type")
-        req = requests.post(f"{self.API_URL}/update_photo", headers=self.HEADERS, files=files)
-        self.HEADERS['Content-Type'] = tmp
-        return req.json()
-
-    @require_authentication
-    def follow(self, user_id, user_ids=None, source=4, source_topic_id=None):
-        """ (Clubhouse, int, list, int, int) -> dict
-
-        Follow a user.
-        Different value for `source` may require different parameters to be set
-        """
-        data = {
-            "source_topic_id": source_topic_id,
-            "user_ids": user_ids,
-            "user_id": int(user_id),
-            "source": source
-        }
-        req = requests.post(f"{self.API_URL}/follow", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def unfollow(self, user_id):
-        """ (Clubhouse, int) -> dict
-
-        Unfollow a user.
-        """
-        data = {
-            "user_id": int(user_id)
-        }
-        req = requests.post(f"{self.API_URL}/unfollow", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def block(self, user_id):
-        """ (Clubhouse, int) -> dict
-
-        Block a user.
-        """
-        data = {
-            "user_id": int(user_id)
-        }
-        req = requests.post(f"{self.API_URL}/block", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def unblock(self, user_id):
-        """ (Clubhouse, int) -> dict
-
-        Unfollow a user.
-        """
-        data = {
-            "user_id": int(user_id)
-        }
-        req = requests.post(f"{self.API_URL}/unblock", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def follow_multiple(self, user_ids, user_id=None, source=7, source_topic_id=None):
-        """ (Clubhouse, list, int, int, int) -> dict
-
-        Follow multiple users at once.
-        Different value for `source` may require different parameters to be set
-        """
-        data = {
-            "source_topic_id": source_topic_id,
-            "user_ids": user_ids,
-            "user_id": user_id,
-            "source": source
-        }
-        req = requests.post(f"{self.API_URL}/follow_multiple", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def follow_club(self, club_id, source_topic_id=None):
-        """ (Clubhouse, int, int) -> dict
-
-        Follow a club
-        """
-        data = {
-            "club_id": int(club_id),
-            "source_topic_id": source_topic_id
-        }
-        req = requests.post(f"{self.API_URL}/follow_club", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def unfollow_club(self, club_id, source_topic_id=None):
-        """ (Clubhouse, int, int) -> dict
-
-        Unfollow a club
-        """
-        data = {
-            "club_id": int(club_id),
-            "source_topic_id": source_topic_id
-        }
-        req = requests.post(f"{self.API_URL}/unfollow_club", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def update_follow_notifications(self, user_id, notification_type=2):
-        """ (Clubhouse, str, int) -> dict
-
-        Update notification frequency for the given user.
-        1 = Always notify, 2 = Sometimes, 3 = Never
-        """
-        data = {
-            "user_id": int(user_id),
-            "notification_type": int(notification_type)
-        }
-        req = requests.post(f"{self.API_URL}/update_follow_notifications", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def get_suggested_follows_similar(self, user_id):
-        """ (Clubhouse, int) -> dict
-
-        Get similar users based on the given user.
-        """
-        data = {
-            "user_id": int(user_id),
-        }
-        req = requests.post(f"{self.API_URL}/get_suggested_follows_similar", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def get_suggested_follows_friends_only(self, club_id=None, upload_contacts=True, contacts=()):
-        """ (Clubhouse, int, int, list of dict) -> dict
-
-        Get users based on the phone number.
-        Only seems to be used upon signup.
-        """
-        data = {
-            "club_id": club_id,
-            "upload_contacts": upload_contacts,
-            "contacts": contacts
-        }
-        req = requests.post(f"{self.API_URL}/get_suggested_follows_friends_only", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def get_suggested_follows_all(self, in_onboarding=True, page_size=50, page=1):
-        """ (Clubhouse, bool, int, int) -> dict
-
-        Get all suggested follows.
-        """
-        query = "in_onboarding={}&page_size={}&page={}".format(
-            "true" if in_onboarding else "false",
-            page_size,
-            page
-        )
-        req = requests.get(f"{self.API_URL}/get_suggested_follows_all?{query}", headers=self.HEADERS)
-        return req.json()
-
-    @require_authentication
-    def ignore_suggested_follow(self, user_id):
-        """ (Clubhouse, str) -> dict
-
-        Remove user_id from the suggested follow list.
-        """
-        data = {
-            "user_id": int(user_id)
-        }
-        req = requests.post(f"{self.API_URL}/user_id", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def get_event(self, event_id=None, user_ids=None, club_id=None, is_member_only=False, event_hashid=None, description=None, time_start_epoch=None, name=None):
-        """ (Clubhouse, int, list, int, bool, int, str, int, str) -> dict
-
-        Get details about the event
-        """
-        data = {
-            "user_ids": user_ids,
-            "club_id": club_id,
-            "is_member_only": is_member_only,
-            "event_id": int(event_id) if event_id else None,
-            "event_hashid": event_hashid,
-            "description": description,
-            "time_start_epoch": time_start_epoch,
-            "name": name
-        }
-        req = requests.post(f"{self.API_URL}/get_event", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def create_event(self, name, time_start_epoch, description, event_id=None, user_ids=(), club_id=None, is_member_only=False, event_hashid=None):
-        """ (Clubhouse, str, int, str, int, list, int, bool, int) -> dict
-
-        Create a new event
-        """
-        data = {
-            "user_ids": user_ids,
-            "club_id": club_id,
-            "is_member_only": is_member_only,
-            "event_id": int(event_id) if event_id else None,
-            "event_hashid": event_hashid,
-            "description": description,
-            "time_start_epoch": time_start_epoch,
-            "name": name
-        }
-        req = requests.post(f"{self.API_URL}/edit_event", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def edit_event(self, name, time_start_epoch, description, event_id=None, user_ids=(), club_id=None, is_member_only=False, event_hashid=None):
-        """ (Clubhouse, str, int, str, int, list, int, bool, int) -> dict
-
-        Edit an event.
-        """
-        data = {
-            "user_ids": user_ids,
-            "club_id": club_id,
-            "is_member_only": is_member_only,
-            "event_id": int(event_id) if event_id else None,
-            "event_hashid": event_hashid,
-            "description": description,
-            "time_start_epoch": time_start_epoch,
-            "name": name
-        }
-        req = requests.post(f"{self.API_URL}/edit_event", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def delete_event(self, event_id, user_ids=None, club_id=None, is_member_only=False, event_hashid=None, description=None, time_start_epoch=None, name=None):
-        """ (Clubhouse, str, list, int, bool, int, str, int, str) -> dict
-
-        Delete event.
-        """
-        data = {
-            "user_ids": user_ids,
-            "club_id": club_id,
-            "is_member_only": is_member_only,
-            "event_id": int(event_id) if event_id else None,
-            "event_hashid": event_hashid,
-            "description": description,
-            "time_start_epoch": time_start_epoch,
-            "name": name
-        }
-        req = requests.post(f"{self.API_URL}/delete_event", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def get_events(self, is_filtered=True, page_size=25, page=1):
-        """ (Clubhouse, bool, int, int) -> dict
-
-        Get list of upcoming events with details.
-        """
-        _is_filtered = "true" if is_filtered else "false"
-        query = "is_filtered={}&page_size={}&page={}".format(
-            "true" if is_filtered else "false",
-            page_size,
-            page
-        )
-        req = requests.get(f"{self.API_URL}/get_events?{query}", headers=self.HEADERS)
-        return req.json()
-
-    @require_authentication
-    def get_club(self, club_id, source_topic_id=None):
-        """ (Clubhouse, int, int) -> dict
-
-        Get the information about the given club_id.
-        """
-        data = {
-            "club_id": int(club_id),
-            "source_topic_id": source_topic_id
+            "file": ("image.jpg", photo_data, "image/jpeg"),
         }
-        req = requests.post(f"{self.API_URL}/get_club", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def get_club_members(self, club_id, return_followers=False, return_members=True, page_size=50, page=1):
-        """ (Clubhouse, int, bool, bool, int, int) -> dict
-
-        Get list of members on the given club_id.
-        """
-        query = "club_id={}&return_followers={}&return_members={}&page_size={}&page={}".format(
-            club_id,
-            int(return_followers),
-            int(return_members),
-            page_size,
-            page
-        )
-        req = requests.get(f"{self.API_URL}/get_club_members?{query}", headers=self.HEADERS)
-        return req.json()
+        return self._dispatch(ENDPOINTS_BY_NAME["update_photo"], files=files)
 
+    @unstable_endpoint
     @require_authentication
-    def get_settings(self):
+    def update_club_rules(self):
         """ (Clubhouse) -> dict
 
-        Receive user's settings.
+        Not implemented method
         """
-        req = requests.get(f"{self.API_URL}/get_settings", headers=self.HEADERS)
-        return req.json()
+        raise NotImplementedError("Not Implemented!")
 
+    @unstable_endpoint
     @require_authentication
-    def get_welcome_channel(self):
+    def update_club_topics(self):
         """ (Clubhouse) -> dict
 
-        Seems to be called upon sign up. Does not seem to return much data.
-        """
-        req = requests.get(f"{self.API_URL}/get_welcome_channel", headers=self.HEADERS)
-        return req.json()
-
-    @require_authentication
-    def hide_channel(self, channel, hide=True):
-        """ (Clubhouse, str, bool) -> dict
-
-        Hide/unhide the channel from the channel list.
-        """
-        # Join channel
-        data = {
-            "channel": channel,
-            "hide": hide
-        }
-        req = requests.post(f"{self.API_URL}/hide_channel", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def join_channel(self, channel, attribution_source="feed", attribution_details="eyJpc19leHBsb3JlIjpmYWxzZSwicmFuayI6MX0="):
-        """ (Clubhouse, str, str) -> dict
-
-        Join the given channel
-        """
-        data = {
-            "channel": channel,
-            "attribution_source": attribution_source,
-            "attribution_details": attribution_details, # base64_json
-        }
-        req = requests.post(f"{self.API_URL}/join_channel", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def leave_channel(self, channel):
-        """ (Clubhouse, str) -> dict
-
-        Leave the given channel
-        """
-        data = {
-            "channel": channel,
-            "channel_id": None
-        }
-        req = requests.post(f"{self.API_URL}/leave_channel", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def make_channel_public(self, channel, channel_id=None):
-        """ (Clubhouse, str, int) -> dict
-
-        Make the current channel open to public.
-        Everyone can join the channel.
-        """
-        data = {
-            "channel": channel,
-            "channel_id": channel_id
-        }
-        req = requests.post(f"{self.API_URL}/make_channel_public", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def make_channel_social(self, channel, channel_id=None):
-        """ (Clubhouse, str, int) -> dict
-
-        Make the current channel open to public.
-        Only people who user follows can join the channel.
-        """
-        data = {
-            "channel": channel,
-            "channel_id": channel_id
-        }
-        req = requests.post(f"{self.API_URL}/make_channel_social", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def end_channel(self, channel, channel_id=None):
-        """ (Clubhouse, str, int) -> dict
-
-        Kick everyone and close the channel. Requires moderator privilege.
-        """
-        data = {
-            "channel": channel,
-            "channel_id": channel_id
-        }
-        req = requests.post(f"{self.API_URL}/end_channel", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def make_moderator(self, channel, user_id):
-        """ (Clubhouse, str, int) -> dict
-
-        Make the given user moderator. Requires moderator privilege.
-        """
-        data = {
-            "channel": channel,
-            "user_id": int(user_id)
-        }
-        req = requests.post(f"{self.API_URL}/make_moderator", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def block_from_channel(self, channel, user_id):
-        """ (Clubhouse, str, int) -> dict
-
-        Remove the user from the channel. The user will not be able to re-join.
+        Not implemented method
         """
-        data = {
-            "channel": channel,
-            "user_id": int(user_id)
-        }
-        req = requests.post(f"{self.API_URL}/block_from_channel", headers=self.HEADERS, json=data)
-        return req.json()
+        raise NotImplementedError("Not Implemented!")
 
+    @unstable_endpoint
     @require_authentication
-    def get_profile(self, user_id):
-        """ (Clubhouse, str) -> dict
+    def get_events_for_user(self):
+        """ (Clubhouse) -> dict
 
-        Lookup someone else's profile. It is OK to one's own profile with this method.
+        Not implemented method
         """
-        data = {
-            "user_id": int(user_id)
-        }
-        req = requests.post(f"{self.API_URL}/get_profile", headers=self.HEADERS, json=data)
-        return req.json()
+        raise NotImplementedError("Not Implemented!")
 
-    @require_authentication
-    def me(self, return_blocked_ids=False, timezone_identifier="Asia/Tokyo", return_following_ids=False):
-        """ (Clubhouse, bool, str, bool) -> dict
 
-        Get my information
-        """
-        data = {
-            "return_blocked_ids": return_blocked_ids,
-            "timezone_identifier": timezone_identifier,
-            "return_following_ids": return_following_ids
-        }
-        req = requests.post(f"{self.API_URL}/me", headers=self.HEADERS, json=data)
-        return req.json()
+install_endpoints(Clubhouse)
 
-    @require_authentication
-    def get_following(self, user_id, page_size=50, page=1):
-        """ (Clubhouse, str, int, int) -> dict
 
-        Get following users type2
-        """
-        query = "user_id={}&page_size={}&page={}".format(
-            user_id,
-            page_size,
-            page
-        )
-        req = requests.get(f"{self.API_URL}/get_following?{query}", headers=self.HEADERS)
-        return req.json()
+class AsyncClubhouse(Clubhouse):
+    """
+    AsyncClubhouse Class
 
-    @require_authentication
-    def get_followers(self, user_id, page_size=50, page=1):
-        """ (Clubhouse, str, int, int) -> dict
+    Same endpoints as Clubhouse, but every endpoint returns an awaitable.
+    Requests run on an aiohttp connection pool, so a single event loop can
+    keep many calls in flight without a thread per room.
 
-        Get followers of the given user_id.
-        """
-        query = "user_id={}&page_size={}&page={}".format(
-            user_id,
-            page_size,
-            page
-        )
-        req = requests.get(f"{self.API_URL}/get_followers?{query}", headers=self.HEADERS)
-        return req.json()
+    >>> async with AsyncClubhouse(user_id, user_token, user_device) as clubhouse:
+    ...     channels = await clubhouse.get_channels()
+    """
 
-    @require_authentication
-    def get_mutual_follows(self, user_id, page_size=50, page=1):
-        """ (Clubhouse, str, int, int) -> dict
+    POOL_SIZE = 100
 
-        Get mutual followers between the current user and the given user_id.
+    def __init__(self, user_id='', user_token='', user_device='', pool_size=None, transport=None, cache=None,
+                 coalesce=True, models=False, codec=None, scheduler=None, metrics=None,
+                 timeout=None, deadline=None, cancel=None):
+        """ (AsyncClubhouse, str, str, str, int, AsyncTransport, ResponseCache, bool, bool, JSONCodec, Scheduler, MetricsCollector, tuple, float, CancelToken) -> NoneType
+        Set authenticated information
         """
-        query = "user_id={}&page_size={}&page={}".format(
+        super().__init__(
             user_id,
-            page_size,
-            page
+            user_token,
+            user_device,
+            transport=transport or AsyncTransport(pool_size or self.POOL_SIZE),
+            cache=cache,
+            coalesce=coalesce,
+            models=models,
+            codec=codec,
+            scheduler=scheduler,
+            metrics=metrics,
+            timeout=timeout,
+            deadline=deadline,
+            cancel=cancel
         )
-        req = requests.get(f"{self.API_URL}/get_mutual_follows?{query}", headers=self.HEADERS)
-        return req.json()
-
-    @require_authentication
-    def get_all_topics(self):
-        """ (Clubhouse) -> dict
-
-        Get list of topics, based on the server's channel selection algorithm
-        """
-        req = requests.get(f"{self.API_URL}/get_all_topics", headers=self.HEADERS)
-        return req.json()
-
-    @require_authentication
-    def get_channels(self):
-        """ (Clubhouse) -> dict
-
-        Get list of channels, based on the server's channel selection algorithm
-        """
-        req = requests.get(f"{self.API_URL}/get_channels", headers=self.HEADERS)
-        return req.json()
-
-    @require_authentication
-    def get_channel(self, channel, channel_id=None):
-        """ (Clubhouse, str, int) -> dict
-
-        Get information of the given channel
-        """
-        data = {
-            "channel": channel,
-            "channel_id": channel_id
-        }
-        req = requests.post(f"{self.API_URL}/get_channel", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def active_ping(self, channel):
-        """ (Clubhouse, str) -> dict
-
-        Keeping the user active while being in a chatroom
-        """
-        data = {
-            "channel": channel,
-            "chanel_id": None
-        }
-        req = requests.post(f"{self.API_URL}/active_ping", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def audience_reply(self, channel, raise_hands=True, unraise_hands=False):
-        """ (Clubhouse, str, bool, bool) -> bool
-
-        Request for raise_hands.
-        """
-        data = {
-            "channel": channel,
-            "raise_hands": raise_hands,
-            "unraise_hands": unraise_hands
-        }
-        req = requests.post(f"{self.API_URL}/audience_reply", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def change_handraise_settings(self, channel, is_enabled=True, handraise_permission=1):
-        """ (Clubhouse, bool, int) -> dict
-
-        Change handraise settings. Requires moderator privilege
-
-        * handraise_permission(int)
-           - 1: Everyone
-           - 2: Followed by the speakers
-        * is_enabled(bool)
-           - True: Enable handraise
-           - False: Disable handraise
-        """
-        handraise_permission = int(handraise_permission)
-        if not 1 <= handraise_permission <= 2:
-            return False
-
-        data = {
-            "channel": channel,
-            "is_enabled": is_enabled,
-            "handraise_permission": handraise_permission
-        }
-        req = requests.post(f"{self.API_URL}/change_handraise_settings", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def update_skintone(self, skintone=1):
-        """ (Clubhouse, int) -> dict
-        Updating skinetone for raising hands, etc.
-        """
-        skintone = int(skintone)
-        if not 1 <= skintone <= 5:
-            return False
-
-        data = {
-            "skintone": skintone
-        }
-        req = requests.post(f"{self.API_URL}/update_skintone", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def get_notifications(self, page_size=20, page=1):
-        """ (Clubhouse, int, int) -> dict
-
-        Get my notifications.
-        """
-        query = f"page_size={page_size}&page={page}"
-        req = requests.get(f"{self.API_URL}/get_notifications?{query}", headers=self.HEADERS)
-        return req.json()
-
-    @require_authentication
-    def get_actionable_notifications(self):
-        """ (Clubhouse, int, int) -> dict
-
-        Get notifications. This may return some notifications that require some actions
-        """
-        req = requests.get(f"{self.API_URL}/get_actionable_notifications", headers=self.HEADERS)
-        return req.json()
-
-    @require_authentication
-    def get_online_friends(self):
-        """ (Clubhouse) -> dict
-
-        List all online friends.
-        """
-        req = requests.post(f"{self.API_URL}/get_online_friends", headers=self.HEADERS, json={})
-        return req.json()
-
-    @require_authentication
-    def accept_speaker_invite(self, channel, user_id):
-        """ (Clubhouse, str, int) -> dict
-
-        Accept speaker's invitation, based on the (channel, invited_moderator)
-        `raise_hands` needs to be called first, prior to the invitation.
-        """
-        data = {
-            "channel": channel,
-            "user_id": int(user_id)
-        }
-        req = requests.post(f"{self.API_URL}/accept_speaker_invite", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def reject_speaker_invite(self, channel, user_id):
-        """ (Clubhouse, str, int) -> dict
-
-        Reject speaker's invitation.
-        """
-        data = {
-            "channel": channel,
-            "user_id": int(user_id)
-        }
-        req = requests.post(f"{self.API_URL}/reject_speaker_invite", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def invite_speaker(self, channel, user_id):
-        """ (Clubhouse, str, int) -> dict
-
-        Move audience to speaker. Requires moderator privilege.
-        """
-        data = {
-            "channel": channel,
-            "user_id": int(user_id)
-        }
-        req = requests.post(f"{self.API_URL}/invite_speaker", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def uninvite_speaker(self, channel, user_id):
-        """ (Clubhouse, str, int) -> dict
-
-        Move speaker to audience. Requires moderator privilege.
-        """
-        data = {
-            "channel": channel,
-            "user_id": int(user_id)
-        }
-        req = requests.post(f"{self.API_URL}/uninvite_speaker", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def mute_speaker(self, channel, user_id):
-        """ (Clubhouse, str, int) -> dict
-
-        Mute speaker. Requires moderator privilege
-        """
-        data = {
-            "channel": channel,
-            "user_id": int(user_id)
-        }
-        req = requests.post(f"{self.API_URL}/mute_speaker", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def get_suggested_speakers(self, channel):
-        """ (Clubhouse, str) -> dict
-
-        Get suggested speakers from the given channel
-        """
-        data = {
-            "channel": channel
-        }
-        req = requests.post(f"{self.API_URL}/get_suggested_speakers", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def create_channel(self, topic="", user_ids=(), is_private=False, is_social_mode=False):
-        """ (Clubhouse, str, list, bool, bool) -> dict
-
-        Create a new channel. Type of the room can be changed
-        """
-        data = {
-            "is_social_mode": is_social_mode,
-            "is_private": is_private,
-            "club_id": None,
-            "user_ids": user_ids,
-            "event_id": None,
-            "topic": topic
-        }
-        req = requests.post(f"{self.API_URL}/create_channel", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def get_create_channel_targets(self):
-        """ (Clubhouse) -> dict
-
-        Not sure what this does. Triggered upon channel creation
-        """
-        data = {}
-        req = requests.post(f"{self.API_URL}/get_create_channel_targets", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def get_suggested_invites(self, club_id=None, upload_contacts=True, contacts=()):
-        """ (Clubhouse, int, bool, list of dict) -> dict
-
-        Get invitations and user lists based on phone number.
-
-        contacts(dict)
-            - example: [{"name": "Test Name", "phone_number": "+821043219876"}, ...]
-        """
-        data = {
-            "club_id": club_id,
-            "upload_contacts": upload_contacts,
-            "contacts": contacts
-        }
-        req = requests.post(f"{self.API_URL}/get_suggested_invites", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def get_suggested_club_invites(self, upload_contacts=True, contacts=()):
-        """ (Clubhouse, int, bool, list of dict) -> dict
-
-        Get user lists based on phone number. For inviting clubs.
-
-        contacts(dict)
-            - example: [{"name": "Test Name", "phone_number": "+821043219876"}, ...]
-        """
-        data = {
-            "upload_contacts": upload_contacts,
-            "contacts": contacts
-        }
-        req = requests.post(f"{self.API_URL}/get_suggested_club_invites", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def invite_to_app(self, name, phone_number, message=None):
-        """ (Clubhouse, str, str, str) -> dict
-
-        Invite users to app. but this only works when you have a leftover invitation.
-        """
-        data = {
-            "name": name,
-            "phone_number": phone_number,
-            "message": message
-        }
-        req = requests.post(f"{self.API_URL}/invite_to_app", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def invite_from_waitlist(self, user_id):
-        """ (Clubhouse, str, str, str) -> dict
-
-        Invite someone from the waitlist.
-        This is much more reliable than inviting someone by invite_to_app
-        """
-        data = {
-            "user_id": int(user_id),
-        }
-        req = requests.post(f"{self.API_URL}/invite_from_waitlist", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def search_users(self, query, followers_only=False, following_only=False, cofollows_only=False):
-        """ (Clubhouse, str, bool, bool, bool) -> dict
-
-        Search users based on the given query.
-        """
-        data = {
-            "cofollows_only": cofollows_only,
-            "following_only": following_only,
-            "followers_only": followers_only,
-            "query": query
-        }
-        req = requests.post(f"{self.API_URL}/search_users", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def search_clubs(self, query, followers_only=False, following_only=False, cofollows_only=False):
-        """ (Clubhouse, str, bool, bool, bool) -> dict
-
-        Search clubs based on the given query.
-        """
-        data = {
-            "cofollows_only": cofollows_only,
-            "following_only": following_only,
-            "followers_only": followers_only,
-            "query": query
-        }
-        req = requests.post(f"{self.API_URL}/search_clubs", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def get_topic(self, topic_id):
-        """ (Clubhouse, int) -> dict
-
-        Get topic's information based on the given topic id.
-        """
-        data = {
-            "topic_id": int(topic_id)
-        }
-        req = requests.post(f"{self.API_URL}/get_topic", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def get_clubs_for_topic(self, topic_id, page_size=25, page=1):
-        """ (Clubhouse, int, int, int) -> dict
-
-        Get list of clubs based on the given topic id.
-        """
-        query = "topic_id={}&page_size={}&page={}".format(
-            topic_id,
-            page_size,
-            page
-        )
-        req = requests.get(f"{self.API_URL}/get_clubs_for_topic?{query}", headers=self.HEADERS)
-        return req.json()
-
-    @require_authentication
-    def get_clubs(self, is_startable_only):
-        """ (Clubhouse, bool) -> dict
-
-        Get list of clubs the user's in.
-        """
-        data = {
-            "is_startable_only": is_startable_only
-        }
-        req = requests.post(f"{self.API_URL}/get_clubs", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def get_users_for_topic(self, topic_id, page_size=25, page=1):
-        """ (Clubhouse, int, int, int) -> dict
-
-        Get list of users based on the given topic id.
-        """
-        query = "topic_id={}&page_size={}&page={}".format(
-            topic_id,
-            page_size,
-            page
-        )
-        req = requests.get(f"{self.API_URL}/get_users_for_topic?{query}", headers=self.HEADERS)
-        return req.json()
-
-    @require_authentication
-    def invite_to_existing_channel(self, channel, user_id):
-        """ (Clubhouse, str, int) -> dict
-
-        Invite someone to a currently joined channel.
-        It will send a ping notification to the given user_id.
-        """
-        data = {
-            "channel": channel,
-            "user_id": int(user_id)
-        }
-        req = requests.post(f"{self.API_URL}/invite_to_existing_channel", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def update_username(self, username):
-        """ (Clubhouse, str) -> dict
-
-        Change username. YOU HAVE LIMITED NUMBER OF TRIALS TO CHANGE YOUR USERNAME.
-        """
-        data = {
-            "username": username,
-        }
-        req = requests.post(f"{self.API_URL}/update_username", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def update_name(self, name):
-        """ (Clubhouse, str) -> dict
-
-        Change your legal name. Be careful of what you're trying to enter.
-            (1) Upon registration
-            (2) Changing your legal name. YOU CAN ONLY DO THIS ONCE.
-        """
-        data = {
-            "name": name,
-        }
-        req = requests.post(f"{self.API_URL}/update_name", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @unstable_endpoint
-    @require_authentication
-    def update_twitter_username(self, username, twitter_token, twitter_secret):
-        """ (Clubhouse, str, str, str) -> dict
-
-        Change Twitter username based on Twitter Token.
-
-        >>> client.update_twitter_username(None, None, None) # Clear username
-        >>> client.update_twitter_username("stereotype32", "...", "...") # Set username
-        """
-        data = {
-            "username": username,
-            "twitter_token": twitter_token,
-            "twitter_secret": twitter_secret
-        }
-        req = requests.post(f"{self.API_URL}/update_twitter_username", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @unstable_endpoint
-    @require_authentication
-    def update_instagram_username(self, code):
-        """ (Clubhouse, str) -> dict
-
-        Change Twitter username based on Instagram token.
-
-        >>> client.update_instagram_username(None) # Clear username
-        >>> client.update_instagram_username("...") # Set username
-        """
-        data = {
-            "code": code
-        }
-        req = requests.post(f"{self.API_URL}/update_instagram_username", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def update_displayname(self, name):
-        """ (Clubhouse, str) -> dict
-
-        Change your nickname. YOU CAN ONLY DO THIS ONCE.
-        """
-        data = {
-            "name": name,
-        }
-        req = requests.post(f"{self.API_URL}/update_name", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def refresh_token(self, refresh_token):
-        """ (Clubhouse, str) -> dict
-
-        Refresh the JWT token. returns both access and refresh token.
-        """
-        data = {
-            "refresh": refresh_token
-        }
-        req = requests.post(f"{self.API_URL}/refresh_token", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def update_bio(self, bio):
-        """ (Clubhouse, str) -> dict
-
-        Update bio on your profile
-        """
-        data = {
-            "bio": bio
-        }
-        req = requests.post(f"{self.API_URL}/update_bio", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def record_action_trails(self, action_trails=()):
-        """ (Clubhouse, list of dict) -> dict
-
-        Recording actions of the user interactions while using the app.
-        action_trails: [{"blob_data":{}, "trail_type": "...", ...}, ...]
-        """
-        data = {
-            "action_trails": action_trails
-        }
-        req = requests.post(f"{self.API_URL}/update_bio", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def add_user_topic(self, club_id=None, topic_id=None):
-        """ (Clubhouse, int, int) -> dict
-
-        Add user's interest.
-
-        Some interesting flags for Language has been shared in the following link.
-        Reference: https://github.com/grishka/Houseclub/issues/24
-        """
-        data = {
-            "club_id": int(club_id) if club_id else None,
-            "topic_id": int(topic_id) if topic_id else None
-        }
-        req = requests.post(f"{self.API_URL}/add_user_topic", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @require_authentication
-    def remove_user_topic(self, club_id, topic_id):
-        """ (Clubhouse, int, int) -> dict
-
-        Remove user's interest
-        """
-        data = {
-            "club_id": int(club_id) if club_id else None,
-            "topic_id": int(topic_id) if topic_id else None
-        }
-        req = requests.post(f"{self.API_URL}/remove_user_topic", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @unstable_endpoint
-    @require_authentication
-    def report_incident(self, user_id, channel, incident_type, incident_description, email):
-        """ (Clubhouse, int, str, unknown, str, str) -> dict
-
-        Report incident
-        There seemed to be a field for attachment, need to trace this later
-        """
-        data = {
-            "user_id": int(user_id),
-            "channel": channel,
-            "incident_type": incident_type,
-            "incident_description": incident_description,
-            "email": email
-        }
-        req = requests.post(f"{self.API_URL}/report_incident", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @unstable_endpoint
-    @require_authentication
-    def reject_welcome_channel(self):
-        """ (Clubhouse) -> dict
-
-        Unknown
-        """
-        req = requests.get(f"{self.API_URL}/reject_welcome_channel", headers=self.HEADERS)
-        return req.json()
-
-    @unstable_endpoint
-    @require_authentication
-    def update_channel_flags(self, channel, visibility, flag_title, unflag_title):
-        """ (Clubhouse, str, bool, unknown, unknown) -> dict
-
-        Unknown
-        """
-        data = {
-            "channel": channel,
-            "visibility": visibility,
-            "flag_title": flag_title,
-            "unflag_title": unflag_title,
-        }
-        req = requests.post(f"{self.API_URL}/update_channel_flags", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @unstable_endpoint
-    @require_authentication
-    def ignore_actionable_notification(self, actionable_notification_id):
-        """ (Clubhouse, int) -> dict
-
-        Ignore the actionable notification.
-        """
-        data = {
-            "actionable_notification_id": actionable_notification_id
-        }
-        req = requests.post(f"{self.API_URL}/ignore_actionable_notification", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @unstable_endpoint
-    @require_authentication
-    def invite_to_new_channel(self, user_id, channel):
-        """ (Clubhouse, int, str) -> dict
-
-        Invite someone to the channel
-        """
-        data = {
-            "user_id": int(user_id),
-            "channel": channel
-        }
-        req = requests.post(f"{self.API_URL}/invite_to_new_channel", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @unstable_endpoint
-    @require_authentication
-    def accept_new_channel_invite(self, channel_invite_id):
-        """ (Clubhouse, int) -> dict
-
-        Accept Channel Invitation
-        """
-        data = {
-            "channel_invite_id": channel_invite_id
-        }
-        req = requests.post(f"{self.API_URL}/accept_new_channel_invite", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @unstable_endpoint
-    @require_authentication
-    def reject_new_channel_invite(self, channel_invite_id):
-        """ (Clubhouse, int) -> dict
-
-        Reject Channel Invitation
-        """
-        data = {
-            "channel_invite_id": channel_invite_id
-        }
-        req = requests.post(f"{self.API_URL}/reject_new_channel_invite", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @unstable_endpoint
-    @require_authentication
-    def cancel_new_channel_invite(self, channel_invite_id):
-        """ (Clubhouse, int) -> dict
-
-        Cancel Channel Invitation
-        """
-        data = {
-            "channel_invite_id": channel_invite_id
-        }
-        req = requests.post(f"{self.API_URL}/cancel_new_channel_invite", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @unstable_endpoint
-    @require_authentication
-    def add_club_admin(self, club_id, user_id):
-        """ (Clubhouse, int, int) -> dict
-
-        Add Club Admin. Requires privilege.
-        """
-        data = {
-            "club_id": int(club_id),
-            "user_id": int(user_id)
-        }
-        req = requests.post(f"{self.API_URL}/add_club_admin", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @unstable_endpoint
-    @require_authentication
-    def remove_club_admin(self, club_id, user_id):
-        """ (Clubhouse, int, int) -> dict
-
-        Remove Club admin. Requires privilege.
-        """
-        data = {
-            "club_id": int(club_id) if club_id else None,
-            "user_id": int(user_id)
-        }
-        req = requests.post(f"{self.API_URL}/remove_club_admin", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @unstable_endpoint
-    @require_authentication
-    def remove_club_member(self, club_id, user_id):
-        """ (Clubhouse, int, int) -> dict
-
-        Remove Club member. Requires privilege.
-        """
-        data = {
-            "club_id": int(club_id) if club_id else None,
-            "user_id": int(user_id)
-        }
-        req = requests.post(f"{self.API_URL}/remove_club_member", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @unstable_endpoint
-    @require_authentication
-    def accept_club_member_invite(self, club_id, source_topic_id=None):
-        """ (Clubhouse, int, int) -> dict
-
-        Accept Club member invite.
-        """
-        data = {
-            "club_id": int(club_id) if club_id else None,
-            "source_topic_id": source_topic_id
-        }
-        req = requests.post(f"{self.API_URL}/accept_club_member_invite", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @unstable_endpoint
-    @require_authentication
-    def add_club_member(self, club_id, user_id, name, phone_number, message, reason):
-        """ (Clubhouse, int, int, str, str, str, unknown) -> dict
-
-        Add club member
-        """
-        data = {
-            "club_id": int(club_id),
-            "user_id": int(user_id),
-            "name": name,
-            "phone_number": phone_number,
-            "message": message,
-            "reason": reason
-        }
-        req = requests.post(f"{self.API_URL}/add_club_member", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @unstable_endpoint
-    @require_authentication
-    def get_club_nominations(self, club_id, source_topic_id):
-        """ (Club, int, int) -> dict
-
-        Get club nomination list
-        """
-        data = {
-            "club_id": int(club_id),
-            "source_topic_id": source_topic_id
-        }
-        req = requests.post(f"{self.API_URL}/get_club_nominations", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @unstable_endpoint
-    @require_authentication
-    def approve_club_nomination(self, club_id, source_topic_id, invite_nomination_id):
-        """ (Club, int, int) -> dict
-
-        Approve club nomination
-        """
-        data = {
-            "club_id": int(club_id),
-            "source_topic_id": source_topic_id,
-            "invite_nomination_id": invite_nomination_id
-        }
-        req = requests.post(f"{self.API_URL}/approve_club_nomination", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @unstable_endpoint
-    @require_authentication
-    def reject_club_nomination(self, club_id, source_topic_id, invite_nomination_id):
-        """ (Club, int, int) -> dict
-
-        Reject club nomination
-        """
-        data = {
-            "club_id": int(club_id),
-            "source_topic_id": source_topic_id,
-            "invite_nomination_id": invite_nomination_id
-        }
-        req = requests.post(f"{self.API_URL}/approve_club_nomination", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @unstable_endpoint
-    @require_authentication
-    def add_club_topic(self, club_id, topic_id):
-        """ (Club, int, int) -> dict
-
-        Add club topic
-        """
-        data = {
-            "club_id": int(club_id),
-            "topic_id": int(topic_id)
-        }
-        req = requests.post(f"{self.API_URL}/add_club_topic", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @unstable_endpoint
-    @require_authentication
-    def remove_club_topic(self, club_id, topic_id):
-        """ (Club, int, int) -> dict
-
-        Remove club topic
-        """
-        data = {
-            "club_id": int(club_id),
-            "topic_id": int(topic_id)
-        }
-        req = requests.post(f"{self.API_URL}/remove_club_topic", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @unstable_endpoint
-    @require_authentication
-    def get_events_to_start(self):
-        """ (Clubhouse) -> dict
-
-        Get events to start
-        """
-        req = requests.get(f"{self.API_URL}/get_events_to_start", headers=self.HEADERS)
-        return req.json()
-
-    @unstable_endpoint
-    @require_authentication
-    def update_is_follow_allowed(self, club_id, is_follow_allowed=True):
-        """ (Clubhouse, int, bool) -> dict
-
-        Update follow button of the given Club
-        """
-        data = {
-            "club_id": int(club_id),
-            "is_follow_allowed": is_follow_allowed
-        }
-        req = requests.post(f"{self.API_URL}/update_is_follow_allowed", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @unstable_endpoint
-    @require_authentication
-    def update_is_membership_private(self, club_id, is_membership_private):
-        """ (Clubhouse, int, bool) -> dict
-
-        Update membership status of the given Club
-        """
-        data = {
-            "club_id": int(club_id),
-            "is_membership_private": is_membership_private
-        }
-        req = requests.post(f"{self.API_URL}/update_is_membership_private", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @unstable_endpoint
-    @require_authentication
-    def update_is_community(self, club_id, is_community):
-        """ (Clubhouse, int, bool) -> dict
-
-        Update community stat of the given Club
-        """
-        data = {
-            "club_id": int(club_id),
-            "is_community": is_community
-        }
-        req = requests.post(f"{self.API_URL}/update_is_community", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @unstable_endpoint
-    @require_authentication
-    def update_club_description(self, club_id, description):
-        """ (Clubhouse, int, str) -> dict
-
-        Update description of the given Club
-        """
-        data = {
-            "club_id": int(club_id),
-            "description": description
-        }
-        req = requests.post(f"{self.API_URL}/update_club_description", headers=self.HEADERS, json=data)
-        return req.json()
-
-    @unstable_endpoint
-    @require_authentication
-    def update_club_rules(self):
-        """ (Clubhouse) -> dict
-
-        Not implemented method
-        """
-        raise NotImplementedError("Not Implemented!")
-
-    @unstable_endpoint
-    @require_authentication
-    def update_club_topics(self):
-        """ (Clubhouse) -> dict
-
-        Not implemented method
-        """
-        raise NotImplementedError("Not Implemented!")
-
-    @unstable_endpoint
-    @require_authentication
-    def get_events_for_user(self):
-        """ (Clubhouse) -> dict
-
-        Not implemented method
-        """
-        raise NotImplementedError("Not Implemented!")
+        if coalesce:
+            self.singleflight = AsyncSingleFlight()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def __enter__(self):
+        raise TypeError("Use `async with` for AsyncClubhouse")
+
+    async def close(self):
+        """ (AsyncClubhouse) -> NoneType
+
+        Release every pooled connection held by the transport.
+        """
+        await self.transport.close()
+
+    def paginate(self, name, *args, page_size=None, max_items=None, page=1, **kwargs):
+        """ (AsyncClubhouse, str, ..., int, int, int, ...) -> async generator
+
+        Iterate over every item of a paged endpoint, prefetching the next page.
+
+        >>> async for user in clubhouse.paginate("get_followers", user_id, max_items=500):
+        ...     print(user['username'])
+        """
+        return apaginate(self, name, *args, page_size=page_size, max_items=max_items, page=page, **kwargs)
+
+    def stream_items(self, name, *args, key="users", limit=None, until=None, rest=False, **kwargs):
+        """ (AsyncClubhouse, str, ..., str, int, callable, bool, ...) -> AsyncItemStream
+
+        Same as Clubhouse.stream_items. The request is sent on the first iteration.
+
+        >>> async with clubhouse.stream_items("get_channel", channel, limit=20) as users:
+        ...     async for user in users:
+        ...         print(user['username'])
+        """
+        async def open_response():
+            reset = _STREAMING.set(stream)
+            try:
+                if await getattr(self, name)(*args, **kwargs) is False:
+                    raise ValueError(f"Invalid arguments for {name}")
+            finally:
+                _STREAMING.reset(reset)
+        stream = AsyncItemStream(open_response, key, limit, until, rest)
+        return stream
+
+    async def _dispatch(self, endpoint, query=None, json=None, files=None, headers=None):
+        """ (AsyncClubhouse, Endpoint, str, dict, dict, dict) -> dict
+
+        Single path taken by every endpoint method.
+        """
+        url = self._urls[endpoint.name]
+        if query:
+            url = f"{url}?{query}"
+        stream = _STREAMING.get()
+        if stream is not None:
+            return await self._stream(endpoint, url, json, self._headers(files, headers), stream)
+        cached = self.cache is not None and self.cache.caches(endpoint)
+        shared = self.singleflight is not None and endpoint.idempotent and not (files or headers)
+        key = request_key(endpoint, query, json) if cached or shared else None
+        if cached:
+            result = self.cache.get(key)
+            if result is not MISS:
+                return result
+        headers = self._headers(files, headers)
+        if shared:
+            # Callers wait for a shared call within their own limits,
+            # and only share calls of the same lane.
+            _, priority, cancel, done = self._call_limits(endpoint)
+            try:
+                return await self.singleflight.do(
+                    key if priority is None else (key, priority), self._fetch, endpoint, url, key, json, files, headers,
+                    cancel=cancel
+                )
+            finally:
+                done()
+        return await self._fetch(endpoint, url, key, json, files, headers)
+
+    async def _fetch(self, endpoint, url, key, json, files, headers):
+        """ (AsyncClubhouse, Endpoint, str, tuple, dict, dict, Mapping) -> dict
+
+        Send the request and update the cache with the response.
+        """
+        generation = self._cache_generation(endpoint, json)
+        result = await self._send(endpoint, url, json, files, headers)
+        if self.cache is not None:
+            self._update_cache(endpoint, key, json, result, generation)
+        return result
+
+    async def _stream(self, endpoint, url, json, headers, stream):
+        """ (AsyncClubhouse, Endpoint, str, dict, Mapping, AsyncItemStream) -> AsyncItemStream
+
+        Send the request of stream_items() and hand the response over to the stream.
+        """
+        data = self.codec.dumps(json) if json is not None else None
+        record = self._start_record(endpoint, url, data, json) if self._hooked else None
+        timeout, priority, cancel, done = self._call_limits(endpoint)
+        def send():
+            return self.transport.request(
+                endpoint.method, url, headers=headers, data=data, record=record,
+                timeout=timeout, cancel=cancel, stream=True
+            )
+        try:
+            if self.scheduler is None:
+                resp = await send()
+            else:
+                resp = await self.scheduler.arun(endpoint, send, self.transport.errors, cancel, priority)
+        except Exception as err:
+            done()
+            if record is not None:
+                self._finish_record(record, err)
+            raise
+        # The limits of the call hold until the stream is closed
+        return stream.attach(resp, functools.partial(self._finish_stream, record, done), cancel)
+
+    async def _send(self, endpoint, url, json, files, headers):
+        """ (AsyncClubhouse, Endpoint, str, dict, dict, Mapping) -> dict
+
+        Send the request through the pooled transport and decode the response.
+        """
+        data = self.codec.dumps(json) if json is not None and not files else None
+        record = self._start_record(endpoint, url, data, json) if self._hooked else None
+        timeout, priority, cancel, done = self._call_limits(endpoint)
+        def send():
+            return self.transport.request(
+                endpoint.method, url, headers=headers, files=files, data=data, record=record,
+                timeout=timeout, cancel=cancel
+            )
+        try:
+            if self.scheduler is None:
+                req = await send()
+            else:
+                req = await self.scheduler.arun(endpoint, send, self.transport.errors, cancel, priority)
+            decoding = time.perf_counter()
+            result = self.codec.loads(req.content)
+            if self.models:
+                result = _models.decode(endpoint.name, result)
+        except Exception as err:
+            if record is not None:
+                self._finish_record(record, err)
+            raise
+        finally:
+            done()
+        if record is not None:
+            record.decode = time.perf_counter() - decoding
+            self._finish_record(record)
+        return result
+
+    def _call_at(self, expires, token, reason):
+        """ (AsyncClubhouse, float, CancelToken, Cancelled) -> callable
+
+        Cancel the token at `expires`, from the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        return loop.call_later(expires - time.monotonic(), token.cancel, reason).cancel
+
+    async def _invalid(self):
+        """ (AsyncClubhouse) -> bool
+
+        Returned by endpoint methods when an argument is out of range.
+        """
+        return False
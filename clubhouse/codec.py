@@ -0,0 +1,107 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+codec.py
+
+JSON codecs used to decode responses and encode request bodies.
+
+The fastest installed library is used by default: orjson, then ujson,
+then the standard json module.
+"""
+
+import json
+
+class JSONCodec:
+    """
+    JSONCodec Class
+
+    Standard library codec, and the base of the other codecs.
+
+    >>> codec = get_codec()
+    >>> codec.loads(codec.dumps({"a": 1}))
+    {'a': 1}
+    """
+
+    name = "json"
+
+    def loads(self, data):
+        """ (JSONCodec, bytes) -> object """
+        return json.loads(data)
+
+    def dumps(self, obj):
+        """ (JSONCodec, object) -> bytes
+
+        Encode to the same compact UTF-8 bytes as the other codecs.
+        """
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name})"
+
+
+class OrjsonCodec(JSONCodec):
+    """
+    OrjsonCodec Class
+
+    Requires `orjson`.
+    """
+
+    name = "orjson"
+
+    def __init__(self):
+        import orjson # pylint: disable=import-outside-toplevel
+        self.loads = orjson.loads
+        self.dumps = orjson.dumps
+
+
+class UjsonCodec(JSONCodec):
+    """
+    UjsonCodec Class
+
+    Requires `ujson`.
+    """
+
+    name = "ujson"
+
+    def __init__(self):
+        import ujson # pylint: disable=import-outside-toplevel
+        self._ujson = ujson
+
+    def loads(self, data):
+        """ (UjsonCodec, bytes) -> object """
+        return self._ujson.loads(data)
+
+    def dumps(self, obj):
+        """ (UjsonCodec, object) -> bytes """
+        return self._ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False).encode("utf-8")
+
+
+# Codecs by order of preference
+CODECS = {
+    "orjson": OrjsonCodec,
+    "ujson": UjsonCodec,
+    "json": JSONCodec,
+}
+
+_default = None
+
+def get_codec(name=None):
+    """ (str) -> JSONCodec
+
+    Get the codec `name`, or the fastest one installed.
+    Raises ImportError if the requested library is not installed.
+    """
+    global _default # pylint: disable=global-statement
+    if name is not None:
+        if name not in CODECS:
+            raise ValueError(f"Unknown codec {name}, expected one of {', '.join(CODECS)}")
+        return CODECS[name]()
+    if _default is None:
+        for codec in CODECS.values():
+            try:
+                _default = codec()
+                break
+            except ImportError:
+                continue
+    return _default
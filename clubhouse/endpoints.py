@@ -0,0 +1,963 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+# pylint: disable=line-too-long,too-many-lines,invalid-name,too-many-arguments
+
+"""
+endpoints.py
+
+Declarative table of the Clubhouse API endpoints.
+
+Each entry describes the HTTP verb, the path, the parameters and how they are
+sent. Clubhouse methods are generated from this table once at import time,
+so every endpoint goes through the same dispatch path (`Clubhouse._dispatch`).
+"""
+
+import linecache
+from collections import namedtuple
+
+REQUIRED = object()
+
+UNSTABLE_WARNING = "[!] This endpoint is NEVER TESTED and MAY BE UNSTABLE. BE CAREFUL!"
+
+
+class Param(namedtuple("Param", "name default convert key check")):
+    """
+    Param Class
+
+    name:
+        - Argument name of the generated method.
+    default:
+        - Default value. REQUIRED if the argument is positional.
+    convert:
+        - Callable applied to the value before it is sent.
+    key:
+        - Field name on the wire, if different from `name`.
+    check:
+        - Container of allowed values. The method returns False otherwise.
+    """
+    __slots__ = ()
+
+
+class Endpoint(namedtuple("Endpoint", "name method path params body extra doc auth anonymous unstable items tag invalidates idempotent")):
+    """
+    Endpoint Class
+
+    name:
+        - Method name on Clubhouse.
+    method, path:
+        - HTTP verb and path relative to Clubhouse.API_URL.
+    params:
+        - Tuple of Param.
+    body:
+        - "query", "json" or None. How the params are sent.
+    extra:
+        - Constant fields always sent along with the params.
+    auth:
+        - The endpoint requires authentication.
+    anonymous:
+        - The endpoint must be called before authentication.
+    unstable:
+        - The endpoint is never tested.
+    items:
+        - For paged endpoints, key of the list in the response.
+    tag:
+        - Cache tag of the response, formatted with the request fields.
+    invalidates:
+        - Cache tags to drop once the endpoint is called.
+          `{self}` stands for the authenticated user id.
+    idempotent:
+        - The endpoint only reads. Identical concurrent calls may share one request.
+          Defaults to True for GET and False for POST.
+    """
+    __slots__ = ()
+
+
+def P(name, default=REQUIRED, convert=None, key=None, check=None):
+    """ (str, object, callable, str, container) -> Param """
+    return Param(name, default, convert, key or name, check)
+
+def GET(name, params, doc, path=None, extra=None, auth=True, anonymous=False, unstable=False,
+        items=None, tag=None, invalidates=(), idempotent=True):
+    """ (str, tuple of Param, str, ...) -> Endpoint """
+    return Endpoint(name, "GET", path or name, params, "query" if params else None,
+                    extra or {}, doc, auth, anonymous, unstable, items, tag, invalidates, idempotent)
+
+def POST(name, params, doc, path=None, body=None, extra=None, auth=True, anonymous=False, unstable=False,
+         items=None, tag=None, invalidates=(), idempotent=False):
+    """ (str, tuple of Param, str, ...) -> Endpoint """
+    return Endpoint(name, "POST", path or name, params, "json" if params or extra else body,
+                    extra or {}, doc, auth, anonymous, unstable, items, tag, invalidates, idempotent)
+
+def request_key(endpoint, query=None, json=None):
+    """ (Endpoint, str, dict) -> tuple
+
+    Hashable key identifying a request, for caching and coalescing.
+    """
+    if json:
+        return (endpoint.name, query, repr(sorted(json.items())))
+    return (endpoint.name, query, None)
+
+
+def _int_or_none(value):
+    return int(value) if value else None
+
+def _bool_str(value):
+    return "true" if value else "false"
+
+
+ENDPOINTS = (
+    POST('start_phone_number_auth', (
+        P('phone_number'),
+    ), """ (Clubhouse, str) -> dict
+
+        Begin phone number authentication.
+        Some examples for the phone number.
+
+        >>> clubhouse = Clubhouse()
+        >>> clubhouse.start_phone_number_auth("+821012341337")
+        ...
+        >>> clubhouse.start_phone_number_auth("+818013371221")
+        ...
+        """, auth=False, anonymous=True),
+    POST('call_phone_number_auth', (
+        P('phone_number'),
+    ), """ (Clubhouse, str) -> dict
+
+        Call the person and send verification message.
+        """, unstable=True, auth=False, anonymous=True),
+    POST('resend_phone_number_auth', (
+        P('phone_number'),
+    ), """ (Clubhouse, str) -> dict
+
+        Resend the verification message
+        """, unstable=True, auth=False, anonymous=True),
+    POST('complete_phone_number_auth', (
+        P('phone_number'),
+        P('verification_code'),
+    ), """ (Clubhouse, str, str) -> dict
+
+        Complete phone number authentication.
+        This should return `auth_token`, `access_token`, `refresh_token`, is_waitlisted, ...
+        Please note that output may be different depending on the status of the authenticated user
+        """, auth=False, anonymous=True),
+    GET('check_for_update', (
+        P('is_testflight', False, convert=int),
+    ), """ (Clubhouse, bool) -> dict
+
+        Check for app updates.
+
+        >>> clubhouse = Clubhouse()
+        >>> clubhouse.check_for_update(False)
+        {'has_update': False, 'success': True}
+        """, auth=False),
+    POST('get_release_notes', (), """ (Clubhouse) -> dict
+
+        Get release notes.
+        """, idempotent=True),
+    POST('check_waitlist_status', (), """ (Clubhouse) -> dict
+
+        Check whether you're still on a waitlist or not.
+        """, idempotent=True),
+    POST('add_email', (
+        P('email'),
+    ), """ (Clubhouse, str) -> dict
+
+        Request for email verification.
+        You only need to do this once.
+        """, invalidates=('me', 'user:{self}')),
+    # Multipart upload, the method itself is written by hand in Clubhouse
+    POST('update_photo', (), "", invalidates=('me', 'user:{self}')),
+    POST('follow', (
+        P('user_id', convert=int),
+        P('user_ids', None),
+        P('source', 4),
+        P('source_topic_id', None),
+    ), """ (Clubhouse, int, list, int, int) -> dict
+
+        Follow a user.
+        Different value for `source` may require different parameters to be set
+        """, invalidates=('me', 'user:{user_id}')),
+    POST('unfollow', (
+        P('user_id', convert=int),
+    ), """ (Clubhouse, int) -> dict
+
+        Unfollow a user.
+        """, invalidates=('me', 'user:{user_id}')),
+    POST('block', (
+        P('user_id', convert=int),
+    ), """ (Clubhouse, int) -> dict
+
+        Block a user.
+        """, invalidates=('me', 'user:{user_id}')),
+    POST('unblock', (
+        P('user_id', convert=int),
+    ), """ (Clubhouse, int) -> dict
+
+        Unfollow a user.
+        """, invalidates=('me', 'user:{user_id}')),
+    POST('follow_multiple', (
+        P('user_ids'),
+        P('user_id', None),
+        P('source', 7),
+        P('source_topic_id', None),
+    ), """ (Clubhouse, list, int, int, int) -> dict
+
+        Follow multiple users at once.
+        Different value for `source` may require different parameters to be set
+        """, invalidates=('me',)),
+    POST('follow_club', (
+        P('club_id', convert=int),
+        P('source_topic_id', None),
+    ), """ (Clubhouse, int, int) -> dict
+
+        Follow a club
+        """, invalidates=('club:{club_id}',)),
+    POST('unfollow_club', (
+        P('club_id', convert=int),
+        P('source_topic_id', None),
+    ), """ (Clubhouse, int, int) -> dict
+
+        Unfollow a club
+        """, invalidates=('club:{club_id}',)),
+    POST('update_follow_notifications', (
+        P('user_id', convert=int),
+        P('notification_type', 2, convert=int),
+    ), """ (Clubhouse, str, int) -> dict
+
+        Update notification frequency for the given user.
+        1 = Always notify, 2 = Sometimes, 3 = Never
+        """, invalidates=('me', 'user:{user_id}')),
+    POST('get_suggested_follows_similar', (
+        P('user_id', convert=int),
+    ), """ (Clubhouse, int) -> dict
+
+        Get similar users based on the given user.
+        """, idempotent=True),
+    POST('get_suggested_follows_friends_only', (
+        P('club_id', None),
+        P('upload_contacts', True),
+        P('contacts', ()),
+    ), """ (Clubhouse, int, int, list of dict) -> dict
+
+        Get users based on the phone number.
+        Only seems to be used upon signup.
+        """),
+    GET('get_suggested_follows_all', (
+        P('in_onboarding', True, convert=_bool_str),
+        P('page_size', 50),
+        P('page', 1),
+    ), """ (Clubhouse, bool, int, int) -> dict
+
+        Get all suggested follows.
+        """, items='users'),
+    POST('ignore_suggested_follow', (
+        P('user_id', convert=int),
+    ), """ (Clubhouse, str) -> dict
+
+        Remove user_id from the suggested follow list.
+        """, path='user_id'),
+    POST('get_event', (
+        P('event_id', None, convert=_int_or_none),
+        P('user_ids', None),
+        P('club_id', None),
+        P('is_member_only', False),
+        P('event_hashid', None),
+        P('description', None),
+        P('time_start_epoch', None),
+        P('name', None),
+    ), """ (Clubhouse, int, list, int, bool, int, str, int, str) -> dict
+
+        Get details about the event
+        """, idempotent=True),
+    POST('create_event', (
+        P('name'),
+        P('time_start_epoch'),
+        P('description'),
+        P('event_id', None, convert=_int_or_none),
+        P('user_ids', ()),
+        P('club_id', None),
+        P('is_member_only', False),
+        P('event_hashid', None),
+    ), """ (Clubhouse, str, int, str, int, list, int, bool, int) -> dict
+
+        Create a new event
+        """, path='edit_event'),
+    POST('edit_event', (
+        P('name'),
+        P('time_start_epoch'),
+        P('description'),
+        P('event_id', None, convert=_int_or_none),
+        P('user_ids', ()),
+        P('club_id', None),
+        P('is_member_only', False),
+        P('event_hashid', None),
+    ), """ (Clubhouse, str, int, str, int, list, int, bool, int) -> dict
+
+        Edit an event.
+        """),
+    POST('delete_event', (
+        P('event_id', convert=_int_or_none),
+        P('user_ids', None),
+        P('club_id', None),
+        P('is_member_only', False),
+        P('event_hashid', None),
+        P('description', None),
+        P('time_start_epoch', None),
+        P('name', None),
+    ), """ (Clubhouse, str, list, int, bool, int, str, int, str) -> dict
+
+        Delete event.
+        """),
+    GET('get_events', (
+        P('is_filtered', True, convert=_bool_str),
+        P('page_size', 25),
+        P('page', 1),
+    ), """ (Clubhouse, bool, int, int) -> dict
+
+        Get list of upcoming events with details.
+        """, items='events'),
+    POST('get_club', (
+        P('club_id', convert=int),
+        P('source_topic_id', None),
+    ), """ (Clubhouse, int, int) -> dict
+
+        Get the information about the given club_id.
+        """, tag='club:{club_id}', idempotent=True),
+    GET('get_club_members', (
+        P('club_id'),
+        P('return_followers', False, convert=int),
+        P('return_members', True, convert=int),
+        P('page_size', 50),
+        P('page', 1),
+    ), """ (Clubhouse, int, bool, bool, int, int) -> dict
+
+        Get list of members on the given club_id.
+        """, items='users'),
+    GET('get_settings', (), """ (Clubhouse) -> dict
+
+        Receive user's settings.
+        """),
+    GET('get_welcome_channel', (), """ (Clubhouse) -> dict
+
+        Seems to be called upon sign up. Does not seem to return much data.
+        """),
+    POST('hide_channel', (
+        P('channel'),
+        P('hide', True),
+    ), """ (Clubhouse, str, bool) -> dict
+
+        Hide/unhide the channel from the channel list.
+        """, invalidates=('channels',)),
+    POST('join_channel', (
+        P('channel'),
+        P('attribution_source', "feed"),
+        P('attribution_details', "eyJpc19leHBsb3JlIjpmYWxzZSwicmFuayI6MX0="),
+    ), """ (Clubhouse, str, str) -> dict
+
+        Join the given channel
+        """),
+    POST('leave_channel', (
+        P('channel'),
+    ), """ (Clubhouse, str) -> dict
+
+        Leave the given channel
+        """, extra={'channel_id': None}),
+    POST('make_channel_public', (
+        P('channel'),
+        P('channel_id', None),
+    ), """ (Clubhouse, str, int) -> dict
+
+        Make the current channel open to public.
+        Everyone can join the channel.
+        """, invalidates=('channels',)),
+    POST('make_channel_social', (
+        P('channel'),
+        P('channel_id', None),
+    ), """ (Clubhouse, str, int) -> dict
+
+        Make the current channel open to public.
+        Only people who user follows can join the channel.
+        """, invalidates=('channels',)),
+    POST('end_channel', (
+        P('channel'),
+        P('channel_id', None),
+    ), """ (Clubhouse, str, int) -> dict
+
+        Kick everyone and close the channel. Requires moderator privilege.
+        """, invalidates=('channels',)),
+    POST('make_moderator', (
+        P('channel'),
+        P('user_id', convert=int),
+    ), """ (Clubhouse, str, int) -> dict
+
+        Make the given user moderator. Requires moderator privilege.
+        """),
+    POST('block_from_channel', (
+        P('channel'),
+        P('user_id', convert=int),
+    ), """ (Clubhouse, str, int) -> dict
+
+        Remove the user from the channel. The user will not be able to re-join.
+        """),
+    POST('get_profile', (
+        P('user_id', convert=int),
+    ), """ (Clubhouse, str) -> dict
+
+        Lookup someone else's profile. It is OK to one's own profile with this method.
+        """, tag='user:{user_id}', idempotent=True),
+    POST('me', (
+        P('return_blocked_ids', False),
+        P('timezone_identifier', "Asia/Tokyo"),
+        P('return_following_ids', False),
+    ), """ (Clubhouse, bool, str, bool) -> dict
+
+        Get my information
+        """, tag='me', idempotent=True),
+    GET('get_following', (
+        P('user_id'),
+        P('page_size', 50),
+        P('page', 1),
+    ), """ (Clubhouse, str, int, int) -> dict
+
+        Get following users type2
+        """, items='users'),
+    GET('get_followers', (
+        P('user_id'),
+        P('page_size', 50),
+        P('page', 1),
+    ), """ (Clubhouse, str, int, int) -> dict
+
+        Get followers of the given user_id.
+        """, items='users'),
+    GET('get_mutual_follows', (
+        P('user_id'),
+        P('page_size', 50),
+        P('page', 1),
+    ), """ (Clubhouse, str, int, int) -> dict
+
+        Get mutual followers between the current user and the given user_id.
+        """, items='users'),
+    GET('get_all_topics', (), """ (Clubhouse) -> dict
+
+        Get list of topics, based on the server's channel selection algorithm
+        """, tag='topics'),
+    GET('get_channels', (), """ (Clubhouse) -> dict
+
+        Get list of channels, based on the server's channel selection algorithm
+        """, tag='channels'),
+    POST('get_channel', (
+        P('channel'),
+        P('channel_id', None),
+    ), """ (Clubhouse, str, int) -> dict
+
+        Get information of the given channel
+        """, idempotent=True),
+    POST('active_ping', (
+        P('channel'),
+    ), """ (Clubhouse, str) -> dict
+
+        Keeping the user active while being in a chatroom
+        """, extra={'chanel_id': None}),
+    POST('audience_reply', (
+        P('channel'),
+        P('raise_hands', True),
+        P('unraise_hands', False),
+    ), """ (Clubhouse, str, bool, bool) -> bool
+
+        Request for raise_hands.
+        """),
+    POST('change_handraise_settings', (
+        P('channel'),
+        P('is_enabled', True),
+        P('handraise_permission', 1, convert=int, check=range(1, 3)),
+    ), """ (Clubhouse, bool, int) -> dict
+
+        Change handraise settings. Requires moderator privilege
+
+        * handraise_permission(int)
+           - 1: Everyone
+           - 2: Followed by the speakers
+        * is_enabled(bool)
+           - True: Enable handraise
+           - False: Disable handraise
+        """),
+    POST('update_skintone', (
+        P('skintone', 1, convert=int, check=range(1, 6)),
+    ), """ (Clubhouse, int) -> dict
+        Updating skinetone for raising hands, etc.
+        """, invalidates=('me', 'user:{self}')),
+    GET('get_notifications', (
+        P('page_size', 20),
+        P('page', 1),
+    ), """ (Clubhouse, int, int) -> dict
+
+        Get my notifications.
+        """, items='notifications'),
+    GET('get_actionable_notifications', (), """ (Clubhouse, int, int) -> dict
+
+        Get notifications. This may return some notifications that require some actions
+        """),
+    POST('get_online_friends', (), """ (Clubhouse) -> dict
+
+        List all online friends.
+        """, body='json', idempotent=True),
+    POST('accept_speaker_invite', (
+        P('channel'),
+        P('user_id', convert=int),
+    ), """ (Clubhouse, str, int) -> dict
+
+        Accept speaker's invitation, based on the (channel, invited_moderator)
+        `raise_hands` needs to be called first, prior to the invitation.
+        """),
+    POST('reject_speaker_invite', (
+        P('channel'),
+        P('user_id', convert=int),
+    ), """ (Clubhouse, str, int) -> dict
+
+        Reject speaker's invitation.
+        """),
+    POST('invite_speaker', (
+        P('channel'),
+        P('user_id', convert=int),
+    ), """ (Clubhouse, str, int) -> dict
+
+        Move audience to speaker. Requires moderator privilege.
+        """),
+    POST('uninvite_speaker', (
+        P('channel'),
+        P('user_id', convert=int),
+    ), """ (Clubhouse, str, int) -> dict
+
+        Move speaker to audience. Requires moderator privilege.
+        """),
+    POST('mute_speaker', (
+        P('channel'),
+        P('user_id', convert=int),
+    ), """ (Clubhouse, str, int) -> dict
+
+        Mute speaker. Requires moderator privilege
+        """),
+    POST('get_suggested_speakers', (
+        P('channel'),
+    ), """ (Clubhouse, str) -> dict
+
+        Get suggested speakers from the given channel
+        """, idempotent=True),
+    POST('create_channel', (
+        P('topic', ""),
+        P('user_ids', ()),
+        P('is_private', False),
+        P('is_social_mode', False),
+    ), """ (Clubhouse, str, list, bool, bool) -> dict
+
+        Create a new channel. Type of the room can be changed
+        """, extra={'club_id': None, 'event_id': None}, invalidates=('channels',)),
+    POST('get_create_channel_targets', (), """ (Clubhouse) -> dict
+
+        Not sure what this does. Triggered upon channel creation
+        """, body='json', idempotent=True),
+    POST('get_suggested_invites', (
+        P('club_id', None),
+        P('upload_contacts', True),
+        P('contacts', ()),
+    ), """ (Clubhouse, int, bool, list of dict) -> dict
+
+        Get invitations and user lists based on phone number.
+
+        contacts(dict)
+            - example: [{"name": "Test Name", "phone_number": "+821043219876"}, ...]
+        """),
+    POST('get_suggested_club_invites', (
+        P('upload_contacts', True),
+        P('contacts', ()),
+    ), """ (Clubhouse, int, bool, list of dict) -> dict
+
+        Get user lists based on phone number. For inviting clubs.
+
+        contacts(dict)
+            - example: [{"name": "Test Name", "phone_number": "+821043219876"}, ...]
+        """),
+    POST('invite_to_app', (
+        P('name'),
+        P('phone_number'),
+        P('message', None),
+    ), """ (Clubhouse, str, str, str) -> dict
+
+        Invite users to app. but this only works when you have a leftover invitation.
+        """),
+    POST('invite_from_waitlist', (
+        P('user_id', convert=int),
+    ), """ (Clubhouse, str, str, str) -> dict
+
+        Invite someone from the waitlist.
+        This is much more reliable than inviting someone by invite_to_app
+        """),
+    POST('search_users', (
+        P('query'),
+        P('followers_only', False),
+        P('following_only', False),
+        P('cofollows_only', False),
+    ), """ (Clubhouse, str, bool, bool, bool) -> dict
+
+        Search users based on the given query.
+        """, idempotent=True),
+    POST('search_clubs', (
+        P('query'),
+        P('followers_only', False),
+        P('following_only', False),
+        P('cofollows_only', False),
+    ), """ (Clubhouse, str, bool, bool, bool) -> dict
+
+        Search clubs based on the given query.
+        """, idempotent=True),
+    POST('get_topic', (
+        P('topic_id', convert=int),
+    ), """ (Clubhouse, int) -> dict
+
+        Get topic's information based on the given topic id.
+        """, tag='topic:{topic_id}', idempotent=True),
+    GET('get_clubs_for_topic', (
+        P('topic_id'),
+        P('page_size', 25),
+        P('page', 1),
+    ), """ (Clubhouse, int, int, int) -> dict
+
+        Get list of clubs based on the given topic id.
+        """, items='clubs'),
+    POST('get_clubs', (
+        P('is_startable_only'),
+    ), """ (Clubhouse, bool) -> dict
+
+        Get list of clubs the user's in.
+        """, idempotent=True),
+    GET('get_users_for_topic', (
+        P('topic_id'),
+        P('page_size', 25),
+        P('page', 1),
+    ), """ (Clubhouse, int, int, int) -> dict
+
+        Get list of users based on the given topic id.
+        """, items='users'),
+    POST('invite_to_existing_channel', (
+        P('channel'),
+        P('user_id', convert=int),
+    ), """ (Clubhouse, str, int) -> dict
+
+        Invite someone to a currently joined channel.
+        It will send a ping notification to the given user_id.
+        """),
+    POST('update_username', (
+        P('username'),
+    ), """ (Clubhouse, str) -> dict
+
+        Change username. YOU HAVE LIMITED NUMBER OF TRIALS TO CHANGE YOUR USERNAME.
+        """, invalidates=('me', 'user:{self}')),
+    POST('update_name', (
+        P('name'),
+    ), """ (Clubhouse, str) -> dict
+
+        Change your legal name. Be careful of what you're trying to enter.
+            (1) Upon registration
+            (2) Changing your legal name. YOU CAN ONLY DO THIS ONCE.
+        """, invalidates=('me', 'user:{self}')),
+    POST('update_twitter_username', (
+        P('username'),
+        P('twitter_token'),
+        P('twitter_secret'),
+    ), """ (Clubhouse, str, str, str) -> dict
+
+        Change Twitter username based on Twitter Token.
+
+        >>> client.update_twitter_username(None, None, None) # Clear username
+        >>> client.update_twitter_username("stereotype32", "...", "...") # Set username
+        """, unstable=True, invalidates=('me', 'user:{self}')),
+    POST('update_instagram_username', (
+        P('code'),
+    ), """ (Clubhouse, str) -> dict
+
+        Change Twitter username based on Instagram token.
+
+        >>> client.update_instagram_username(None) # Clear username
+        >>> client.update_instagram_username("...") # Set username
+        """, unstable=True, invalidates=('me', 'user:{self}')),
+    POST('update_displayname', (
+        P('name'),
+    ), """ (Clubhouse, str) -> dict
+
+        Change your nickname. YOU CAN ONLY DO THIS ONCE.
+        """, path='update_name', invalidates=('me', 'user:{self}')),
+    POST('refresh_token', (
+        P('refresh_token', key='refresh'),
+    ), """ (Clubhouse, str) -> dict
+
+        Refresh the JWT token. returns both access and refresh token.
+        """),
+    POST('update_bio', (
+        P('bio'),
+    ), """ (Clubhouse, str) -> dict
+
+        Update bio on your profile
+        """, invalidates=('me', 'user:{self}')),
+    POST('record_action_trails', (
+        P('action_trails', ()),
+    ), """ (Clubhouse, list of dict) -> dict
+
+        Recording actions of the user interactions while using the app.
+        action_trails: [{"blob_data":{}, "trail_type": "...", ...}, ...]
+        """, path='update_bio'),
+    POST('add_user_topic', (
+        P('club_id', None, convert=_int_or_none),
+        P('topic_id', None, convert=_int_or_none),
+    ), """ (Clubhouse, int, int) -> dict
+
+        Add user's interest.
+
+        Some interesting flags for Language has been shared in the following link.
+        Reference: https://github.com/grishka/Houseclub/issues/24
+        """, invalidates=('me', 'user:{self}')),
+    POST('remove_user_topic', (
+        P('club_id', convert=_int_or_none),
+        P('topic_id', convert=_int_or_none),
+    ), """ (Clubhouse, int, int) -> dict
+
+        Remove user's interest
+        """, invalidates=('me', 'user:{self}')),
+    POST('report_incident', (
+        P('user_id', convert=int),
+        P('channel'),
+        P('incident_type'),
+        P('incident_description'),
+        P('email'),
+    ), """ (Clubhouse, int, str, unknown, str, str) -> dict
+
+        Report incident
+        There seemed to be a field for attachment, need to trace this later
+        """, unstable=True),
+    GET('reject_welcome_channel', (), """ (Clubhouse) -> dict
+
+        Unknown
+        """, unstable=True, idempotent=False),
+    POST('update_channel_flags', (
+        P('channel'),
+        P('visibility'),
+        P('flag_title'),
+        P('unflag_title'),
+    ), """ (Clubhouse, str, bool, unknown, unknown) -> dict
+
+        Unknown
+        """, unstable=True),
+    POST('ignore_actionable_notification', (
+        P('actionable_notification_id'),
+    ), """ (Clubhouse, int) -> dict
+
+        Ignore the actionable notification.
+        """, unstable=True),
+    POST('invite_to_new_channel', (
+        P('user_id', convert=int),
+        P('channel'),
+    ), """ (Clubhouse, int, str) -> dict
+
+        Invite someone to the channel
+        """, unstable=True),
+    POST('accept_new_channel_invite', (
+        P('channel_invite_id'),
+    ), """ (Clubhouse, int) -> dict
+
+        Accept Channel Invitation
+        """, unstable=True),
+    POST('reject_new_channel_invite', (
+        P('channel_invite_id'),
+    ), """ (Clubhouse, int) -> dict
+
+        Reject Channel Invitation
+        """, unstable=True),
+    POST('cancel_new_channel_invite', (
+        P('channel_invite_id'),
+    ), """ (Clubhouse, int) -> dict
+
+        Cancel Channel Invitation
+        """, unstable=True),
+    POST('add_club_admin', (
+        P('club_id', convert=int),
+        P('user_id', convert=int),
+    ), """ (Clubhouse, int, int) -> dict
+
+        Add Club Admin. Requires privilege.
+        """, unstable=True, invalidates=('club:{club_id}',)),
+    POST('remove_club_admin', (
+        P('club_id', convert=_int_or_none),
+        P('user_id', convert=int),
+    ), """ (Clubhouse, int, int) -> dict
+
+        Remove Club admin. Requires privilege.
+        """, unstable=True, invalidates=('club:{club_id}',)),
+    POST('remove_club_member', (
+        P('club_id', convert=_int_or_none),
+        P('user_id', convert=int),
+    ), """ (Clubhouse, int, int) -> dict
+
+        Remove Club member. Requires privilege.
+        """, unstable=True, invalidates=('club:{club_id}',)),
+    POST('accept_club_member_invite', (
+        P('club_id', convert=_int_or_none),
+        P('source_topic_id', None),
+    ), """ (Clubhouse, int, int) -> dict
+
+        Accept Club member invite.
+        """, unstable=True, invalidates=('club:{club_id}',)),
+    POST('add_club_member', (
+        P('club_id', convert=int),
+        P('user_id', convert=int),
+        P('name'),
+        P('phone_number'),
+        P('message'),
+        P('reason'),
+    ), """ (Clubhouse, int, int, str, str, str, unknown) -> dict
+
+        Add club member
+        """, unstable=True, invalidates=('club:{club_id}',)),
+    POST('get_club_nominations', (
+        P('club_id', convert=int),
+        P('source_topic_id'),
+    ), """ (Club, int, int) -> dict
+
+        Get club nomination list
+        """, unstable=True, idempotent=True),
+    POST('approve_club_nomination', (
+        P('club_id', convert=int),
+        P('source_topic_id'),
+        P('invite_nomination_id'),
+    ), """ (Club, int, int) -> dict
+
+        Approve club nomination
+        """, unstable=True, invalidates=('club:{club_id}',)),
+    POST('reject_club_nomination', (
+        P('club_id', convert=int),
+        P('source_topic_id'),
+        P('invite_nomination_id'),
+    ), """ (Club, int, int) -> dict
+
+        Reject club nomination
+        """, path='approve_club_nomination', unstable=True, invalidates=('club:{club_id}',)),
+    POST('add_club_topic', (
+        P('club_id', convert=int),
+        P('topic_id', convert=int),
+    ), """ (Club, int, int) -> dict
+
+        Add club topic
+        """, unstable=True, invalidates=('club:{club_id}',)),
+    POST('remove_club_topic', (
+        P('club_id', convert=int),
+        P('topic_id', convert=int),
+    ), """ (Club, int, int) -> dict
+
+        Remove club topic
+        """, unstable=True, invalidates=('club:{club_id}',)),
+    GET('get_events_to_start', (), """ (Clubhouse) -> dict
+
+        Get events to start
+        """, unstable=True),
+    POST('update_is_follow_allowed', (
+        P('club_id', convert=int),
+        P('is_follow_allowed', True),
+    ), """ (Clubhouse, int, bool) -> dict
+
+        Update follow button of the given Club
+        """, unstable=True, invalidates=('club:{club_id}',)),
+    POST('update_is_membership_private', (
+        P('club_id', convert=int),
+        P('is_membership_private'),
+    ), """ (Clubhouse, int, bool) -> dict
+
+        Update membership status of the given Club
+        """, unstable=True, invalidates=('club:{club_id}',)),
+    POST('update_is_community', (
+        P('club_id', convert=int),
+        P('is_community'),
+    ), """ (Clubhouse, int, bool) -> dict
+
+        Update community stat of the given Club
+        """, unstable=True, invalidates=('club:{club_id}',)),
+    POST('update_club_description', (
+        P('club_id', convert=int),
+        P('description'),
+    ), """ (Clubhouse, int, str) -> dict
+
+        Update description of the given Club
+        """, unstable=True, invalidates=('club:{club_id}',)),
+)
+
+ENDPOINTS_BY_NAME = {endpoint.name: endpoint for endpoint in ENDPOINTS}
+
+
+def _method_source(endpoint):
+    """ (Endpoint) -> str
+
+    Build the source code of the method for the given endpoint.
+    """
+    name = endpoint.name
+    args = ["self"]
+    for param in endpoint.params:
+        if param.default is REQUIRED:
+            args.append(param.name)
+        else:
+            args.append(f"{param.name}={param.default!r}")
+
+    lines = [f"def {name}({', '.join(args)}):"]
+    if endpoint.unstable:
+        lines.append("    print(UNSTABLE_WARNING)")
+    if endpoint.auth:
+        lines.append("    if not self._authenticated:")
+        lines.append("        raise Exception('Not Authenticated')")
+    if endpoint.anonymous:
+        lines.append("    if self._authenticated:")
+        lines.append("        raise Exception('Already Authenticatied')")
+    for param in endpoint.params:
+        if param.convert:
+            lines.append(f"    {param.name} = _{name}__{param.name}__convert({param.name})")
+        if param.check is not None:
+            lines.append(f"    if {param.name} not in _{name}__{param.name}__check:")
+            lines.append("        return self._invalid()")
+
+    if endpoint.body == "query":
+        query = "&".join(f"{param.key}={{{param.name}}}" for param in endpoint.params)
+        lines.append(f"    return self._dispatch(_{name}, query=f\"{query}\")")
+    elif endpoint.body == "json":
+        fields = [f"{param.key!r}: {param.name}" for param in endpoint.params]
+        fields += [f"{key!r}: {value!r}" for key, value in endpoint.extra.items()]
+        lines.append(f"    return self._dispatch(_{name}, json={{{', '.join(fields)}}})")
+    else:
+        lines.append(f"    return self._dispatch(_{name})")
+    return "\n".join(lines)
+
+
+def install_endpoints(cls):
+    """ (type) -> type
+
+    Generate a method on `cls` for every endpoint in the table.
+    Methods already defined on the class are left untouched.
+    All methods are compiled at once to keep the import cheap.
+    """
+    namespace = {"UNSTABLE_WARNING": UNSTABLE_WARNING}
+    sources = []
+    endpoints = [endpoint for endpoint in ENDPOINTS if endpoint.name not in cls.__dict__]
+    for endpoint in endpoints:
+        namespace[f"_{endpoint.name}"] = endpoint
+        for param in endpoint.params:
+            namespace[f"_{endpoint.name}__{param.name}__convert"] = param.convert
+            namespace[f"_{endpoint.name}__{param.name}__check"] = param.check
+        sources.append(_method_source(endpoint))
+
+    filename = f"<{cls.__name__} endpoints>"
+    source = "\n\n".join(sources) + "\n"
+    # Keep the generated source around for tracebacks.
+    linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+    exec(compile(source, filename, "exec"), namespace) # pylint: disable=exec-used
+
+    for endpoint in endpoints:
+        method = namespace[endpoint.name]
+        method.__doc__ = endpoint.doc
+        method.__module__ = cls.__module__
+        method.__qualname__ = f"{cls.__qualname__}.{endpoint.name}"
+        setattr(cls, endpoint.name, method)
+    return cls
@@ -0,0 +1,333 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+feed.py
+
+The hallway (get_channels), kept up to date in the background.
+
+A ChannelFeed holds the latest channel listing in memory and refreshes it
+every `interval` seconds as a background call, so listing the channels
+does not wait for the network. Reads past the interval still answer right
+away from the copy they have, and start a refresh (stale-while-revalidate).
+When a refresh fails, the previous listing keeps being served and its age
+keeps growing. Without a previous listing, get() raises the error.
+
+Every refresh is compared with the previous listing, and the channels
+which appeared or ended are kept as a numbered change feed.
+"""
+
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .metrics import Histogram
+from .timer import default_scheduler
+
+def diff_channels(old, new):
+    """ (dict, dict) -> (list of dict, list of dict)
+
+    Get the channels added to and removed from `old` in `new`, both keyed
+    by channel name.
+    """
+    added = [channel for name, channel in new.items() if name not in old]
+    removed = [channel for name, channel in old.items() if name not in new]
+    return added, removed
+
+
+class ChannelFeed:
+    """
+    ChannelFeed Class
+
+    Latest get_channels listing of the client, refreshed every `interval`
+    seconds on the timer scheduler.
+
+    `on_change(change)` is called for each refresh that added or removed
+    channels, with the same dict as changes() returns. The last `history`
+    changes are kept.
+
+    >>> feed = ChannelFeed(clubhouse, interval=30)
+    >>> feed.get()              # cached listing, waits only for the first one
+    >>> feed.age                # seconds since the listing was fetched
+    >>> for change in feed.changes(since=version):
+    ...     print(change["version"], change["added"], change["removed"])
+    >>> feed.close()
+    """
+
+    def __init__(self, client, interval=30, history=100, on_change=None, timers=None):
+        """ (ChannelFeed, Clubhouse, float, int, callable, TimerScheduler) -> NoneType
+        """
+        self.client = client
+        self.interval = interval
+        self.on_change = on_change
+        self.result = None
+        self.version = 0
+        self.refreshes = 0
+        self.failures = 0
+        self.last_error = None
+        self.handler_errors = 0
+        self.latency = Histogram()
+        self.lock = threading.Lock()
+        self._channels = None
+        self._by_name = {}
+        self._changes = deque(maxlen=history)
+        self._fetched_at = None
+        # Start time of the refresh whose listing is held, so that a slower
+        # refresh started earlier does not overwrite a newer listing
+        self._started_at = None
+        self._refreshing = False
+        self._pending = None
+        self._start(timers)
+
+    def _start(self, timers):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="channel-feed")
+        self._timer = (timers or default_scheduler()).call_every(self.interval, self._tick)
+        self._tick()
+
+    @property
+    def channels(self):
+        """ (ChannelFeed) -> list of dict
+
+        Get the latest listing, or None before the first one.
+        """
+        return self._channels
+
+    @property
+    def age(self):
+        """ (ChannelFeed) -> float
+
+        Get the seconds since the listing was fetched, or None.
+        """
+        if self._fetched_at is None:
+            return None
+        return time.monotonic() - self._fetched_at
+
+    @property
+    def stale(self):
+        """ (ChannelFeed) -> bool """
+        age = self.age
+        return age is None or age >= self.interval
+
+    def get(self):
+        """ (ChannelFeed) -> list of dict
+
+        Get the latest listing right away. A stale listing is still
+        returned, and refreshed in the background. Before the first
+        listing, fetch it now, raising if that fails.
+        """
+        channels = self._channels
+        if channels is None:
+            # Wait for the refresh in flight rather than sending another
+            pending = self._pending
+            if pending is not None:
+                pending.result()
+                if self._channels is not None:
+                    return self._channels
+            return self.refresh()
+        if self.stale:
+            self._tick()
+        return channels
+
+    def changes(self, since=0):
+        """ (ChannelFeed, int) -> list of dict
+
+        Get the changes after version `since`, oldest first. Each change is
+        {"version", "time", "added", "removed"}; older changes than the
+        `history` kept are lost.
+        """
+        with self.lock:
+            return [change for change in self._changes if change["version"] > since]
+
+    def refresh(self):
+        """ (ChannelFeed) -> list of dict
+
+        Fetch the listing now and wait for it. A failed refresh returns
+        the previous listing, or raises if there is none.
+        """
+        started = time.monotonic()
+        try:
+            result = self.client.get_channels()
+        except Exception as err: # pylint: disable=broad-except
+            self._failed(started, str(err) or type(err).__name__)
+            raise
+        return self._update(started, result)
+
+    def _tick(self):
+        """ Refresh in the background, unless a refresh is already running """
+        with self.lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        try:
+            self._pending = self._executor.submit(self._refresh)
+        except RuntimeError:
+            # Closed
+            self._refreshing = False
+
+    def _refresh(self):
+        try:
+            with self.client.limits(priority="background"):
+                self.refresh()
+        except Exception: # pylint: disable=broad-except
+            pass
+        finally:
+            self._refreshing = False
+
+    def _update(self, started, result):
+        """ Hold the listing of a successful refresh, and record what changed """
+        if not result.get("success"):
+            error = result.get("error_message", "failed")
+            self._failed(started, error)
+            if self._channels is None:
+                raise Exception(f"get_channels failed ({error})")
+            return self._channels
+        channels = result.get("channels") or []
+        by_name = {channel["channel"]: channel for channel in channels}
+        change = None
+        with self.lock:
+            self.refreshes += 1
+            self.latency.record(time.monotonic() - started)
+            if self._started_at is not None and started < self._started_at:
+                return self._channels
+            first = self._channels is None
+            added, removed = diff_channels(self._by_name, by_name)
+            self.result = result
+            self._channels = channels
+            self._by_name = by_name
+            self._fetched_at = time.monotonic()
+            self._started_at = started
+            if not first and (added or removed):
+                self.version += 1
+                change = {"version": self.version, "time": time.time(), "added": added, "removed": removed}
+                self._changes.append(change)
+        if change is not None and self.on_change is not None:
+            try:
+                self.on_change(change)
+            except Exception: # pylint: disable=broad-except
+                self.handler_errors += 1
+        return channels
+
+    def _failed(self, started, error):
+        with self.lock:
+            self.refreshes += 1
+            self.failures += 1
+            self.last_error = error
+            self.latency.record(time.monotonic() - started)
+
+    def stats(self):
+        """ (ChannelFeed) -> dict
+
+        Get the refresh counters and latency (in milliseconds), and the age of the listing.
+        """
+        with self.lock:
+            return {
+                "channels": len(self._channels) if self._channels is not None else None,
+                "age": self.age,
+                "version": self.version,
+                "refreshes": self.refreshes,
+                "failures": self.failures,
+                "last_error": self.last_error,
+                "handler_errors": self.handler_errors,
+                "latency": self.latency.summary(),
+            }
+
+    def close(self):
+        """ (ChannelFeed) -> NoneType
+
+        Stop refreshing. The last listing can still be read.
+        """
+        self._timer.cancel()
+        self._executor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AsyncChannelFeed(ChannelFeed):
+    """
+    AsyncChannelFeed Class
+
+    Same as ChannelFeed, for AsyncClubhouse: the refreshes are tasks of the
+    running event loop. Create it from a coroutine, and call close() when done.
+
+    >>> feed = AsyncChannelFeed(clubhouse)
+    >>> channels = await feed.get()
+    """
+
+    def _start(self, timers):
+        self._refresh_task = None
+        self._tick()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def get(self): # pylint: disable=invalid-overridden-method
+        """ (AsyncChannelFeed) -> list of dict
+
+        Get the latest listing right away. A stale listing is still
+        returned, and refreshed in the background. Before the first
+        listing, wait for it, raising if it fails.
+        """
+        channels = self._channels
+        if channels is None:
+            # Wait for the refresh in flight rather than sending another
+            if self._refresh_task is not None:
+                await asyncio.shield(self._refresh_task)
+                if self._channels is not None:
+                    return self._channels
+            return await self.refresh()
+        if self.stale:
+            self._tick()
+        return channels
+
+    async def refresh(self): # pylint: disable=invalid-overridden-method
+        """ (AsyncChannelFeed) -> list of dict
+
+        Fetch the listing now and wait for it. A failed refresh returns
+        the previous listing, or raises if there is none.
+        """
+        started = time.monotonic()
+        try:
+            result = await self.client.get_channels()
+        except Exception as err: # pylint: disable=broad-except
+            self._failed(started, str(err) or type(err).__name__)
+            raise
+        return self._update(started, result)
+
+    def _tick(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.get_running_loop().create_task(self._refresh())
+
+    async def _refresh(self): # pylint: disable=invalid-overridden-method
+        try:
+            with self.client.limits(priority="background"):
+                await self.refresh()
+        except Exception: # pylint: disable=broad-except
+            pass
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        due = loop.time()
+        while True:
+            # Scheduled from the due time, so the refreshes do not drift,
+            # but skip the ones missed while the loop was busy.
+            due = max(due + self.interval, loop.time())
+            await asyncio.sleep(due - loop.time())
+            self._tick()
+
+    def close(self):
+        """ (AsyncChannelFeed) -> NoneType
+
+        Stop refreshing. The last listing can still be read.
+        """
+        self._task.cancel()
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
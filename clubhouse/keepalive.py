@@ -0,0 +1,232 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+keepalive.py
+
+active_ping of every joined room, on one schedule.
+
+The rooms are spread over `slots` time slots of the ping interval, so with
+many rooms the pings go out at an even rate instead of in bursts. The pings
+of a slot are sent concurrently over the pooled connections of the client,
+and a room is not pinged when another request about it went through lately.
+"""
+
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .metrics import Histogram
+from .timer import default_scheduler
+
+class RoomPing:
+    """
+    RoomPing Class
+
+    Ping state and counters of one room.
+    """
+
+    __slots__ = ("channel", "slot", "pings", "failures", "skipped", "last_seen", "last_error", "latency")
+
+    def __init__(self, channel, slot):
+        """ (RoomPing, str, int) -> NoneType
+        """
+        self.channel = channel
+        self.slot = slot
+        self.pings = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_seen = None
+        self.last_error = None
+        self.latency = Histogram()
+
+    def snapshot(self, now):
+        """ (RoomPing, float) -> dict """
+        return {
+            "pings": self.pings,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "success_rate": 1 - self.failures / self.pings if self.pings else None,
+            "seconds_since_seen": now - self.last_seen if self.last_seen is not None else None,
+            "last_error": self.last_error,
+            "latency": self.latency.summary(),
+        }
+
+
+class PingManager:
+    """
+    PingManager Class
+
+    Keeps every joined room alive with active_ping every `interval` seconds.
+
+    A room is skipped when a successful request about it (get_channel,
+    audience_reply, ...) was made less than `skip_within` seconds ago, so
+    the longest gap between two signs of life is interval + skip_within.
+    Set skip_within to 0 to always ping.
+
+    >>> pings = PingManager(clubhouse)
+    >>> pings.add(channel_name)
+    ...
+    >>> pings.remove(channel_name)
+    >>> pings.stats()[channel_name]["latency"]["p99"]
+    """
+
+    def __init__(self, client, interval=30, slots=30, concurrency=8, skip_within=None, timers=None):
+        """ (PingManager, Clubhouse, float, int, int, float, TimerScheduler) -> NoneType
+        """
+        self.client = client
+        self.interval = interval
+        self.skip_within = interval / 2 if skip_within is None else skip_within
+        self.rooms = {}
+        self.slots = [set() for _ in range(slots)]
+        self.lock = threading.Lock()
+        self._slot = 0
+        self._start(concurrency, timers)
+        if self.skip_within:
+            client.add_hook("response", self._on_response)
+
+    def _start(self, concurrency, timers):
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="ping")
+        self._timer = (timers or default_scheduler()).call_every(self.interval / len(self.slots), self._tick)
+
+    def add(self, channel):
+        """ (PingManager, str) -> NoneType
+
+        Start pinging the room, in the least busy slot.
+        """
+        with self.lock:
+            if channel in self.rooms:
+                return
+            slot = min(range(len(self.slots)), key=lambda i: len(self.slots[i]))
+            self.slots[slot].add(channel)
+            self.rooms[channel] = RoomPing(channel, slot)
+
+    def remove(self, channel):
+        """ (PingManager, str) -> NoneType """
+        with self.lock:
+            room = self.rooms.pop(channel, None)
+            if room is not None:
+                self.slots[room.slot].discard(channel)
+
+    def __contains__(self, channel):
+        return channel in self.rooms
+
+    def __len__(self):
+        return len(self.rooms)
+
+    def close(self):
+        """ (PingManager) -> NoneType
+
+        Stop pinging every room.
+        """
+        self._stop()
+        if self.skip_within:
+            self.client.remove_hook("response", self._on_response)
+        with self.lock:
+            self.rooms.clear()
+            for slot in self.slots:
+                slot.clear()
+
+    def stats(self):
+        """ (PingManager) -> dict
+
+        Get the ping counters and latency (in milliseconds) of each room.
+        """
+        now = time.monotonic()
+        with self.lock:
+            return {channel: room.snapshot(now) for channel, room in self.rooms.items()}
+
+    def _stop(self):
+        self._timer.cancel()
+        self._executor.shutdown(wait=False)
+
+    def _due(self):
+        """ Move to the next slot and get the rooms of it to ping """
+        with self.lock:
+            channels = list(self.slots[self._slot])
+            self._slot = (self._slot + 1) % len(self.slots)
+            now = time.monotonic()
+            due = []
+            for channel in channels:
+                room = self.rooms[channel]
+                if room.last_seen is not None and now - room.last_seen < self.skip_within:
+                    room.skipped += 1
+                else:
+                    due.append(room)
+            return due
+
+    def _tick(self):
+        for room in self._due():
+            self._executor.submit(self._ping, room)
+
+    def _ping(self, room):
+        started = time.perf_counter()
+        try:
+            result = self.client.active_ping(room.channel)
+            error = None if result.get("success") else result.get("error_message", "failed")
+        except Exception as err: # pylint: disable=broad-except
+            error = str(err) or type(err).__name__
+        self._done(room, time.perf_counter() - started, error)
+
+    def _done(self, room, latency, error):
+        with self.lock:
+            room.pings += 1
+            room.latency.record(latency)
+            if error is None:
+                room.last_seen = time.monotonic()
+            else:
+                room.failures += 1
+                room.last_error = error
+
+    def _on_response(self, record):
+        """ A request about a room proves that the room is still joined """
+        if record.channel is None or record.endpoint in ("active_ping", "leave_channel"):
+            return
+        if record.status is not None and record.status < 400:
+            room = self.rooms.get(record.channel)
+            if room is not None:
+                room.last_seen = time.monotonic()
+
+
+class AsyncPingManager(PingManager):
+    """
+    AsyncPingManager Class
+
+    Same as PingManager, for AsyncClubhouse: the schedule is a task of the
+    running event loop, with up to `concurrency` pings in flight.
+    Create it from a coroutine, and call close() when done.
+    """
+
+    def _start(self, concurrency, timers):
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._pings = set()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def _stop(self):
+        self._task.cancel()
+        for task in self._pings:
+            task.cancel()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        step = self.interval / len(self.slots)
+        due = loop.time()
+        while True:
+            # Scheduled from the due time, so the ticks do not drift,
+            # but skip the ticks missed while the loop was busy.
+            due = max(due + step, loop.time())
+            await asyncio.sleep(due - loop.time())
+            for room in self._due():
+                task = loop.create_task(self._ping(room))
+                self._pings.add(task)
+                task.add_done_callback(self._pings.discard)
+
+    async def _ping(self, room):
+        async with self._semaphore:
+            started = time.perf_counter()
+            try:
+                result = await self.client.active_ping(room.channel)
+                error = None if result.get("success") else result.get("error_message", "failed")
+            except Exception as err: # pylint: disable=broad-except
+                error = str(err) or type(err).__name__
+            self._done(room, time.perf_counter() - started, error)
@@ -0,0 +1,354 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+metrics.py
+
+Request timings, latency histograms and a Prometheus text exporter.
+
+Clubhouse fires hooks around every request it sends (see Clubhouse.add_hook).
+MetricsCollector listens to them and keeps, per endpoint, HDR-style latency
+histograms of each phase of the request, byte counts and error counts.
+"""
+
+import os
+import time
+import threading
+
+# Phases of a request, in order. Set to None when unknown.
+PHASES = ("dns", "connect", "tls", "wait", "download", "decode")
+
+class RequestRecord:
+    """
+    RequestRecord Class
+
+    Passed to the hooks of a request. Times are in seconds:
+
+    dns, connect, tls:
+        - Name resolution, TCP and TLS handshakes. 0 on a reused connection.
+    wait:
+        - From sending the request to receiving the response headers.
+    download:
+        - Reading the response body.
+    decode:
+        - Decoding the JSON body.
+    total:
+        - The whole call, retries included.
+
+    channel:
+        - The room the request is about, when the request has one.
+
+    When retried, the phases and `status` are those of the last attempt.
+    """
+
+    __slots__ = (
+        "endpoint", "url", "channel", "started", "attempts", "status", "sent", "received", "error", "total",
+    ) + PHASES
+
+    def __init__(self, endpoint, url, channel=None):
+        """ (RequestRecord, str, str, str) -> NoneType
+        """
+        self.endpoint = endpoint
+        self.url = url
+        self.channel = channel
+        self.started = time.perf_counter()
+        self.attempts = 0
+        self.status = None
+        self.sent = 0
+        self.received = 0
+        self.error = None
+        self.total = None
+        for phase in PHASES:
+            setattr(self, phase, None)
+
+    def timings(self):
+        """ (RequestRecord) -> dict
+
+        Get the known phase times, and the total.
+        """
+        timings = {phase: getattr(self, phase) for phase in PHASES if getattr(self, phase) is not None}
+        timings["total"] = self.total
+        return timings
+
+    def __repr__(self):
+        return f"RequestRecord({self.endpoint}, status={self.status}, total={self.total})"
+
+
+class Histogram:
+    """
+    Histogram Class
+
+    HDR-style histogram of durations: values are counted in log-linear
+    buckets with a relative error below 1 / 2 ** (sub_bits - 1),
+    from 1 microsecond to hours, in a sparse dict.
+    """
+
+    def __init__(self, sub_bits=7):
+        """ (Histogram, int) -> NoneType
+        """
+        self.sub_bits = sub_bits
+        self.sub_count = 1 << sub_bits
+        self.half = self.sub_count >> 1
+        self.counts = {}
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def _index(self, micros):
+        if micros < self.sub_count:
+            return micros
+        shift = micros.bit_length() - self.sub_bits
+        return self.sub_count + (shift - 1) * self.half + (micros >> shift) - self.half
+
+    def _value(self, index):
+        """ Highest value (in microseconds) counted in the bucket """
+        if index < self.sub_count:
+            return index
+        shift, sub = divmod(index - self.sub_count, self.half)
+        shift += 1
+        return ((sub + self.half) << shift) + (1 << shift) - 1
+
+    def record(self, seconds):
+        """ (Histogram, float) -> NoneType """
+        index = self._index(max(0, int(seconds * 1000000)))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, percent):
+        """ (Histogram, float) -> float
+
+        Get the value (in seconds) below which `percent` % of the values fall.
+        """
+        if not self.count:
+            return 0.0
+        target = self.count * percent / 100
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._value(index) / 1000000, self.max)
+        return self.max
+
+    def count_below(self, seconds):
+        """ (Histogram, float) -> int
+
+        Get the number of values up to `seconds`, within the bucket precision.
+        """
+        limit = self._index(int(seconds * 1000000))
+        return sum(count for index, count in self.counts.items() if index <= limit)
+
+    def summary(self):
+        """ (Histogram) -> dict
+
+        Get the count, mean and percentiles, in milliseconds.
+        """
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count * 1000 if self.count else 0.0,
+            "p50": self.percentile(50) * 1000,
+            "p90": self.percentile(90) * 1000,
+            "p99": self.percentile(99) * 1000,
+            "max": self.max * 1000,
+        }
+
+
+class EndpointMetrics:
+    """
+    EndpointMetrics Class
+
+    Counters and histograms of one endpoint.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.statuses = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency = Histogram()
+        self.phases = {phase: Histogram() for phase in PHASES}
+
+    def snapshot(self):
+        """ (EndpointMetrics) -> dict """
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": self.errors / self.requests if self.requests else 0.0,
+            "statuses": dict(self.statuses),
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "latency": self.latency.summary(),
+            "phases": {
+                phase: histogram.summary() for phase, histogram in self.phases.items() if histogram.count
+            },
+        }
+
+
+class MetricsCollector:
+    """
+    MetricsCollector Class
+
+    In-process collector of the request hooks of one or more clients.
+
+    >>> collector = MetricsCollector().attach(clubhouse)
+    >>> clubhouse.get_channels()
+    >>> collector.stats()["get_channels"]["latency"]["p99"]
+    """
+
+    def __init__(self):
+        self.endpoints = {}
+        self.lock = threading.Lock()
+
+    def attach(self, client):
+        """ (MetricsCollector, Clubhouse) -> MetricsCollector
+
+        Listen to the requests of the client.
+        """
+        client.add_hook("response", self.record)
+        client.add_hook("error", self.record)
+        return self
+
+    def detach(self, client):
+        """ (MetricsCollector, Clubhouse) -> NoneType """
+        client.remove_hook("response", self.record)
+        client.remove_hook("error", self.record)
+
+    def record(self, record):
+        """ (MetricsCollector, RequestRecord) -> NoneType
+
+        Account for a finished request.
+        """
+        with self.lock:
+            metrics = self.endpoints.get(record.endpoint)
+            if metrics is None:
+                metrics = self.endpoints[record.endpoint] = EndpointMetrics()
+            metrics.requests += 1
+            if record.error is not None or (record.status or 0) >= 400:
+                metrics.errors += 1
+            if record.status is not None:
+                metrics.statuses[record.status] = metrics.statuses.get(record.status, 0) + 1
+            metrics.bytes_sent += record.sent
+            metrics.bytes_received += record.received
+            if record.total is not None:
+                metrics.latency.record(record.total)
+            for phase in PHASES:
+                value = getattr(record, phase)
+                if value is not None:
+                    metrics.phases[phase].record(value)
+
+    def stats(self):
+        """ (MetricsCollector) -> dict
+
+        Get a snapshot of the metrics, by endpoint. Times are in milliseconds.
+        """
+        with self.lock:
+            return {name: metrics.snapshot() for name, metrics in sorted(self.endpoints.items())}
+
+    def reset(self):
+        """ (MetricsCollector) -> NoneType """
+        with self.lock:
+            self.endpoints.clear()
+
+
+# Bucket bounds of the exported latency histograms, in seconds
+PROMETHEUS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def prometheus_text(collector, prefix="clubhouse"):
+    """ (MetricsCollector, str) -> str
+
+    Render the metrics in the Prometheus text exposition format.
+    """
+    with collector.lock:
+        endpoints = sorted(collector.endpoints.items())
+        lines = []
+        for family, attr in (
+                ("requests_total", "requests"),
+                ("request_errors_total", "errors"),
+                ("request_bytes_sent_total", "bytes_sent"),
+                ("request_bytes_received_total", "bytes_received"),
+            ):
+            lines.append(f"# TYPE {prefix}_{family} counter")
+            for name, metrics in endpoints:
+                lines.append(f'{prefix}_{family}{{endpoint="{name}"}} {getattr(metrics, attr)}')
+
+        family = f"{prefix}_request_duration_seconds"
+        lines.append(f"# TYPE {family} histogram")
+        for name, metrics in endpoints:
+            latency = metrics.latency
+            for bound in PROMETHEUS_BUCKETS:
+                lines.append(f'{family}_bucket{{endpoint="{name}",le="{bound}"}} {latency.count_below(bound)}')
+            lines.append(f'{family}_bucket{{endpoint="{name}",le="+Inf"}} {latency.count}')
+            lines.append(f'{family}_sum{{endpoint="{name}"}} {latency.sum:.6f}')
+            lines.append(f'{family}_count{{endpoint="{name}"}} {latency.count}')
+
+        family = f"{prefix}_request_phase_seconds"
+        lines.append(f"# TYPE {family} summary")
+        for name, metrics in endpoints:
+            for phase, histogram in metrics.phases.items():
+                if not histogram.count:
+                    continue
+                labels = f'endpoint="{name}",phase="{phase}"'
+                for quantile in (0.5, 0.9, 0.99):
+                    lines.append(
+                        f'{family}{{{labels},quantile="{quantile}"}} {histogram.percentile(quantile * 100):.6f}'
+                    )
+                lines.append(f"{family}_sum{{{labels}}} {histogram.sum:.6f}")
+                lines.append(f"{family}_count{{{labels}}} {histogram.count}")
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(collector, filename, prefix="clubhouse"):
+    """ (MetricsCollector, str, str) -> NoneType
+
+    Write the metrics to `filename`, e.g. for the textfile collector of
+    the node exporter. The file is replaced atomically.
+    """
+    temp_filename = f"{filename}.{os.getpid()}.tmp"
+    with open(temp_filename, "w") as metrics_file:
+        metrics_file.write(prometheus_text(collector, prefix))
+    os.replace(temp_filename, filename)
+
+
+class PrometheusExporter:
+    """
+    PrometheusExporter Class
+
+    Writes the metrics of a collector to a file every `interval` seconds.
+
+    >>> exporter = PrometheusExporter(collector, "/var/lib/node_exporter/clubhouse.prom").start()
+    ...
+    >>> exporter.stop()
+    """
+
+    def __init__(self, collector, filename, interval=15, prefix="clubhouse"):
+        """ (PrometheusExporter, MetricsCollector, str, float, str) -> NoneType
+        """
+        self.collector = collector
+        self.filename = filename
+        self.interval = interval
+        self.prefix = prefix
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """ (PrometheusExporter) -> PrometheusExporter """
+        self._thread = threading.Thread(target=self._run, name="prometheus-exporter")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """ (PrometheusExporter) -> NoneType
+
+        Stop exporting, after a last write.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        write_prometheus(self.collector, self.filename, self.prefix)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            write_prometheus(self.collector, self.filename, self.prefix)
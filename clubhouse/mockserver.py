@@ -0,0 +1,656 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+# pylint: disable=unused-argument
+
+"""
+mockserver.py
+
+Local stand-in for the Clubhouse API, for offline load tests.
+
+Serves every path of the endpoint table (see endpoints.py) from synthetic
+data, plus the PubNub subscribe API for room events. Latency and errors
+can be injected, and every request is logged.
+
+$ python -m clubhouse.mockserver --port 8080 --users 5000 --latency 0.05
+$ CLUBHOUSE_API_URL=http://127.0.0.1:8080/api python3 v2.py
+
+>>> server = MockServer(MockData(num_users=5000), latency=0.01).start()
+>>> Clubhouse.API_URL = server.api_url
+>>> ...
+>>> server.stop()
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from collections import deque
+from urllib.parse import urlsplit, parse_qsl, unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from .endpoints import ENDPOINTS
+
+class MockData:
+    """
+    MockData Class
+
+    Synthetic users, clubs, topics, events and channels.
+    The same seed always gives the same data.
+    """
+
+    def __init__(self, num_users=1000, num_channels=50, users_per_channel=100, num_clubs=100,
+                 num_topics=50, num_events=50, seed=0):
+        """ (MockData, int, int, int, int, int, int, int) -> NoneType
+        """
+        rand = random.Random(seed)
+        self.lock = threading.RLock()
+        self.users = {}
+        for user_id in range(1, num_users + 1):
+            self.users[user_id] = {
+                "user_id": user_id,
+                "name": f"User {user_id}",
+                "username": f"user{user_id}",
+                "photo_url": f"https://example.com/photos/{user_id}.jpg",
+                "bio": f"Bio of user {user_id}",
+                "num_followers": rand.randint(0, 10000),
+                "num_following": rand.randint(0, 1000),
+                "time_created": "2021-01-01T00:00:00.000000+00:00",
+            }
+        self.topics = [
+            {"id": topic_id, "title": f"Topic {topic_id}", "abbreviated_title": f"T{topic_id}"}
+            for topic_id in range(1, num_topics + 1)
+        ]
+        self.clubs = {}
+        for club_id in range(1, num_clubs + 1):
+            self.clubs[club_id] = {
+                "club_id": club_id,
+                "name": f"Club {club_id}",
+                "description": f"Description of club {club_id}",
+                "photo_url": f"https://example.com/clubs/{club_id}.jpg",
+                "num_members": rand.randint(1, num_users),
+                "num_followers": rand.randint(1, num_users),
+                "is_follow_allowed": True,
+                "is_membership_private": False,
+                "is_community": False,
+            }
+        user_ids = list(self.users)
+        self.events = [
+            {
+                "event_id": event_id,
+                "name": f"Event {event_id}",
+                "description": f"Description of event {event_id}",
+                "time_start": "2021-03-01T00:00:00+00:00",
+                "club": self.clubs.get(rand.randint(1, num_clubs)) if num_clubs else None,
+                "hosts": [self.users[user_id] for user_id in rand.sample(user_ids, min(3, len(user_ids)))],
+                "is_member_only": False,
+                "is_expired": False,
+            }
+            for event_id in range(1, num_events + 1)
+        ]
+        # channel -> {"channel_id", "topic", "members": {user_id: flags}}
+        self.channels = {}
+        for channel_id in range(1, num_channels + 1):
+            members = {}
+            for i, user_id in enumerate(rand.sample(user_ids, min(users_per_channel, len(user_ids)))):
+                members[user_id] = {
+                    "is_speaker": i < 5,
+                    "is_moderator": i < 1,
+                    "is_invited_as_speaker": False,
+                    "is_followed_by_speaker": rand.random() < 0.3,
+                    "is_new": rand.random() < 0.05,
+                }
+            self.channels[f"mock{channel_id:04d}"] = {
+                "channel_id": channel_id,
+                "topic": f"Room {channel_id}",
+                "members": members,
+            }
+
+    def user(self, user_id):
+        """ (MockData, int) -> dict
+
+        Get the user, creating it if needed.
+        """
+        with self.lock:
+            if user_id not in self.users:
+                self.users[user_id] = {"user_id": user_id, "name": f"User {user_id}", "username": f"user{user_id}"}
+            return self.users[user_id]
+
+    def channel_user(self, user_id, flags):
+        """ (MockData, int, dict) -> dict
+
+        Get a user as listed in a channel.
+        """
+        user = self.user(user_id)
+        return {
+            "user_id": user_id,
+            "name": user['name'],
+            "username": user['username'],
+            "photo_url": user.get('photo_url'),
+            "first_name": user['name'].split()[0],
+            "skintone": 1,
+            "time_joined_as_speaker": None,
+            **flags,
+        }
+
+
+class MockAPI:
+    """
+    MockAPI Class
+
+    Answers API calls from MockData. Handlers are named after the path of
+    the endpoint; paths without a handler answer {"success": True}.
+    Changes to rooms are published as PubNub events.
+    """
+
+    def __init__(self, data, origin=""):
+        """ (MockAPI, MockData, str) -> NoneType
+        """
+        self.data = data
+        self.origin = origin
+        self.messages = deque(maxlen=10000)
+        self.timetoken = 16000000000000000
+        self.published = threading.Condition()
+        self.paths = {endpoint.path: endpoint for endpoint in ENDPOINTS}
+
+    def call(self, path, params, user_id):
+        """ (MockAPI, str, dict, int) -> (int, dict)
+
+        Answer a call to `path`, as (HTTP status, body).
+        """
+        endpoint = self.paths.get(path)
+        if endpoint is None:
+            return 404, {"success": False, "error_message": f"Unknown path {path}"}
+        handler = getattr(self, f"handle_{path}", None)
+        if handler is not None:
+            return 200, handler(params, user_id)
+        if endpoint.items:
+            return 200, self._page(endpoint.items, params, self._items(endpoint.items))
+        return 200, {"success": True}
+
+    def publish(self, channel, payload):
+        """ (MockAPI, str, dict) -> NoneType
+
+        Publish a PubNub message.
+        """
+        with self.published:
+            self.timetoken += 1
+            self.messages.append((self.timetoken, channel, payload))
+            self.published.notify_all()
+
+    def subscribe(self, channels, timetoken, timeout):
+        """ (MockAPI, list of str, int, float) -> dict
+
+        Answer a PubNub subscribe call: wait up to `timeout` seconds for
+        messages after `timetoken` on the given channels.
+        """
+        channels = set(channels)
+        with self.published:
+            if timetoken:
+                deadline = time.monotonic() + timeout
+                while True:
+                    messages = [
+                        {"c": channel, "d": payload}
+                        for token, channel, payload in self.messages
+                        if token > timetoken and channel in channels
+                    ]
+                    remaining = deadline - time.monotonic()
+                    if messages or remaining <= 0:
+                        break
+                    self.published.wait(remaining)
+            else:
+                messages = []
+            return {"t": {"t": str(self.timetoken), "r": 1}, "m": messages}
+
+    def _items(self, key):
+        if key == "users":
+            return list(self.data.users.values())
+        if key == "clubs":
+            return list(self.data.clubs.values())
+        if key == "events":
+            return self.data.events
+        return []
+
+    @staticmethod
+    def _page(key, params, items):
+        """ Slice `items` by the page/page_size params """
+        page = int(params.get("page") or 1)
+        page_size = int(params.get("page_size") or 50)
+        start = (page - 1) * page_size
+        return {
+            "success": True,
+            key: items[start:start + page_size],
+            "count": len(items),
+            "next": page + 1 if start + page_size < len(items) else None,
+            "previous": page - 1 if page > 1 else None,
+        }
+
+    def _channel(self, name, user_id, full=True):
+        """ Get a channel as returned by get_channel (full) or get_channels """
+        channel = self.data.channels.get(name)
+        if channel is None:
+            return {"success": False, "error_message": "That room is no longer available"}
+        members = channel['members'].items()
+        if not full:
+            members = list(members)[:5]
+        result = {
+            "success": True,
+            "channel": name,
+            "channel_id": channel['channel_id'],
+            "topic": channel['topic'],
+            "is_private": False,
+            "is_social_mode": False,
+            "url": f"https://www.joinclubhouse.com/room/{name}",
+            "club": None,
+            "num_all": len(channel['members']),
+            "num_speakers": sum(1 for flags in channel['members'].values() if flags['is_speaker']),
+            "users": [self.data.channel_user(member_id, flags) for member_id, flags in members],
+        }
+        if full:
+            result.update({
+                "token": "mock-agora-token",
+                "pubnub_token": "mock-pubnub-token",
+                "pubnub_origin": self.origin,
+                "pubnub_heartbeat_value": 30,
+                "pubnub_heartbeat_interval": 10,
+            })
+        return result
+
+    def _set_flags(self, params, action, **flags):
+        name = params.get("channel")
+        user_id = int(params.get("user_id") or 0)
+        with self.data.lock:
+            channel = self.data.channels.get(name)
+            if channel is None or user_id not in channel['members']:
+                return {"success": False, "error_message": "That user is not in the room"}
+            channel['members'][user_id].update(flags)
+        self.publish(f"channel_all.{name}", {"action": action, "channel": name, "user_id": user_id})
+        return {"success": True}
+
+    def handle_get_channels(self, params, user_id):
+        """ get_channels """
+        with self.data.lock:
+            channels = [self._channel(name, user_id, full=False) for name in self.data.channels]
+        return {"success": True, "channels": channels, "events": self.data.events[:3]}
+
+    def handle_get_channel(self, params, user_id):
+        """ get_channel """
+        with self.data.lock:
+            return self._channel(params.get("channel"), user_id)
+
+    def handle_join_channel(self, params, user_id):
+        """ join_channel """
+        name = params.get("channel")
+        with self.data.lock:
+            channel = self.data.channels.get(name)
+            if channel is None:
+                return self._channel(name, user_id)
+            joined = user_id not in channel['members']
+            flags = channel['members'].setdefault(user_id, {
+                "is_speaker": False,
+                "is_moderator": False,
+                "is_invited_as_speaker": False,
+                "is_followed_by_speaker": False,
+                "is_new": False,
+            })
+            result = self._channel(name, user_id)
+            profile = self.data.channel_user(user_id, flags)
+        if joined:
+            self.publish(f"channel_all.{name}", {"action": "join_channel", "channel": name, "user_profile": profile})
+        return result
+
+    def handle_leave_channel(self, params, user_id):
+        """ leave_channel """
+        name = params.get("channel")
+        with self.data.lock:
+            channel = self.data.channels.get(name)
+            left = channel is not None and channel['members'].pop(user_id, None) is not None
+        if left:
+            self.publish(f"channel_all.{name}", {"action": "leave_channel", "channel": name, "user_id": user_id})
+        return {"success": True}
+
+    def handle_active_ping(self, params, user_id):
+        """ active_ping """
+        return {"success": True, "should_leave": params.get("channel") not in self.data.channels}
+
+    def handle_make_moderator(self, params, user_id):
+        """ make_moderator """
+        return self._set_flags(params, "make_moderator", is_speaker=True, is_moderator=True)
+
+    def handle_invite_speaker(self, params, user_id):
+        """ invite_speaker """
+        result = self._set_flags(params, "invite_speaker", is_invited_as_speaker=True)
+        if result['success']:
+            name, invited = params.get("channel"), int(params.get("user_id"))
+            self.publish(f"channel_user.{name}.{invited}", {
+                "action": "invite_speaker", "channel": name, "from_user_id": user_id,
+                "from_name": self.data.user(user_id)['name'],
+            })
+        return result
+
+    def handle_uninvite_speaker(self, params, user_id):
+        """ uninvite_speaker """
+        return self._set_flags(params, "uninvite_speaker", is_invited_as_speaker=False)
+
+    def handle_accept_speaker_invite(self, params, user_id):
+        """ accept_speaker_invite """
+        return self._set_flags(
+            {"channel": params.get("channel"), "user_id": user_id}, "add_speaker",
+            is_speaker=True, is_invited_as_speaker=False
+        )
+
+    def handle_audience_reply(self, params, user_id):
+        """ audience_reply """
+        name = params.get("channel")
+        action = "raise_hands" if params.get("raise_hands") else "unraise_hands"
+        self.publish(f"channel_all.{name}", {"action": action, "channel": name, "user_id": user_id})
+        return {"success": True}
+
+    def handle_end_channel(self, params, user_id):
+        """ end_channel """
+        name = params.get("channel")
+        with self.data.lock:
+            ended = self.data.channels.pop(name, None) is not None
+        if ended:
+            self.publish(f"channel_all.{name}", {"action": "end_channel", "channel": name})
+        return {"success": ended}
+
+    def handle_create_channel(self, params, user_id):
+        """ create_channel """
+        with self.data.lock:
+            channel_id = max((channel['channel_id'] for channel in self.data.channels.values()), default=0) + 1
+            name = f"mock{channel_id:04d}"
+            self.data.channels[name] = {
+                "channel_id": channel_id,
+                "topic": params.get("topic") or "",
+                "members": {user_id: {
+                    "is_speaker": True,
+                    "is_moderator": True,
+                    "is_invited_as_speaker": False,
+                    "is_followed_by_speaker": False,
+                    "is_new": False,
+                }},
+            }
+            return self._channel(name, user_id)
+
+    def handle_me(self, params, user_id):
+        """ me """
+        return {
+            "success": True,
+            "user_profile": self.data.user(user_id),
+            "num_invites": 0,
+            "has_unread_notifications": False,
+            "notifications_enabled": True,
+        }
+
+    def handle_get_profile(self, params, user_id):
+        """ get_profile """
+        profile_id = int(params.get("user_id") or 0)
+        if profile_id not in self.data.users:
+            return {"success": False, "error_message": "User not found"}
+        return {"success": True, "user_profile": self.data.users[profile_id]}
+
+    def handle_search_users(self, params, user_id):
+        """ search_users """
+        query = (params.get("query") or "").lower()
+        users = [
+            user for user in self.data.users.values()
+            if query in user['username'].lower() or query in user['name'].lower()
+        ]
+        return self._page("users", params, users)
+
+    def handle_search_clubs(self, params, user_id):
+        """ search_clubs """
+        query = (params.get("query") or "").lower()
+        clubs = [club for club in self.data.clubs.values() if query in club['name'].lower()]
+        return self._page("clubs", params, clubs)
+
+    def handle_get_club(self, params, user_id):
+        """ get_club """
+        club = self.data.clubs.get(int(params.get("club_id") or 0))
+        if club is None:
+            return {"success": False, "error_message": "Club not found"}
+        return {"success": True, "club": club, "topics": self.data.topics[:3], "is_admin": False, "is_member": False}
+
+    def handle_get_all_topics(self, params, user_id):
+        """ get_all_topics """
+        return {"success": True, "topics": self.data.topics}
+
+    def handle_get_topic(self, params, user_id):
+        """ get_topic """
+        topic_id = int(params.get("topic_id") or 0)
+        for topic in self.data.topics:
+            if topic['id'] == topic_id:
+                return {"success": True, "topic": topic}
+        return {"success": False, "error_message": "Topic not found"}
+
+    def handle_get_online_friends(self, params, user_id):
+        """ get_online_friends """
+        return {"success": True, "users": list(self.data.users.values())[:20], "clubs": []}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """ HTTP handler of MockServer """
+
+    protocol_version = "HTTP/1.1"
+    server_version = "ClubhouseMock/1.0"
+
+    # Headers and body are written separately; don't hold the body back
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args): # pylint: disable=arguments-differ
+        pass
+
+    def _respond(self, status, body, started, endpoint, headers=()):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        for key, value in headers:
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(content)
+        self.server.mock.log_request(self.command, self.path, endpoint, status, len(content), started)
+
+    def _handle(self):
+        mock = self.server.mock
+        started = time.perf_counter()
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        parts = urlsplit(self.path)
+        params = dict(parse_qsl(parts.query))
+
+        if parts.path.startswith("/v2/subscribe/"):
+            # /v2/subscribe/{sub_key}/{channels}/0
+            channels = unquote(parts.path.split("/")[4]).split(",")
+            result = mock.api.subscribe(channels, int(params.get("tt") or 0), mock.subscribe_timeout)
+            return self._respond(200, result, started, "pubnub_subscribe")
+
+        path = parts.path[len(mock.prefix):].lstrip("/") if parts.path.startswith(mock.prefix) else ""
+        if body and self.headers.get("Content-Type", "").startswith("application/json"):
+            try:
+                params.update(json.loads(body))
+            except ValueError:
+                return self._respond(400, {"success": False, "error_message": "Invalid JSON"}, started, path)
+
+        mock.delay()
+        error = mock.injected_error()
+        if error:
+            headers = [("Retry-After", str(mock.retry_after))] if mock.retry_after is not None else []
+            return self._respond(error, {"success": False, "error_message": "Injected error"}, started, path, headers)
+        try:
+            user_id = int(self.headers.get("CH-UserID"))
+        except (TypeError, ValueError):
+            user_id = 0
+        status, result = mock.api.call(path, params, user_id)
+        return self._respond(status, result, started, path)
+
+    do_GET = do_POST = _handle
+
+
+class _Server(ThreadingHTTPServer):
+    """ HTTP server of MockServer """
+
+    daemon_threads = True
+
+    # Room for load tests opening many connections at once
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # Clients going away mid-response (e.g. a cancelled long-poll) are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class MockServer:
+    """
+    MockServer Class
+
+    Threaded HTTP server running MockAPI.
+
+    latency, jitter:
+        - Every API call waits latency + uniform(0, jitter) seconds.
+    error_rate, error_statuses:
+        - Share of API calls answered with one of the error statuses instead.
+    retry_after:
+        - Retry-After header sent with injected errors, if not None.
+    log_file:
+        - Also append every request to this file, as JSON lines.
+    """
+
+    def __init__(self, data=None, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0,
+                 error_statuses=(503,), retry_after=None, log_file=None, subscribe_timeout=10, seed=0):
+        """ (MockServer, MockData, str, int, float, float, float, tuple, float, str, float, int) -> NoneType
+        """
+        self.httpd = _Server((host, port), _Handler)
+        self.httpd.mock = self
+        self.host, self.port = self.httpd.server_address[:2]
+        self.prefix = "/api"
+        self.api = MockAPI(data or MockData(), origin=self.url)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.retry_after = retry_after
+        self.subscribe_timeout = subscribe_timeout
+        self.log = deque(maxlen=100000)
+        self._log_file = open(log_file, "a") if log_file else None
+        self._log_lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._thread = None
+
+    @property
+    def url(self):
+        """ (MockServer) -> str """
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def api_url(self):
+        """ (MockServer) -> str
+
+        Value for Clubhouse.API_URL (or CLUBHOUSE_API_URL).
+        """
+        return f"{self.url}{self.prefix}"
+
+    def delay(self):
+        """ (MockServer) -> NoneType """
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self._random.uniform(0, self.jitter))
+
+    def injected_error(self):
+        """ (MockServer) -> int
+
+        Get the status of an injected error, or None.
+        """
+        if self.error_rate and self._random.random() < self.error_rate:
+            return self._random.choice(self.error_statuses)
+        return None
+
+    def log_request(self, method, path, endpoint, status, size, started):
+        """ (MockServer, str, str, str, int, int, float) -> NoneType """
+        entry = {
+            "time": time.time(),
+            "method": method,
+            "path": path,
+            "endpoint": endpoint,
+            "status": status,
+            "bytes": size,
+            "duration": time.perf_counter() - started,
+        }
+        with self._log_lock:
+            self.log.append(entry)
+            if self._log_file is not None:
+                self._log_file.write(json.dumps(entry) + "\n")
+                self._log_file.flush()
+
+    def start(self):
+        """ (MockServer) -> MockServer
+
+        Serve in a background thread.
+        """
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="clubhouse-mock")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """ (MockServer) -> NoneType """
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._log_file is not None:
+            self._log_file.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main(argv=None):
+    """ Main function """
+    parser = argparse.ArgumentParser(description="Local mock of the Clubhouse API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--users", type=int, default=1000, help="number of users")
+    parser.add_argument("--channels", type=int, default=50, help="number of rooms")
+    parser.add_argument("--room-size", type=int, default=100, help="users per room")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random seconds added to every call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls failing")
+    parser.add_argument("--error-status", type=int, action="append", help="status of failing calls")
+    parser.add_argument("--retry-after", type=float, default=None)
+    parser.add_argument("--log", default=None, help="JSON lines file of requests")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    data = MockData(
+        num_users=args.users,
+        num_channels=args.channels,
+        users_per_channel=args.room_size,
+        seed=args.seed
+    )
+    server = MockServer(
+        data,
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_statuses=args.error_status or (503,),
+        retry_after=args.retry_after,
+        log_file=args.log,
+        seed=args.seed
+    )
+    print(f"[.] Serving the mock API on {server.api_url}")
+    print(f"    export CLUBHOUSE_API_URL={server.api_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
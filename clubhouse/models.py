@@ -0,0 +1,317 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+models.py
+
+Compact models for the objects returned by the API.
+
+A nested dict costs a hash table per object, which adds up with thousands
+of room participants kept in memory. Models keep the common fields in
+__slots__ and the rarely used ones in a single dict, only created when the
+object has such fields. Nested objects of rarely used fields (e.g. the clubs
+of a user profile) are only decoded into models when first accessed.
+
+Models read like the dicts they replace, so existing code keeps working:
+
+>>> clubhouse = Clubhouse(user_id, user_token, user_device, models=True)
+>>> channel = clubhouse.get_channel("abcd1234")
+>>> channel.users[0].username == channel['users'][0]['username']
+True
+"""
+
+class Model:
+    """
+    Model Class
+
+    Base class of the models. Subclasses list their common fields in
+    __slots__, and the decoder of nested objects in NESTED: fields in
+    __slots__ are decoded right away, others on first access.
+
+    Fields missing from the payload read as None.
+    """
+
+    __slots__ = ("_rest",)
+
+    # field -> decoder of the nested value
+    NESTED = {}
+
+    _fields = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._fields = frozenset(cls.__slots__)
+
+    def __init__(self, data):
+        """ (Model, dict) -> NoneType
+        """
+        rest = None
+        fields = self._fields
+        nested = self.NESTED
+        for key, value in data.items():
+            if key in fields:
+                if key in nested and value is not None:
+                    value = nested[key](value)
+                object.__setattr__(self, key, value)
+            else:
+                if rest is None:
+                    rest = {}
+                rest[key] = value
+        self._rest = rest
+
+    def __getattr__(self, name):
+        # Only called for unset slots and fields outside of __slots__
+        if name in self._fields:
+            return None
+        if name.startswith("_"):
+            raise AttributeError(name)
+        rest = self._rest
+        if rest is None or name not in rest:
+            raise AttributeError(name)
+        return self._materialize(name)
+
+    def _materialize(self, key):
+        value = self._rest[key]
+        decoder = self.NESTED.get(key)
+        if decoder is not None and value is not None:
+            value = self._rest[key] = decoder(value)
+        return value
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            try:
+                return object.__getattribute__(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._rest is None or key not in self._rest:
+            raise KeyError(key)
+        return self._materialize(key)
+
+    def __setitem__(self, key, value):
+        if key in self._fields:
+            object.__setattr__(self, key, value)
+        else:
+            if self._rest is None:
+                self._rest = {}
+            self._rest[key] = value
+
+    def __contains__(self, key):
+        if key in self._fields:
+            try:
+                object.__getattribute__(self, key)
+            except AttributeError:
+                return False
+            return True
+        return self._rest is not None and key in self._rest
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        if isinstance(other, (Model, dict)):
+            return self.to_dict() == (other.to_dict() if isinstance(other, Model) else other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        fields = ", ".join(f"{key}={self[key]!r}" for key in self.keys() if key in self._fields)
+        return f"{type(self).__name__}({fields})"
+
+    def keys(self):
+        """ (Model) -> list of str
+
+        Get the fields present in the payload.
+        """
+        keys = []
+        for key in self.__slots__:
+            try:
+                object.__getattribute__(self, key)
+            except AttributeError:
+                continue
+            keys.append(key)
+        if self._rest is not None:
+            keys.extend(self._rest)
+        return keys
+
+    def items(self):
+        """ (Model) -> list of (str, object) """
+        return [(key, self[key]) for key in self.keys()]
+
+    def get(self, key, default=None):
+        """ (Model, str, object) -> object """
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def update(self, data):
+        """ (Model, dict) -> NoneType """
+        for key, value in data.items():
+            self[key] = value
+
+    def copy(self):
+        """ (Model) -> Model
+
+        Shallow copy, as dict.copy().
+        """
+        # copy.copy() would read unset slots through __getattr__ and set them to None
+        clone = type(self).__new__(type(self))
+        for key in self.__slots__:
+            try:
+                object.__setattr__(clone, key, object.__getattribute__(self, key))
+            except AttributeError:
+                continue
+        clone._rest = dict(self._rest) if self._rest is not None else None
+        return clone
+
+    def to_dict(self):
+        """ (Model) -> dict
+
+        Get the payload back as plain dicts and lists.
+        """
+        return {key: _to_plain(value) for key, value in self.items()}
+
+
+def _to_plain(value):
+    if isinstance(value, Model):
+        return value.to_dict()
+    if isinstance(value, list):
+        return [_to_plain(item) for item in value]
+    return value
+
+def _one(cls):
+    """ (type) -> callable
+
+    Decoder of a nested object.
+    """
+    def decode(value):
+        return cls(value) if isinstance(value, dict) else value
+    return decode
+
+def _many(cls):
+    """ (type) -> callable
+
+    Decoder of a nested list of objects.
+    """
+    def decode(values):
+        if not isinstance(values, list):
+            return values
+        return [cls(value) if isinstance(value, dict) else value for value in values]
+    return decode
+
+
+class User(Model):
+    """
+    User Class
+
+    A user, as listed in a room or returned by get_profile.
+    """
+    __slots__ = (
+        "user_id", "name", "username", "photo_url", "first_name", "skintone",
+        "is_new", "is_speaker", "is_moderator", "is_invited_as_speaker",
+        "is_followed_by_speaker", "time_joined_as_speaker",
+    )
+
+
+class Club(Model):
+    """
+    Club Class
+    """
+    __slots__ = (
+        "club_id", "name", "description", "photo_url", "num_members", "num_followers",
+        "is_follow_allowed", "is_membership_private", "is_community", "url",
+    )
+
+
+class Topic(Model):
+    """
+    Topic Class
+    """
+    __slots__ = ("id", "title", "abbreviated_title", "url", "image_url")
+
+
+class Channel(Model):
+    """
+    Channel Class
+
+    A room. get_channel and join_channel responses decode into this.
+    """
+    __slots__ = (
+        "channel", "channel_id", "topic", "url", "club", "club_id", "club_name",
+        "is_private", "is_social_mode", "num_all", "num_speakers", "users",
+    )
+
+
+class Event(Model):
+    """
+    Event Class
+    """
+    __slots__ = (
+        "event_id", "name", "description", "time_start", "url", "channel",
+        "club", "hosts", "is_member_only", "is_expired",
+    )
+
+
+User.NESTED = {
+    "mutual_follows": _many(User),
+    "clubs": _many(Club),
+    "invited_by_user_profile": _one(User),
+    "invited_by_club": _one(Club),
+    "topics": _many(Topic),
+}
+Club.NESTED = {
+    "topics": _many(Topic),
+}
+Topic.NESTED = {
+    "topics": _many(Topic),
+    "clubs": _many(Club),
+    "users": _many(User),
+}
+Channel.NESTED = {
+    "club": _one(Club),
+    "users": _many(User),
+}
+Event.NESTED = {
+    "club": _one(Club),
+    "hosts": _many(User),
+}
+
+# Endpoints whose whole response is a model
+RESPONSE_MODELS = {
+    "get_channel": Channel,
+    "join_channel": Channel,
+    "create_channel": Channel,
+}
+
+# Keys of the other responses holding models
+RESPONSE_FIELDS = {
+    "user_profile": _one(User),
+    "users": _many(User),
+    "channels": _many(Channel),
+    "club": _one(Club),
+    "clubs": _many(Club),
+    "events": _many(Event),
+    "event": _one(Event),
+    "topic": _one(Topic),
+    "topics": _many(Topic),
+}
+
+def decode(name, result):
+    """ (str, dict) -> dict
+
+    Decode the response of the endpoint `name` into models.
+    """
+    if not isinstance(result, dict):
+        return result
+    model = RESPONSE_MODELS.get(name)
+    if model is not None:
+        return model(result)
+    for key, value in result.items():
+        decoder = RESPONSE_FIELDS.get(key)
+        if decoder is not None and value is not None:
+            result[key] = decoder(value)
+    return result
@@ -0,0 +1,175 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+mux.py
+
+Waiting on several event queues at once, without a thread per queue.
+
+An EventQueue wakes up the Selectors it is registered with when an item
+is put into it, so a single thread can wait for shell, room, timer and
+network events with one call.
+"""
+
+import time
+import threading
+from collections import deque
+from queue import Empty
+
+class EventQueue:
+    """
+    EventQueue Class
+
+    Unbounded FIFO queue with the put/get interface of queue.Queue,
+    which can be waited on by Selectors.
+    """
+
+    def __init__(self, name=None):
+        """ (EventQueue, str) -> NoneType
+        """
+        self.name = name
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._selectors = []
+
+    def put(self, item, block=True, timeout=None): # pylint: disable=unused-argument
+        """ (EventQueue, object) -> NoneType
+
+        Add an item and wake up whoever waits on the queue.
+        """
+        with self._cond:
+            self._items.append(item)
+            self._cond.notify()
+            selectors = list(self._selectors)
+        for selector in selectors:
+            selector.notify()
+
+    put_nowait = put
+
+    def get(self, block=True, timeout=None):
+        """ (EventQueue, bool, float) -> object
+
+        Remove and return the oldest item. Raises queue.Empty when there is
+        none within `timeout` seconds (or right away if not `block`).
+        """
+        with self._cond:
+            if block and not self._cond.wait_for(lambda: self._items, timeout):
+                raise Empty
+            if not self._items:
+                raise Empty
+            return self._items.popleft()
+
+    def get_nowait(self):
+        """ (EventQueue) -> object """
+        return self.get(False)
+
+    def empty(self):
+        """ (EventQueue) -> bool """
+        return not self._items
+
+    def qsize(self):
+        """ (EventQueue) -> int """
+        return len(self._items)
+
+    def _pop(self):
+        """ Returns (True, item), or (False, None) when empty """
+        with self._cond:
+            if self._items:
+                return True, self._items.popleft()
+            return False, None
+
+    def _register(self, selector):
+        with self._cond:
+            self._selectors.append(selector)
+
+    def _unregister(self, selector):
+        with self._cond:
+            if selector in self._selectors:
+                self._selectors.remove(selector)
+
+    def __repr__(self):
+        return f"EventQueue({self.name}, size={len(self._items)})"
+
+
+class Selector:
+    """
+    Selector Class
+
+    Waits on several EventQueues from one thread. Queues are served in
+    turn, so a busy queue does not starve the others.
+
+    >>> selector = Selector(shell_events, room_events)
+    >>> for queue, event in selector:
+    ...     if queue is room_events:
+    ...         ...
+    >>> selector.close()    # from any thread: ends the loop above
+    """
+
+    def __init__(self, *queues):
+        """ (Selector, EventQueue, ...) -> NoneType
+        """
+        self.queues = list(queues)
+        self.closed = False
+        self._cond = threading.Condition()
+        self._next = 0
+        for queue in self.queues:
+            queue._register(self) # pylint: disable=protected-access
+
+    def notify(self):
+        """ (Selector) -> NoneType
+
+        Wake up the thread waiting in select().
+        """
+        with self._cond:
+            self._cond.notify()
+
+    def select(self, timeout=None):
+        """ (Selector, float) -> (EventQueue, object)
+
+        Get the next item of any of the queues, with the queue it came from.
+        Raises queue.Empty when there is none within `timeout` seconds, and
+        returns None once the selector is closed.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self.closed:
+                count = len(self.queues)
+                for i in range(count):
+                    queue = self.queues[(self._next + i) % count]
+                    found, item = queue._pop() # pylint: disable=protected-access
+                    if found:
+                        self._next = (self._next + i + 1) % count
+                        return queue, item
+                if deadline is None:
+                    self._cond.wait()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise Empty
+                    self._cond.wait(remaining)
+            return None
+
+    def close(self):
+        """ (Selector) -> NoneType
+
+        Stop waiting: wake up select() and stop listening to the queues.
+        Items left in the queues stay there.
+        """
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        for queue in self.queues:
+            queue._unregister(self) # pylint: disable=protected-access
+
+    def __iter__(self):
+        while True:
+            selected = self.select()
+            if selected is None:
+                return
+            yield selected
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
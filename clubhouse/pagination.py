@@ -0,0 +1,98 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+pagination.py
+
+Iterators over paged endpoints (get_followers, get_club_members, ...).
+
+Items are yielded one by one while the next page is already being fetched,
+so a long list is walked in constant memory with the I/O overlapped.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from .endpoints import ENDPOINTS_BY_NAME
+
+def _paged_endpoint(name):
+    """ (str) -> Endpoint
+
+    Get the endpoint for `name`, making sure it is paged.
+    """
+    endpoint = ENDPOINTS_BY_NAME.get(name)
+    if endpoint is None or not endpoint.items:
+        raise ValueError(f"{name} is not a paged endpoint")
+    return endpoint
+
+def _page_items(endpoint, result):
+    """ (Endpoint, dict) -> (list, int)
+
+    Get the items and the next page number of the given response.
+    """
+    if not result.get("success", True):
+        raise Exception(f"Failed to fetch {endpoint.name} ({result.get('error_message')})")
+    return result.get(endpoint.items) or [], result.get("next")
+
+def paginate(client, name, *args, page_size=None, max_items=None, page=1, **kwargs):
+    """ (Clubhouse, str, ..., int, int, int, ...) -> generator
+
+    Yield every item of the paged endpoint `name`, starting from `page`.
+    Page N+1 is requested in the background while page N is consumed.
+    Stops when the server has no `next` page, or after `max_items` items.
+
+    >>> for user in paginate(clubhouse, "get_followers", user_id, max_items=500):
+    ...     print(user['username'])
+    """
+    endpoint = _paged_endpoint(name)
+    method = getattr(client, name)
+    if page_size:
+        kwargs["page_size"] = page_size
+
+    count = 0
+    executor = ThreadPoolExecutor(max_workers=1)
+    future = executor.submit(method, *args, page=page, **kwargs)
+    try:
+        while future is not None:
+            items, next_page = _page_items(endpoint, future.result())
+            future = None
+            if items and next_page and (max_items is None or count + len(items) < max_items):
+                future = executor.submit(method, *args, page=next_page, **kwargs)
+            for item in items:
+                if max_items is not None and count >= max_items:
+                    return
+                count += 1
+                yield item
+    finally:
+        if future is not None:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+async def apaginate(client, name, *args, page_size=None, max_items=None, page=1, **kwargs):
+    """ (AsyncClubhouse, str, ..., int, int, int, ...) -> async generator
+
+    Same as paginate(), for AsyncClubhouse.
+
+    >>> async for user in apaginate(clubhouse, "get_followers", user_id, max_items=500):
+    ...     print(user['username'])
+    """
+    endpoint = _paged_endpoint(name)
+    method = getattr(client, name)
+    if page_size:
+        kwargs["page_size"] = page_size
+
+    count = 0
+    task = asyncio.ensure_future(method(*args, page=page, **kwargs))
+    try:
+        while task is not None:
+            items, next_page = _page_items(endpoint, await task)
+            task = None
+            if items and next_page and (max_items is None or count + len(items) < max_items):
+                task = asyncio.ensure_future(method(*args, page=next_page, **kwargs))
+            for item in items:
+                if max_items is not None and count >= max_items:
+                    return
+                count += 1
+                yield item
+    finally:
+        if task is not None:
+            task.cancel()
@@ -0,0 +1,518 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+ratelimit.py
+
+Retries, backoff, rate budgets and priority lanes shared by every API call
+of a client.
+
+Calls are sorted into classes ("auth", "read", "write", "keepalive"), each
+with its own token bucket. A 429 slows its class down for every caller, and the rate
+recovers step by step as calls succeed again. This way throughput degrades
+smoothly under server pressure instead of hammering the API until it fails.
+"""
+
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+class RequestFailed(Exception):
+    """
+    RequestFailed Class
+
+    Raised by a call whose last response was an error status, once it is
+    not retried anymore. Carries the endpoint name, the status, the number
+    of attempts and the last response.
+    """
+
+    def __init__(self, endpoint, status, attempts, response=None):
+        """ (RequestFailed, str, int, int, Response) -> NoneType
+        """
+        super().__init__(f"{endpoint} failed with HTTP {status} after {attempts} attempt(s)")
+        self.endpoint = endpoint
+        self.status = status
+        self.attempts = attempts
+        self.response = response
+
+
+class TokenBucket:
+    """
+    TokenBucket Class
+
+    Allows `rate` calls per second on average, with bursts of up to `burst`.
+    throttle() halves the rate (down to `min_rate`) and pauses the bucket;
+    recover() brings it back up step by step.
+    """
+
+    def __init__(self, rate, burst, min_rate=None, clock=time.monotonic):
+        """ (TokenBucket, float, int, float, callable) -> NoneType
+        """
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate or rate / 16
+        self.clock = clock
+        self.tokens = float(burst)
+        self.updated = clock()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """ (TokenBucket) -> float
+
+        Take a token. Returns the number of seconds to wait before using it.
+        """
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+            return max(wait, self.paused_until - now)
+
+    def throttle(self, pause=0.0):
+        """ (TokenBucket, float) -> NoneType
+
+        The server pushed back: halve the rate and pause for `pause` seconds.
+        """
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+            self.paused_until = max(self.paused_until, self.clock() + pause)
+
+    def recover(self):
+        """ (TokenBucket) -> NoneType
+
+        A call went through: raise the rate by a tenth of the maximum.
+        """
+        if self.rate < self.max_rate:
+            with self.lock:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+
+class Lane:
+    """
+    Lane Class
+
+    Priority lane of API calls: at most `concurrency` of its calls are sent
+    at once (None for no limit), the others wait their turn in order.
+    Lanes do not share their slots, so calls of a busy lane never wait
+    for those of another one.
+    """
+
+    def __init__(self, name, concurrency=None):
+        """ (Lane, str, int) -> NoneType
+        """
+        self.name = name
+        self.concurrency = concurrency
+        self.active = 0
+        self.waiting = 0
+        self.calls = 0
+        self.waited = 0.0
+        self.max_wait = 0.0
+        self._cond = threading.Condition()
+        # (future, loop) of the coroutines waiting for a slot
+        self._async_waiters = deque()
+
+    def _free(self):
+        return self.concurrency is None or self.active < self.concurrency
+
+    def _took(self, started):
+        """ A slot was taken by a call which waited since `started` """
+        wait = time.monotonic() - started
+        self.calls += 1
+        self.waited += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def acquire(self, cancel=None):
+        """ (Lane, CancelToken) -> NoneType
+
+        Wait for a slot. Raises the reason of `cancel` if it is cancelled meanwhile.
+        """
+        started = time.monotonic()
+        remove = None
+        if cancel is not None:
+            def wake(_reason):
+                with self._cond:
+                    self._cond.notify_all()
+            remove = cancel.add_callback(wake)
+        try:
+            with self._cond:
+                self.waiting += 1
+                try:
+                    while not (self._free() and not self._async_waiters):
+                        if cancel is not None and cancel.cancelled:
+                            # Pass on the wake up this call may have taken
+                            self._cond.notify()
+                            cancel.raise_if_cancelled()
+                        self._cond.wait()
+                finally:
+                    self.waiting -= 1
+                self.active += 1
+                self._took(started)
+        finally:
+            if remove is not None:
+                remove()
+
+    async def aacquire(self, cancel=None):
+        """ (Lane, CancelToken) -> NoneType
+
+        Same as acquire(), from a coroutine.
+        """
+        started = time.monotonic()
+        with self._cond:
+            if self._free() and not self._async_waiters:
+                self.active += 1
+                self._took(started)
+                return
+            loop = asyncio.get_running_loop()
+            slot = loop.create_future()
+            self._async_waiters.append((slot, loop))
+            self.waiting += 1
+        remove = None
+        if cancel is not None:
+            remove = cancel.add_callback(lambda _reason: loop.call_soon_threadsafe(slot.cancel))
+        try:
+            await slot
+        except asyncio.CancelledError:
+            with self._cond:
+                if (slot, loop) in self._async_waiters:
+                    self._async_waiters.remove((slot, loop))
+                    self.waiting -= 1
+            if cancel is not None and cancel.cancelled:
+                cancel.raise_if_cancelled()
+            raise
+        finally:
+            if remove is not None:
+                remove()
+        with self._cond:
+            self._took(started)
+
+    def release(self):
+        """ (Lane) -> NoneType
+
+        Give the slot to the next call waiting, if any.
+        """
+        with self._cond:
+            if self._async_waiters:
+                # The slot is handed over, so the count stays the same
+                slot, loop = self._async_waiters.popleft()
+                self.waiting -= 1
+                loop.call_soon_threadsafe(self._hand_over, slot)
+                return
+            self.active -= 1
+            self._cond.notify()
+
+    def _hand_over(self, slot):
+        if slot.done():
+            # The waiter gave up in the meantime
+            self.release()
+        else:
+            slot.set_result(None)
+
+    def stats(self):
+        """ (Lane) -> dict """
+        return {
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "waiting": self.waiting,
+            "calls": self.calls,
+            "average_wait": self.waited / self.calls if self.calls else 0.0,
+            "max_wait": self.max_wait,
+        }
+
+
+class RetryPolicy:
+    """
+    RetryPolicy Class
+
+    Jittered exponential backoff ("full jitter"): the n-th retry waits a
+    random time between 0 and min(max_backoff, backoff * 2 ** n).
+    A Retry-After header is honored as long as it is below `max_retry_after`.
+
+    Read-only (idempotent) endpoints are retried on `retry_statuses` and on
+    network errors. Mutating endpoints are only retried on `safe_statuses`,
+    which tell that the request was not processed, so a follow or a message
+    is never sent twice.
+    """
+
+    def __init__(self, retries=3, backoff=0.5, max_backoff=30, max_retry_after=60,
+                 retry_statuses=(429, 500, 502, 503, 504), safe_statuses=(429, 503)):
+        """ (RetryPolicy, int, float, float, float, tuple, tuple) -> NoneType
+        """
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.retry_statuses = frozenset(retry_statuses)
+        self.safe_statuses = frozenset(safe_statuses)
+
+    def retries_status(self, endpoint, status):
+        """ (RetryPolicy, Endpoint, int) -> bool """
+        if endpoint.idempotent:
+            return status in self.retry_statuses
+        return status in self.safe_statuses
+
+    def retries_error(self, endpoint):
+        """ (RetryPolicy, Endpoint) -> bool
+
+        Check whether a network error may be retried; the request may have been processed.
+        """
+        return endpoint.idempotent
+
+    def delay(self, attempt, retry_after=None):
+        """ (RetryPolicy, int, str) -> float
+
+        Get the seconds to wait before the retry number `attempt` (from 0).
+        Returns None if the server asks to wait for longer than max_retry_after.
+        """
+        if retry_after:
+            seconds = parse_retry_after(retry_after)
+            if seconds is not None:
+                return seconds if seconds <= self.max_retry_after else None
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+
+def parse_retry_after(value):
+    """ (str) -> float
+
+    Parse a Retry-After header, given in seconds or as an HTTP date.
+    """
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class Scheduler:
+    """
+    Scheduler Class
+
+    Runs every API call of a client through its priority lane, the rate
+    budget of its class and the retry policy.
+
+    Lanes keep user-facing calls ahead of the rest:
+        - interactive: calls made for the user (join, leave, hand-up, ...)
+        - keepalive: active_ping
+        - background: polling and bulk sweeps, see Clubhouse.limits(priority=...)
+    The slots of a lane are taken before the rate budget, so a background
+    sweep only ever holds a few reservations ahead of a join.
+
+    >>> clubhouse = Clubhouse(user_id, user_token, user_device,
+    ...                       scheduler=Scheduler(rates={"write": (1, 3)}, lanes={"background": 1}))
+    >>> clubhouse.scheduler.stats()
+    """
+
+    # class -> (calls per second, burst)
+    DEFAULT_RATES = {
+        "auth": (0.5, 3),
+        "read": (10, 20),
+        "write": (3, 5),
+        "keepalive": (4, 10),
+    }
+
+    # endpoint name -> class, for the endpoints not classed by classify()
+    ENDPOINT_CLASSES = {
+        # A POST, but sent on a fixed schedule for every room: kept apart
+        # so that pings never queue up joins, leaves or hand raises.
+        "active_ping": "keepalive",
+    }
+
+    # lane -> calls in flight at once (None for no limit)
+    DEFAULT_LANES = {
+        "interactive": None,
+        "keepalive": 4,
+        "background": 2,
+    }
+
+    # endpoint name -> lane, for the endpoints not in the interactive lane
+    ENDPOINT_LANES = {
+        "active_ping": "keepalive",
+    }
+
+    def __init__(self, retry=None, rates=None, sleep=time.sleep, lanes=None):
+        """ (Scheduler, RetryPolicy, dict, callable, dict) -> NoneType
+        `rates` overrides DEFAULT_RATES. Set a class to None to leave it unlimited.
+        `lanes` overrides DEFAULT_LANES.
+        """
+        self.retry = retry or RetryPolicy()
+        self.sleep = sleep
+        self.buckets = {
+            name: TokenBucket(*rate)
+            for name, rate in {**self.DEFAULT_RATES, **(rates or {})}.items() if rate
+        }
+        self.lanes = {
+            name: Lane(name, concurrency)
+            for name, concurrency in {**self.DEFAULT_LANES, **(lanes or {})}.items()
+        }
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self.failures = 0
+
+    @classmethod
+    def classify(cls, endpoint):
+        """ (Endpoint) -> str
+
+        Get the class of the endpoint.
+        """
+        name = cls.ENDPOINT_CLASSES.get(endpoint.name)
+        if name is not None:
+            return name
+        if endpoint.anonymous:
+            return "auth"
+        return "read" if endpoint.idempotent else "write"
+
+    def ensure_rate(self, name, rate, burst=None):
+        """ (Scheduler, str, float, int) -> NoneType
+
+        Raise the rate budget of a class to at least `rate` calls per second
+        (and `burst`). A lower budget is left as it is, as is an unlimited class.
+        """
+        bucket = self.buckets.get(name)
+        if bucket is None:
+            return
+        with bucket.lock:
+            if rate > bucket.max_rate:
+                bucket.rate += rate - bucket.max_rate
+                bucket.max_rate = rate
+                bucket.min_rate = max(bucket.min_rate, rate / 16)
+            if burst is not None and burst > bucket.burst:
+                bucket.burst = burst
+
+    def lane(self, endpoint, priority=None):
+        """ (Scheduler, Endpoint, str) -> Lane
+
+        Get the lane of a call, `priority` if given.
+        """
+        name = priority or self.ENDPOINT_LANES.get(endpoint.name, "interactive")
+        try:
+            return self.lanes[name]
+        except KeyError:
+            raise Exception(f"Unknown priority: {name}") from None
+
+    def run(self, endpoint, send, errors=(OSError,), cancel=None, priority=None):
+        """ (Scheduler, Endpoint, callable, tuple, CancelToken, str) -> Response
+
+        Call send() until it returns a response that is not retried.
+        Network errors listed in `errors` are retried for idempotent endpoints.
+        Cancelling `cancel` stops the waits between attempts.
+        `priority` is the lane of the call, see lane().
+        """
+        bucket = self.buckets.get(self.classify(endpoint))
+        lane = self.lane(endpoint, priority)
+        attempt = 0
+        while True:
+            lane.acquire(cancel)
+            try:
+                if bucket is not None:
+                    wait = bucket.reserve()
+                    if wait > 0:
+                        self._sleep(wait, cancel)
+                resp, delay = self._attempt(endpoint, bucket, attempt, send, errors)
+            finally:
+                lane.release()
+            if delay is None:
+                return resp
+            self._sleep(delay, cancel)
+            attempt += 1
+
+    async def arun(self, endpoint, send, errors=(OSError, asyncio.TimeoutError), cancel=None, priority=None):
+        """ (Scheduler, Endpoint, coroutine function, tuple, CancelToken, str) -> AsyncResponse
+
+        Same as run(), for the async transport.
+        """
+        bucket = self.buckets.get(self.classify(endpoint))
+        lane = self.lane(endpoint, priority)
+        attempt = 0
+        while True:
+            await lane.aacquire(cancel)
+            try:
+                if bucket is not None:
+                    wait = bucket.reserve()
+                    if wait > 0:
+                        await self._asleep(wait, cancel)
+                resp, delay = await self._aattempt(endpoint, bucket, attempt, send, errors)
+            finally:
+                lane.release()
+            if delay is None:
+                return resp
+            await self._asleep(delay, cancel)
+            attempt += 1
+
+    def _sleep(self, delay, cancel):
+        if cancel is None:
+            self.sleep(delay)
+        elif cancel.wait(delay):
+            cancel.raise_if_cancelled()
+
+    @staticmethod
+    async def _asleep(delay, cancel):
+        if cancel is None:
+            await asyncio.sleep(delay)
+        elif await cancel.async_wait(delay):
+            cancel.raise_if_cancelled()
+
+    def _attempt(self, endpoint, bucket, attempt, send, errors):
+        try:
+            resp = send()
+        except errors as err:
+            return None, self._on_error(endpoint, attempt, err)
+        return resp, self._on_response(endpoint, bucket, attempt, resp)
+
+    async def _aattempt(self, endpoint, bucket, attempt, send, errors):
+        try:
+            resp = await send()
+        except errors as err:
+            return None, self._on_error(endpoint, attempt, err)
+        return resp, self._on_response(endpoint, bucket, attempt, resp)
+
+    def _on_error(self, endpoint, attempt, err):
+        """ Returns the delay before the retry, or raises the error """
+        self.calls += 1
+        if attempt >= self.retry.retries or not self.retry.retries_error(endpoint):
+            self.failures += 1
+            raise err
+        self.retries += 1
+        return self.retry.delay(attempt)
+
+    def _on_response(self, endpoint, bucket, attempt, resp):
+        """ Returns the delay before the retry, or None to keep the response """
+        self.calls += 1
+        status = resp.status_code
+        if status not in self.retry.retry_statuses:
+            if bucket is not None:
+                bucket.recover()
+            return None
+        delay = self.retry.delay(attempt, resp.headers.get("Retry-After"))
+        if status == 429:
+            self.throttled += 1
+            if bucket is not None:
+                bucket.throttle(delay or self.retry.max_retry_after)
+        if delay is None or attempt >= self.retry.retries or not self.retry.retries_status(endpoint, status):
+            self.failures += 1
+            raise RequestFailed(endpoint.name, status, attempt + 1, resp)
+        self.retries += 1
+        return delay
+
+    def stats(self):
+        """ (Scheduler) -> dict
+
+        Get the retry counters and the current rate of each class.
+        """
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "failures": self.failures,
+            "rates": {name: bucket.rate for name, bucket in self.buckets.items()},
+            "lanes": {name: lane.stats() for name, lane in self.lanes.items()},
+        }
@@ -0,0 +1,365 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+realtime.py
+
+Room events over PubNub.
+
+Clubhouse publishes room events (joins, leaves, speakers, raised hands, ...)
+on PubNub. This module speaks the PubNub subscribe protocol directly over
+HTTP, so the origin can be pointed at a local fake server.
+"""
+
+import asyncio
+import threading
+from urllib.parse import quote
+from .transport import HTTPTransport, AsyncTransport
+from .cancel import CancelToken
+
+class PubNubSubscriber:
+    """
+    PubNubSubscriber Class
+
+    Long-polls the PubNub subscribe endpoint for the given channels.
+
+    origin:
+        - Base URL of the PubNub server, e.g. "http://localhost:8080".
+    cancel:
+        - CancelToken aborting the poll in flight, see close().
+    """
+
+    ORIGIN = "https://clubhouse.pubnub.com"
+
+    # The server holds the subscribe request for up to 310 seconds
+    SUBSCRIBE_TIMEOUT = 320
+
+    # A response this large may have been cut, so messages may be missing
+    MESSAGE_LIMIT = 100
+
+    def __init__(self, subscribe_key, channels, uuid, auth_key=None, origin=None, heartbeat=None, transport=None,
+                 cancel=None):
+        """ (PubNubSubscriber, str, list of str, str, str, str, int, HTTPTransport, CancelToken) -> NoneType
+        """
+        self.subscribe_key = subscribe_key
+        self.channels = list(channels)
+        self.uuid = str(uuid)
+        self.auth_key = auth_key
+        self.origin = (origin or self.ORIGIN).rstrip("/")
+        if "://" not in self.origin:
+            self.origin = f"https://{self.origin}"
+        self.heartbeat = heartbeat
+        self.transport = transport or HTTPTransport(pool_size=1)
+        self.cancel = CancelToken(cancel)
+        self.timetoken = "0"
+        self.region = None
+
+    def _url(self):
+        channels = ",".join(quote(channel, safe="") for channel in self.channels)
+        query = f"tt={self.timetoken}&uuid={quote(self.uuid)}"
+        if self.region is not None:
+            query += f"&tr={self.region}"
+        if self.auth_key:
+            query += f"&auth={quote(self.auth_key)}"
+        if self.heartbeat:
+            query += f"&heartbeat={self.heartbeat}"
+        return f"{self.origin}/v2/subscribe/{self.subscribe_key}/{channels}/0?{query}"
+
+    def poll(self):
+        """ (PubNubSubscriber) -> list of (str, dict)
+
+        Wait for the next batch of messages, as (pubnub channel, payload).
+        The first call only fetches the current timetoken and returns nothing.
+        Raises on network or server errors.
+        """
+        resp = self.transport.request("GET", self._url(), timeout=self.SUBSCRIBE_TIMEOUT, cancel=self.cancel)
+        resp.raise_for_status()
+        return self._parse(resp.json())
+
+    def _parse(self, result):
+        """ Keep the timetoken of a subscribe response and get its messages """
+        first = self.timetoken == "0"
+        self.timetoken = result['t']['t']
+        self.region = result['t'].get('r')
+        if first:
+            return []
+        return [(message.get('c'), message.get('d')) for message in result.get('m', ())]
+
+    def reset(self):
+        """ (PubNubSubscriber) -> NoneType
+
+        Start over from the current timetoken on the next poll.
+        """
+        self.timetoken = "0"
+        self.region = None
+
+    def close(self):
+        """ (PubNubSubscriber) -> NoneType
+
+        Abort the poll in flight, which raises cancel.Cancelled, and close the transport.
+        """
+        self.cancel.cancel()
+        self.transport.close()
+
+
+class AsyncPubNubSubscriber(PubNubSubscriber):
+    """
+    AsyncPubNubSubscriber Class
+
+    Same as PubNubSubscriber, on an AsyncTransport. Pass a shared
+    transport to follow many rooms over one connection pool.
+    """
+
+    def __init__(self, subscribe_key, channels, uuid, auth_key=None, origin=None, heartbeat=None, transport=None,
+                 cancel=None):
+        """ (AsyncPubNubSubscriber, str, list of str, str, str, str, int, AsyncTransport, CancelToken) -> NoneType
+        """
+        self._owns_transport = transport is None
+        super().__init__(
+            subscribe_key, channels, uuid, auth_key, origin, heartbeat,
+            transport or AsyncTransport(pool_size=1), cancel,
+        )
+
+    async def poll(self):
+        """ (AsyncPubNubSubscriber) -> list of (str, dict)
+
+        Same as PubNubSubscriber.poll().
+        """
+        resp = await self.transport.request("GET", self._url(), timeout=self.SUBSCRIBE_TIMEOUT, cancel=self.cancel)
+        resp.raise_for_status()
+        return self._parse(resp.json())
+
+    async def close(self):
+        """ (AsyncPubNubSubscriber) -> NoneType
+
+        Abort the poll in flight and close the transport, unless it was given.
+        """
+        self.cancel.cancel()
+        if self._owns_transport:
+            await self.transport.close()
+
+class RoomEventStream:
+    """
+    RoomEventStream Class
+
+    Subscribes to the PubNub channels of a room and applies the events to a
+    RoomState. get_channel is only called to resynchronize after a gap:
+    a failed or cut subscribe response, after which events may have been missed.
+    The stream ends by itself once the client's cancel token is cancelled.
+
+    >>> channel_info = clubhouse.join_channel(channel)
+    >>> room = RoomState(channel, channel_info)
+    >>> stream = RoomEventStream(clubhouse, room, channel_info, on_event=print)
+    >>> stream.start()
+    ...
+    >>> stream.stop()
+    """
+
+    # Seconds to wait before resubscribing after an error
+    RETRY_DELAY = 5
+
+    # Seconds stop() waits for the stream thread to end
+    STOP_TIMEOUT = 5
+
+    SUBSCRIBER = PubNubSubscriber
+
+    def __init__(self, client, room, channel_info, on_event=None, origin=None, transport=None):
+        """ (Clubhouse, RoomState, dict, callable, str, HTTPTransport) -> NoneType
+
+        `channel_info` is the join_channel response; it holds the PubNub token.
+        `on_event(event)` is called from the stream thread for each applied event.
+        """
+        self.client = client
+        self.room = room
+        self.on_event = on_event
+        self.user_id = client.HEADERS.get("CH-UserID")
+        self._user_key = int(self.user_id)
+        self.personal_channel = f"channel_user.{room.channel}.{self.user_id}"
+        self.subscriber = self.SUBSCRIBER(
+            client.PUBNUB_SUB_KEY,
+            [
+                f"users.{self.user_id}",
+                self.personal_channel,
+                f"channel_all.{room.channel}",
+                f"channel_speakers.{room.channel}",
+            ],
+            self.user_id,
+            auth_key=channel_info.get("pubnub_token"),
+            origin=origin or channel_info.get("pubnub_origin"),
+            heartbeat=channel_info.get("pubnub_heartbeat_value"),
+            transport=transport,
+            cancel=getattr(client, "cancel", None),
+        )
+        self.resyncs = 0
+        self.events = 0
+        # Aborts the subscribe long-poll and resyncs in flight on stop()
+        self.cancel = self.subscriber.cancel
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        """ (RoomEventStream) -> bool """
+        return self._thread is not None and self._thread.is_alive() and not self._stopped.is_set()
+
+    def start(self):
+        """ (RoomEventStream) -> RoomEventStream
+
+        Start the stream thread.
+        """
+        self._thread = threading.Thread(target=self._run, name=f"pubnub-{self.room.channel}")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """ (RoomEventStream, float) -> NoneType
+
+        Stop the stream: abort the poll in flight and wait up to `timeout`
+        seconds (STOP_TIMEOUT by default) for the thread to end.
+        Events received after this are dropped.
+        """
+        self._stopped.set()
+        self.subscriber.close()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(self.STOP_TIMEOUT if timeout is None else timeout)
+
+    def resync(self):
+        """ (RoomEventStream) -> bool
+
+        Reload the room from get_channel.
+        """
+        with self.client.limits(cancel=self.cancel):
+            channel_info = self.client.get_channel(self.room.channel)
+        if not channel_info.get('success'):
+            return False
+        self.room.update(channel_info)
+        self.resyncs += 1
+        return True
+
+    def _run(self):
+        gap = False
+        while not self._stopped.is_set():
+            try:
+                messages = self.subscriber.poll()
+            except Exception: # pylint: disable=broad-except
+                if self.cancel.cancelled or self._stopped.wait(self.RETRY_DELAY):
+                    # Stopped, or cancelled along with the client: no retry would succeed
+                    break
+                self.subscriber.reset()
+                gap = True
+                continue
+            if self._stopped.is_set():
+                break
+            for pubnub_channel, event in messages:
+                self._handle(pubnub_channel, event)
+            if gap or len(messages) >= self.subscriber.MESSAGE_LIMIT:
+                # Events may have been missed, reload the whole room.
+                try:
+                    gap = not self.resync()
+                except Exception: # pylint: disable=broad-except
+                    gap = True
+
+    def _handle(self, pubnub_channel, event):
+        if not isinstance(event, dict):
+            return
+        if event.get("channel", self.room.channel) != self.room.channel:
+            return
+        if pubnub_channel == self.personal_channel and "user_id" not in event and "user_profile" not in event:
+            # Events on the personal channel are about the current user
+            event = dict(event, user_id=self._user_key)
+        self.events += 1
+        self.room.apply(event)
+        if self.on_event:
+            self.on_event(event)
+
+
+class AsyncRoomEventStream(RoomEventStream):
+    """
+    AsyncRoomEventStream Class
+
+    Same as RoomEventStream, for AsyncClubhouse: the stream is a task of the
+    running event loop and `on_event(event)` is called on the loop.
+    Resyncs are made within `budget` (e.g. a sessions.RoomBudget), if given.
+
+    >>> stream = AsyncRoomEventStream(clubhouse, room, channel_info, on_event=print)
+    >>> stream.start()
+    ...
+    >>> await stream.stop()
+    """
+
+    SUBSCRIBER = AsyncPubNubSubscriber
+
+    def __init__(self, client, room, channel_info, on_event=None, origin=None, transport=None, budget=None):
+        """ (AsyncClubhouse, RoomState, dict, callable, str, AsyncTransport, RoomBudget) -> NoneType
+        """
+        super().__init__(client, room, channel_info, on_event, origin, transport)
+        self.budget = budget
+        self._task = None
+
+    @property
+    def running(self):
+        """ (AsyncRoomEventStream) -> bool """
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """ (AsyncRoomEventStream) -> AsyncRoomEventStream
+
+        Start the stream task. Must be called from the event loop.
+        """
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    async def stop(self):
+        """ (AsyncRoomEventStream) -> NoneType
+
+        Stop the stream and wait for the task to end.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self.subscriber.close()
+
+    async def resync(self):
+        """ (AsyncRoomEventStream) -> bool
+
+        Reload the room from get_channel.
+        """
+        if self.budget is None:
+            return await self._resync()
+        async with self.budget:
+            return await self._resync()
+
+    async def _resync(self):
+        with self.client.limits(cancel=self.cancel):
+            channel_info = await self.client.get_channel(self.room.channel)
+        if not channel_info.get('success'):
+            return False
+        self.room.update(channel_info)
+        self.resyncs += 1
+        return True
+
+    async def _run(self):
+        gap = False
+        while True:
+            try:
+                messages = await self.subscriber.poll()
+            except Exception: # pylint: disable=broad-except
+                if self.cancel.cancelled:
+                    # Cancelled along with the client: no retry would succeed
+                    break
+                await asyncio.sleep(self.RETRY_DELAY)
+                self.subscriber.reset()
+                gap = True
+                continue
+            for pubnub_channel, event in messages:
+                self._handle(pubnub_channel, event)
+            if gap or len(messages) >= self.subscriber.MESSAGE_LIMIT:
+                try:
+                    gap = not await self.resync()
+                except Exception: # pylint: disable=broad-except
+                    gap = True
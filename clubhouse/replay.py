@@ -0,0 +1,346 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+replay.py
+
+Record the API traffic of a client to a JSONL file, and replay it later
+without any network.
+
+Each line of a capture file is one request and its response:
+    {"method": "POST", "path": "/api/get_channel", "endpoint": "get_channel",
+     "body": "{\"channel\": \"xyz\"}", "status": 200, "latency": 0.0412,
+     "headers": {...}, "payload": "{\"success\": true, ...}"}
+Requests which failed on the network have "error" instead of a response.
+
+A replay serves the recorded responses in order, the same way every time,
+which makes for repeatable benchmark inputs and lets one profile the CPU
+cost of the client alone.
+
+>>> clubhouse = Clubhouse(user_id, user_token, user_device,
+...                       transport=RecordingTransport(HTTPTransport(), "session.jsonl"))
+...
+>>> clubhouse = Clubhouse(user_id, user_token, user_device, transport=ReplayTransport("session.jsonl"))
+"""
+
+import json
+import time
+import base64
+import asyncio
+import threading
+from collections import deque
+from urllib.parse import urlsplit
+import requests
+from requests.structures import CaseInsensitiveDict
+from .transport import AsyncResponse
+
+def _entry_key(method, path, body, match_body):
+    return (method, path, body if match_body else None)
+
+def _encode_payload(content):
+    """ (bytes) -> dict """
+    try:
+        return {"payload": content.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"payload": base64.b64encode(content).decode("ascii"), "encoding": "base64"}
+
+def _decode_payload(entry):
+    """ (dict) -> bytes """
+    if entry.get("encoding") == "base64":
+        return base64.b64decode(entry["payload"])
+    return entry.get("payload", "").encode("utf-8")
+
+def _request_path(url):
+    """ (str) -> str
+
+    Path and query of the url, so that a capture does not depend on the API host.
+    """
+    parts = urlsplit(url)
+    return f"{parts.path}?{parts.query}" if parts.query else parts.path
+
+
+class CaptureWriter:
+    """
+    CaptureWriter Class
+
+    Appends entries to a capture file through a large write buffer, so
+    recording costs one small write per request instead of a disk flush.
+    Entries are written whole, one line each, from any thread.
+    """
+
+    def __init__(self, path, buffer_size=1 << 16):
+        """ (CaptureWriter, str, int) -> NoneType
+        """
+        self.path = path
+        self.entries = 0
+        self._file = open(path, "a", encoding="utf-8", buffering=buffer_size)
+        self._lock = threading.Lock()
+
+    def write(self, entry):
+        """ (CaptureWriter, dict) -> NoneType """
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self.entries += 1
+
+    def flush(self):
+        """ (CaptureWriter) -> NoneType """
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        """ (CaptureWriter) -> NoneType """
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+class RecordingTransport:
+    """
+    RecordingTransport Class
+
+    Sends the requests through `transport` and records every request and
+    response into the capture file at `path`. Call close() (or the close()
+    of the client) to flush the file.
+    """
+
+    def __init__(self, transport, path, buffer_size=1 << 16):
+        """ (RecordingTransport, HTTPTransport, str, int) -> NoneType
+        """
+        self.transport = transport
+        self.errors = transport.errors
+        self.writer = CaptureWriter(path, buffer_size)
+
+    def request(self, method, url, headers=None, json=None, files=None, timeout=None, data=None, record=None,
+                cancel=None, stream=False): # pylint: disable=redefined-outer-name,unused-argument
+        """ (RecordingTransport, str, str, dict, dict, dict, float, bytes, RequestRecord, CancelToken, bool) -> requests.Response
+
+        Send the request and record it. Streamed responses are read whole.
+        """
+        entry = self._start(method, url, json, files, data)
+        try:
+            resp = self.transport.request(
+                method, url, headers=headers, json=json, files=files, timeout=timeout, data=data, record=record,
+                cancel=cancel
+            )
+        except self.errors as err:
+            self._failed(entry, err)
+            raise
+        self._done(entry, resp)
+        return resp
+
+    def _start(self, method, url, json_body, files, data):
+        path = _request_path(url)
+        if data is not None:
+            body = data.decode("utf-8") if isinstance(data, bytes) else data
+        elif json_body is not None:
+            body = json.dumps(json_body)
+        else:
+            body = None
+        entry = {
+            "method": method,
+            "path": path,
+            "endpoint": urlsplit(url).path.rstrip("/").rsplit("/", 1)[-1],
+            "body": body,
+        }
+        if files:
+            entry["files"] = sorted(files)
+        entry["started"] = time.perf_counter()
+        return entry
+
+    def _done(self, entry, resp):
+        entry["latency"] = round(time.perf_counter() - entry.pop("started"), 6)
+        entry["status"] = resp.status_code
+        entry["headers"] = dict(resp.headers)
+        entry.update(_encode_payload(resp.content))
+        self.writer.write(entry)
+
+    def _failed(self, entry, err):
+        entry["latency"] = round(time.perf_counter() - entry.pop("started"), 6)
+        entry["error"] = f"{type(err).__name__}: {err}"
+        self.writer.write(entry)
+
+    def close(self):
+        """ (RecordingTransport) -> NoneType
+
+        Flush the capture file and close the wrapped transport.
+        """
+        self.writer.close()
+        self.transport.close()
+
+
+class AsyncRecordingTransport(RecordingTransport):
+    """
+    AsyncRecordingTransport Class
+
+    Same as RecordingTransport, around an AsyncTransport.
+    """
+
+    async def request(self, method, url, headers=None, json=None, files=None, data=None, record=None,
+                      timeout=None, cancel=None, stream=False): # pylint: disable=redefined-outer-name,invalid-overridden-method,unused-argument
+        """ (AsyncRecordingTransport, str, str, dict, dict, dict, bytes, RequestRecord, float, CancelToken, bool) -> AsyncResponse
+
+        Send the request and record it. Streamed responses are read whole.
+        """
+        entry = self._start(method, url, json, files, data)
+        try:
+            resp = await self.transport.request(
+                method, url, headers=headers, json=json, files=files, data=data, record=record, timeout=timeout,
+                cancel=cancel
+            )
+        except self.errors as err:
+            self._failed(entry, err)
+            raise
+        self._done(entry, resp)
+        return resp
+
+    async def close(self): # pylint: disable=invalid-overridden-method
+        """ (AsyncRecordingTransport) -> NoneType """
+        self.writer.close()
+        await self.transport.close()
+
+
+class ReplayTransport:
+    """
+    ReplayTransport Class
+
+    Answers requests with the responses of a capture file.
+
+    A request is matched on its method, path and body (only method and
+    path with `match_body=False`). The responses recorded for a request
+    are served in the order they were recorded; once they are all used,
+    they start over (or an exception is raised with `loop=False`).
+    Recorded network errors are raised again as requests.ConnectionError.
+
+    With `timing=True`, each response takes as long as it did when it was
+    recorded, divided by `speed`. By default responses come back right away.
+
+    >>> replay = ReplayTransport("session.jsonl", timing=True, speed=2)
+    >>> clubhouse = Clubhouse(user_id, user_token, user_device, transport=replay)
+    >>> replay.stats()
+    """
+
+    errors = (requests.ConnectionError, requests.Timeout)
+
+    def __init__(self, path, timing=False, speed=1.0, match_body=True, loop=True):
+        """ (ReplayTransport, str, bool, float, bool, bool) -> NoneType
+        """
+        self.path = path
+        self.timing = timing
+        self.speed = speed
+        self.match_body = match_body
+        self.loop = loop
+        self.served = 0
+        self.missed = 0
+        self._lock = threading.Lock()
+        self._entries = {}
+        with open(path, encoding="utf-8") as capture:
+            for line in capture:
+                if line.strip():
+                    self.add(json.loads(line))
+
+    def add(self, entry):
+        """ (ReplayTransport, dict) -> NoneType
+
+        Add a recorded request and its response.
+        """
+        key = _entry_key(entry["method"], entry["path"], entry.get("body"), self.match_body)
+        recorded = self._entries.get(key)
+        if recorded is None:
+            recorded = self._entries[key] = deque()
+        if "error" not in entry:
+            entry = dict(entry, content=_decode_payload(entry), headers=CaseInsensitiveDict(entry.get("headers") or {}))
+        recorded.append(entry)
+
+    def __len__(self):
+        return sum(len(recorded) for recorded in self._entries.values())
+
+    def _next(self, method, url, json_body, data):
+        """ Get the recorded entry answering the request """
+        if data is not None:
+            body = data.decode("utf-8") if isinstance(data, bytes) else data
+        elif json_body is not None:
+            body = json.dumps(json_body)
+        else:
+            body = None
+        path = _request_path(url)
+        with self._lock:
+            recorded = self._entries.get(_entry_key(method, path, body, self.match_body))
+            if not recorded:
+                self.missed += 1
+                raise Exception(f"No recorded response for {method} {path}")
+            entry = recorded.popleft()
+            if self.loop:
+                recorded.append(entry)
+            self.served += 1
+        return entry
+
+    def _delay(self, entry):
+        return entry.get("latency", 0.0) / self.speed if self.timing else 0.0
+
+    def _respond(self, entry, delay, record):
+        if record is not None:
+            record.attempts += 1
+            record.dns = record.connect = record.tls = 0.0
+            record.wait = delay
+            record.download = 0.0
+        if "error" in entry:
+            raise requests.ConnectionError(f"Replayed {entry['error']}")
+        if record is not None:
+            record.status = entry["status"]
+            record.received = len(entry["content"])
+        return AsyncResponse(entry["status"], entry["headers"], entry["content"])
+
+    def request(self, method, url, headers=None, json=None, files=None, timeout=None, data=None, record=None,
+                cancel=None, stream=False): # pylint: disable=unused-argument,redefined-outer-name
+        """ (ReplayTransport, str, str, dict, dict, dict, float, bytes, RequestRecord, CancelToken, bool) -> AsyncResponse
+
+        Get the recorded response of the request.
+        """
+        if cancel is not None:
+            cancel.raise_if_cancelled()
+        entry = self._next(method, url, json, data)
+        delay = self._delay(entry)
+        if delay > 0:
+            if cancel is None:
+                time.sleep(delay)
+            elif cancel.wait(delay):
+                cancel.raise_if_cancelled()
+        return self._respond(entry, delay, record)
+
+    def stats(self):
+        """ (ReplayTransport) -> dict """
+        return {"recorded": len(self), "served": self.served, "missed": self.missed}
+
+    def close(self):
+        """ (ReplayTransport) -> NoneType """
+
+
+class AsyncReplayTransport(ReplayTransport):
+    """
+    AsyncReplayTransport Class
+
+    Same as ReplayTransport, for AsyncClubhouse.
+    """
+
+    errors = (requests.ConnectionError, requests.Timeout, asyncio.TimeoutError)
+
+    async def request(self, method, url, headers=None, json=None, files=None, data=None, record=None,
+                      timeout=None, cancel=None, stream=False): # pylint: disable=unused-argument,redefined-outer-name,invalid-overridden-method
+        """ (AsyncReplayTransport, str, str, dict, dict, dict, bytes, RequestRecord, float, CancelToken, bool) -> AsyncResponse
+
+        Get the recorded response of the request.
+        """
+        if cancel is not None:
+            cancel.raise_if_cancelled()
+        entry = self._next(method, url, json, data)
+        delay = self._delay(entry)
+        if delay > 0:
+            if cancel is None:
+                await asyncio.sleep(delay)
+            elif await cancel.async_wait(delay):
+                cancel.raise_if_cancelled()
+        return self._respond(entry, delay, record)
+
+    async def close(self): # pylint: disable=invalid-overridden-method
+        """ (AsyncReplayTransport) -> NoneType """
@@ -0,0 +1,165 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+room.py
+
+In-memory model of a room (channel).
+"""
+
+import threading
+from itertools import islice
+
+class RoomState:
+    """
+    RoomState Class
+
+    Users of a channel, keyed by user_id, with the speakers, moderators,
+    invited speakers and raised hands kept as sets of user_id.
+    Loaded from a get_channel/join_channel payload, then kept up to date
+    with later payloads (see update()) or the PubNub events of the room.
+    The user dicts of a payload may be shared (cache, coalesced calls), so
+    a user is copied before it is changed.
+
+    >>> room = RoomState("abcd1234", clubhouse.join_channel("abcd1234"))
+    >>> 1234 in room.speakers
+    True
+    >>> room.apply({"action": "leave_channel", "user_id": 1234})
+    'leave_channel'
+    """
+
+    # User flag -> attribute holding the set of users with the flag
+    FLAGS = {
+        "is_speaker": "speakers",
+        "is_moderator": "moderators",
+        "is_invited_as_speaker": "invited",
+    }
+
+    def __init__(self, channel, channel_info=None):
+        """ (RoomState, str, dict) -> NoneType
+        """
+        self.channel = channel
+        self.users = {}
+        self.speakers = set()
+        self.moderators = set()
+        self.invited = set()
+        self.hands_raised = set()
+        self.ended = False
+        self.lock = threading.RLock()
+        if channel_info:
+            self.update(channel_info)
+
+    def __contains__(self, user_id):
+        return user_id in self.users
+
+    def __len__(self):
+        return len(self.users)
+
+    def get(self, user_id):
+        """ (RoomState, int) -> dict
+
+        Get the user, or None if they are not in the room.
+        """
+        return self.users.get(user_id)
+
+    def get_users(self, limit=None):
+        """ (RoomState, int) -> list of dict
+
+        Get a snapshot of the users in the room, in join order.
+        """
+        with self.lock:
+            return list(islice(self.users.values(), limit))
+
+    def update(self, channel_info):
+        """ (RoomState, dict) -> (set, set, set)
+
+        Bring the state in line with a full get_channel/join_channel payload.
+        Users whose entry did not change are left untouched.
+        Returns the user_id of the users who joined, left and changed.
+        """
+        joined, changed = set(), set()
+        with self.lock:
+            left = set(self.users)
+            for user in channel_info.get('users') or ():
+                user_id = user['user_id']
+                old = self.users.get(user_id)
+                if old is None:
+                    joined.add(user_id)
+                else:
+                    left.discard(user_id)
+                    if old == user:
+                        continue
+                    changed.add(user_id)
+                self.users[user_id] = user
+                self._index(user_id, user)
+            for user_id in left:
+                self._remove(user_id)
+        return joined, left, changed
+
+    def apply(self, event):
+        """ (RoomState, dict) -> str
+
+        Apply a PubNub event of the room. Returns the action if it changed the state.
+        """
+        action = event.get("action")
+        profile = event.get("user_profile") or {}
+        user_id = profile.get("user_id", event.get("user_id"))
+
+        with self.lock:
+            if action == "join_channel" and user_id is not None:
+                user = self.users.get(user_id)
+                if user is None:
+                    user = {
+                        "is_speaker": False,
+                        "is_moderator": False,
+                        "is_invited_as_speaker": False,
+                        "is_followed_by_speaker": False,
+                    }
+                else:
+                    user = user.copy()
+                user.update(profile)
+                self.users[user_id] = user
+                self._index(user_id, user)
+            elif action in ("leave_channel", "remove_from_channel"):
+                self._remove(user_id)
+            elif action == "end_channel":
+                self.ended = True
+            elif user_id not in self.users:
+                return None
+            elif action == "add_speaker":
+                self._set(user_id, is_speaker=True)
+                self.hands_raised.discard(user_id)
+            elif action == "remove_speaker":
+                self._set(user_id, is_speaker=False, is_moderator=False)
+            elif action == "make_moderator":
+                self._set(user_id, is_speaker=True, is_moderator=True)
+            elif action == "raise_hands":
+                self.hands_raised.add(user_id)
+            elif action == "unraise_hands":
+                self.hands_raised.discard(user_id)
+            elif action == "invite_speaker":
+                self._set(user_id, is_invited_as_speaker=True)
+            elif action == "uninvite_speaker":
+                self._set(user_id, is_invited_as_speaker=False)
+            else:
+                return None
+        return action
+
+    def _set(self, user_id, **flags):
+        user = self.users[user_id].copy()
+        user.update(flags)
+        self.users[user_id] = user
+        self._index(user_id, user)
+
+    def _index(self, user_id, user):
+        for flag, attr in self.FLAGS.items():
+            if user.get(flag):
+                getattr(self, attr).add(user_id)
+            else:
+                getattr(self, attr).discard(user_id)
+
+    def _remove(self, user_id):
+        self.users.pop(user_id, None)
+        for attr in self.FLAGS.values():
+            getattr(self, attr).discard(user_id)
+        self.hands_raised.discard(user_id)
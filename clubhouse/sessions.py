@@ -0,0 +1,395 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+sessions.py
+
+Many rooms at once in one process, e.g. for monitoring.
+
+SessionManager joins rooms on one AsyncClubhouse, so every room shares its
+connection pool, scheduler and cache, plus one PubNub connection pool, one
+keep-alive schedule and one profile store. Each room gets its own request
+budget and a bounded event queue, so a busy room cannot starve the others.
+"""
+
+import math
+import time
+import asyncio
+from collections import OrderedDict
+from .metrics import Histogram
+from .ratelimit import TokenBucket
+from .room import RoomState
+from .realtime import AsyncRoomEventStream
+from .keepalive import AsyncPingManager
+from .transport import AsyncTransport
+
+# Fields of a room user that describe the user rather than their place in the room
+PROFILE_FIELDS = ("user_id", "name", "username", "photo_url", "first_name", "skintone", "is_new")
+
+class ProfileStore:
+    """
+    ProfileStore Class
+
+    Bounded LRU store of user profiles shared by every room. It is filled
+    from the users of joined rooms and from join events, and falls back to
+    get_profile for unknown users.
+    """
+
+    def __init__(self, maxsize=100000):
+        """ (ProfileStore, int) -> NoneType
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._profiles = OrderedDict()
+
+    def __len__(self):
+        return len(self._profiles)
+
+    def __contains__(self, user_id):
+        return user_id in self._profiles
+
+    def put(self, user):
+        """ (ProfileStore, dict) -> NoneType
+
+        Store the profile fields of a user.
+        """
+        user_id = user.get("user_id")
+        if user_id is None:
+            return
+        profile = self._profiles.get(user_id)
+        if profile is None:
+            profile = self._profiles[user_id] = {}
+            if len(self._profiles) > self.maxsize:
+                self._profiles.popitem(last=False)
+        else:
+            self._profiles.move_to_end(user_id)
+        for field in PROFILE_FIELDS:
+            if field in user:
+                profile[field] = user[field]
+
+    def get(self, user_id):
+        """ (ProfileStore, int) -> dict
+
+        Get the stored profile of the user, or None.
+        """
+        profile = self._profiles.get(user_id)
+        if profile is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._profiles.move_to_end(user_id)
+        return profile
+
+    async def fetch(self, client, user_id):
+        """ (ProfileStore, AsyncClubhouse, int) -> dict
+
+        Get the profile of the user, from the store or get_profile.
+        """
+        profile = self.get(user_id)
+        if profile is None:
+            result = await client.get_profile(user_id)
+            if result.get("success") and result.get("user_profile"):
+                self.put(result["user_profile"])
+                profile = self._profiles.get(user_id)
+        return profile
+
+    def stats(self):
+        """ (ProfileStore) -> dict """
+        return {"size": len(self._profiles), "hits": self.hits, "misses": self.misses}
+
+
+class RoomBudget:
+    """
+    RoomBudget Class
+
+    Requests of one room: `rate` per second on average with bursts of
+    `burst`, and at most `concurrency` in flight. Callers wait their turn.
+
+    >>> async with budget:
+    ...     await clubhouse.get_channel(channel)
+    """
+
+    def __init__(self, rate=2, burst=5, concurrency=2):
+        """ (RoomBudget, float, int, int) -> NoneType
+        """
+        self.bucket = TokenBucket(rate, burst)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.calls = 0
+        self.waited = 0.0
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        try:
+            wait = self.bucket.reserve()
+            if wait > 0:
+                self.waited += wait
+                await asyncio.sleep(wait)
+        except BaseException:
+            # Cancelled while waiting for its turn
+            self.semaphore.release()
+            raise
+        self.calls += 1
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.semaphore.release()
+
+
+class ManagedRoom:
+    """
+    ManagedRoom Class
+
+    A room joined by a SessionManager. `state` is kept up to date from
+    PubNub; events are also queued for the manager's `on_event` handler.
+    Its calls, and the resyncs of its stream, are made within its budget.
+    When the handler falls behind and the queue is full, the oldest
+    events are dropped (the state itself stays complete).
+    """
+
+    def __init__(self, manager, channel, budget, queue_size):
+        """ (ManagedRoom, SessionManager, str, RoomBudget, int) -> NoneType
+        """
+        self.manager = manager
+        self.client = manager.client
+        self.channel = channel
+        self.budget = budget
+        self.state = None
+        self.stream = None
+        self.queue = asyncio.Queue(queue_size)
+        self.joined_at = None
+        self.events = 0
+        self.dropped = 0
+        self.handler_errors = 0
+        self._consumer = None
+
+    async def call(self, name, *args, **kwargs):
+        """ (ManagedRoom, str, ...) -> dict
+
+        Call an endpoint about this room within its budget, e.g.
+        room.call("get_channel") for clubhouse.get_channel(room.channel).
+        """
+        async with self.budget:
+            return await getattr(self.client, name)(self.channel, *args, **kwargs)
+
+    async def join(self):
+        """ (ManagedRoom) -> bool """
+        channel_info = await self.call("join_channel")
+        if not channel_info.get("success"):
+            return False
+        self.joined_at = time.monotonic()
+        self.state = RoomState(self.channel, channel_info)
+        for user in channel_info.get("users") or ():
+            self.manager.profiles.put(user)
+        self.manager.pings.add(self.channel)
+        if self.manager.on_event is not None:
+            self._consumer = asyncio.get_running_loop().create_task(self._consume())
+        if channel_info.get("pubnub_token"):
+            self.stream = AsyncRoomEventStream(
+                self.client, self.state, channel_info, on_event=self._on_event, transport=self.manager.pubnub,
+                budget=self.budget
+            ).start()
+        return True
+
+    async def leave(self):
+        """ (ManagedRoom) -> NoneType """
+        self.manager.pings.remove(self.channel)
+        if self.stream is not None:
+            await self.stream.stop()
+        if self._consumer is not None:
+            self._consumer.cancel()
+        await self.call("leave_channel")
+
+    def stats(self):
+        """ (ManagedRoom) -> dict """
+        return {
+            "users": len(self.state) if self.state is not None else 0,
+            "seconds_joined": time.monotonic() - self.joined_at if self.joined_at else 0.0,
+            "events": self.events,
+            "dropped": self.dropped,
+            "queued": self.queue.qsize(),
+            "handler_errors": self.handler_errors,
+            "resyncs": self.stream.resyncs if self.stream is not None else 0,
+            "streaming": self.stream is not None and self.stream.running,
+            "calls": self.budget.calls,
+            "budget_wait": self.budget.waited,
+        }
+
+    def _on_event(self, event):
+        self.events += 1
+        profile = event.get("user_profile")
+        if profile:
+            self.manager.profiles.put(profile)
+        if self._consumer is None:
+            return
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def _consume(self):
+        while True:
+            event = await self.queue.get()
+            try:
+                result = self.manager.on_event(self, event)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception: # pylint: disable=broad-except
+                self.handler_errors += 1
+
+
+class SessionManager:
+    """
+    SessionManager Class
+
+    Holds up to `max_rooms` rooms at once on one AsyncClubhouse. Create the
+    client with `cache=True` and `metrics=True` to share a cache and get
+    request metrics in stats(), and with `scheduler=True` for retries and
+    rate budgets.
+
+    `budget` is (rate, burst, concurrency) of each room's requests,
+    including the resyncs of its event stream.
+    `on_event(room, event)` is called (or awaited) for every room event.
+
+    Pings are not taken from the room budgets: every room is pinged once
+    per `ping_interval`, which a busy room must not delay. They have their
+    own "keepalive" class in the client's scheduler (see ratelimit.py),
+    whose rate is raised to fit max_rooms / ping_interval pings per second,
+    so they neither fall behind nor hold up joins and leaves.
+
+    The loop lag (how late timers fire) is sampled all along: once its p99
+    climbs, the process is holding more rooms than it can serve.
+
+    >>> async with AsyncClubhouse(user_id, user_token, user_device, cache=True, metrics=True,
+    ...                           scheduler=True) as client:
+    ...     async with SessionManager(client, on_event=handle) as manager:
+    ...         for channel in channels:
+    ...             await manager.join(channel)
+    ...         print(manager.stats()["loop_lag"])
+    """
+
+    # Seconds between two samples of the loop lag
+    LAG_INTERVAL = 0.25
+
+    # Keepalive rate budget over the steady rate of pings, for retries
+    PING_HEADROOM = 1.5
+
+    def __init__(self, client, max_rooms=100, budget=(2, 5, 2), queue_size=1000, on_event=None,
+                 profiles=None, ping_interval=30):
+        """ (SessionManager, AsyncClubhouse, int, tuple, int, callable, ProfileStore, float) -> NoneType
+        """
+        self.client = client
+        self.max_rooms = max_rooms
+        self.budget = budget
+        self.queue_size = queue_size
+        self.on_event = on_event
+        self.profiles = profiles or ProfileStore()
+        self.ping_interval = ping_interval
+        if client.scheduler is not None:
+            # The pings of one of the 30 slots of AsyncPingManager go out at once
+            burst = max(10, 2 * math.ceil(max_rooms / 30))
+            client.scheduler.ensure_rate("keepalive", max_rooms / ping_interval * self.PING_HEADROOM, burst)
+        self.rooms = {}
+        self.pings = None
+        self.pubnub = None
+        self.loop_lag = Histogram()
+        self.started = None
+        self._lag_task = None
+
+    async def __aenter__(self):
+        return self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def start(self):
+        """ (SessionManager) -> SessionManager
+
+        Start the shared tasks. Must be called from the event loop.
+        """
+        if self.started is None:
+            self.started = time.monotonic()
+            self.pings = AsyncPingManager(self.client, interval=self.ping_interval)
+            # One pool for the subscribe long-polls of every room
+            self.pubnub = AsyncTransport(pool_size=self.max_rooms)
+            self._lag_task = asyncio.get_running_loop().create_task(self._sample_lag())
+        return self
+
+    def __len__(self):
+        return len(self.rooms)
+
+    def __contains__(self, channel):
+        return channel in self.rooms
+
+    async def join(self, channel):
+        """ (SessionManager, str) -> ManagedRoom
+
+        Join the room. Returns None if the room could not be joined.
+        """
+        self.start()
+        room = self.rooms.get(channel)
+        if room is not None:
+            return room
+        if len(self.rooms) >= self.max_rooms:
+            raise Exception(f"Already in {self.max_rooms} rooms")
+        room = ManagedRoom(self, channel, RoomBudget(*self.budget), self.queue_size)
+        self.rooms[channel] = room
+        try:
+            joined = await room.join()
+        except BaseException:
+            del self.rooms[channel]
+            raise
+        if not joined:
+            del self.rooms[channel]
+            return None
+        return room
+
+    async def leave(self, channel):
+        """ (SessionManager, str) -> NoneType """
+        room = self.rooms.pop(channel, None)
+        if room is not None:
+            await room.leave()
+
+    async def close(self):
+        """ (SessionManager) -> NoneType
+
+        Leave every room and stop the shared tasks.
+        """
+        await asyncio.gather(*(self.leave(channel) for channel in list(self.rooms)), return_exceptions=True)
+        if self.started is not None:
+            self.pings.close()
+            self._lag_task.cancel()
+            await self.pubnub.close()
+            self.started = None
+
+    def stats(self):
+        """ (SessionManager) -> dict
+
+        Get the totals over every room, the loop lag (in milliseconds), the
+        stats of each room and those of the shared client.
+        """
+        rooms = {channel: room.stats() for channel, room in self.rooms.items()}
+        pings = self.pings.stats() if self.pings is not None else {}
+        elapsed = time.monotonic() - self.started if self.started is not None else 0.0
+        events = sum(room["events"] for room in rooms.values())
+        return {
+            "rooms": len(rooms),
+            "users": sum(room["users"] for room in rooms.values()),
+            "events": events,
+            "events_per_second": events / elapsed if elapsed else 0.0,
+            "dropped": sum(room["dropped"] for room in rooms.values()),
+            "queued": sum(room["queued"] for room in rooms.values()),
+            "streaming": sum(room["streaming"] for room in rooms.values()),
+            "ping_failures": sum(ping["failures"] for ping in pings.values()),
+            "loop_lag": self.loop_lag.summary(),
+            "profiles": self.profiles.stats(),
+            "by_room": {channel: dict(room, ping=pings.get(channel)) for channel, room in rooms.items()},
+            "client": self.client.stats(),
+        }
+
+    async def _sample_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            due = loop.time() + self.LAG_INTERVAL
+            await asyncio.sleep(self.LAG_INTERVAL)
+            self.loop_lag.record(max(0.0, loop.time() - due))
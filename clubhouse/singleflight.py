@@ -0,0 +1,172 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+singleflight.py
+
+Coalescing of identical concurrent requests.
+"""
+
+import asyncio
+import threading
+from .cancel import Cancelled
+
+class _Call:
+    """ In-flight call shared by every caller of the same key """
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = []
+
+
+class SingleFlight:
+    """
+    SingleFlight Class
+
+    While a call for a key is in flight, other callers of the same key wait
+    for it and get the same result (or exception) instead of sending their own.
+
+    The call runs under the limits of the caller who sent it. The others
+    wait no longer than their own `cancel` token allows, and if the call
+    was cancelled on its sender's behalf, they send it again.
+
+    >>> flight = SingleFlight()
+    >>> flight.do(key, client.get_channel, "abc")
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, *args, cancel=None):
+        """ (SingleFlight, object, callable, ..., CancelToken) -> object
+
+        Run func(*args), unless a call with the same key is already running.
+        Waiting for another caller's call raises cancel.Cancelled once
+        `cancel` is cancelled.
+        """
+        while True:
+            with self._lock:
+                call = self._inflight.get(key)
+                leader = call is None
+                if leader:
+                    call = self._inflight[key] = _Call()
+                    self.calls += 1
+                else:
+                    self.coalesced += 1
+            if leader:
+                return self._lead(key, call, func, args)
+
+            self._wait(call, cancel)
+            if not call.done.is_set():
+                cancel.raise_if_cancelled()
+            if call.error is None:
+                return call.result
+            if not isinstance(call.error, Cancelled) or (cancel is not None and cancel.cancelled):
+                raise call.error
+            # Cancelled for its sender only: send it again.
+
+    def _lead(self, key, call, func, args):
+        try:
+            call.result = func(*args)
+            return call.result
+        except BaseException as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+                call.done.set()
+                waiters, call.waiters = call.waiters, []
+            for waiter in waiters:
+                waiter.set()
+
+    def _wait(self, call, cancel):
+        if cancel is None:
+            call.done.wait()
+            return
+        woken = threading.Event()
+        with self._lock:
+            if call.done.is_set():
+                return
+            call.waiters.append(woken)
+        remove = cancel.add_callback(lambda _reason: woken.set())
+        try:
+            woken.wait()
+        finally:
+            remove()
+            with self._lock:
+                if woken in call.waiters:
+                    call.waiters.remove(woken)
+
+    def stats(self):
+        """ (SingleFlight) -> dict
+
+        Get the number of calls sent and calls that shared another one.
+        """
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+        }
+
+
+class AsyncSingleFlight:
+    """
+    AsyncSingleFlight Class
+
+    Same as SingleFlight, for coroutines on a single event loop.
+    The shared call runs in its own task, so cancelling one caller
+    does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._inflight = {}
+
+    async def do(self, key, func, *args, cancel=None):
+        """ (AsyncSingleFlight, object, coroutine function, ..., CancelToken) -> object
+
+        Await func(*args), unless a call with the same key is already running.
+        """
+        while True:
+            task = self._inflight.get(key)
+            leader = task is None
+            if leader:
+                self.calls += 1
+                task = self._inflight[key] = asyncio.ensure_future(func(*args))
+                task.add_done_callback(lambda _: self._inflight.pop(key, None))
+                return await asyncio.shield(task)
+
+            self.coalesced += 1
+            if cancel is None:
+                await asyncio.wait([task])
+            else:
+                waiter = asyncio.ensure_future(cancel.async_wait())
+                try:
+                    await asyncio.wait([task, waiter], return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    waiter.cancel()
+                if not task.done():
+                    cancel.raise_if_cancelled()
+            try:
+                return task.result()
+            except Cancelled:
+                if cancel is not None and cancel.cancelled:
+                    raise
+            # Cancelled for its sender only: send it again.
+
+    def stats(self):
+        """ (AsyncSingleFlight) -> dict
+
+        Get the number of calls sent and calls that shared another one.
+        """
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+        }
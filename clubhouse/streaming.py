@@ -0,0 +1,439 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+streaming.py
+
+Reading the items of a large response (e.g. the `users` of a room) while
+it is being received.
+
+ItemParser is fed the body chunk by chunk and hands out each element of
+one top-level array as soon as it is complete. Other top-level fields are
+kept in `fields`. An ItemStream stops reading once its consumer has had
+enough, so a room of 5,000 users costs the first 20 of them instead of
+the whole list.
+"""
+
+import re
+import json
+import time
+import codecs
+import asyncio
+from .transport import abort_response
+
+# Bytes read from the socket at once
+CHUNK_SIZE = 16384
+
+_SKIP = re.compile(r"[\s,]*")
+_SPACE = re.compile(r"\s*")
+
+# Characters which may follow a complete value
+_DELIMITERS = frozenset(" \t\r\n,:]}")
+
+# Returned by ItemParser steps which need more data
+_MORE = object()
+
+
+class ItemParser:
+    """
+    ItemParser Class
+
+    Incremental parser of a JSON object, yielding the elements of its
+    `key` array one by one. Every other top-level field is decoded whole
+    into `fields`.
+
+    >>> parser = ItemParser("users")
+    >>> parser.feed(b'{"success": true, "users": [{"user_id": 1}, {"us')
+    >>> list(parser)
+    [{'user_id': 1}]
+    >>> parser.fields
+    {'success': True}
+    """
+
+    def __init__(self, key):
+        """ (ItemParser, str) -> NoneType
+        """
+        self.key = key
+        self.fields = {}
+        self.done = False
+        self._decoder = json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self._state = self._start
+        self._field = None
+        # Length of the buffer to wait for before decoding again an incomplete value
+        self._retry_at = 0
+
+    def feed(self, data, eof=False):
+        """ (ItemParser, bytes, bool) -> NoneType
+
+        Add the next chunk of the body. Set `eof` with the last one.
+        """
+        if self._pos > CHUNK_SIZE:
+            self._buf = self._buf[self._pos:]
+            self._retry_at -= self._pos
+            self._pos = 0
+        self._buf += self._text.decode(data, final=eof)
+        self._eof = eof
+
+    def __iter__(self):
+        """ Yield the items parsed from the data fed so far """
+        while not self.done:
+            item = self._state()
+            if item is _MORE:
+                return
+            if item is not None:
+                yield item[0]
+
+    def _skip(self, pattern):
+        """ Returns the next character after `pattern`, or None for more data """
+        self._pos = pattern.match(self._buf, self._pos).end()
+        if self._pos < len(self._buf):
+            return self._buf[self._pos]
+        if self._eof:
+            raise ValueError("Truncated JSON body")
+        return None
+
+    def _decode(self):
+        """ Returns the next JSON value, or _MORE """
+        if len(self._buf) < self._retry_at and not self._eof:
+            return _MORE
+        try:
+            value, end = self._decoder.raw_decode(self._buf, self._pos)
+        except json.JSONDecodeError:
+            if self._eof:
+                raise
+            end = len(self._buf)
+        if not self._eof and (end == len(self._buf) or self._buf[end] not in _DELIMITERS):
+            # Incomplete, or a number which may go on in the next chunk.
+            # Wait until the pending text doubles, so that a large value
+            # is not decoded over and over again.
+            self._retry_at = len(self._buf) + max(len(self._buf) - self._pos, 1)
+            return _MORE
+        self._pos = end
+        return value
+
+    def _start(self):
+        char = self._skip(_SPACE)
+        if char is None:
+            return _MORE
+        if char != "{":
+            raise ValueError("Expected a JSON object")
+        self._pos += 1
+        self._state = self._next_field
+        return None
+
+    def _next_field(self):
+        char = self._skip(_SKIP)
+        if char is None:
+            return _MORE
+        if char == "}":
+            self._pos += 1
+            self.done = True
+            return None
+        field = self._decode()
+        if field is _MORE:
+            return _MORE
+        self._field = field
+        self._state = self._colon
+        return None
+
+    def _colon(self):
+        char = self._skip(_SPACE)
+        if char is None:
+            return _MORE
+        if char != ":":
+            raise ValueError(f"Expected ':' after {self._field!r}")
+        self._pos += 1
+        self._state = self._field_value
+        return None
+
+    def _field_value(self):
+        char = self._skip(_SPACE)
+        if char is None:
+            return _MORE
+        if self._field == self.key and char == "[":
+            self._pos += 1
+            self._state = self._next_item
+        else:
+            self._state = self._value
+        return None
+
+    def _value(self):
+        value = self._decode()
+        if value is _MORE:
+            return _MORE
+        self.fields[self._field] = value
+        self._state = self._next_field
+        return None
+
+    def _next_item(self):
+        char = self._skip(_SKIP)
+        if char is None:
+            return _MORE
+        if char == "]":
+            self._pos += 1
+            self._state = self._next_field
+            return None
+        item = self._decode()
+        if item is _MORE:
+            return _MORE
+        return (item,)
+
+
+class ItemStream:
+    """
+    ItemStream Class
+
+    Items of a response, parsed while the body is received.
+
+    Iteration stops after `limit` items, or after the first item for which
+    `until(item)` is true. The connection is then closed, unless `rest` is
+    set: the rest of the body is read (skipping the items, so they are not
+    kept in memory) to get the fields after the array, e.g. the `token` of
+    join_channel.
+
+    `fields` has the other top-level fields of the response read so far.
+    Use it as a context manager, or close() it, when not iterating to the end.
+    Until then, cancelling the `cancel` token of the call (see Clubhouse.limits)
+    aborts the read, which raises cancel.Cancelled.
+
+    >>> with clubhouse.stream_items("get_channel", channel, limit=20) as users:
+    ...     for user in users:
+    ...         print(user['username'])
+    """
+
+    def __init__(self, key="users", limit=None, until=None, rest=False):
+        """ (ItemStream, str, int, callable, bool) -> NoneType
+        """
+        self.response = None
+        self.status_code = None
+        self.limit = limit
+        self.until = until
+        self.rest = rest
+        self.count = 0
+        self.received = 0
+        self.read_time = 0.0
+        self.parse_time = 0.0
+        self.closed = False
+        self.cancel = None
+        self._parser = ItemParser(key)
+        self._on_close = None
+        self._remove_abort = None
+
+    def attach(self, response, on_close=None, cancel=None):
+        """ (ItemStream, Response, callable, CancelToken) -> ItemStream
+
+        Read the items from `response`, a streamed response of the transport.
+        `on_close(stream)` is called once the stream is closed. Cancelling
+        `cancel` aborts reading the body.
+        """
+        self.response = response
+        self.status_code = response.status_code
+        self._on_close = on_close
+        self.cancel = cancel
+        if cancel is not None:
+            self._remove_abort = cancel.add_callback(self._abort)
+        return self
+
+    def _abort(self, _reason):
+        abort_response(self.response)
+
+    def _check_cancelled(self):
+        if self.cancel is not None:
+            self.cancel.raise_if_cancelled()
+
+    @property
+    def fields(self):
+        """ (ItemStream) -> dict """
+        return self._parser.fields
+
+    @property
+    def complete(self):
+        """ (ItemStream) -> bool
+
+        Check whether the whole body was read.
+        """
+        return self._parser.done
+
+    def _stops(self, item):
+        return (self.limit is not None and self.count >= self.limit) or (self.until is not None and self.until(item))
+
+    def _parsed(self):
+        started = time.perf_counter()
+        items = list(self._parser)
+        self.parse_time += time.perf_counter() - started
+        return items
+
+    def _feed(self, chunk):
+        if chunk is None:
+            self._parser.feed(b"", eof=True)
+        else:
+            self.received += len(chunk)
+            self._parser.feed(chunk)
+
+    def _items(self):
+        chunks = self.response.iter_content(CHUNK_SIZE)
+        while not self._parser.done:
+            self._check_cancelled()
+            started = time.perf_counter()
+            try:
+                chunk = next(chunks, None)
+            finally:
+                # An aborted read fails or ends early: report the cancellation instead
+                self._check_cancelled()
+            self.read_time += time.perf_counter() - started
+            self._feed(chunk)
+            yield from self._parsed()
+
+    def __iter__(self):
+        if self.closed:
+            return
+        items = self._items()
+        try:
+            if self.limit is None or self.limit > 0:
+                for item in items:
+                    self.count += 1
+                    yield item
+                    if self._stops(item):
+                        break
+            if self.rest:
+                for _ in items:
+                    pass
+        finally:
+            self.close()
+
+    def close(self):
+        """ (ItemStream) -> NoneType
+
+        Stop reading and release the connection.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        if self._remove_abort is not None:
+            self._remove_abort()
+        self.response.close()
+        if self._on_close is not None:
+            self._on_close(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AsyncItemStream(ItemStream):
+    """
+    AsyncItemStream Class
+
+    Same as ItemStream, for AsyncClubhouse. The request is sent on the
+    first iteration.
+
+    >>> async with clubhouse.stream_items("get_channel", channel, limit=20) as users:
+    ...     async for user in users:
+    ...         print(user['username'])
+    """
+
+    def __init__(self, open_response=None, key="users", limit=None, until=None, rest=False):
+        """ (AsyncItemStream, coroutine function, str, int, callable, bool) -> NoneType
+
+        `open_response()` sends the request and attach()es the response.
+        """
+        super().__init__(key, limit, until, rest)
+        self._open_response = open_response
+        self._loop = None
+        self._reader = None
+
+    def attach(self, response, on_close=None, cancel=None):
+        """ (AsyncItemStream, AsyncResponse, callable, CancelToken) -> AsyncItemStream
+
+        Same as ItemStream.attach, from the event loop.
+        """
+        self._loop = asyncio.get_running_loop()
+        return super().attach(response, on_close, cancel)
+
+    def _abort(self, _reason):
+        self._loop.call_soon_threadsafe(self._abort_read)
+
+    def _abort_read(self):
+        if self._reader is not None:
+            self._reader.cancel()
+
+    async def open(self):
+        """ (AsyncItemStream) -> AsyncItemStream
+
+        Send the request, if not done yet.
+        """
+        if self.response is None and not self.closed:
+            await self._open_response()
+        return self
+
+    async def _aitems(self):
+        await self.open()
+        chunks = self.response.iter_chunks(CHUNK_SIZE).__aiter__()
+        while not self._parser.done:
+            self._check_cancelled()
+            started = time.perf_counter()
+            self._reader = asyncio.current_task()
+            try:
+                chunk = await chunks.__anext__()
+            except StopAsyncIteration:
+                chunk = None
+            except asyncio.CancelledError:
+                if self.cancel is None or not self.cancel.cancelled:
+                    raise
+                if hasattr(self._reader, "uncancel"):
+                    self._reader.uncancel()
+                self._check_cancelled()
+            finally:
+                self._reader = None
+            self.read_time += time.perf_counter() - started
+            self._feed(chunk)
+            for item in self._parsed():
+                yield item
+
+    async def __aiter__(self):
+        if self.closed:
+            return
+        items = self._aitems()
+        try:
+            if self.limit is None or self.limit > 0:
+                async for item in items:
+                    self.count += 1
+                    yield item
+                    if self._stops(item):
+                        break
+            if self.rest:
+                async for _ in items:
+                    pass
+        finally:
+            await items.aclose()
+            self.close()
+
+    def __iter__(self):
+        raise TypeError("Use 'async for' with AsyncItemStream")
+
+    def close(self):
+        """ (AsyncItemStream) -> NoneType
+
+        Stop reading and release the connection.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        if self._remove_abort is not None:
+            self._remove_abort()
+        if self.response is not None:
+            self.response.close()
+        if self._on_close is not None:
+            self._on_close(self)
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *exc_info):
+        self.close()
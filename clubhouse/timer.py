@@ -0,0 +1,282 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+timer.py
+
+Periodic and delayed tasks shared by every room of a process.
+
+A single dispatcher thread keeps the tasks in a heap ordered by due time
+and hands the due ones to a small pool of worker threads, so thousands of
+rooms pinging every 30 seconds cost a few threads instead of one each.
+"""
+
+import time
+import heapq
+import itertools
+import threading
+import traceback
+from queue import SimpleQueue
+
+class TimerHandle:
+    """
+    TimerHandle Class
+
+    Returned when a task is scheduled. cancel() stops it; a run already
+    in progress is not interrupted, but the task is not run again.
+    """
+
+    __slots__ = (
+        "func", "args", "kwargs", "interval", "due", "runs", "skipped", "cancelled", "_scheduler", "_pending",
+    )
+
+    def __init__(self, scheduler, func, args, kwargs, interval, due):
+        """ (TimerHandle, TimerScheduler, callable, tuple, dict, float, float) -> NoneType
+        """
+        self._scheduler = scheduler
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.interval = interval
+        self.due = due
+        self.runs = 0
+        self.skipped = 0
+        self.cancelled = False
+        self._pending = False
+
+    def cancel(self):
+        """ (TimerHandle) -> NoneType """
+        self._scheduler.cancel(self)
+
+    def __repr__(self):
+        name = getattr(self.func, "__qualname__", repr(self.func))
+        return f"TimerHandle({name}, interval={self.interval}, runs={self.runs}, cancelled={self.cancelled})"
+
+
+class TimerScheduler:
+    """
+    TimerScheduler Class
+
+    Runs delayed and periodic tasks on `workers` threads.
+
+    Periodic tasks are scheduled from their previous due time, not from
+    the end of the previous run, so they do not drift. When a run is
+    late by more than a whole interval (e.g. the workers were all busy),
+    the missed runs are skipped instead of being run back to back.
+    A task never runs twice at the same time.
+
+    >>> timers = TimerScheduler(workers=4)
+    >>> handle = timers.call_every(30, client.active_ping, channel_name)
+    >>> handle.cancel()
+    """
+
+    # Rebuild the heap when more than this share of it is cancelled
+    COMPACT_RATIO = 0.5
+
+    def __init__(self, workers=4, clock=time.monotonic):
+        """ (TimerScheduler, int, callable) -> NoneType
+        """
+        self.workers = workers
+        self.clock = clock
+        self.runs = 0
+        self.errors = 0
+        self.skipped = 0
+        self.max_lateness = 0.0
+        self._heap = []
+        self._cancelled = 0
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._queue = SimpleQueue()
+        self._threads = []
+        self._stopped = False
+
+    def call_later(self, delay, func, *args, **kwargs):
+        """ (TimerScheduler, float, callable, ...) -> TimerHandle
+
+        Run func(*args, **kwargs) once, in `delay` seconds.
+        """
+        return self._schedule(func, args, kwargs, None, delay)
+
+    def call_every(self, interval, func, *args, first=None, **kwargs):
+        """ (TimerScheduler, float, callable, ...) -> TimerHandle
+
+        Run func(*args, **kwargs) every `interval` seconds, the first time
+        in `first` seconds (default: `interval`). The task stops when it
+        returns False. Exceptions are printed and do not stop it.
+        """
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        return self._schedule(func, args, kwargs, interval, interval if first is None else first)
+
+    def cancel(self, handle):
+        """ (TimerScheduler, TimerHandle) -> NoneType """
+        with self._cond:
+            if handle.cancelled:
+                return
+            handle.cancelled = True
+            if not handle._pending:
+                return
+            self._cancelled += 1
+            if self._cancelled > 64 and self._cancelled > len(self._heap) * self.COMPACT_RATIO:
+                for entry in self._heap:
+                    entry[2]._pending = not entry[2].cancelled
+                self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+                heapq.heapify(self._heap)
+                self._cancelled = 0
+
+    def shutdown(self):
+        """ (TimerScheduler) -> NoneType
+
+        Stop the threads. Pending tasks are dropped, running ones finish.
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+
+    def __len__(self):
+        with self._cond:
+            return len(self._heap) - self._cancelled
+
+    def stats(self):
+        """ (TimerScheduler) -> dict
+
+        Get the task counters. max_lateness is in seconds.
+        """
+        with self._cond:
+            return {
+                "scheduled": len(self._heap) - self._cancelled,
+                "runs": self.runs,
+                "errors": self.errors,
+                "skipped": self.skipped,
+                "max_lateness": self.max_lateness,
+                "threads": len(self._threads),
+            }
+
+    def _schedule(self, func, args, kwargs, interval, delay):
+        handle = TimerHandle(self, func, args, kwargs, interval, self.clock() + max(0.0, delay))
+        with self._cond:
+            if self._stopped:
+                raise Exception("The timer scheduler is shut down")
+            if not self._threads:
+                self._start()
+            self._push(handle)
+        return handle
+
+    def _push(self, handle):
+        """ Called with the lock held """
+        entry = (handle.due, next(self._counter), handle)
+        handle._pending = True
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._cond.notify()
+
+    def _start(self):
+        """ Called with the lock held """
+        self._threads.append(threading.Thread(target=self._dispatch, name="timer-dispatch"))
+        for i in range(self.workers):
+            self._threads.append(threading.Thread(target=self._work, name=f"timer-worker-{i}"))
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    def _dispatch(self):
+        with self._cond:
+            while not self._stopped:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                due, _, handle = self._heap[0]
+                if handle.cancelled:
+                    heapq.heappop(self._heap)
+                    handle._pending = False
+                    self._cancelled -= 1
+                    continue
+                delay = due - self.clock()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+                handle._pending = False
+                self._queue.put(handle)
+
+    def _work(self):
+        while True:
+            handle = self._queue.get()
+            if handle is None:
+                return
+            if not handle.cancelled:
+                self._run(handle)
+
+    def _run(self, handle):
+        started = self.clock()
+        try:
+            ret = handle.func(*handle.args, **handle.kwargs)
+        except Exception: # pylint: disable=broad-except
+            ret = None
+            traceback.print_exc()
+            with self._cond:
+                self.errors += 1
+        handle.runs += 1
+        with self._cond:
+            self.runs += 1
+            self.max_lateness = max(self.max_lateness, started - handle.due)
+            if handle.interval is None or ret is False or handle.cancelled or self._stopped:
+                if not handle.cancelled:
+                    # Done, so it is not counted as pending anymore
+                    handle.cancelled = True
+                return
+            due = handle.due + handle.interval
+            now = self.clock()
+            if due <= now:
+                missed = int((now - due) // handle.interval) + 1
+                due += missed * handle.interval
+                handle.skipped += missed
+                self.skipped += missed
+            handle.due = due
+            self._push(handle)
+
+
+_default = None
+_deadlines = None
+_default_lock = threading.Lock()
+
+def default_scheduler():
+    """ () -> TimerScheduler
+
+    Get the scheduler shared by the whole process.
+    """
+    global _default # pylint: disable=global-statement
+    with _default_lock:
+        if _default is None:
+            _default = TimerScheduler()
+        return _default
+
+def deadline_scheduler():
+    """ () -> TimerScheduler
+
+    Get the scheduler of call deadlines. Its tasks only cancel tokens, so
+    they never wait behind tasks of the shared scheduler which are blocked
+    in a request (pings, polls), and they still fire for those requests.
+    """
+    global _deadlines # pylint: disable=global-statement
+    with _default_lock:
+        if _deadlines is None:
+            _deadlines = TimerScheduler(workers=1)
+        return _deadlines
+
+def set_interval(interval, scheduler=None):
+    """ (int, TimerScheduler) -> decorator
+
+    set_interval decorator
+
+    Calling the decorated function runs it every `interval` seconds on the
+    shared scheduler until it returns False, and returns a TimerHandle.
+    """
+    def decorator(func):
+        def wrap(*args, **kwargs):
+            return (scheduler or default_scheduler()).call_every(interval, func, *args, **kwargs)
+        return wrap
+    return decorator
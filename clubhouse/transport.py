@@ -0,0 +1,465 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+transport.py
+
+HTTP transport used by the Clubhouse client.
+"""
+
+import json
+import time
+import socket
+import asyncio
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.exceptions import ConnectTimeoutError
+from urllib3.util.connection import allowed_gai_family
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# RequestRecord (see metrics.py) and _InFlight of the request being sent by the current thread
+_current = threading.local()
+
+class _InFlight:
+    """ Connection of a request in flight, so that another thread can abort it """
+    __slots__ = ("conn", "aborted")
+
+    def __init__(self):
+        self.conn = None
+        self.aborted = False
+
+    def abort(self, _reason=None):
+        self.aborted = True
+        _shutdown(getattr(self.conn, "sock", None))
+
+def _shutdown(sock):
+    if sock is not None:
+        try:
+            # Wakes up a blocked recv() on the request thread
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+def abort_response(response):
+    """ (requests.Response) -> NoneType
+
+    Shut down the connection of a streamed response, from any thread.
+    A read blocked on it returns right away.
+    """
+    raw = getattr(response, "raw", None)
+    sock = getattr(getattr(raw, "connection", None), "sock", None)
+    if sock is None:
+        # A connection which is not kept alive hands its socket over to the response
+        socket_io = getattr(getattr(getattr(raw, "_fp", None), "fp", None), "raw", None)
+        sock = getattr(socket_io, "_sock", None)
+    _shutdown(sock)
+
+
+class _TimedConnection:
+    """
+    Connection mixin timing name resolution, TCP and TLS handshakes into
+    the RequestRecord of the current thread, if any.
+    Timed connections resolve the host first, then try each address in
+    turn (e.g. IPv6, then IPv4) as urllib3 does.
+    """
+
+    def _new_conn(self):
+        record = getattr(_current, "record", None)
+        if record is None:
+            return super()._new_conn()
+        host = self._dns_host
+        start = time.perf_counter()
+        try:
+            addresses = list(dict.fromkeys(
+                info[4][0] for info in socket.getaddrinfo(
+                    host.strip("[]"), self.port, allowed_gai_family(), socket.SOCK_STREAM
+                )
+            )) or [host]
+        except OSError:
+            # Let urllib3 report the failure
+            addresses = [host]
+        resolved = time.perf_counter()
+        record.dns = resolved - start
+        try:
+            for tried, address in enumerate(addresses, 1):
+                self._dns_host = address
+                try:
+                    sock = super()._new_conn()
+                    break
+                except ConnectTimeoutError:
+                    # Refused, unreachable or timed out: try the next address
+                    if tried == len(addresses):
+                        raise
+        finally:
+            self._dns_host = host
+        record.connect = time.perf_counter() - resolved
+        return sock
+
+    def connect(self):
+        record = getattr(_current, "record", None)
+        start = time.perf_counter()
+        super().connect()
+        if record is not None and isinstance(self, HTTPSConnection):
+            record.tls = time.perf_counter() - start - record.dns - record.connect
+
+
+class _TimedHTTPConnection(_TimedConnection, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnection, HTTPSConnection):
+    pass
+
+
+class _AbortablePool:
+    """ Connection pool mixin exposing the connection of each request to its _InFlight """
+
+    def _make_request(self, conn, *args, **kwargs): # pylint: disable=arguments-differ
+        inflight = getattr(_current, "inflight", None)
+        if inflight is not None:
+            inflight.conn = conn
+            if inflight.aborted:
+                raise requests.ConnectionError("Request aborted")
+        return super()._make_request(conn, *args, **kwargs)
+
+
+class _TimedHTTPConnectionPool(_AbortablePool, HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(_AbortablePool, HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    """ HTTPAdapter whose connections can be timed """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+class HTTPTransport:
+    """
+    HTTPTransport Class
+
+    Owns a pooled keep-alive session, so consecutive API calls reuse
+    an already established TCP/TLS connection instead of doing a new handshake.
+
+    pool_size:
+        - Maximum number of connections kept alive per host.
+    pool_block:
+        - Block when the pool is exhausted instead of opening throwaway connections.
+    """
+
+    # Network errors, retried by ratelimit.Scheduler for read-only endpoints
+    errors = (requests.ConnectionError, requests.Timeout)
+
+    def __init__(self, pool_size=10, pool_block=False):
+        """ (HTTPTransport, int, bool) -> NoneType
+        Create a pooled session
+        """
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        adapter = _TimedAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            pool_block=pool_block
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method, url, headers=None, json=None, files=None, timeout=None, data=None, record=None,
+                cancel=None, stream=False):
+        """ (HTTPTransport, str, str, dict, dict, dict, float, bytes, RequestRecord, CancelToken, bool) -> requests.Response
+
+        Send the request over a pooled connection.
+        `timeout` is in seconds, or (connect, read) as in requests.
+        `data` is a body that is already encoded, sent as is.
+        The phases of the request are timed into `record` when given.
+        Cancelling `cancel` aborts the request, which raises the reason of the token.
+        With `stream`, the response is returned once its headers are in, and the
+        body is read with iter_content(). Error responses are read whole.
+        """
+        if cancel is None:
+            return self._request(method, url, headers, json, files, timeout, data, record, stream)
+        cancel.raise_if_cancelled()
+        inflight = _current.inflight = _InFlight()
+        remove = cancel.add_callback(inflight.abort)
+        try:
+            return self._request(method, url, headers, json, files, timeout, data, record, stream)
+        except (requests.RequestException, OSError) as err:
+            if inflight.aborted:
+                raise type(cancel.reason)(*cancel.reason.args) from err
+            raise
+        finally:
+            remove()
+            _current.inflight = None
+
+    def _request(self, method, url, headers, json, files, timeout, data, record, stream=False):
+        if record is None:
+            resp = self.session.request(
+                method, url, headers=headers, json=json, files=files, timeout=timeout, data=data, stream=stream
+            )
+            if stream and resp.status_code >= 400:
+                resp.content # pylint: disable=pointless-statement
+            return resp
+        record.attempts += 1
+        record.dns = record.connect = record.tls = 0.0
+        _current.record = record
+        start = time.perf_counter()
+        try:
+            resp = self.session.request(
+                method, url, headers=headers, json=json, files=files, timeout=timeout, data=data, stream=True
+            )
+            received = time.perf_counter()
+            if not stream or resp.status_code >= 400:
+                record.received = len(resp.content)
+        finally:
+            _current.record = None
+        record.wait = received - start - record.dns - record.connect - record.tls
+        record.download = time.perf_counter() - received
+        record.status = resp.status_code
+        return resp
+
+    def close(self):
+        """ (HTTPTransport) -> NoneType
+
+        Close every pooled connection.
+        """
+        self.session.close()
+
+
+class AsyncResponse:
+    """
+    AsyncResponse Class
+
+    Fully read response of AsyncTransport. Mirrors the bits of
+    requests.Response that the client relies on.
+
+    A streamed response (see AsyncTransport.request) has no content: its
+    body is read with iter_chunks().
+    """
+
+    def __init__(self, status_code, headers, content, stream=None):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self._stream = stream
+
+    def iter_content(self, chunk_size=None): # pylint: disable=unused-argument
+        """ (AsyncResponse, int) -> generator
+
+        Body of a response read whole, as requests.Response.iter_content.
+        """
+        if self.content:
+            yield self.content
+
+    async def iter_chunks(self, chunk_size):
+        """ (AsyncResponse, int) -> async generator
+
+        Read the body chunk by chunk.
+        """
+        if self._stream is None:
+            if self.content:
+                yield self.content
+            return
+        async for chunk in self._stream.content.iter_chunked(chunk_size):
+            yield chunk
+
+    def close(self):
+        """ (AsyncResponse) -> NoneType
+
+        Drop the connection of a streamed response which is not read to the end.
+        """
+        if self._stream is not None:
+            self._stream.close()
+
+    def json(self):
+        """ (AsyncResponse) -> dict
+
+        Decode the response body.
+        """
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        """ (AsyncResponse) -> NoneType
+
+        Raise if the server answered with an error status.
+        """
+        if self.status_code >= 400:
+            raise Exception(f"HTTP {self.status_code}")
+
+
+class AsyncTransport:
+    """
+    AsyncTransport Class
+
+    Same as HTTPTransport, but runs on an aiohttp connection pool so one event
+    loop can drive many requests at once. Requires `aiohttp` to be installed.
+
+    pool_size:
+        - Maximum number of simultaneous connections.
+    """
+
+    def __init__(self, pool_size=100):
+        """ (AsyncTransport, int) -> NoneType
+        Prepare the pool. The session itself is created on the first request,
+        as aiohttp needs a running event loop.
+        """
+        try:
+            # Imported here so that sync-only users don't pay for it at import time
+            import aiohttp # pylint: disable=import-outside-toplevel
+        except ImportError as err:
+            raise ImportError("aiohttp is required to use the async transport") from err
+        self.aiohttp = aiohttp
+        self.errors = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+        self.pool_size = pool_size
+        self.session = None
+
+    def _get_session(self):
+        if self.session is None or self.session.closed:
+            connector = self.aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=self.pool_size)
+            self.session = self.aiohttp.ClientSession(
+                connector=connector,
+                auto_decompress=True,
+                trace_configs=[self._trace_config()]
+            )
+        return self.session
+
+    def _trace_config(self):
+        """ (AsyncTransport) -> aiohttp.TraceConfig
+
+        Time name resolution and connection setup into the RequestRecord
+        passed as `trace_request_ctx`. aiohttp reports the TLS handshake as
+        part of the connection, so `tls` is left unknown.
+        """
+        async def on_dns_start(_session, context, _params):
+            context.dns_start = time.perf_counter()
+
+        async def on_dns_end(_session, context, _params):
+            if context.trace_request_ctx is not None:
+                context.trace_request_ctx.dns = time.perf_counter() - context.dns_start
+
+        async def on_connection_start(_session, context, _params):
+            context.connection_start = time.perf_counter()
+
+        async def on_connection_end(_session, context, _params):
+            record = context.trace_request_ctx
+            if record is not None:
+                record.connect = time.perf_counter() - context.connection_start - record.dns
+
+        trace_config = self.aiohttp.TraceConfig()
+        trace_config.on_dns_resolvehost_start.append(on_dns_start)
+        trace_config.on_dns_resolvehost_end.append(on_dns_end)
+        trace_config.on_connection_create_start.append(on_connection_start)
+        trace_config.on_connection_create_end.append(on_connection_end)
+        return trace_config
+
+    async def request(self, method, url, headers=None, json=None, files=None, data=None, record=None, timeout=None,
+                      cancel=None, stream=False):
+        """ (AsyncTransport, str, str, dict, dict, dict, bytes, RequestRecord, float, CancelToken, bool) -> AsyncResponse
+
+        Send the request over a pooled connection and read the whole body.
+        `data` is a body that is already encoded, sent as is.
+        The phases of the request are timed into `record` when given.
+        `timeout` is the total time allowed for the request in seconds, or
+        (connect, read) for the connection and each read of the socket.
+        Cancelling `cancel` aborts the request, which raises the reason of the token.
+        With `stream`, the response is returned once its headers are in, and the
+        body is read with iter_chunks(). Error responses are read whole.
+        """
+        if cancel is None:
+            return await self._request(method, url, headers, json, files, data, record, timeout, stream)
+        cancel.raise_if_cancelled()
+        loop = asyncio.get_running_loop()
+        task = asyncio.current_task()
+        active = [True]
+        def abort():
+            if active[0]:
+                task.cancel()
+        remove = cancel.add_callback(lambda _reason: loop.call_soon_threadsafe(abort))
+        try:
+            return await self._request(method, url, headers, json, files, data, record, timeout, stream)
+        except asyncio.CancelledError as err:
+            if not cancel.cancelled:
+                raise
+            if hasattr(task, "uncancel"):
+                task.uncancel()
+            raise type(cancel.reason)(*cancel.reason.args) from err
+        finally:
+            active[0] = False
+            remove()
+
+    async def _request(self, method, url, headers, json, files, data, record, timeout, stream=False):
+        if files:
+            data = self.aiohttp.FormData()
+            for name, (filename, fileobj, content_type) in files.items():
+                data.add_field(name, fileobj, filename=filename, content_type=content_type)
+        session = self._get_session()
+        if timeout is None:
+            options = {}
+        elif isinstance(timeout, tuple):
+            connect, read = timeout
+            options = {"timeout": self.aiohttp.ClientTimeout(total=None, sock_connect=connect, sock_read=read)}
+        else:
+            options = {"timeout": self.aiohttp.ClientTimeout(total=timeout)}
+        if stream:
+            return await self._open(session, method, url, headers, json, data, record, options)
+        if record is None:
+            async with session.request(method, url, headers=headers, json=json, data=data, **options) as resp:
+                content = await resp.read()
+                return AsyncResponse(resp.status, resp.headers, content)
+
+        record.attempts += 1
+        record.dns = record.connect = 0.0
+        record.tls = None
+        start = time.perf_counter()
+        async with session.request(
+                method, url, headers=headers, json=json, data=data, trace_request_ctx=record, **options
+            ) as resp:
+            received = time.perf_counter()
+            content = await resp.read()
+        record.wait = received - start - record.dns - record.connect
+        record.download = time.perf_counter() - received
+        record.status = resp.status
+        record.received = len(content)
+        return AsyncResponse(resp.status, resp.headers, content)
+
+    async def _open(self, session, method, url, headers, json, data, record, options):
+        """ Send the request of a streamed response, see request() """
+        if record is not None:
+            record.attempts += 1
+            record.dns = record.connect = 0.0
+            record.tls = None
+            options = dict(options, trace_request_ctx=record)
+        start = time.perf_counter()
+        resp = await session.request(method, url, headers=headers, json=json, data=data, **options)
+        received = time.perf_counter()
+        if resp.status < 400:
+            response = AsyncResponse(resp.status, resp.headers, b"", stream=resp)
+        else:
+            try:
+                response = AsyncResponse(resp.status, resp.headers, await resp.read())
+            finally:
+                resp.release()
+        if record is not None:
+            record.wait = received - start - record.dns - record.connect
+            record.download = time.perf_counter() - received
+            record.status = resp.status
+            record.received = len(response.content)
+        return response
+
+    async def close(self):
+        """ (AsyncTransport) -> NoneType
+
+        Close every pooled connection.
+        """
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
@@ -34,6 +34,9 @@ setup(
         "clubhouse-lib",
     ],
     install_requires=_requires_from_file("requirements.txt"),
+    extras_require={
+        "async": ["aiohttp"],
+    },
     classifiers=[
         "Development Status :: 5 - Production/Stable",
         "Intended Audience :: Developers",
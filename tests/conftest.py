@@ -0,0 +1,69 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+conftest.py
+
+Fixtures shared by the tests: the local mock API, and a scripted
+transport for the cases the mock cannot produce on demand.
+"""
+
+import threading
+from json import dumps, loads
+from urllib.parse import urlsplit
+import pytest
+import requests
+from clubhouse.clubhouse import Clubhouse
+from clubhouse.mockserver import MockServer, MockData
+from clubhouse.transport import AsyncResponse
+
+
+class ScriptedTransport:
+    """
+    ScriptedTransport Class
+
+    Answers each request with `handler(endpoint, body)`, which returns
+    (status, payload) or raises. Every request is kept in `requests`.
+    """
+
+    errors = (requests.ConnectionError, requests.Timeout)
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def request(self, method, url, headers=None, json=None, files=None, timeout=None, data=None, record=None,
+                cancel=None, stream=False): # pylint: disable=redefined-outer-name,unused-argument
+        endpoint = urlsplit(url).path.rsplit("/", 1)[-1]
+        body = loads(data) if data else json
+        with self.lock:
+            self.requests.append((endpoint, body))
+        status, payload = self.handler(endpoint, body)
+        headers = {}
+        if isinstance(payload, tuple):
+            payload, headers = payload
+        return AsyncResponse(status, headers, dumps(payload).encode())
+
+    def calls(self, endpoint):
+        """ Number of requests sent to the endpoint """
+        with self.lock:
+            return sum(1 for name, _ in self.requests if name == endpoint)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def scripted():
+    """ Factory of ScriptedTransport """
+    return ScriptedTransport
+
+
+@pytest.fixture
+def mock_server(monkeypatch):
+    """ Mock API on a free port, with Clubhouse pointed at it """
+    server = MockServer(MockData(num_users=200, num_channels=5, users_per_channel=20)).start()
+    monkeypatch.setattr(Clubhouse, "API_URL", server.api_url)
+    yield server
+    server.stop()
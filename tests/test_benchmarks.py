@@ -0,0 +1,41 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+test_benchmarks.py
+
+Smoke test of the client benchmark, on a tiny workload.
+"""
+
+import sys
+import json
+import subprocess
+from pathlib import Path
+
+BENCH_CLIENT = Path(__file__).parent.parent / "benchmarks" / "bench_client.py"
+
+TINY = ["--requests", "10", "--concurrency", "2", "--pings", "10", "--users", "50", "--room-size", "10"]
+
+def bench(*args):
+    """ Run bench_client.py, which starts its own mock API """
+    return subprocess.run(
+        [sys.executable, str(BENCH_CLIENT), *TINY, *args],
+        capture_output=True, text=True, timeout=120, check=True
+    ).stdout
+
+def test_bench_client_reports_and_compares(tmp_path):
+    output = tmp_path / "before.json"
+    bench("--output", str(output), "--label", "before")
+    report = json.loads(output.read_text())
+    assert report["label"] == "before"
+    results = report["results"]
+    for scenario in ("sync", "threads", "async"):
+        for name in ("get_channels", "get_channel", "active_ping"):
+            assert results[scenario][name]["requests"] == 10
+            assert results[scenario][name]["rps"] > 0
+    assert results["allocations"]["active_ping"]["calls"] == 10
+    assert results["active_ping_rss"]["pings"] == 10
+    assert set(results["decode"]) == {"get_channels", "get_channel", "get_followers", "search_users"}
+
+    lines = bench("--compare", str(output)).splitlines()
+    assert any(line.startswith("sync.get_channel.rps ") for line in lines)
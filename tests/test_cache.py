@@ -0,0 +1,83 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+test_cache.py
+
+ResponseCache and its use by the client.
+"""
+
+from clubhouse.cache import ResponseCache, MISS
+from clubhouse.clubhouse import Clubhouse
+
+KEY = ("get_profile", None, "[('user_id', 1)]")
+
+def test_ttl_expires(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("clubhouse.cache.time.monotonic", lambda: now[0])
+    cache = ResponseCache(ttls={"get_profile": 60})
+    cache.put(KEY, {"success": True})
+    now[0] += 59
+    assert cache.get(KEY) == {"success": True}
+    now[0] += 2
+    assert cache.get(KEY) is MISS
+    assert len(cache) == 0
+
+def test_lru_eviction():
+    cache = ResponseCache(maxsize=2)
+    keys = [("me", None, str(i)) for i in range(3)]
+    cache.put(keys[0], 0)
+    cache.put(keys[1], 1)
+    cache.get(keys[0])
+    cache.put(keys[2], 2)
+    assert cache.get(keys[1]) is MISS
+    assert cache.get(keys[0]) == 0
+    assert cache.stats()["evictions"] == 1
+
+def test_invalidate_by_tag():
+    cache = ResponseCache()
+    cache.put(KEY, 1, "user:1")
+    cache.put(("me", None, None), 2, "me")
+    cache.invalidate("user:1")
+    assert cache.get(KEY) is MISS
+    assert cache.get(("me", None, None)) == 2
+
+def test_put_after_invalidation_is_discarded():
+    cache = ResponseCache()
+    generation = cache.generation("user:1")
+    cache.invalidate("user:1")
+    cache.put(KEY, 1, "user:1", generation)
+    assert cache.get(KEY) is MISS
+    assert cache.stats()["discarded"] == 1
+    cache.put(KEY, 2, "user:1", cache.generation("user:1"))
+    assert cache.get(KEY) == 2
+
+def test_clear_changes_every_generation():
+    cache = ResponseCache()
+    generation = cache.generation("user:1")
+    cache.clear()
+    cache.put(KEY, 1, "user:1", generation)
+    assert cache.get(KEY) is MISS
+
+def test_client_caches_and_invalidates(scripted):
+    transport = scripted(lambda endpoint, body: (200, {"success": True, "endpoint": endpoint}))
+    client = Clubhouse("1", "token", "device", transport=transport, cache=True)
+    client.get_profile(2)
+    client.get_profile(2)
+    assert transport.calls("get_profile") == 1
+    client.follow(2)
+    client.get_profile(2)
+    assert transport.calls("get_profile") == 2
+
+def test_client_drops_response_invalidated_in_flight(scripted):
+    def handler(endpoint, body):
+        if endpoint == "get_profile":
+            # A follow() from another thread lands while get_profile is in flight
+            client.cache.invalidate("user:2")
+        return 200, {"success": True}
+    transport = scripted(handler)
+    client = Clubhouse("1", "token", "device", transport=transport, cache=True)
+    client.get_profile(2)
+    client.get_profile(2)
+    assert transport.calls("get_profile") == 2
+    assert client.cache.stats()["discarded"] == 2
@@ -0,0 +1,56 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+test_cancel.py
+
+Deadlines and cancel tokens of calls to the mock server.
+"""
+
+import time
+import threading
+import pytest
+from clubhouse.clubhouse import Clubhouse
+from clubhouse.cancel import CancelToken, Cancelled, DeadlineExceeded
+from clubhouse.timer import default_scheduler
+
+def test_deadline_aborts_a_slow_call(mock_server):
+    mock_server.latency = 3
+    client = Clubhouse("1", "token", "device")
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        with client.limits(deadline=0.3):
+            client.get_channels()
+    assert time.monotonic() - started < 1
+
+def test_cancel_token_aborts_a_call(mock_server):
+    mock_server.latency = 3
+    client = Clubhouse("1", "token", "device")
+    token = CancelToken()
+    threading.Timer(0.2, token.cancel).start()
+    started = time.monotonic()
+    with pytest.raises(Cancelled):
+        with client.limits(cancel=token):
+            client.get_channels()
+    assert time.monotonic() - started < 1
+    # The connection was dropped, not left to the next call
+    mock_server.latency = 0
+    assert client.get_channels()["success"]
+
+def test_deadlines_fire_while_the_shared_timer_is_busy(mock_server):
+    mock_server.latency = 3
+    timers = default_scheduler()
+    release = threading.Event()
+    handles = [timers.call_later(0, release.wait, 5) for _ in range(timers.workers)]
+    try:
+        time.sleep(0.1)
+        client = Clubhouse("1", "token", "device")
+        started = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            with client.limits(deadline=0.3):
+                client.get_channels()
+        assert time.monotonic() - started < 1
+    finally:
+        release.set()
+        for handle in handles:
+            handle.cancel()
@@ -0,0 +1,59 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+test_codec.py
+
+JSON codecs and how the client picks one.
+"""
+
+import sys
+import pytest
+from clubhouse import codec
+from clubhouse.clubhouse import Clubhouse
+
+PAYLOAD = {"success": True, "users": [{"user_id": 1, "name": "Zoë 日本", "bio": None, "url": "https://a/b"}]}
+
+def installed():
+    """ Names of the codecs whose library is installed """
+    names = []
+    for name in codec.CODECS:
+        try:
+            codec.get_codec(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+@pytest.mark.parametrize("name", installed())
+def test_codecs_encode_the_same_bytes(name):
+    chosen = codec.get_codec(name)
+    assert chosen.name == name
+    data = chosen.dumps(PAYLOAD)
+    assert data == codec.JSONCodec().dumps(PAYLOAD)
+    assert chosen.loads(data) == PAYLOAD
+    assert chosen.loads(data.decode("utf-8")) == PAYLOAD
+
+def test_fastest_installed_codec_is_the_default(monkeypatch):
+    monkeypatch.setattr(codec, "_default", None)
+    assert codec.get_codec().name == installed()[0]
+    assert codec.get_codec() is codec.get_codec()
+
+    # Without orjson and ujson, the standard json module is used
+    monkeypatch.setattr(codec, "_default", None)
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    monkeypatch.setitem(sys.modules, "ujson", None)
+    assert codec.get_codec().name == "json"
+    with pytest.raises(ImportError):
+        codec.get_codec("orjson")
+    with pytest.raises(ValueError):
+        codec.get_codec("simplejson")
+
+@pytest.mark.parametrize("name", installed())
+def test_client_uses_its_codec(name, scripted):
+    transport = scripted(lambda endpoint, body: (200, PAYLOAD))
+    client = Clubhouse("1", "token", "device", transport=transport, codec=codec.get_codec(name))
+    assert client.search_users("Zoë") == PAYLOAD
+    assert transport.requests == [("search_users", {
+        "query": "Zoë", "followers_only": False, "following_only": False, "cofollows_only": False
+    })]
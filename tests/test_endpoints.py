@@ -0,0 +1,191 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+# pylint: disable=redefined-outer-name
+
+"""
+test_endpoints.py
+
+Tests of the endpoint methods generated from endpoints.py.
+
+endpoints.json holds the signature of every endpoint method of the original
+hand-written client, and the request it sent for a fixed set of arguments.
+The generated methods of Clubhouse and AsyncClubhouse must keep the same
+signatures, checks and requests.
+"""
+
+import json
+import asyncio
+import inspect
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit
+import pytest
+from clubhouse.clubhouse import Clubhouse, AsyncClubhouse
+from clubhouse.endpoints import ENDPOINTS
+from clubhouse.transport import AsyncResponse
+
+SNAPSHOT = json.loads((Path(__file__).parent / "endpoints.json").read_text())
+
+NOT_IMPLEMENTED = ("update_club_rules", "update_club_topics", "get_events_for_user")
+
+
+class RecordingTransport:
+    """
+    RecordingTransport Class
+
+    Keeps (method, path?query, json body, file names) of every request
+    and answers {"success": true}.
+    """
+
+    errors = ()
+
+    def __init__(self):
+        self.requests = []
+        self.headers = []
+
+    def request(self, method, url, headers=None, files=None, data=None, **kwargs): # pylint: disable=unused-argument
+        parts = urlsplit(url)
+        path = parts.path[len(urlsplit(Clubhouse.API_URL).path):]
+        if parts.query:
+            path = f"{path}?{parts.query}"
+        self.requests.append([method, path, json.loads(data) if data else None, sorted(files) if files else None])
+        self.headers.append(headers)
+        return AsyncResponse(200, {}, b'{"success": true}')
+
+    def close(self):
+        pass
+
+
+class AsyncRecordingTransport(RecordingTransport):
+    """ RecordingTransport awaited by AsyncClubhouse """
+
+    async def request(self, *args, **kwargs): # pylint: disable=invalid-overridden-method
+        return super().request(*args, **kwargs)
+
+    async def close(self): # pylint: disable=invalid-overridden-method
+        pass
+
+
+def sample(param):
+    """ Value passed for the parameter when the snapshot was taken """
+    default = param.default
+    if default is inspect.Parameter.empty or default is None or isinstance(default, str):
+        return "2"
+    if isinstance(default, bool):
+        return not default
+    if isinstance(default, int):
+        return 2 if param.name == "handraise_permission" else default + 1
+    return ["3"]
+
+def arguments(method, full, photo):
+    """ Keyword arguments of the snapshot call """
+    if method.__name__ == "update_photo":
+        return {"photo_filename": photo}
+    params = list(inspect.signature(method).parameters.values())[1:]
+    return {
+        param.name: sample(param) for param in params
+        if full or param.default is inspect.Parameter.empty
+    }
+
+@pytest.fixture
+def photo(tmp_path):
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(b"\xff\xd8\xff")
+    return str(path)
+
+
+def test_every_endpoint_is_generated():
+    assert set(SNAPSHOT) == {endpoint.name for endpoint in ENDPOINTS}
+    for name in NOT_IMPLEMENTED:
+        with pytest.raises(NotImplementedError):
+            getattr(Clubhouse("1", "token", "device", transport=RecordingTransport()), name)()
+
+@pytest.mark.parametrize("name", sorted(SNAPSHOT))
+def test_endpoint_matches_snapshot(name, photo, capsys):
+    expected = SNAPSHOT[name]
+    method = getattr(Clubhouse, name)
+    assert str(inspect.signature(method)) == expected["signature"]
+    assert method.__doc__
+
+    anonymous = Clubhouse("1", "", "device", transport=RecordingTransport())
+    authenticated = Clubhouse("1", "token", "device", transport=RecordingTransport())
+    for client, refused in ((anonymous, expected["auth"]), (authenticated, expected["anonymous"])):
+        if refused:
+            with pytest.raises(Exception, match="Authenticat"):
+                getattr(client, name)(**arguments(method, True, photo))
+
+    client = anonymous if expected["anonymous"] else authenticated
+    for label in ("required", "all"):
+        assert getattr(client, name)(**arguments(method, label == "all", photo)) == {"success": True}
+        assert client.transport.requests.pop() == expected[label]
+    assert not client.transport.requests
+    assert ("NEVER TESTED" in capsys.readouterr().out) == expected["unstable"]
+
+def test_out_of_range_argument_is_not_sent():
+    client = Clubhouse("1", "token", "device", transport=RecordingTransport())
+    assert client.update_skintone(6) is False
+    assert client.change_handraise_settings("room", handraise_permission=0) is False
+    assert not client.transport.requests
+    assert client.update_skintone("5") == {"success": True}
+    assert client.transport.requests == [["POST", "/update_skintone", {"skintone": 5}, None]]
+
+@pytest.mark.parametrize("name", sorted(SNAPSHOT))
+def test_async_endpoint_matches_snapshot(name, photo, capsys):
+    expected = SNAPSHOT[name]
+    method = getattr(AsyncClubhouse, name)
+    assert str(inspect.signature(method)) == expected["signature"]
+
+    async def call(client, full):
+        return await getattr(client, name)(**arguments(method, full, photo))
+
+    anonymous = AsyncClubhouse("1", "", "device", transport=AsyncRecordingTransport())
+    authenticated = AsyncClubhouse("1", "token", "device", transport=AsyncRecordingTransport())
+    for client, refused in ((anonymous, expected["auth"]), (authenticated, expected["anonymous"])):
+        if refused:
+            with pytest.raises(Exception, match="Authenticat"):
+                asyncio.run(call(client, True))
+
+    client = anonymous if expected["anonymous"] else authenticated
+    for label in ("required", "all"):
+        assert asyncio.run(call(client, label == "all")) == {"success": True}
+        assert client.transport.requests.pop() == expected[label]
+    assert not client.transport.requests
+    assert ("NEVER TESTED" in capsys.readouterr().out) == expected["unstable"]
+
+def test_async_out_of_range_argument_is_not_sent():
+    client = AsyncClubhouse("1", "token", "device", transport=AsyncRecordingTransport())
+    assert asyncio.run(client.update_skintone(6)) is False
+    assert not client.transport.requests
+
+def test_headers_belong_to_the_instance(photo):
+    template = dict(Clubhouse.HEADERS)
+    first = Clubhouse("1", "first", "device-1", transport=RecordingTransport())
+    second = Clubhouse("2", "", "", transport=RecordingTransport())
+    assert Clubhouse.HEADERS == template
+    assert first.HEADERS["Authorization"] == "Token first"
+    assert "Authorization" not in second.HEADERS
+    assert second.HEADERS["CH-UserID"] == "2"
+    with pytest.raises(TypeError):
+        first.HEADERS["CH-UserID"] = "3"
+
+    first.get_channels()
+    first.update_photo(photo)
+    sent, upload = first.transport.headers
+    assert sent["CH-UserID"] == "1" and sent["CH-DeviceId"] == "DEVICE-1"
+    assert sent["Content-Type"].startswith("application/json")
+    # requests sets the multipart Content-Type of uploads
+    assert "Content-Type" not in upload and upload["Authorization"] == "Token first"
+
+def test_clients_on_threads_keep_their_accounts(mock_server): # pylint: disable=unused-argument
+    errors = []
+    def run(user_id):
+        client = Clubhouse(str(user_id), "token", f"device-{user_id}")
+        for _ in range(10):
+            if client.me()["user_profile"]["user_id"] != user_id:
+                errors.append(user_id)
+    threads = [threading.Thread(target=run, args=(user_id,)) for user_id in range(1, 9)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
@@ -0,0 +1,109 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+test_feed.py
+
+Channel listing kept up to date in the background.
+"""
+
+import time
+import asyncio
+import pytest
+from clubhouse.clubhouse import Clubhouse, AsyncClubhouse
+from clubhouse.feed import ChannelFeed, AsyncChannelFeed
+from clubhouse.timer import TimerScheduler
+
+def channel(name):
+    return {"channel": name, "topic": name, "num_speakers": 1, "is_social_mode": False, "is_private": False}
+
+class Hallway:
+    """ get_channels answers, switched by the tests """
+
+    def __init__(self):
+        self.listing = None
+
+    def __call__(self, endpoint, body):
+        if self.listing is None:
+            return 200, {"success": False, "error_message": "Not now"}
+        return 200, {"success": True, "channels": [channel(name) for name in self.listing]}
+
+
+def async_transport(scripted, handler):
+    """ Scripted transport awaited by AsyncClubhouse """
+    class AsyncScriptedTransport(scripted):
+        async def request(self, *args, **kwargs): # pylint: disable=invalid-overridden-method
+            return super().request(*args, **kwargs)
+
+        async def close(self): # pylint: disable=invalid-overridden-method
+            pass
+    return AsyncScriptedTransport(handler)
+
+
+@pytest.fixture
+def timers():
+    scheduler = TimerScheduler(workers=1)
+    yield scheduler
+    scheduler.shutdown()
+
+def test_first_failure_raises(scripted, timers): # pylint: disable=redefined-outer-name
+    hallway = Hallway()
+    client = Clubhouse("1", "token", "device", transport=scripted(hallway))
+    with ChannelFeed(client, interval=60, timers=timers) as feed:
+        with pytest.raises(Exception, match="Not now"):
+            feed.get()
+        hallway.listing = ["a", "b"]
+        assert [item["channel"] for item in feed.get()] == ["a", "b"]
+        hallway.listing = None
+        assert [item["channel"] for item in feed.refresh()] == ["a", "b"]
+        assert feed.stats()["last_error"] == "Not now"
+
+def test_changes_are_numbered(scripted, timers): # pylint: disable=redefined-outer-name
+    hallway = Hallway()
+    hallway.listing = ["a", "b"]
+    changes = []
+    client = Clubhouse("1", "token", "device", transport=scripted(hallway))
+    with ChannelFeed(client, interval=60, timers=timers, on_change=changes.append) as feed:
+        feed.refresh()
+        hallway.listing = ["b", "c"]
+        feed.refresh()
+        assert feed.version == 1
+        change, = feed.changes()
+        assert [item["channel"] for item in change["added"]] == ["c"]
+        assert [item["channel"] for item in change["removed"]] == ["a"]
+        assert changes == [change]
+        assert feed.changes(since=1) == []
+
+def test_async_first_failure_raises(scripted):
+    hallway = Hallway()
+    async def main():
+        async with AsyncClubhouse("1", "token", "device", transport=async_transport(scripted, hallway)) as client:
+            async with AsyncChannelFeed(client, interval=60) as feed:
+                with pytest.raises(Exception, match="Not now"):
+                    await feed.get()
+                hallway.listing = ["a"]
+                return await feed.get()
+    assert [item["channel"] for item in asyncio.run(main())] == ["a"]
+
+def test_first_get_waits_for_the_refresh_in_flight(scripted, timers): # pylint: disable=redefined-outer-name
+    hallway = Hallway()
+    hallway.listing = ["a"]
+    def slow(endpoint, body):
+        time.sleep(0.1)
+        return hallway(endpoint, body)
+    transport = scripted(slow)
+    client = Clubhouse("1", "token", "device", transport=transport, scheduler=True)
+    with ChannelFeed(client, interval=60, timers=timers) as feed:
+        assert [item["channel"] for item in feed.get()] == ["a"]
+    assert transport.calls("get_channels") == 1
+
+def test_async_first_get_waits_for_the_refresh_in_flight(scripted):
+    hallway = Hallway()
+    hallway.listing = ["a"]
+    transport = async_transport(scripted, hallway)
+    async def main():
+        async with AsyncClubhouse("1", "token", "device", transport=transport) as client:
+            async with AsyncChannelFeed(client, interval=60) as feed:
+                return await feed.get()
+    assert [item["channel"] for item in asyncio.run(main())] == ["a"]
+    assert transport.calls("get_channels") == 1
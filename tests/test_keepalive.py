@@ -0,0 +1,111 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+# pylint: disable=redefined-outer-name
+
+"""
+test_keepalive.py
+
+active_ping of the joined rooms by PingManager and AsyncPingManager.
+"""
+
+import time
+import asyncio
+import pytest
+from clubhouse.clubhouse import Clubhouse, AsyncClubhouse
+from clubhouse.keepalive import PingManager, AsyncPingManager
+from clubhouse.timer import TimerScheduler
+
+ROOMS = [f"mock{channel_id:04d}" for channel_id in range(1, 5)]
+
+@pytest.fixture
+def timers():
+    scheduler = TimerScheduler(workers=1)
+    yield scheduler
+    scheduler.shutdown()
+
+def pinged(mock_server):
+    """ Number of active_ping calls answered by the mock API """
+    return sum(1 for entry in list(mock_server.log) if entry["endpoint"] == "active_ping")
+
+def test_rooms_are_pinged_in_their_slots(mock_server, timers):
+    client = Clubhouse("1", "token", "device")
+    pings = PingManager(client, interval=0.4, slots=2, skip_within=0, timers=timers)
+    for channel in ROOMS:
+        pings.add(channel)
+    pings.add(ROOMS[0])
+    assert len(pings) == 4 and ROOMS[0] in pings
+    assert [len(slot) for slot in pings.slots] == [2, 2]
+    time.sleep(1)
+    stats = pings.stats()
+    pings.close()
+    assert all(room["pings"] >= 2 and room["failures"] == 0 for room in stats.values())
+    assert not pings.stats()
+
+    # Closed: no more pings, once those in flight are answered
+    time.sleep(0.2)
+    count = pinged(mock_server)
+    time.sleep(0.5)
+    assert pinged(mock_server) == count
+
+def test_stats_count_pings_and_failures(scripted, timers):
+    def handler(_endpoint, body):
+        if body["channel"] == "down":
+            return 500, {"success": False, "error_message": "Room is down"}
+        return 200, {"success": True}
+    client = Clubhouse("1", "token", "device", transport=scripted(handler))
+    pings = PingManager(client, interval=0.1, slots=1, skip_within=0, timers=timers)
+    pings.add("up")
+    pings.add("down")
+    time.sleep(0.35)
+    stats = pings.stats()
+    pings.close()
+    assert stats["up"]["pings"] >= 2 and stats["up"]["failures"] == 0
+    assert stats["up"]["success_rate"] == 1 and stats["up"]["seconds_since_seen"] < 0.3
+    assert stats["up"]["latency"]["count"] == stats["up"]["pings"]
+    assert stats["down"]["pings"] >= 2 and stats["down"]["success_rate"] == 0
+    assert stats["down"]["last_error"] == "Room is down"
+    assert stats["down"]["seconds_since_seen"] is None
+
+def test_recent_requests_skip_the_ping(mock_server, timers):
+    client = Clubhouse("1", "token", "device")
+    busy, quiet = ROOMS[:2]
+    pings = PingManager(client, interval=0.1, slots=1, skip_within=10, timers=timers)
+    pings.add(busy)
+    pings.add(quiet)
+    client.audience_reply(busy)
+    time.sleep(0.35)
+    stats = pings.stats()
+    pings.close()
+    assert stats[busy]["pings"] == 0 and stats[busy]["skipped"] >= 2
+    # After its first ping, the quiet room is skipped as well
+    assert stats[quiet]["pings"] == 1 and stats[quiet]["skipped"] >= 1
+    assert pinged(mock_server) == 1
+    assert not client.hooks["response"]
+
+def test_removed_room_is_not_pinged(mock_server, timers):
+    client = Clubhouse("1", "token", "device")
+    sent = []
+    client.add_hook("request", lambda record: sent.append(record.channel))
+    pings = PingManager(client, interval=0.1, slots=1, skip_within=0, timers=timers)
+    pings.add(ROOMS[0])
+    pings.add(ROOMS[1])
+    pings.remove(ROOMS[1])
+    time.sleep(0.35)
+    assert list(pings.stats()) == [ROOMS[0]]
+    pings.close()
+    assert len(sent) >= 2 and set(sent) == {ROOMS[0]}
+
+def test_async_rooms_are_pinged(mock_server):
+    async def main():
+        async with AsyncClubhouse("1", "token", "device") as client:
+            pings = AsyncPingManager(client, interval=0.2, slots=2, skip_within=0)
+            for channel in ROOMS:
+                pings.add(channel)
+            await asyncio.sleep(0.7)
+            stats = pings.stats()
+            pings.close()
+            return stats
+    stats = asyncio.run(main())
+    assert set(stats) == set(ROOMS)
+    assert all(room["pings"] >= 2 and room["failures"] == 0 for room in stats.values())
+    assert pinged(mock_server) >= 8
@@ -0,0 +1,66 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+test_mockserver.py
+
+The local mock API: endpoints, room events, injected latency and errors.
+"""
+
+import json
+import time
+import requests
+from clubhouse.clubhouse import Clubhouse
+from clubhouse.endpoints import ENDPOINTS
+from clubhouse.mockserver import MockServer, MockData
+
+def test_every_endpoint_is_served(mock_server):
+    with requests.Session() as session:
+        for endpoint in ENDPOINTS:
+            resp = session.request(endpoint.method, f"{mock_server.api_url}/{endpoint.path}", json={})
+            assert resp.status_code == 200, endpoint.path
+            assert "success" in resp.json()
+        assert session.post(f"{mock_server.api_url}/not_an_endpoint").status_code == 404
+
+def test_room_changes_are_published(mock_server):
+    client = Clubhouse("500", "token", "device")
+    subscribe = f"{mock_server.url}/v2/subscribe/key/channel_all.mock0002/0"
+    timetoken = requests.get(subscribe).json()["t"]["t"]
+
+    channel = client.join_channel("mock0002")
+    assert channel["success"] and channel["pubnub_origin"] == mock_server.url
+    assert 500 in [user["user_id"] for user in client.get_channel("mock0002")["users"]]
+    client.leave_channel("mock0002")
+
+    messages = requests.get(subscribe, params={"tt": timetoken}).json()["m"]
+    assert [message["d"]["action"] for message in messages] == ["join_channel", "leave_channel"]
+    assert messages[0]["d"]["user_profile"]["user_id"] == 500
+
+def test_subscribe_waits_for_messages(mock_server):
+    mock_server.subscribe_timeout = 0.2
+    subscribe = f"{mock_server.url}/v2/subscribe/key/channel_all.mock0003/0"
+    timetoken = requests.get(subscribe).json()["t"]["t"]
+    started = time.monotonic()
+    assert requests.get(subscribe, params={"tt": timetoken}).json()["m"] == []
+    assert time.monotonic() - started >= 0.2
+
+def test_latency_errors_and_log(tmp_path):
+    log_file = tmp_path / "requests.jsonl"
+    server = MockServer(
+        MockData(num_users=10, num_channels=1, users_per_channel=5),
+        latency=0.1, error_rate=1.0, error_statuses=(429,), retry_after=2, log_file=str(log_file)
+    ).start()
+    try:
+        started = time.monotonic()
+        resp = requests.get(f"{server.api_url}/get_channels")
+        assert time.monotonic() - started >= 0.1
+        assert resp.status_code == 429
+        assert resp.headers["Retry-After"] == "2"
+    finally:
+        server.stop()
+    entries = [json.loads(line) for line in log_file.read_text().splitlines()]
+    assert [(entry["endpoint"], entry["status"]) for entry in entries] == [("get_channels", 429)]
+
+def test_same_seed_same_data():
+    assert MockData(num_users=50, seed=3).users == MockData(num_users=50, seed=3).users
+    assert MockData(num_users=50, seed=3).users != MockData(num_users=50, seed=4).users
@@ -0,0 +1,62 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+# pylint: disable=protected-access
+
+"""
+test_models.py
+
+Compact models of the API responses.
+"""
+
+import pytest
+from clubhouse.clubhouse import Clubhouse
+from clubhouse.models import User, Club, Channel, decode
+
+def test_responses_decode_to_the_same_payload(mock_server): # pylint: disable=unused-argument
+    plain = Clubhouse("1", "token", "device")
+    compact = Clubhouse("1", "token", "device", models=True)
+    for name, args in (("get_channel", ("mock0001",)), ("get_channels", ()), ("me", ()), ("get_club", (1,))):
+        expected = getattr(plain, name)(*args)
+        result = getattr(compact, name)(*args)
+        assert result == expected
+
+    channel = compact.get_channel("mock0001")
+    assert isinstance(channel, Channel)
+    assert channel.to_dict() == plain.get_channel("mock0001")
+    assert all(isinstance(user, User) for user in channel.users)
+    assert channel.users[0].username == channel["users"][0]["username"]
+    assert all(isinstance(item, Channel) for item in compact.get_channels()["channels"])
+    assert isinstance(compact.me()["user_profile"], User)
+    assert isinstance(compact.get_club(1)["club"], Club)
+
+def test_model_reads_like_a_dict():
+    user = User({"user_id": 1, "username": "one", "pronouns": "they/them"})
+    assert not hasattr(user, "__dict__")
+    assert user.name is None
+    assert "name" not in user and "username" in user and "pronouns" in user
+    with pytest.raises(KeyError):
+        user["name"] # pylint: disable=pointless-statement
+    with pytest.raises(AttributeError):
+        user.unknown # pylint: disable=pointless-statement,no-member
+    assert user.get("name", "none") == "none"
+    assert user.pronouns == user["pronouns"] == "they/them"
+    assert user.keys() == ["user_id", "username", "pronouns"]
+    assert len(user) == 3 and list(user) == user.keys()
+    assert user == {"user_id": 1, "username": "one", "pronouns": "they/them"}
+
+    clone = user.copy()
+    clone.update({"username": "uno", "bio": "hi"})
+    assert user.username == "one" and "bio" not in user
+    assert clone.to_dict() == {"user_id": 1, "username": "uno", "pronouns": "they/them", "bio": "hi"}
+
+def test_rare_nested_fields_decode_on_access():
+    user = User({"user_id": 1, "clubs": [{"club_id": 2, "name": "Two"}], "invited_by_user_profile": None})
+    assert user._rest["clubs"] == [{"club_id": 2, "name": "Two"}]
+    assert isinstance(user.clubs[0], Club) and user.clubs[0].name == "Two"
+    assert user._rest["clubs"][0] is user.clubs[0]
+    assert user.invited_by_user_profile is None
+
+def test_decode_leaves_other_payloads():
+    assert decode("get_channel", None) is None
+    assert decode("get_settings", {"success": True, "notifications": [1]}) == {"success": True, "notifications": [1]}
+    assert decode("get_profile", {"user_profile": None})["user_profile"] is None
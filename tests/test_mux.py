@@ -0,0 +1,78 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+test_mux.py
+
+EventQueue and Selector.
+"""
+
+import time
+import threading
+from queue import Empty
+import pytest
+from clubhouse.mux import EventQueue, Selector
+
+def later(delay, func, *args):
+    timer = threading.Timer(delay, func, args)
+    timer.start()
+    return timer
+
+def test_queue_is_fifo_with_timeouts():
+    queue = EventQueue("shell")
+    queue.put(1)
+    queue.put(2)
+    assert queue.qsize() == 2
+    assert queue.get() == 1
+    assert queue.get_nowait() == 2
+    with pytest.raises(Empty):
+        queue.get_nowait()
+    started = time.monotonic()
+    with pytest.raises(Empty):
+        queue.get(timeout=0.05)
+    assert time.monotonic() - started >= 0.05
+
+def test_selector_reports_the_queue():
+    shell, room = EventQueue("shell"), EventQueue("room")
+    with Selector(shell, room) as selector:
+        room.put("joined")
+        assert selector.select(0) == (room, "joined")
+        with pytest.raises(Empty):
+            selector.select(0.02)
+
+def test_selector_serves_queues_in_turn():
+    busy, quiet = EventQueue("busy"), EventQueue("quiet")
+    for i in range(5):
+        busy.put(i)
+    quiet.put("a")
+    quiet.put("b")
+    with Selector(busy, quiet) as selector:
+        order = [selector.select(0)[0].name for _ in range(5)]
+    assert order == ["busy", "quiet", "busy", "quiet", "busy"]
+
+def test_put_from_another_thread_wakes_the_selector():
+    shell, room = EventQueue("shell"), EventQueue("room")
+    with Selector(shell, room) as selector:
+        later(0.05, shell.put, "leave")
+        started = time.monotonic()
+        assert selector.select(2) == (shell, "leave")
+        assert time.monotonic() - started < 0.5
+
+def test_close_ends_the_loop_and_keeps_items():
+    queue = EventQueue("room")
+    selector = Selector(queue)
+    seen = []
+    def consume():
+        for _, item in selector:
+            seen.append(item)
+    thread = threading.Thread(target=consume)
+    thread.start()
+    queue.put(1)
+    time.sleep(0.05)
+    selector.close()
+    thread.join(1)
+    assert not thread.is_alive()
+    assert seen == [1]
+    queue.put(2)
+    assert selector.select(0) is None
+    assert queue.get_nowait() == 2
@@ -0,0 +1,66 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+test_pagination.py
+
+Iterators over paged endpoints, against the mock API.
+"""
+
+import time
+import asyncio
+import pytest
+from clubhouse.clubhouse import Clubhouse, AsyncClubhouse
+
+def pages(mock_server, endpoint, expected, timeout=5):
+    """ Page numbers requested from the endpoint, in order, once they match
+    `expected` or after `timeout`. Requests are logged once answered.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        requested = [
+            int(entry["path"].split("page=")[-1]) for entry in list(mock_server.log)
+            if entry["endpoint"] == endpoint
+        ]
+        if requested == expected or time.monotonic() > deadline:
+            return requested
+        time.sleep(0.01)
+
+def test_walks_every_page(mock_server):
+    client = Clubhouse("1", "token", "device")
+    users = list(client.paginate("get_followers", 1))
+    assert [user["user_id"] for user in users] == list(range(1, 201))
+    assert pages(mock_server, "get_followers", [1, 2, 3, 4]) == [1, 2, 3, 4]
+
+def test_max_items_stops_prefetching(mock_server):
+    client = Clubhouse("1", "token", "device")
+    users = list(client.paginate("get_followers", 1, page_size=25, max_items=60, page=2))
+    assert [user["user_id"] for user in users] == list(range(26, 86))
+    assert pages(mock_server, "get_followers", [2, 3, 4]) == [2, 3, 4]
+
+def test_next_page_is_fetched_while_iterating(mock_server):
+    client = Clubhouse("1", "token", "device")
+    users = client.paginate("get_club_members", 1)
+    assert next(users)["user_id"] == 1
+    assert pages(mock_server, "get_club_members", [1, 2]) == [1, 2]
+    users.close()
+
+def test_errors_and_unpaged_endpoints(scripted):
+    client = Clubhouse("1", "token", "device", transport=scripted(
+        lambda endpoint, body: (200, {"success": False, "error_message": "Nope"})
+    ))
+    with pytest.raises(Exception, match="Nope"):
+        list(client.paginate("get_followers", 1))
+    with pytest.raises(ValueError):
+        list(client.paginate("get_channels"))
+
+def test_async_walks_every_page(mock_server):
+    async def main():
+        async with AsyncClubhouse("1", "token", "device") as client:
+            everyone = [user["user_id"] async for user in client.paginate("get_following", 1)]
+            first = [user["user_id"] async for user in client.paginate("get_following", 1, max_items=70)]
+            return everyone, first
+    everyone, first = asyncio.run(main())
+    assert everyone == list(range(1, 201))
+    assert first == list(range(1, 71))
+    assert pages(mock_server, "get_following", [1, 2, 3, 4, 1, 2]) == [1, 2, 3, 4, 1, 2]
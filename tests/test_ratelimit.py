@@ -0,0 +1,209 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+test_ratelimit.py
+
+Rate budgets, retries and priority lanes of the scheduler.
+"""
+
+import time
+import asyncio
+import threading
+import pytest
+import requests
+from clubhouse.clubhouse import Clubhouse, AsyncClubhouse
+from clubhouse.endpoints import ENDPOINTS_BY_NAME
+from clubhouse.ratelimit import TokenBucket, RetryPolicy, Scheduler, Lane, RequestFailed, parse_retry_after
+from clubhouse.cancel import CancelToken, Cancelled
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def scheduler(**kwargs):
+    """ Scheduler recording its waits instead of sleeping """
+    slept = []
+    return Scheduler(RetryPolicy(**kwargs), sleep=slept.append), slept
+
+def test_bucket_bursts_then_paces():
+    clock = Clock()
+    bucket = TokenBucket(2, 3, clock=clock)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve() == pytest.approx(0.5)
+    clock.now += 1.5
+    assert bucket.reserve() == 0.0
+
+def test_bucket_throttles_and_recovers():
+    clock = Clock()
+    bucket = TokenBucket(8, 8, clock=clock)
+    bucket.throttle(pause=2)
+    assert bucket.rate == 4
+    assert bucket.reserve() == pytest.approx(2)
+    for _ in range(3):
+        bucket.recover()
+    assert bucket.rate == pytest.approx(6.4)
+    for _ in range(10):
+        bucket.recover()
+    assert bucket.rate == 8
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert parse_retry_after("soon") is None
+
+def test_only_safe_statuses_retry_writes():
+    policy = RetryPolicy()
+    assert policy.retries_status(ENDPOINTS_BY_NAME["get_channel"], 500)
+    assert not policy.retries_status(ENDPOINTS_BY_NAME["follow"], 500)
+    assert policy.retries_status(ENDPOINTS_BY_NAME["follow"], 503)
+
+def test_retries_5xx_then_succeeds(scripted):
+    statuses = [503, 502, 200]
+    transport = scripted(lambda endpoint, body: (statuses.pop(0), {"success": True}))
+    sched, slept = scheduler()
+    client = Clubhouse("1", "token", "device", transport=transport, scheduler=sched)
+    assert client.get_channel("abc")["success"]
+    assert transport.calls("get_channel") == 3
+    assert len(slept) == 2
+    assert sched.stats()["retries"] == 2
+
+def test_gives_up_with_request_failed(scripted):
+    transport = scripted(lambda endpoint, body: (500, {"success": False}))
+    sched, _ = scheduler(retries=2)
+    client = Clubhouse("1", "token", "device", transport=transport, scheduler=sched)
+    with pytest.raises(RequestFailed) as failed:
+        client.get_channel("abc")
+    assert (failed.value.endpoint, failed.value.status, failed.value.attempts) == ("get_channel", 500, 3)
+    with pytest.raises(RequestFailed) as failed:
+        client.follow(2)
+    assert failed.value.attempts == 1
+    assert transport.calls("follow") == 1
+
+def test_429_honors_retry_after_and_throttles(scripted):
+    responses = [(429, ({"success": False}, {"Retry-After": "7"})), (200, {"success": True})]
+    transport = scripted(lambda endpoint, body: responses.pop(0))
+    sched, slept = scheduler()
+    client = Clubhouse("1", "token", "device", transport=transport, scheduler=sched)
+    client.get_channel("abc")
+    assert slept[0] == 7
+    assert sched.stats()["throttled"] == 1
+    assert sched.buckets["read"].rate < Scheduler.DEFAULT_RATES["read"][0]
+
+def test_network_errors_retry_reads_only(scripted):
+    failures = [1]
+    def handler(endpoint, body):
+        if failures:
+            failures.pop()
+            raise requests.ConnectionError("reset")
+        return 200, {"success": True}
+    transport = scripted(handler)
+    sched, _ = scheduler()
+    client = Clubhouse("1", "token", "device", transport=transport, scheduler=sched)
+    assert client.get_channel("abc")["success"]
+    failures.append(1)
+    with pytest.raises(requests.ConnectionError):
+        client.audience_reply("abc")
+
+def test_without_scheduler_errors_are_returned(scripted):
+    transport = scripted(lambda endpoint, body: (503, {"success": False}))
+    client = Clubhouse("1", "token", "device", transport=transport)
+    assert client.scheduler is None
+    assert client.get_channel("abc") == {"success": False}
+    assert transport.calls("get_channel") == 1
+
+def test_lane_caps_concurrency():
+    lane = Lane("background", 1)
+    lane.acquire()
+    acquired = threading.Event()
+    def second():
+        lane.acquire()
+        acquired.set()
+    thread = threading.Thread(target=second)
+    thread.start()
+    assert not acquired.wait(0.1)
+    assert lane.stats()["waiting"] == 1
+    lane.release()
+    assert acquired.wait(1)
+    lane.release()
+    thread.join()
+
+def test_cancelled_while_waiting_for_a_lane():
+    lane = Lane("background", 1)
+    lane.acquire()
+    token = CancelToken()
+    threading.Timer(0.1, token.cancel).start()
+    started = time.monotonic()
+    with pytest.raises(Cancelled):
+        lane.acquire(token)
+    assert time.monotonic() - started < 1
+    lane.release()
+    assert lane.stats()["active"] == 0
+
+def test_interactive_calls_skip_the_background_queue(scripted):
+    release = threading.Event()
+    def handler(endpoint, body):
+        if endpoint == "get_profile":
+            release.wait(2)
+        return 200, {"success": True}
+    transport = scripted(handler)
+    client = Clubhouse("1", "token", "device", transport=transport, scheduler=Scheduler(lanes={"background": 1}))
+    def background(user_id):
+        with client.limits(priority="background"):
+            client.get_profile(user_id)
+    threads = [threading.Thread(target=background, args=(user_id,)) for user_id in (2, 3)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    started = time.monotonic()
+    client.get_channel("abc")
+    assert time.monotonic() - started < 0.5
+    assert client.scheduler.lanes["background"].stats()["waiting"] == 1
+    release.set()
+    for thread in threads:
+        thread.join()
+
+def test_calls_are_put_in_their_lane():
+    lanes = Scheduler()
+    assert lanes.lane(ENDPOINTS_BY_NAME["active_ping"]).name == "keepalive"
+    assert lanes.lane(ENDPOINTS_BY_NAME["get_channel"]).name == "interactive"
+    assert lanes.lane(ENDPOINTS_BY_NAME["get_channel"], "background").name == "background"
+    with pytest.raises(Exception, match="Unknown priority"):
+        lanes.lane(ENDPOINTS_BY_NAME["get_channel"], "urgent")
+
+def test_async_lane_serves_waiters_in_order():
+    async def main():
+        lane = Lane("background", 1)
+        order = []
+        async def call(number):
+            await lane.aacquire()
+            order.append(number)
+            await asyncio.sleep(0.01)
+            lane.release()
+        await asyncio.gather(*(call(number) for number in range(5)))
+        return order, lane.stats()
+    order, stats = asyncio.run(main())
+    assert order == [0, 1, 2, 3, 4]
+    assert stats["active"] == 0 and stats["waiting"] == 0
+
+def test_async_interactive_call_skips_a_background_sweep(mock_server):
+    mock_server.latency = 0.2
+    async def main():
+        scheduler = Scheduler(rates={name: None for name in Scheduler.DEFAULT_RATES}, lanes={"background": 2})
+        async with AsyncClubhouse("1", "token", "device", pool_size=4, scheduler=scheduler, coalesce=False) as client:
+            with client.limits(priority="background"):
+                sweep = [asyncio.ensure_future(client.get_profile(user_id)) for user_id in range(1, 21)]
+            await asyncio.sleep(0.05)
+            background = scheduler.lanes["background"].stats()
+            started = time.monotonic()
+            assert (await client.get_channel("mock0001"))["success"]
+            elapsed = time.monotonic() - started
+            await asyncio.gather(*sweep)
+            return background, elapsed
+    background, elapsed = asyncio.run(main())
+    assert background["active"] == 2 and background["waiting"] == 18
+    assert elapsed < 0.6
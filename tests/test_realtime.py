@@ -0,0 +1,82 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+test_realtime.py
+
+Room events over the PubNub subscribe API of the mock server.
+"""
+
+import time
+import asyncio
+from clubhouse.clubhouse import Clubhouse, AsyncClubhouse
+from clubhouse.room import RoomState
+from clubhouse.realtime import RoomEventStream, AsyncRoomEventStream
+from clubhouse.cancel import CancelToken
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+def join(user_id):
+    client = Clubhouse(str(user_id), "token", "device")
+    channel = client.get_channels()["channels"][0]["channel"]
+    return client, channel, client.join_channel(channel)
+
+def test_events_update_the_room(mock_server):
+    client, channel, channel_info = join(1)
+    room = RoomState(channel, channel_info)
+    events = []
+    stream = RoomEventStream(client, room, channel_info, on_event=events.append).start()
+    try:
+        assert wait_for(lambda: stream.subscriber.timetoken != "0")
+        other = Clubhouse("2", "token", "device")
+        other.join_channel(channel)
+        assert wait_for(lambda: 2 in room)
+        assert events[0]["action"] == "join_channel"
+    finally:
+        stream.stop()
+
+def test_stop_aborts_the_long_poll(mock_server):
+    mock_server.subscribe_timeout = 60
+    client, channel, channel_info = join(1)
+    stream = RoomEventStream(client, RoomState(channel, channel_info), channel_info).start()
+    assert wait_for(lambda: stream.subscriber.timetoken != "0")
+    time.sleep(0.1)
+    started = time.monotonic()
+    stream.stop()
+    assert time.monotonic() - started < 2
+    assert not stream._thread.is_alive() # pylint: disable=protected-access
+    assert not stream.running
+
+def test_stream_ends_with_the_client_token(mock_server):
+    mock_server.subscribe_timeout = 60
+    client, channel, channel_info = join(1)
+    client.cancel = CancelToken()
+    stream = RoomEventStream(client, RoomState(channel, channel_info), channel_info).start()
+    assert wait_for(lambda: stream.subscriber.timetoken != "0")
+    time.sleep(0.1)
+    client.cancel.cancel()
+    stream._thread.join(2) # pylint: disable=protected-access
+    assert not stream._thread.is_alive() # pylint: disable=protected-access
+    assert not stream.running
+    stream.stop()
+
+def test_async_stream_ends_with_the_client_token(mock_server):
+    mock_server.subscribe_timeout = 60
+    async def main():
+        async with AsyncClubhouse("1", "token", "device", cancel=CancelToken()) as client:
+            channel = (await client.get_channels())["channels"][0]["channel"]
+            channel_info = await client.join_channel(channel)
+            stream = AsyncRoomEventStream(client, RoomState(channel, channel_info), channel_info).start()
+            await asyncio.sleep(0.2)
+            client.cancel.cancel()
+            await asyncio.wait_for(asyncio.shield(stream._task), 2) # pylint: disable=protected-access
+            running = stream.running
+            await stream.stop()
+            return running
+    assert asyncio.run(main()) is False
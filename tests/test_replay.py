@@ -0,0 +1,138 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+test_replay.py
+
+Recording the traffic of a client against the mock API, and replaying it
+without any network.
+"""
+
+import sys
+import json
+import time
+import asyncio
+import subprocess
+from pathlib import Path
+import pytest
+import requests
+from clubhouse.clubhouse import Clubhouse, AsyncClubhouse
+from clubhouse.transport import HTTPTransport, AsyncTransport
+from clubhouse.replay import RecordingTransport, AsyncRecordingTransport, ReplayTransport, AsyncReplayTransport
+
+# Nothing listens there: a replay must not touch the network
+NOWHERE = "http://127.0.0.1:9/api"
+
+def browse(client):
+    """ A few calls of a user in the hallway, then in a room """
+    return [
+        client.get_channels(),
+        client.join_channel("mock0001"),
+        client.get_channel("mock0001"),
+        client.get_profile(3),
+        client.leave_channel("mock0001"),
+    ]
+
+def test_replay_serves_the_recorded_session(mock_server, monkeypatch, tmp_path):
+    capture = tmp_path / "session.jsonl"
+    transport = RecordingTransport(HTTPTransport(), str(capture))
+    with Clubhouse("1", "token", "device", transport=transport) as client:
+        recorded = browse(client)
+    entries = [json.loads(line) for line in capture.read_text().splitlines()]
+    assert [entry["endpoint"] for entry in entries] == [
+        "get_channels", "join_channel", "get_channel", "get_profile", "leave_channel"
+    ]
+    assert entries[3]["path"] == "/api/get_profile"
+    assert json.loads(entries[3]["body"]) == {"user_id": 3}
+    assert all(entry["status"] == 200 for entry in entries)
+
+    monkeypatch.setattr(Clubhouse, "API_URL", NOWHERE)
+    mock_server.stop()
+    replay = ReplayTransport(str(capture))
+    client = Clubhouse("1", "token", "device", transport=replay)
+    assert browse(client) == recorded
+    assert browse(client) == recorded
+    assert replay.stats() == {"recorded": 5, "served": 10, "missed": 0}
+
+def test_responses_of_a_request_are_served_in_order(mock_server, tmp_path):
+    capture = tmp_path / "session.jsonl"
+    with Clubhouse("1", "token", "device", transport=RecordingTransport(HTTPTransport(), str(capture))) as client:
+        before = client.get_channel("mock0002")
+        Clubhouse("700", "token", "device").join_channel("mock0002")
+        after = client.get_channel("mock0002")
+    assert before != after
+
+    client = Clubhouse("1", "token", "device", transport=ReplayTransport(str(capture)))
+    assert [client.get_channel("mock0002") for _ in range(3)] == [before, after, before]
+
+    replay = ReplayTransport(str(capture), loop=False)
+    client = Clubhouse("1", "token", "device", transport=replay)
+    client.get_channel("mock0002")
+    client.get_channel("mock0002")
+    with pytest.raises(Exception, match="No recorded response"):
+        client.get_channel("mock0002")
+    with pytest.raises(Exception, match="No recorded response"):
+        client.get_channel("mock0003")
+    assert replay.stats()["missed"] == 2
+
+def test_body_matching(tmp_path):
+    capture = tmp_path / "session.jsonl"
+    capture.write_text(json.dumps({
+        "method": "POST", "path": "/api/get_profile", "endpoint": "get_profile", "body": '{"user_id":3}',
+        "status": 200, "latency": 0.01, "headers": {}, "payload": '{"success": true}',
+    }) + "\n")
+    client = Clubhouse("1", "token", "device", transport=ReplayTransport(str(capture)))
+    with pytest.raises(Exception, match="No recorded response"):
+        client.get_profile(4)
+    client = Clubhouse("1", "token", "device", transport=ReplayTransport(str(capture), match_body=False))
+    assert client.get_profile(4) == {"success": True}
+
+def test_network_errors_are_replayed(scripted, tmp_path):
+    def handler(_endpoint, _body):
+        raise requests.ConnectionError("Connection refused")
+    capture = tmp_path / "session.jsonl"
+    with Clubhouse("1", "token", "device", transport=RecordingTransport(scripted(handler), str(capture))) as client:
+        with pytest.raises(requests.ConnectionError):
+            client.get_channels()
+    assert "ConnectionError: Connection refused" in json.loads(capture.read_text())["error"]
+
+    client = Clubhouse("1", "token", "device", transport=ReplayTransport(str(capture)))
+    with pytest.raises(requests.ConnectionError, match="Connection refused"):
+        client.get_channels()
+
+def test_replay_keeps_the_recorded_timing(mock_server, tmp_path):
+    mock_server.latency = 0.2
+    capture = tmp_path / "session.jsonl"
+    with Clubhouse("1", "token", "device", transport=RecordingTransport(HTTPTransport(), str(capture))) as client:
+        client.get_channels()
+    for timing, speed, least, most in ((False, 1, 0, 0.1), (True, 1, 0.2, 0.5), (True, 4, 0.05, 0.15)):
+        client = Clubhouse("1", "token", "device", transport=ReplayTransport(str(capture), timing=timing, speed=speed))
+        started = time.monotonic()
+        client.get_channels()
+        assert least <= time.monotonic() - started < most
+
+def test_async_record_and_replay(mock_server, monkeypatch, tmp_path):
+    capture = tmp_path / "session.jsonl"
+    async def record():
+        transport = AsyncRecordingTransport(AsyncTransport(), str(capture))
+        async with AsyncClubhouse("1", "token", "device", transport=transport) as client:
+            return await asyncio.gather(client.get_channels(), client.get_profile(3))
+    recorded = asyncio.run(record())
+
+    monkeypatch.setattr(Clubhouse, "API_URL", NOWHERE)
+    mock_server.stop()
+    async def replay():
+        async with AsyncClubhouse("1", "token", "device", transport=AsyncReplayTransport(str(capture))) as client:
+            return await asyncio.gather(client.get_channels(), client.get_profile(3))
+    assert asyncio.run(replay()) == recorded
+
+def test_bench_replay_smoke(tmp_path):
+    bench = Path(__file__).parent.parent / "benchmarks" / "bench_replay.py"
+    capture = tmp_path / "session.jsonl"
+    result = subprocess.run(
+        [sys.executable, str(bench), "--record", str(capture), "--rounds", "3", "--users", "50", "--room-size", "10"],
+        capture_output=True, text=True, timeout=120, check=True
+    )
+    report = json.loads(result.stdout)
+    assert report["replay"]["missed"] == 0
+    assert report["calls"] > 0 and report["cpu_us_per_call"] > 0
@@ -0,0 +1,63 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+test_room.py
+
+RoomState loaded from payloads and kept up to date with events.
+"""
+
+import copy
+from clubhouse.room import RoomState
+from clubhouse.models import decode
+
+def user(user_id, **flags):
+    return {"user_id": user_id, "name": f"user{user_id}", "is_speaker": False, "is_moderator": False,
+            "is_invited_as_speaker": False, **flags}
+
+PAYLOAD = {"success": True, "users": [user(1, is_speaker=True, is_moderator=True), user(2), user(3)]}
+
+def test_update_indexes_flags():
+    room = RoomState("abc", PAYLOAD)
+    assert len(room) == 3
+    assert room.speakers == {1}
+    assert room.moderators == {1}
+    joined, left, changed = room.update({"users": [user(1, is_speaker=True, is_moderator=True), user(2, is_speaker=True),
+                                                   user(4)]})
+    assert (joined, left, changed) == ({4}, {3}, {2})
+    assert room.speakers == {1, 2}
+
+def test_apply_events():
+    room = RoomState("abc", PAYLOAD)
+    assert room.apply({"action": "join_channel", "user_profile": user(5)}) == "join_channel"
+    assert 5 in room
+    assert room.apply({"action": "raise_hands", "user_id": 5}) == "raise_hands"
+    assert room.hands_raised == {5}
+    room.apply({"action": "add_speaker", "user_id": 5})
+    assert 5 in room.speakers and not room.hands_raised
+    room.apply({"action": "make_moderator", "user_id": 2})
+    assert room.moderators == {1, 2}
+    room.apply({"action": "remove_speaker", "user_id": 1})
+    assert 1 not in room.speakers and 1 not in room.moderators
+    room.apply({"action": "leave_channel", "user_id": 5})
+    assert 5 not in room and 5 not in room.speakers
+    assert room.apply({"action": "add_speaker", "user_id": 99}) is None
+    room.apply({"action": "end_channel"})
+    assert room.ended
+
+def test_events_leave_the_payload_untouched():
+    payload = copy.deepcopy(PAYLOAD)
+    room = RoomState("abc", payload)
+    room.apply({"action": "invite_speaker", "user_id": 2})
+    room.apply({"action": "join_channel", "user_profile": {"user_id": 3, "name": "renamed"}})
+    assert payload == PAYLOAD
+    assert room.get(2)["is_invited_as_speaker"]
+    assert room.get(3)["name"] == "renamed"
+
+def test_events_leave_the_models_untouched():
+    payload = decode("get_channel", copy.deepcopy(PAYLOAD))
+    room = RoomState("abc", payload)
+    room.apply({"action": "add_speaker", "user_id": 3})
+    assert not payload["users"][2]["is_speaker"]
+    assert room.get(3)["is_speaker"]
+    assert 3 in room.speakers
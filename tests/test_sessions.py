@@ -0,0 +1,64 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+test_sessions.py
+
+Rate budgets of the rooms of a SessionManager.
+"""
+
+import asyncio
+import pytest
+from clubhouse.clubhouse import AsyncClubhouse
+from clubhouse.endpoints import ENDPOINTS_BY_NAME
+from clubhouse.ratelimit import Scheduler
+from clubhouse.room import RoomState
+from clubhouse.realtime import AsyncRoomEventStream
+from clubhouse.sessions import SessionManager, RoomBudget
+
+def test_pings_have_their_own_class():
+    assert Scheduler.classify(ENDPOINTS_BY_NAME["active_ping"]) == "keepalive"
+    assert Scheduler.classify(ENDPOINTS_BY_NAME["join_channel"]) == "write"
+
+def test_manager_sizes_the_keepalive_class():
+    async def main():
+        async with AsyncClubhouse("1", "token", "device", scheduler=True) as client:
+            SessionManager(client, max_rooms=300, ping_interval=30)
+            return client.scheduler.buckets["keepalive"]
+    bucket = asyncio.run(main())
+    assert bucket.max_rate >= 300 / 30
+    assert bucket.burst >= 20
+
+def test_small_manager_keeps_the_default_rate():
+    async def main():
+        async with AsyncClubhouse("1", "token", "device", scheduler=True) as client:
+            SessionManager(client, max_rooms=10)
+            return client.scheduler.buckets["keepalive"]
+    assert asyncio.run(main()).max_rate == Scheduler.DEFAULT_RATES["keepalive"][0]
+
+def test_resyncs_use_the_room_budget(mock_server): # pylint: disable=unused-argument
+    async def main():
+        async with AsyncClubhouse("1", "token", "device") as client:
+            channel = (await client.get_channels())["channels"][0]["channel"]
+            channel_info = await client.join_channel(channel)
+            budget = RoomBudget()
+            stream = AsyncRoomEventStream(client, RoomState(channel, channel_info), channel_info, budget=budget)
+            try:
+                assert await stream.resync()
+            finally:
+                await stream.subscriber.close()
+            return budget.calls, stream.resyncs
+    assert asyncio.run(main()) == (1, 1)
+
+def test_cancelled_wait_frees_the_budget():
+    async def main():
+        budget = RoomBudget(rate=1, burst=1, concurrency=1)
+        async with budget:
+            pass
+        waiting = asyncio.ensure_future(budget.__aenter__())
+        await asyncio.sleep(0.05)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert not budget.semaphore.locked()
+    asyncio.run(main())
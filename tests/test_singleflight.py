@@ -0,0 +1,210 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+test_singleflight.py
+
+Coalescing of identical concurrent calls.
+"""
+
+import time
+import asyncio
+import threading
+import pytest
+from clubhouse.singleflight import SingleFlight, AsyncSingleFlight
+from clubhouse.clubhouse import Clubhouse
+from clubhouse.cancel import CancelToken, Cancelled, DeadlineExceeded
+
+def run_threads(count, target):
+    results = [None] * count
+    def run(i):
+        results[i] = target()
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+def test_concurrent_calls_share_one():
+    flight = SingleFlight()
+    started = threading.Event()
+    calls = []
+    def func():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return {"value": 1}
+    leader = threading.Thread(target=flight.do, args=("key", func))
+    leader.start()
+    started.wait(1)
+    results = run_threads(4, lambda: flight.do("key", func))
+    leader.join()
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert flight.stats() == {"calls": 1, "coalesced": 4}
+
+def test_error_reaches_every_caller():
+    flight = SingleFlight()
+    started = threading.Event()
+    def func():
+        started.set()
+        time.sleep(0.2)
+        raise ValueError("boom")
+    errors = []
+    def call():
+        try:
+            flight.do("key", func)
+        except ValueError as err:
+            errors.append(err)
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(1)
+    run_threads(2, call)
+    leader.join()
+    assert len(errors) == 3
+
+def test_sequential_calls_are_not_shared():
+    flight = SingleFlight()
+    assert flight.do("key", lambda: 1) == 1
+    assert flight.do("key", lambda: 2) == 2
+    assert flight.stats()["coalesced"] == 0
+
+def test_async_cancelled_caller_leaves_others():
+    async def main():
+        flight = AsyncSingleFlight()
+        calls = []
+        async def func():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return 42
+        first = asyncio.ensure_future(flight.do("key", func))
+        second = asyncio.ensure_future(flight.do("key", func))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert await second == 42
+        assert len(calls) == 1
+    asyncio.run(main())
+
+def test_client_coalesces_reads_only(scripted):
+    def handler(endpoint, body):
+        time.sleep(0.2)
+        return 200, {"success": True}
+    transport = scripted(handler)
+    client = Clubhouse("1", "token", "device", transport=transport)
+    run_threads(4, lambda: client.get_channel("abc"))
+    assert transport.calls("get_channel") == 1
+    run_threads(3, lambda: client.audience_reply("abc"))
+    assert transport.calls("audience_reply") == 3
+
+def test_follower_stops_waiting_on_its_token():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    def func():
+        started.set()
+        release.wait(2)
+        return 1
+    leader = threading.Thread(target=flight.do, args=("key", func))
+    leader.start()
+    started.wait(1)
+    token = CancelToken()
+    threading.Timer(0.05, token.cancel).start()
+    begun = time.monotonic()
+    with pytest.raises(Cancelled):
+        flight.do("key", func, cancel=token)
+    assert time.monotonic() - begun < 1
+    release.set()
+    leader.join()
+
+def test_followers_resend_a_call_cancelled_for_its_sender():
+    flight = SingleFlight()
+    started = threading.Event()
+    calls = []
+    def func():
+        calls.append(1)
+        if len(calls) == 1:
+            started.set()
+            time.sleep(0.1)
+            raise Cancelled("leader gave up")
+        return 2
+    errors = []
+    def lead():
+        try:
+            flight.do("key", func)
+        except Cancelled as err:
+            errors.append(err)
+    leader = threading.Thread(target=lead)
+    leader.start()
+    started.wait(1)
+    assert flight.do("key", func, cancel=CancelToken()) == 2
+    leader.join()
+    assert len(errors) == 1 and len(calls) == 2
+
+def test_client_followers_keep_their_own_deadline(scripted):
+    def handler(endpoint, body):
+        time.sleep(0.3)
+        return 200, {"success": True}
+    transport = scripted(handler)
+    client = Clubhouse("1", "token", "device", transport=transport)
+    leader = threading.Thread(target=client.get_channel, args=("abc",))
+    leader.start()
+    time.sleep(0.05)
+    with pytest.raises(DeadlineExceeded):
+        with client.limits(deadline=0.05):
+            client.get_channel("abc")
+    leader.join()
+    assert transport.calls("get_channel") == 1
+    assert client.singleflight.stats()["coalesced"] == 1
+
+def test_client_shares_calls_of_one_lane_only(scripted):
+    def handler(endpoint, body):
+        time.sleep(0.2)
+        return 200, {"success": True}
+    transport = scripted(handler)
+    client = Clubhouse("1", "token", "device", transport=transport)
+    def background():
+        with client.limits(priority="background"):
+            client.get_channel("abc")
+    leader = threading.Thread(target=background)
+    leader.start()
+    time.sleep(0.05)
+    client.get_channel("abc")
+    leader.join()
+    assert transport.calls("get_channel") == 2
+
+def test_async_follower_resends_after_the_sender_is_cancelled():
+    async def main():
+        flight = AsyncSingleFlight()
+        calls = []
+        async def func():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            if len(calls) == 1:
+                raise Cancelled("leader gave up")
+            return 42
+        first = asyncio.ensure_future(flight.do("key", func))
+        await asyncio.sleep(0)
+        token = CancelToken()
+        assert await flight.do("key", func, cancel=token) == 42
+        with pytest.raises(Cancelled):
+            await first
+        assert len(calls) == 2
+    asyncio.run(main())
+
+def test_async_follower_stops_waiting_on_its_token():
+    async def main():
+        flight = AsyncSingleFlight()
+        async def func():
+            await asyncio.sleep(0.3)
+            return 42
+        first = asyncio.ensure_future(flight.do("key", func))
+        await asyncio.sleep(0)
+        token = CancelToken()
+        asyncio.get_running_loop().call_later(0.05, token.cancel)
+        with pytest.raises(Cancelled):
+            await flight.do("key", func, cancel=token)
+        assert not first.done()
+        assert await first == 42
+    asyncio.run(main())
@@ -0,0 +1,152 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+test_streaming.py
+
+Items of large responses read while they are received.
+"""
+
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from clubhouse.clubhouse import Clubhouse, AsyncClubhouse
+from clubhouse.streaming import ItemParser
+from clubhouse.cancel import CancelToken, Cancelled, DeadlineExceeded
+
+BODY = {
+    "success": True,
+    "users": [{"user_id": 12345, "name": "Zoë 🎙", "flags": [1.5, None, False]}, {"user_id": 2, "name": "b"}, 3],
+    "token": "abc",
+}
+
+def parse(chunks):
+    parser = ItemParser("users")
+    items = []
+    for chunk in chunks:
+        parser.feed(chunk)
+        items.extend(parser)
+    parser.feed(b"", eof=True)
+    items.extend(parser)
+    return parser, items
+
+def test_any_chunk_boundary():
+    data = json.dumps(BODY, ensure_ascii=False).encode()
+    parser, items = parse(data[i:i + 1] for i in range(len(data)))
+    assert items == BODY["users"]
+    assert parser.fields == {"success": True, "token": "abc"}
+    assert parser.done
+
+def test_number_split_across_chunks():
+    parser, items = parse([b'{"users": [1', b'23, 4', b'5]}'])
+    assert items == [123, 45]
+    assert parser.done
+
+def test_truncated_body():
+    with pytest.raises(ValueError):
+        parse([b'{"users": [1, 2'])
+
+def test_limit_until_and_rest(mock_server): # pylint: disable=unused-argument
+    client = Clubhouse("1", "token", "device")
+    channel = client.get_channels()["channels"][0]["channel"]
+    with client.stream_items("get_channel", channel, limit=5) as users:
+        assert len(list(users)) == 5
+    assert users.count == 5 and users.closed
+    with client.stream_items("get_channel", channel, until=lambda user: user["user_id"] % 2 == 0) as users:
+        found = list(users)
+    assert found[-1]["user_id"] % 2 == 0
+    assert all(user["user_id"] % 2 for user in found[:-1])
+    with client.stream_items("join_channel", channel, limit=1, rest=True) as users:
+        assert len(list(users)) == 1
+    assert users.complete
+    assert users.fields["token"] == "mock-agora-token"
+
+def test_invalid_arguments_raise():
+    client = Clubhouse("1", "token", "device")
+    with pytest.raises(ValueError):
+        client.stream_items("update_skintone", 9)
+    async def main():
+        async with AsyncClubhouse("1", "token", "device") as aclient:
+            async with aclient.stream_items("update_skintone", 9) as users:
+                pass
+        return users
+    with pytest.raises(ValueError):
+        asyncio.run(main())
+
+
+class StallingHandler(BaseHTTPRequestHandler):
+    """ Sends the start of a room, then stalls """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self): # pylint: disable=invalid-name
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        head = b'{"success": true, "users": [{"user_id": 1}, '
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(head) + 1000))
+        self.end_headers()
+        self.wfile.write(head)
+        self.wfile.flush()
+        self.server.release.wait(5)
+
+    def log_message(self, *args): # pylint: disable=arguments-differ
+        pass
+
+
+@pytest.fixture
+def stalling(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StallingHandler)
+    server.daemon_threads = True
+    server.release = threading.Event()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(Clubhouse, "API_URL", f"http://127.0.0.1:{server.server_address[1]}/api")
+    yield server
+    server.release.set()
+    server.shutdown()
+    server.server_close()
+
+def test_deadline_covers_the_body(stalling): # pylint: disable=unused-argument,redefined-outer-name
+    client = Clubhouse("1", "token", "device")
+    with client.limits(deadline=0.3):
+        users = client.stream_items("get_channel", "abc")
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        with users:
+            for _ in users:
+                pass
+    assert time.monotonic() - started < 2
+    assert users.closed
+
+def test_cancel_covers_the_body(stalling): # pylint: disable=unused-argument,redefined-outer-name
+    client = Clubhouse("1", "token", "device")
+    token = CancelToken()
+    with client.limits(cancel=token):
+        users = client.stream_items("get_channel", "abc")
+    threading.Timer(0.2, token.cancel).start()
+    started = time.monotonic()
+    with pytest.raises(Cancelled):
+        with users:
+            for _ in users:
+                pass
+    assert time.monotonic() - started < 2
+
+def test_async_deadline_covers_the_body(stalling): # pylint: disable=unused-argument,redefined-outer-name
+    async def main():
+        async with AsyncClubhouse("1", "token", "device") as client:
+            with client.limits(deadline=0.3):
+                users = client.stream_items("get_channel", "abc")
+                await users.open()
+            items = []
+            with pytest.raises(DeadlineExceeded):
+                async with users:
+                    async for user in users:
+                        items.append(user)
+            return items
+    started = time.monotonic()
+    assert asyncio.run(main()) == [{"user_id": 1}]
+    assert time.monotonic() - started < 2
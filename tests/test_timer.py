@@ -0,0 +1,103 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+test_timer.py
+
+Delayed and periodic tasks of the timer scheduler.
+"""
+
+import time
+import threading
+import pytest
+from clubhouse.timer import TimerScheduler, set_interval
+
+@pytest.fixture
+def timers():
+    scheduler = TimerScheduler(workers=2)
+    yield scheduler
+    scheduler.shutdown()
+
+def test_call_later_runs_once(timers):
+    ran = threading.Event()
+    started = time.monotonic()
+    handle = timers.call_later(0.05, ran.set)
+    assert ran.wait(1)
+    assert time.monotonic() - started >= 0.05
+    time.sleep(0.05)
+    assert handle.runs == 1
+    assert len(timers) == 0
+
+def test_periodic_runs_do_not_drift(timers):
+    starts = []
+    def task():
+        starts.append(time.monotonic())
+        time.sleep(0.02)
+        return len(starts) < 8
+    handle = timers.call_every(0.05, task)
+    deadline = time.monotonic() + 2
+    while handle.runs < 8 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(starts) == 8
+    # Scheduled from the previous due time, not from the end of the previous run
+    assert starts[-1] - starts[0] == pytest.approx(7 * 0.05, abs=0.03)
+
+def test_late_runs_are_skipped_not_stacked(timers):
+    active, overlaps, runs = [0], [0], []
+    lock = threading.Lock()
+    def task():
+        with lock:
+            active[0] += 1
+            overlaps[0] = max(overlaps[0], active[0])
+        runs.append(time.monotonic())
+        time.sleep(0.12)
+        with lock:
+            active[0] -= 1
+    handle = timers.call_every(0.05, task, first=0)
+    time.sleep(0.5)
+    handle.cancel()
+    time.sleep(0.15)
+    assert overlaps[0] == 1
+    assert handle.skipped >= 3
+    assert 3 <= len(runs) <= 5
+    assert min(b - a for a, b in zip(runs, runs[1:])) >= 0.12
+
+def test_stops_on_false_and_cancel(timers):
+    counts = {"false": 0, "cancel": 0}
+    def until_false():
+        counts["false"] += 1
+        return counts["false"] < 2
+    def forever():
+        counts["cancel"] += 1
+    timers.call_every(0.02, until_false)
+    handle = timers.call_every(0.02, forever)
+    time.sleep(0.15)
+    handle.cancel()
+    cancelled_at = counts["cancel"]
+    time.sleep(0.1)
+    assert counts["false"] == 2
+    assert counts["cancel"] == cancelled_at
+    assert len(timers) == 0
+
+def test_errors_do_not_stop_the_task(timers, capsys):
+    calls = []
+    def failing():
+        calls.append(1)
+        raise ValueError("boom")
+    handle = timers.call_every(0.02, failing)
+    time.sleep(0.15)
+    handle.cancel()
+    assert len(calls) >= 3
+    assert timers.stats()["errors"] == len(calls)
+    assert "ValueError" in capsys.readouterr().err
+
+def test_set_interval(timers):
+    calls = []
+    @set_interval(0.02, scheduler=timers)
+    def poll(name):
+        calls.append(name)
+        return len(calls) < 3
+    handle = poll("room")
+    time.sleep(0.2)
+    assert calls == ["room"] * 3
+    assert handle.cancelled
@@ -0,0 +1,100 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+test_transport.py
+
+Connection reuse and timed connections of the pooled transports.
+"""
+
+import time
+import socket
+import asyncio
+import threading
+import pytest
+import requests
+from clubhouse.clubhouse import Clubhouse, AsyncClubhouse
+
+def fake_host(monkeypatch, mock_server, addresses):
+    """ Resolve api.test to `addresses`, on the port of the mock server """
+    resolve = socket.getaddrinfo
+    def getaddrinfo(host, port, *args, **kwargs):
+        if host == "api.test":
+            return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, port)) for address in addresses]
+        return resolve(host, port, *args, **kwargs)
+    monkeypatch.setattr(socket, "getaddrinfo", getaddrinfo)
+    monkeypatch.setattr(Clubhouse, "API_URL", f"http://api.test:{mock_server.port}/api")
+
+def timed_client(**kwargs):
+    client = Clubhouse("1", "token", "device", **kwargs)
+    records = []
+    client.add_hook("response", records.append)
+    return client, records
+
+def test_timed_connection_falls_back_to_the_next_address(monkeypatch, mock_server):
+    # Nothing listens on 127.0.0.2, the mock is on 127.0.0.1
+    fake_host(monkeypatch, mock_server, ["127.0.0.2", "127.0.0.1"])
+    client, records = timed_client()
+    assert client.get_channels()["success"]
+    assert records[0].status == 200
+    assert records[0].connect > 0
+
+def test_timed_connection_reports_the_last_failure(monkeypatch, mock_server):
+    fake_host(monkeypatch, mock_server, ["127.0.0.2", "127.0.0.3"])
+    client, _ = timed_client()
+    with pytest.raises(requests.ConnectionError):
+        client.get_channels()
+
+def test_consecutive_calls_reuse_the_connection(mock_server): # pylint: disable=unused-argument
+    client, records = timed_client()
+    for _ in range(5):
+        assert client.get_channels()["success"]
+    assert records[0].connect > 0
+    assert all(record.connect == 0 for record in records[1:])
+
+    # A closed client connects again
+    client.close()
+    assert client.get_channels()["success"]
+    assert records[-1].connect > 0
+
+def test_threads_share_the_pool(mock_server):
+    mock_server.latency = 0.05
+    # Identical calls are not shared, each one needs a connection
+    client, records = timed_client(pool_size=4, coalesce=False)
+    barrier = threading.Barrier(4)
+    def call():
+        barrier.wait()
+        for _ in range(3):
+            assert client.get_profile(1)["success"]
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(records) == 12
+    assert sum(1 for record in records if record.connect > 0) <= 4
+
+def test_async_calls_run_at_once_on_the_pool(mock_server):
+    mock_server.latency = 0.1
+    async def main():
+        async with AsyncClubhouse("1", "token", "device", pool_size=5, coalesce=False) as client:
+            records = []
+            client.add_hook("response", records.append)
+            started = time.monotonic()
+            results = await asyncio.gather(*(client.get_profile(user_id) for user_id in range(1, 21)))
+            elapsed = time.monotonic() - started
+            assert [result["user_profile"]["user_id"] for result in results] == list(range(1, 21))
+            # Another call reuses one of the open connections
+            await client.get_profile(1)
+            return elapsed, records
+    elapsed, records = asyncio.run(main())
+    # 20 calls of 0.1s, 5 at a time
+    assert 0.4 <= elapsed < 1.5
+    assert sum(1 for record in records if record.connect > 0) <= 5
+    assert records[-1].connect == 0
+
+def test_async_client_needs_async_with():
+    client = AsyncClubhouse("1", "token", "device")
+    with pytest.raises(TypeError):
+        with client:
+            pass
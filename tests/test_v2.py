@@ -0,0 +1,63 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+test_v2.py
+
+Room sessions of the v2 shell.
+"""
+
+import threading
+from clubhouse.clubhouse import Clubhouse
+from clubhouse.ratelimit import Scheduler, RetryPolicy
+from clubhouse.mux import EventQueue
+from v2 import RoomSession, UIEvent, UIEventType
+
+def room_handler(failing=()):
+    """ Scripted answers of a room without PubNub, failing the given endpoints """
+    def handler(endpoint, body):
+        if endpoint in failing:
+            return 500, {"success": False}
+        if endpoint in ("join_channel", "get_channel"):
+            return 200, {"success": True, "channel": body["channel"], "users": [
+                {"user_id": 1, "name": "me", "username": "me", "is_speaker": False, "is_moderator": False},
+                {"user_id": 2, "name": "mod", "username": "mod", "is_speaker": True, "is_moderator": True},
+            ]}
+        return 200, {"success": True}
+    return handler
+
+def test_failed_command_keeps_the_room(scripted, capsys):
+    transport = scripted(room_handler(failing=("audience_reply",)))
+    client = Clubhouse("1", "token", "device", transport=transport,
+                       scheduler=Scheduler(RetryPolicy(retries=1)))
+    shell = EventQueue("shell")
+    room = RoomSession(client, "abc", shell)
+    shell.put(UIEvent(UIEventType.RequestSpeaker, None))
+    shell.put(UIEvent(UIEventType.Leave, None))
+    thread = threading.Thread(target=room.run)
+    thread.start()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert "audience_reply failed with HTTP 500" in capsys.readouterr().out
+    assert transport.calls("leave_channel") == 1
+    assert room.zombie
+
+def test_present_users_follow_the_room(scripted):
+    client = Clubhouse("1", "token", "device", transport=scripted(room_handler()))
+    room = RoomSession(client, "abc", EventQueue("shell"))
+    assert room.join()
+    room.room.apply({"action": "join_channel", "user_profile": {"user_id": 3}})
+    room.room.apply({"action": "leave_channel", "user_id": 2})
+    assert room.present_users() == [1, 3]
+
+def test_only_the_personal_invite_is_accepted(scripted):
+    transport = scripted(room_handler())
+    client = Clubhouse("1", "token", "device", transport=transport)
+    room = RoomSession(client, "abc", EventQueue("shell"))
+    assert room.join()
+    # Sent to the whole room, then to the invited user with the inviter
+    assert room._handle_room_event({"action": "invite_speaker", "user_id": 1}) is None # pylint: disable=protected-access
+    assert transport.calls("accept_speaker_invite") == 0
+    event = room._handle_room_event({"action": "invite_speaker", "user_id": 1, "from_user_id": 2}) # pylint: disable=protected-access
+    assert event.enum == UIEventType.Rejoin
+    assert transport.requests[-1] == ("accept_speaker_invite", {"channel": "abc", "user_id": 2})
@@ -0,0 +1,121 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+# pylint: disable=protected-access
+
+"""
+test_v2_async.py
+
+The asyncio runtime of the v2 shell, driven by scripted input against the mock API.
+"""
+
+import asyncio
+import v2_async
+from clubhouse.clubhouse import AsyncClubhouse
+
+USER_ID = 900
+
+async def until(predicate, timeout=5):
+    """ Wait until predicate() is true """
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+def shell(monkeypatch, steps):
+    """ Replace stdin by `steps`: command lines, and coroutine functions awaited in between """
+    async def read_lines(prompt="> "): # pylint: disable=unused-argument
+        for step in steps:
+            if callable(step):
+                await step()
+            else:
+                yield step
+    monkeypatch.setattr(v2_async, "read_lines", read_lines)
+
+def new_session():
+    return v2_async.AsyncSession(AsyncClubhouse(str(USER_ID), "token", "device"))
+
+def run(session):
+    """ Run the session to the end of its input """
+    async def main():
+        async with session.client:
+            await session.run()
+    asyncio.run(main())
+
+def following(session):
+    """ Wait until the room of the session follows its PubNub events """
+    def ready():
+        room = session.room
+        return room is not None and room.stream is not None and room.stream.subscriber.timetoken != "0"
+    return lambda: until(ready)
+
+def members(mock_server, channel):
+    return mock_server.api.data.channels[channel]["members"]
+
+def endpoints(mock_server):
+    """ Endpoints called, as logged once answered """
+    return [entry["endpoint"] for entry in list(mock_server.log)]
+
+
+def test_commands_reach_the_room(mock_server, monkeypatch, capsys):
+    session = new_session()
+    shell(monkeypatch, [
+        "channels",
+        "join mock0001",
+        following(session),
+        lambda: until(lambda: USER_ID in members(mock_server, "mock0001")),
+        "refresh",
+        "hand-up",
+        lambda: until(lambda: "audience_reply" in endpoints(mock_server)),
+        "leave",
+        lambda: until(lambda: session.room is None),
+        "exit",
+    ])
+    run(session)
+    out = capsys.readouterr().out
+    # Listed by "channels", before joining
+    assert "mock0001" in out.split("joined channel")[0]
+    assert "joined channel [mock0001]" in out
+    assert "You've raised your hand" in out
+    assert "left room [mock0001]" in out
+    assert USER_ID not in members(mock_server, "mock0001")
+    assert {"get_channels", "join_channel", "active_ping", "audience_reply"} <= set(endpoints(mock_server))
+    assert not session.pings.rooms
+    assert session.pings._task.cancelled()
+
+def test_speaker_invite_rejoins_the_room(mock_server, monkeypatch, capsys):
+    session = new_session()
+    async def invite():
+        async with AsyncClubhouse("2", "token", "device") as moderator:
+            await moderator.invite_speaker("mock0001", USER_ID)
+        await until(lambda: endpoints(mock_server).count("join_channel") == 2)
+    shell(monkeypatch, [
+        "join mock0001",
+        following(session),
+        invite,
+        following(session),
+        "exit",
+    ])
+    run(session)
+    out = capsys.readouterr().out
+    assert "Now you have a speaker permission" in out
+    assert "accept_speaker_invite" in endpoints(mock_server)
+    assert endpoints(mock_server).count("join_channel") == 2
+    assert USER_ID not in members(mock_server, "mock0001")
+
+def test_ended_room_is_left(mock_server, monkeypatch, capsys):
+    session = new_session()
+    async def end():
+        async with AsyncClubhouse("2", "token", "device") as moderator:
+            await moderator.end_channel("mock0002")
+        await until(lambda: session.room is None)
+    shell(monkeypatch, ["join mock0002", following(session), end, "exit"])
+    run(session)
+    assert "The room [mock0002] has ended" in capsys.readouterr().out
+    assert "mock0002" not in mock_server.api.data.channels
+
+def test_exit_leaves_the_room(mock_server, monkeypatch):
+    session = new_session()
+    shell(monkeypatch, ["join mock0003", following(session), "exit"])
+    run(session)
+    assert session.room is None
+    assert USER_ID not in members(mock_server, "mock0003")
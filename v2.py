@@ -9,17 +9,25 @@ RTC: For voice communication
 import os
 import sys
 import threading
-import selectors
 import configparser
 import readline
 from rich.table import Table
 from rich.console import Console
 from clubhouse.clubhouse import Clubhouse
+from clubhouse.timer import set_interval
+from clubhouse.keepalive import PingManager
+from clubhouse.feed import ChannelFeed
+from clubhouse.cancel import CancelToken, Cancelled
+from clubhouse.ratelimit import RequestFailed
+from clubhouse.mux import EventQueue, Selector
+from clubhouse.room import RoomState
+from clubhouse.realtime import RoomEventStream
 from typing import Union, Optional
-from queue import Queue
+from queue import Empty
 
-# Clubhouse.API_URL = "https://www.clubhouseapi.com/api"
-# Clubhouse.API_URL = "http://localhost:8080/api"
+# Point to another API server, e.g. the local mock:
+# CLUBHOUSE_API_URL=http://127.0.0.1:8080/api python3 v2.py
+Clubhouse.API_URL = os.environ.get("CLUBHOUSE_API_URL", Clubhouse.API_URL)
 
 # Set some global variables
 try:
@@ -43,26 +51,6 @@ except ImportError as e:
     INPUT_DEVICES = None
     OUTPUT_DEVICES = None
 
-def set_interval(interval):
-    """ (int) -> decorator
-
-    set_interval decorator
-    """
-    def decorator(func):
-        def wrap(*args, **kwargs):
-            stopped = threading.Event()
-            def loop():
-                while not stopped.wait(interval):
-                    ret = func(*args, **kwargs)
-                    if not ret:
-                        break
-            thread = threading.Thread(target=loop)
-            thread.daemon = True
-            thread.start()
-            return stopped
-        return wrap
-    return decorator
-
 def write_config(user_id, user_token, user_device, filename='setting.ini'):
     """ (str, str, str, str) -> bool
 
@@ -141,19 +129,29 @@ def process_onboarding(client):
         print("    Try registering by real device if this process pops again.")
         break
 
-def print_channel_list(client, max_limit=20):
-    """ (Clubhouse) -> NoneType
+def print_channel_list(feed, max_limit=20):
+    """ (ChannelFeed) -> NoneType
 
-    Print list of channels
+    Print list of channels, from the listing kept by the feed
+    """
+    try:
+        channels = feed.get()
+    except Exception as err:
+        print(f"[-] Error while listing the channels ({err})")
+        return
+    print_channels(channels, max_limit, feed.age)
+
+def print_channels(channels, max_limit=20, age=None):
+    """ (list of dict, int, float) -> NoneType
+
+    Print the given channels, listed `age` seconds ago
     """
-    # Get channels and print out
     console = Console()
     table = Table(show_header=True, header_style="bold magenta")
     table.add_column("")
     table.add_column("channel_name", style="cyan", justify="right")
     table.add_column("topic")
     table.add_column("speaker_count")
-    channels = client.get_channels()['channels']
     i = 0
     for channel in channels:
         i += 1
@@ -169,8 +167,33 @@ def print_channel_list(client, max_limit=20):
         )
     print("")
     console.print(table)
+    if age is not None:
+        print(f"[-] Updated {int(age)}s ago")
     print("> ")
 
+def print_users(room, max_limit=20):
+    """ (RoomState, int) -> NoneType
+
+    Print the first users of the room
+    """
+    console = Console()
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("user_id", style="cyan", justify="right")
+    table.add_column("username")
+    table.add_column("name")
+    table.add_column("is_speaker")
+    table.add_column("is_moderator")
+    for user in room.get_users(max_limit):
+        table.add_row(
+            str(user['user_id']),
+            str(user['name']),
+            str(user['username']),
+            str(user['is_speaker']),
+            str(user['is_moderator']),
+        )
+    print("")
+    console.print(table)
+
 class Session:
     def __init__(self, client):
         super(Session, self).__init__()
@@ -180,9 +203,11 @@ class Session:
         self.hotkey_listener = None
         self.is_mute = False
         self.room = None
-        self.room_switcher = Queue()
-        self.room_shell = Queue()
+        self.room_switcher = EventQueue("room_switcher")
+        self.room_shell = EventQueue("room_shell")
         self.in_a_room = False
+        self.pings = PingManager(client)
+        self.channels = ChannelFeed(client)
 
     def loop(self):
         shell_thread = threading.Thread(target=lambda: self.shell())
@@ -196,18 +221,24 @@ class Session:
                 # helps delay exit until you have cleanly left a room
                 if channel_name is None:
                     break
-                room = RoomSession(self.client, channel_name, self.room_shell)
+                room = RoomSession(self.client, channel_name, self.room_shell, self.pings)
                 while True:
+                    self.room = room
                     self.in_a_room = True
                     nxt = room.run()
                     if nxt is not None:
                         room = nxt
                         continue
                     break
+                self.room = None
         # room_thread = threading.Thread(target=room_loop)
         # room_thread.daemon = True
         # room_thread.start()
-        room_loop()
+        try:
+            room_loop()
+        finally:
+            self.pings.close()
+            self.channels.close()
 
     def outputs(self):
         devs, err = RTC.createAudioPlaybackDeviceManager()
@@ -240,54 +271,66 @@ class Session:
             if len(inp) == 0:
                 continue
             ev = None
-            if inp[0] == "exit":
-                if self.in_a_room:
-                    self.room_shell.put(UIEvent(UIEventType.Leave, None))
-                # tell room loop to die
-                self.room_switcher.put(None)
-            elif inp[0] == "channels":
-                print_channel_list(self.client, self.max_limit)
-            elif inp[0] == "leave":
-                self.room_shell.put(UIEvent(UIEventType.Leave, None))
-            elif inp[0] == "hand-up":
-                self.room_shell.put(UIEvent(UIEventType.RequestSpeaker, None))
-            elif inp[0] == "rejoin":
-                self.room_shell.put(UIEvent(UIEventType.Rejoin, None))
-            elif inp[0] == "toggle-mute" or inp[0] == "m":
-                self._toggle_mute()
-            elif inp[0] == "outputs":
-                self.outputs()
-            elif inp[0] == "inputs":
-                self.inputs()
-            elif inp[0] == "set-output":
-                if len(inp) == 2:
-                    self.set_output(inp[1])
-            elif inp[0] == "set-input":
-                if len(inp) == 2:
-                    self.set_input(inp[1])
-            elif inp[0] == "update-photo":
-                self.client.update_photo(inp[1])
-            elif inp[0] == "friend-ids":
-                self.friend_ids()
-            elif inp[0] == "accept-friends":
-                if self.in_a_room:
-                    self.room_shell.put(UIEvent(UIEventType.AcceptFriends, None))
-            elif inp[0] == "search-friends":
-                rest = raw[len(inp[0]) + 1:]
-                print(rest)
-                self.search_friends(rest)
-            elif inp[0] == "refresh":
-                self.room_shell.put(UIEvent(UIEventType.Refresh, None))
-            elif inp[0] == "join":
-                if len(inp) == 2:
+            try:
+                if inp[0] == "exit":
                     if self.in_a_room:
+                        self._interrupt_room()
                         self.room_shell.put(UIEvent(UIEventType.Leave, None))
-                    self.room_switcher.put(inp[1])
+                    # tell room loop to die
+                    self.room_switcher.put(None)
+                elif inp[0] == "channels":
+                    print_channel_list(self.channels, self.max_limit)
+                elif inp[0] == "leave":
+                    self._interrupt_room()
+                    self.room_shell.put(UIEvent(UIEventType.Leave, None))
+                elif inp[0] == "hand-up":
+                    self.room_shell.put(UIEvent(UIEventType.RequestSpeaker, None))
+                elif inp[0] == "rejoin":
+                    self.room_shell.put(UIEvent(UIEventType.Rejoin, None))
+                elif inp[0] == "toggle-mute" or inp[0] == "m":
+                    self._toggle_mute()
+                elif inp[0] == "outputs":
+                    self.outputs()
+                elif inp[0] == "inputs":
+                    self.inputs()
+                elif inp[0] == "set-output":
+                    if len(inp) == 2:
+                        self.set_output(inp[1])
+                elif inp[0] == "set-input":
+                    if len(inp) == 2:
+                        self.set_input(inp[1])
+                elif inp[0] == "update-photo":
+                    self.client.update_photo(inp[1])
+                elif inp[0] == "friend-ids":
+                    self.friend_ids()
+                elif inp[0] == "accept-friends":
+                    if self.in_a_room:
+                        self.room_shell.put(UIEvent(UIEventType.AcceptFriends, None))
+                elif inp[0] == "search-friends":
+                    rest = raw[len(inp[0]) + 1:]
+                    print(rest)
+                    self.search_friends(rest)
+                elif inp[0] == "refresh":
+                    self.room_shell.put(UIEvent(UIEventType.Refresh, None))
+                elif inp[0] == "join":
+                    if len(inp) == 2:
+                        if self.in_a_room:
+                            self._interrupt_room()
+                            self.room_shell.put(UIEvent(UIEventType.Leave, None))
+                        self.room_switcher.put(inp[1])
+                    else:
+                        print("syntax: join <channel name>")
                 else:
-                    print("syntax: join <channel name>")
-            else:
-                print("unknown command")
-                continue
+                    print("unknown command")
+                    continue
+            except RequestFailed as err:
+                print(f"[-] {err}")
+
+    def _interrupt_room(self):
+        """ Abort the requests of the room, so that it leaves right away """
+        room = self.room
+        if room is not None:
+            room.cancel.cancel()
 
     def search_friends(self, search_term):
         res = self.client.search_users(search_term, following_only=True)
@@ -325,21 +368,22 @@ class UIEvent:
     enum: UIEventType
     data: Any
 
-def select(*queues):
-    combined = Queue(maxsize=0)
-    def listen_and_forward(queue):
+def select(*queues, timeout=None):
+    """ (EventQueue, ..., float) -> generator
+
+    Yield (queue, item) as items arrive on any of the queues, and
+    (None, None) when nothing arrived for `timeout` seconds.
+    Stops when the generator is closed.
+    """
+    with Selector(*queues) as selector:
         while True:
-            combined.put((queue, queue.get()))
-    threads = []
-    for queue in queues:
-        t = threading.Thread(target=listen_and_forward, args=(queue,))
-        t.daemon = True
-        t.start()
-        threads.push(t)
-    while True:
-        yield combined.get()
-    for t in threads:
-        t.stop()
+            try:
+                selected = selector.select(timeout)
+            except Empty:
+                selected = (None, None)
+            if selected is None:
+                return
+            yield selected
 
 class RoomSession:
     """
@@ -357,44 +401,73 @@ class RoomSession:
             return None
         return session
 
-    def __init__(self, client, channel_name, shell_events) -> None:
+    # Seconds allowed to leave the room
+    LEAVE_DEADLINE = 5
+
+    def __init__(self, client, channel_name, shell_events, pings=None, cancel=None) -> None:
         super(RoomSession, self).__init__()
         self.client = client
         self.channel_name = channel_name
         self.user_id = client.HEADERS.get("CH-UserID")
+        self.user_key = int(self.user_id)
         self.max_limit = 20
         self._ping_func = None
         self._wait_func = None
         self.channel_speaker_permission = False
         self.is_mute = False
         self.channel_info = None
+        self.room = None
+        self.events = None
         self.zombie = False
         self.shell_events = shell_events
+        self.room_events = EventQueue(f"room:{channel_name}")
+        self.pings = pings
+        # Cancelled to abort the requests of the room, e.g. when leaving it
+        self.cancel = CancelToken(cancel)
 
     def run(self):
         if not self.join():
             return None
-        self._print_users()
-
-        while True:
-            ev = self.shell_events.get()
-            if ev.enum == UIEventType.Leave:
-                break
-            elif ev.enum == UIEventType.RequestSpeaker:
-                self._request_speaker_permission()
-            elif ev.enum == UIEventType.Refresh:
-                self._print_users()
-            elif ev.enum == UIEventType.Rejoin:
-                return self.rejoin()
-            elif ev.enum == UIEventType.AcceptFriends:
-                return self.accept_friends()
+        try:
+            self._print_users()
+        except RequestFailed as err:
+            print(f"[-] {err}")
+
+        events = select(self.shell_events, self.room_events)
+        try:
+            for source, ev in events:
+                try:
+                    with self.client.limits(cancel=self.cancel):
+                        if source is self.room_events:
+                            ev = self._handle_room_event(ev)
+                            if ev is None:
+                                continue
+                        if ev.enum == UIEventType.Leave:
+                            break
+                        elif ev.enum == UIEventType.RequestSpeaker:
+                            self._request_speaker_permission()
+                        elif ev.enum == UIEventType.Refresh:
+                            self._print_users()
+                        elif ev.enum == UIEventType.Rejoin:
+                            return self.rejoin()
+                        elif ev.enum == UIEventType.AcceptFriends:
+                            return self.accept_friends()
+                except Cancelled:
+                    # Interrupted by the shell, which queued what to do next
+                    continue
+                except RequestFailed as err:
+                    # Still failing after the retries of the scheduler
+                    print(f"[-] {err}")
+                    continue
+        finally:
+            events.close()
         self.leave()
         print(f"left room [{self.channel_name}]")
         return None
 
     def accept_friends(self):
         self._refresh_info()
-        for user in self.channel_info['users']:
+        for user in self.room.get_users():
             if bool(user['is_followed_by_speaker']) and not bool(user['is_invited_as_speaker']):
                 self.client.invite_speaker(self.channel_name, user['user_id'])
 
@@ -406,33 +479,35 @@ class RoomSession:
                 self.client.invite_speaker(self.channel_name, user_id)
 
     def present_users(self):
-        return [user['user_id'] for user in self.channel_info['users']]
+        return [user['user_id'] for user in self.room.get_users()]
 
     def make_mod(self, user_id):
-        if user_id in self.present_users():
+        if user_id in self.room:
             self.client.make_moderator(self.channel_name, user_id)
 
     def join(self) -> bool:
-        self.channel_info = self.client.join_channel(self.channel_name)
-        if not self.channel_info['success']:
-            # Check if this channel_name was taken from the link
-            self.channel_info = self.client.join_channel(self.channel_name, "link", "e30=")
+        try:
+            self.channel_info = self.client.join_channel(self.channel_name)
             if not self.channel_info['success']:
-                print(f"[-] Error while joining the channel ({self.channel_info['error_message']})")
-                return False
+                # Check if this channel_name was taken from the link
+                self.channel_info = self.client.join_channel(self.channel_name, "link", "e30=")
+        except RequestFailed as err:
+            print(f"[-] Error while joining the channel ({err})")
+            return False
+        if not self.channel_info['success']:
+            print(f"[-] Error while joining the channel ({self.channel_info['error_message']})")
+            return False
 
         print(f"joined channel [{self.channel_name}]")
 
-        for user in self.channel_info['users']:
-            if user['user_id'] == int(self.user_id):
-                self.channel_speaker_permission = bool(user['is_speaker'])
-                break
+        self.room = RoomState(self.channel_name, self.channel_info)
+        self.channel_speaker_permission = self.user_key in self.room.speakers
 
         # Check for the voice level.
         if RTC:
             token = self.channel_info['token']
             print("running joinChannel")
-            RTC.joinChannel(token, self.channel_name, "", int(self.user_id))
+            RTC.joinChannel(token, self.channel_name, "", self.user_key)
             print("ran joinChannel")
         else:
             print("[!] Agora SDK is not installed.")
@@ -440,62 +515,92 @@ class RoomSession:
 
         # Activate pinging
         self.client.active_ping(self.channel_name)
-        self._ping_func = self._ping_keep_alive()
+        if self.pings is not None:
+            self.pings.add(self.channel_name)
+        else:
+            self._ping_func = self._ping_keep_alive()
         self._wait_func = None
 
+        # Follow the room over PubNub instead of polling get_channel
+        if self.channel_info.get('pubnub_token'):
+            self.events = RoomEventStream(self.client, self.room, self.channel_info, on_event=self._on_room_event)
+            self.events.start()
+
         return True
 
     def _refresh_info(self):
+        if self.events and self.events.running:
+            # The room is kept up to date by the event stream
+            return
         _channel_info = self.client.get_channel(self.channel_name)
         if bool(_channel_info['success']):
             self.channel_info = _channel_info
+            self.room.update(_channel_info)
+
+    def _on_room_event(self, event):
+        """ (dict) -> NoneType
+        Called from the event stream for every event of the room.
+        The event is handled by the room loop, see run().
+        """
+        self.room_events.put(event)
+
+    def _handle_room_event(self, event) -> Optional[UIEvent]:
+        """ (dict) -> UIEvent
+        Returns the UI event to act on, if any.
+        """
+        action = event.get('action')
+        if action == "end_channel":
+            print(f"[-] The room [{self.channel_name}] has ended.")
+            return UIEvent(UIEventType.Leave, None)
+        if event.get('user_id') != self.user_key:
+            return None
+        if action == "invite_speaker" and not self.channel_speaker_permission:
+            if event.get('from_user_id') is None:
+                # Notice to the whole room; the invite itself comes on the personal channel
+                return None
+            res_inv = self.client.accept_speaker_invite(self.channel_name, event['from_user_id'])
+            if res_inv['success']:
+                print("[-] Now you have a speaker permission.")
+                print("    Please re-join this channel to activate a permission.")
+                return UIEvent(UIEventType.Rejoin, None)
+        elif action in ("add_speaker", "make_moderator"):
+            self.channel_speaker_permission = True
+        elif action == "remove_speaker":
+            self.channel_speaker_permission = False
+        return None
 
     def _print_users(self):
         self._refresh_info()
-        console = Console()
-        table = Table(show_header=True, header_style="bold magenta")
-        table.add_column("user_id", style="cyan", justify="right")
-        table.add_column("username")
-        table.add_column("name")
-        table.add_column("is_speaker")
-        table.add_column("is_moderator")
-        users = self.channel_info['users']
-        i = 0
-        for user in users:
-            i += 1
-            if i > self.max_limit:
-                break
-            table.add_row(
-                str(user['user_id']),
-                str(user['name']),
-                str(user['username']),
-                str(user['is_speaker']),
-                str(user['is_moderator']),
-            )
-            # Check if the user is the speaker
-            if user['user_id'] == int(self.user_id):
-                self.channel_speaker_permission = bool(user['is_speaker'])
-        print("")
-        console.print(table)
+        # Check if the user is the speaker
+        self.channel_speaker_permission = self.user_key in self.room.speakers
+        print_users(self.room, self.max_limit)
 
     def leave(self):
         # Safely leave the channel upon quitting the channel.
         if self.zombie:
             return
+        if self.pings is not None:
+            self.pings.remove(self.channel_name)
         if self._ping_func:
-            self._ping_func.set()
+            self._ping_func.cancel()
         if self._wait_func:
-            self._wait_func.set()
+            self._wait_func.cancel()
+        if self.events:
+            self.events.stop()
         if RTC:
             RTC.leaveChannel()
-        # if self._listener:
-        #     self.listener.stop()
-        self.client.leave_channel(self.channel_name)
+        self.cancel.cancel()
+        # Not aborted along with the other requests of the room
+        try:
+            with self.client.limits(deadline=self.LEAVE_DEADLINE, cancel=CancelToken()):
+                self.client.leave_channel(self.channel_name)
+        except (RequestFailed, Cancelled) as err:
+            print(f"[-] Error while leaving the channel ({err})")
         self.zombie = True
 
     def rejoin(self) -> Optional['RoomSession']:
         self.leave()
-        neu = RoomSession(self.client, self.channel_name, self.shell_events)
+        neu = RoomSession(self.client, self.channel_name, self.shell_events, self.pings)
         if neu is not None:
             neu.channel_speaker_permission = self.channel_speaker_permission
         return neu
@@ -509,7 +614,9 @@ class RoomSession:
             return
         if not self.channel_speaker_permission:
             self.client.audience_reply(self.channel_name, True, False)
-            self._wait_func = self._wait_speaker_permission(self.user_id)
+            if not (self.events and self.events.running):
+                # No event stream, so poll for the invite instead
+                self._wait_func = self._wait_speaker_permission(self.user_id)
             print("[/] You've raised your hand. Wait for the moderator to give you the permission.")
         else:
             print("[/] You are already a speaker.")
@@ -519,7 +626,8 @@ class RoomSession:
         """ (str) -> bool
         Continue to ping alive every 30 seconds.
         """
-        self.client.active_ping(self.channel_name)
+        with self.client.limits(cancel=self.cancel):
+            self.client.active_ping(self.channel_name)
         return True
 
     @set_interval(10)
@@ -527,21 +635,24 @@ class RoomSession:
         """ (str) -> bool
         Function that runs when you've requested for a voice permission.
         """
-        # Get some random users from the channel.
-        _channel_info = self.client.get_channel(self.channel_name)
-        if _channel_info['success']:
-            for _user in _channel_info['users']:
-                if _user['user_id'] != user_id:
-                    user_id = _user['user_id']
-                    break
-            # Check if the moderator allowed your request.
-            res_inv = self.client.accept_speaker_invite(self.channel_name, user_id)
-            if res_inv['success']:
-                print("[-] Now you have a speaker permission.")
-                print("    Please re-join this channel to activate a permission.")
-                self.shell_events.put(UIEvent(UIEventType.Rejoin, None))
-                return False
-        return True
+        # Polling, so it must not hold up the commands of the user
+        with self.client.limits(cancel=self.cancel, priority="background"):
+            # Get some random users from the channel.
+            _channel_info = self.client.get_channel(self.channel_name)
+            if _channel_info['success']:
+                self.room.update(_channel_info)
+                for _user in _channel_info['users']:
+                    if _user['user_id'] != user_id:
+                        user_id = _user['user_id']
+                        break
+                # Check if the moderator allowed your request.
+                res_inv = self.client.accept_speaker_invite(self.channel_name, user_id)
+                if res_inv['success']:
+                    print("[-] Now you have a speaker permission.")
+                    print("    Please re-join this channel to activate a permission.")
+                    self.shell_events.put(UIEvent(UIEventType.Rejoin, None))
+                    return False
+            return True
 
 
 def chat_main(client):
@@ -615,7 +726,8 @@ def main():
         client = Clubhouse(
             user_id=user_id,
             user_token=user_token,
-            user_device=user_device
+            user_device=user_device,
+            scheduler=True
         )
 
         # # Check if user is still on the waitlist
@@ -635,61 +747,6 @@ def main():
         user_authentication(client)
         main()
 
-# from pubnub.callbacks import SubscribeCallback
-# from pubnub.enums import PNStatusCategory, PNOperationType
-# from pubnub.pnconfiguration import PNConfiguration
-# from pubnub.pubnub import PubNub
-# pnconfig = PNConfiguration()
-# pnconfig.publish_key = Clubhouse.PUBNUB_PUB_KEY
-# pnconfig.subscribe_key = Clubhouse.PUBNUB_SUB_KEY
-# pnconfig.uuid = 'myUniqueUUID'
-# PUBNUB_ROOM = PubNub(pnconfig)
-
-
-def my_publish_callback(envelope, status):
-    # Check whether request successfully completed or not
-    if not status.is_error():
-        pass  # Message successfully published to specified channel.
-    else:
-        pass  # Handle message publish error. Check 'category' property to find out possible issue
-              # because of which request did fail.
-              # Request can be resent using: [status retry];
-
-class RoomSubscribeCallback:
-# class RoomSubscribeCallback(SubscribeCallback):
-    def presence(self, pubnub, presence):
-        print(presence)
-
-    def status(self, pubnub, status):
-        if status.category == PNStatusCategory.PNUnexpectedDisconnectCategory:
-            pass  # This event happens when radio / connectivity is lost
-
-        elif status.category == PNStatusCategory.PNConnectedCategory:
-            # Connect event. You can do stuff like publish, and know you'll get it.
-            # Or just use the connected event to confirm you are subscribed for
-            # UI / internal notifications, etc
-            pubnub.publish().channel('my_channel').message('Hello world!').pn_async(my_publish_callback)
-        elif status.category == PNStatusCategory.PNReconnectedCategory:
-            pass
-            # Happens as part of our regular operation. This event happens when
-            # radio / connectivity is lost, then regained.
-        elif status.category == PNStatusCategory.PNDecryptionErrorCategory:
-            pass
-            # Handle message decryption error. Probably client configured to
-            # encrypt messages and on live data feed it received plain text.
-
-    def message(self, pubnub, message):
-        # Handle new message stored in message.message
-        print(message.message)
-
-# PUBNUB_ROOM.add_listener(RoomSubscribeCallback())
-
-class RoomPubNub:
-    def __init__(self, client):
-        super(RoomPubNub, self).__init__()
-        pubnub.subscribe().channels('my_channel').execute()
-        pass
-
 if __name__ == "__main__":
     try:
         main()
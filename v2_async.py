@@ -0,0 +1,397 @@
+#!/usr/bin/python -u
+#-*- coding: utf-8 -*-
+
+"""
+v2_async.py
+
+Asyncio runtime of v2.py
+
+Shell input, room events, keep-alive pings and speaker permission polling
+of every room run as tasks of a single event loop on AsyncClubhouse.
+Same commands as v2.py.
+"""
+
+import sys
+import asyncio
+from typing import Optional
+from clubhouse.clubhouse import Clubhouse, AsyncClubhouse
+from clubhouse.keepalive import AsyncPingManager
+from clubhouse.feed import AsyncChannelFeed
+from clubhouse.room import RoomState
+from clubhouse.realtime import AsyncRoomEventStream
+from clubhouse.ratelimit import RequestFailed
+from v2 import (
+    RTC, Session, UIEvent, UIEventType,
+    read_config, print_channels, print_users, user_authentication,
+)
+
+async def read_lines(prompt="> "):
+    """ (str) -> async generator
+
+    Yield the lines typed on stdin, until end of file.
+    """
+    loop = asyncio.get_running_loop()
+    lines = asyncio.Queue()
+    try:
+        # Read from the loop when stdin is readable, without a thread
+        loop.add_reader(sys.stdin.fileno(), lambda: lines.put_nowait(sys.stdin.readline()))
+    except (NotImplementedError, ValueError, OSError):
+        # e.g. Windows, or stdin is a regular file
+        lines = None
+    try:
+        while True:
+            print(prompt, end="", flush=True)
+            if lines is None:
+                line = await loop.run_in_executor(None, sys.stdin.readline)
+            else:
+                line = await lines.get()
+            if not line:
+                return
+            yield line.strip()
+    finally:
+        if lines is not None:
+            loop.remove_reader(sys.stdin.fileno())
+
+
+class AsyncRoomSession:
+    """
+    Same as v2.RoomSession, as tasks of the event loop.
+    Shell commands (UIEvent) and room events (dict) arrive on `events`.
+    """
+
+    # Seconds between two checks for the speaker permission, without room events
+    WAIT_SPEAKER_INTERVAL = 10
+
+    # Seconds between two active_ping, without a ping manager
+    PING_INTERVAL = 30
+
+    def __init__(self, client, channel_name, pings=None) -> None:
+        self.client = client
+        self.channel_name = channel_name
+        self.user_id = client.HEADERS.get("CH-UserID")
+        self.user_key = int(self.user_id)
+        self.max_limit = 20
+        self.pings = pings
+        self.channel_speaker_permission = False
+        self.channel_info = None
+        self.room = None
+        self.stream = None
+        self.events = asyncio.Queue()
+        self.tasks = set()
+        self.zombie = False
+
+    async def run(self) -> Optional['AsyncRoomSession']:
+        """
+        Returns the session to continue with after a rejoin
+        """
+        if not await self.join():
+            return None
+        await self._print_users()
+
+        while True:
+            ev = await self.events.get()
+            try:
+                if isinstance(ev, dict):
+                    ev = await self._handle_room_event(ev)
+                    if ev is None:
+                        continue
+                if ev.enum == UIEventType.Leave:
+                    break
+                elif ev.enum == UIEventType.RequestSpeaker:
+                    await self._request_speaker_permission()
+                elif ev.enum == UIEventType.Refresh:
+                    await self._print_users()
+                elif ev.enum == UIEventType.Rejoin:
+                    return await self.rejoin()
+                elif ev.enum == UIEventType.AcceptFriends:
+                    await self.accept_friends()
+            except RequestFailed as err:
+                # Still failing after the retries of the scheduler
+                print(f"[-] {err}")
+        await self.leave()
+        print(f"left room [{self.channel_name}]")
+        return None
+
+    async def join(self) -> bool:
+        self.channel_info = await self.client.join_channel(self.channel_name)
+        if not self.channel_info['success']:
+            # Check if this channel_name was taken from the link
+            self.channel_info = await self.client.join_channel(self.channel_name, "link", "e30=")
+            if not self.channel_info['success']:
+                print(f"[-] Error while joining the channel ({self.channel_info['error_message']})")
+                return False
+
+        print(f"joined channel [{self.channel_name}]")
+
+        self.room = RoomState(self.channel_name, self.channel_info)
+        self.channel_speaker_permission = self.user_key in self.room.speakers
+
+        # Check for the voice level.
+        if RTC:
+            RTC.joinChannel(self.channel_info['token'], self.channel_name, "", self.user_key)
+        else:
+            print("[!] Agora SDK is not installed.")
+            print("    You may not speak or listen to the conversation.")
+
+        # Activate pinging
+        await self.client.active_ping(self.channel_name)
+        if self.pings is not None:
+            self.pings.add(self.channel_name)
+        else:
+            self._start(self._ping_keep_alive())
+
+        # Follow the room over PubNub instead of polling get_channel
+        if self.channel_info.get('pubnub_token'):
+            self.stream = AsyncRoomEventStream(
+                self.client, self.room, self.channel_info, on_event=self.events.put_nowait
+            ).start()
+        return True
+
+    async def leave(self):
+        # Safely leave the channel upon quitting the channel.
+        if self.zombie:
+            return
+        self.zombie = True
+        for task in list(self.tasks):
+            task.cancel()
+        if self.pings is not None:
+            self.pings.remove(self.channel_name)
+        if self.stream:
+            await self.stream.stop()
+        if RTC:
+            RTC.leaveChannel()
+        await self.client.leave_channel(self.channel_name)
+
+    async def rejoin(self) -> Optional['AsyncRoomSession']:
+        await self.leave()
+        neu = AsyncRoomSession(self.client, self.channel_name, self.pings)
+        neu.channel_speaker_permission = self.channel_speaker_permission
+        return neu
+
+    async def accept_friends(self):
+        await self._refresh_info()
+        for user in self.room.get_users():
+            if bool(user['is_followed_by_speaker']) and not bool(user['is_invited_as_speaker']):
+                await self.client.invite_speaker(self.channel_name, user['user_id'])
+
+    def _start(self, coro):
+        """ Run a task of the room, cancelled when leaving """
+        task = asyncio.get_running_loop().create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def _refresh_info(self):
+        if self.stream and self.stream.running:
+            # The room is kept up to date by the event stream
+            return
+        _channel_info = await self.client.get_channel(self.channel_name)
+        if bool(_channel_info['success']):
+            self.channel_info = _channel_info
+            self.room.update(_channel_info)
+
+    async def _print_users(self):
+        await self._refresh_info()
+        # Check if the user is the speaker
+        self.channel_speaker_permission = self.user_key in self.room.speakers
+        print_users(self.room, self.max_limit)
+
+    async def _handle_room_event(self, event) -> Optional[UIEvent]:
+        """ (dict) -> UIEvent
+        Returns the UI event to act on, if any.
+        """
+        action = event.get('action')
+        if action == "end_channel":
+            print(f"[-] The room [{self.channel_name}] has ended.")
+            return UIEvent(UIEventType.Leave, None)
+        if event.get('user_id') != self.user_key:
+            return None
+        if action == "invite_speaker" and not self.channel_speaker_permission:
+            if event.get('from_user_id') is None:
+                # Notice to the whole room; the invite itself comes on the personal channel
+                return None
+            res_inv = await self.client.accept_speaker_invite(self.channel_name, event['from_user_id'])
+            if res_inv['success']:
+                print("[-] Now you have a speaker permission.")
+                print("    Please re-join this channel to activate a permission.")
+                return UIEvent(UIEventType.Rejoin, None)
+        elif action in ("add_speaker", "make_moderator"):
+            self.channel_speaker_permission = True
+        elif action == "remove_speaker":
+            self.channel_speaker_permission = False
+        return None
+
+    async def _request_speaker_permission(self):
+        """ (str) -> bool
+
+        Raise hands for permissions
+        """
+        if self.channel_speaker_permission:
+            print("[/] You are already a speaker.")
+            return
+        await self.client.audience_reply(self.channel_name, True, False)
+        if not (self.stream and self.stream.running):
+            # No event stream, so poll for the invite instead
+            self._start(self._wait_speaker_permission())
+        print("[/] You've raised your hand. Wait for the moderator to give you the permission.")
+
+    async def _ping_keep_alive(self):
+        """ Continue to ping alive every 30 seconds. """
+        while True:
+            await asyncio.sleep(self.PING_INTERVAL)
+            await self.client.active_ping(self.channel_name)
+
+    async def _wait_speaker_permission(self):
+        """ Runs when you've requested for a voice permission. """
+        user_id = self.user_id
+        while True:
+            await asyncio.sleep(self.WAIT_SPEAKER_INTERVAL)
+            # Polling, so it must not hold up the commands of the user
+            with self.client.limits(priority="background"):
+                # Get some random users from the channel.
+                _channel_info = await self.client.get_channel(self.channel_name)
+                if not _channel_info['success']:
+                    continue
+                self.room.update(_channel_info)
+                for _user in _channel_info['users']:
+                    if _user['user_id'] != user_id:
+                        user_id = _user['user_id']
+                        break
+                # Check if the moderator allowed your request.
+                res_inv = await self.client.accept_speaker_invite(self.channel_name, user_id)
+            if res_inv['success']:
+                print("[-] Now you have a speaker permission.")
+                print("    Please re-join this channel to activate a permission.")
+                self.events.put_nowait(UIEvent(UIEventType.Rejoin, None))
+                return
+
+
+class AsyncSession(Session):
+    """
+    Same as v2.Session, on one event loop. The audio device commands are
+    those of Session.
+    """
+
+    def __init__(self, client): # pylint: disable=super-init-not-called
+        self.client = client
+        self.max_limit = 20
+        self.user_id = client.HEADERS.get("CH-UserID")
+        self.is_mute = False
+        self.room = None
+        self.pings = None
+        self.channels = None
+        self._room_task = None
+
+    async def run(self):
+        self.pings = AsyncPingManager(self.client)
+        self.channels = AsyncChannelFeed(self.client)
+        try:
+            async for raw in read_lines():
+                try:
+                    if raw and not await self.command(raw):
+                        break
+                except RequestFailed as err:
+                    print(f"[-] {err}")
+        finally:
+            await self._leave_room()
+            self.pings.close()
+            self.channels.close()
+
+    async def command(self, raw) -> bool:
+        """
+        Returns False to exit
+        """
+        inp = raw.split()
+        if inp[0] == "exit":
+            return False
+        elif inp[0] == "channels":
+            try:
+                print_channels(await self.channels.get(), self.max_limit, self.channels.age)
+            except Exception as err:
+                print(f"[-] Error while listing the channels ({err})")
+        elif inp[0] == "leave":
+            self._to_room(UIEventType.Leave)
+        elif inp[0] == "hand-up":
+            self._to_room(UIEventType.RequestSpeaker)
+        elif inp[0] == "rejoin":
+            self._to_room(UIEventType.Rejoin)
+        elif inp[0] == "refresh":
+            self._to_room(UIEventType.Refresh)
+        elif inp[0] == "accept-friends":
+            self._to_room(UIEventType.AcceptFriends)
+        elif inp[0] == "toggle-mute" or inp[0] == "m":
+            self._toggle_mute()
+        elif inp[0] == "outputs":
+            self.outputs()
+        elif inp[0] == "inputs":
+            self.inputs()
+        elif inp[0] == "set-output":
+            if len(inp) == 2:
+                self.set_output(inp[1])
+        elif inp[0] == "set-input":
+            if len(inp) == 2:
+                self.set_input(inp[1])
+        elif inp[0] == "update-photo":
+            await self.client.update_photo(inp[1])
+        elif inp[0] == "search-friends":
+            print(await self.client.search_users(raw[len(inp[0]) + 1:], following_only=True))
+        elif inp[0] == "join":
+            if len(inp) == 2:
+                await self._leave_room()
+                self.room = AsyncRoomSession(self.client, inp[1], self.pings)
+                self._room_task = asyncio.get_running_loop().create_task(self._room_loop(self.room))
+            else:
+                print("syntax: join <channel name>")
+        else:
+            print("unknown command")
+        return True
+
+    def _to_room(self, enum):
+        if self.room is not None:
+            self.room.events.put_nowait(UIEvent(enum, None))
+
+    async def _room_loop(self, room):
+        channel_name = room.channel_name
+        try:
+            while room is not None:
+                self.room = room
+                room = await room.run()
+        except Exception as err: # pylint: disable=broad-except
+            print(f"[-] Error in room [{channel_name}] ({err})")
+            await self.room.leave()
+        finally:
+            self.room = None
+
+    async def _leave_room(self):
+        """ Leave the current room, and wait until it is left """
+        if self._room_task is None:
+            return
+        self._to_room(UIEventType.Leave)
+        await self._room_task
+        self._room_task = None
+
+
+async def chat_main(user_id, user_token, user_device):
+    """ (str, str, str) -> NoneType
+    Main function for chat
+    """
+    async with AsyncClubhouse(user_id=user_id, user_token=user_token, user_device=user_device,
+                              scheduler=True) as client:
+        await AsyncSession(client).run()
+
+def main():
+    """
+    Initialize required configurations, start with some basic stuff.
+    """
+    user_config = read_config()
+    user_id = user_config.get('user_id')
+    user_token = user_config.get('user_token')
+    user_device = user_config.get('user_device')
+    if not (user_id and user_token and user_device):
+        user_authentication(Clubhouse())
+        main()
+        return
+    asyncio.run(chat_main(user_id, user_token, user_device))
+
+if __name__ == "__main__":
+    main()